@@ -1,13 +1,223 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.db.models import Q, Exists, OuterRef, Min
+from django.utils.functional import cached_property
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
+from . import estados_masivos
+from .archivo import referencias_archivadas
+from .busqueda import filtrar_personal
+from .invalidacion import invalidar_calendario
 from .models import (
     Personal, DeptoEmpresa, Cargo, InfoLaboral,
     TipoAusentismo, Ausentismo, TipoLicenciaMedica, LicenciaMedicaPorPersonal,
-    Estado, EstadoFuente, Turno, TurnoBloque, Faena, AsignacionFaena, EstadoManual
+    Estado, EstadoFuente, Turno, TurnoBloque, Faena, AsignacionFaena, EstadoManual,
+    RegistroArchivado
 )
 
+# ============================================================================
+# SOPORTE PARA TABLAS GRANDES
+# ============================================================================
+
+def filas_estimadas(queryset):
+    """
+    Cantidad de filas estimada por el motor para la tabla del queryset, sin
+    recorrerla. Solo aplica a querysets sin filtros: PostgreSQL y MySQL usan
+    sus estadísticas; SQLite, MAX(rowid), que sale del extremo del B-tree y
+    es una cota superior (no descuenta filas borradas). En otro caso retorna None.
+    """
+    if queryset.query.where:
+        return None
+    
+    connection = connections[queryset.db]
+    tabla = queryset.model._meta.db_table
+    parametros = [tabla]
+    if connection.vendor == 'postgresql':
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE relname = %s"
+    elif connection.vendor == 'mysql':
+        sql = "SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s"
+    elif connection.vendor == 'sqlite':
+        sql = f"SELECT MAX(rowid) FROM {connection.ops.quote_name(tabla)}"
+        parametros = []
+    else:
+        return None
+    
+    with connection.cursor() as cursor:
+        cursor.execute(sql, parametros)
+        fila = cursor.fetchone()
+    if not fila or fila[0] is None or fila[0] < 0:
+        return None
+    return int(fila[0])
+
+class PaginadorConteoEstimado(Paginator):
+    """
+    Paginador que evita el COUNT(*) exacto de tablas grandes: sin filtros usa
+    la estimación del motor si supera `umbral`; con filtros (o si no hay
+    estimación) cuenta de forma exacta.
+    """
+    umbral = 10000
+    
+    @cached_property
+    def count(self):
+        estimado = filas_estimadas(self.object_list)
+        if estimado is not None and estimado >= self.umbral:
+            return estimado
+        return super().count
+
+class TablaGrandeAdmin(admin.ModelAdmin):
+    """
+    Base para tablas que crecen con la dotación (asignaciones, estados manuales,
+    ausentismos, licencias): paginación con conteo estimado y sin el segundo
+    COUNT(*) del total sin filtrar.
+    """
+    paginator = PaginadorConteoEstimado
+    show_full_result_count = False
+
+class BusquedaPersonalAdminMixin:
+    """
+    Busca por nombre o RUT de la persona (sin tildes, por prefijo de palabra)
+    con el índice de palabras de calendario.busqueda: un personal_id__in sobre
+    PalabraBusquedaPersonal en lugar de LIKE sobre el join, que no usan índice.
+    `campo_personal` es la FK a Personal del modelo.
+    """
+    campo_personal = 'personal'
+    
+    def get_search_fields(self, request):
+        # Solo para que el changelist muestre la caja de búsqueda
+        return [f'={self.campo_personal}__rut']
+    
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        personas = filtrar_personal(Personal.objects.all(), search_term).values('personal_id')
+        return queryset.filter(**{f'{self.campo_personal}__in': personas}), False
+
+# ============================================================================
+# ACCIONES MASIVAS
+# ============================================================================
+
+class ArchivoHistoricoAdminMixin:
+    """
+    La confirmación de borrado muestra los registros del archivo histórico que
+    lo impiden (claves PROTECT) o que se borran en cascada; la regla en sí la
+    aplica calendario.signals.respetar_archivo_al_borrar.
+    """
+
+    def get_deleted_objects(self, objs, request):
+        eliminados, conteo, permisos, protegidos = super().get_deleted_objects(objs, request)
+        en_cascada = 0
+        for obj in objs:
+            archivo_protegido, archivo_en_cascada = referencias_archivadas(obj)
+            protegidos.extend(f'{RegistroArchivado._meta.verbose_name}: {registro}' for registro in archivo_protegido[:10])
+            en_cascada += archivo_en_cascada.count()
+        if en_cascada:
+            nombre = RegistroArchivado._meta.verbose_name_plural
+            conteo[nombre] = conteo.get(nombre, 0) + en_cascada
+        return eliminados, conteo, permisos, protegidos
+
+
+class FechaAccionForm(ActionForm):
+    fecha = forms.DateField(required=False, label='Fecha', widget=forms.DateInput(attrs={'type': 'date'}))
+
+class AsignacionAccionForm(FechaAccionForm):
+    faena = forms.ModelChoiceField(Faena.objects.filter(activo=True), required=False, label='Faena')
+    turno = forms.ModelChoiceField(Turno.objects.filter(activo=True), required=False, label='Turno')
+
+class EstadoManualMasivoForm(ActionForm):
+    estado = forms.ModelChoiceField(Estado.objects.filter(activo=True), required=False, label='Estado')
+    fecha_inicio = forms.DateField(required=False, label='Desde', widget=forms.DateInput(attrs={'type': 'date'}))
+    fecha_fin = forms.DateField(required=False, label='Hasta', widget=forms.DateInput(attrs={'type': 'date'}))
+    motivo = forms.CharField(required=False, max_length=200, label='Motivo')
+
+class AccionesRangoMixin:
+    """
+    Acciones masivas para modelos con fecha_inicio, fecha_fin y activo.
+    Cada acción valida la selección completa y aplica un único UPDATE dentro
+    de una transacción: se actualizan todas las filas o ninguna. Como un UPDATE
+    no emite señales, cada acción invalida el calendario de la selección.
+    """
+    action_form = FechaAccionForm
+    actions = ['cerrar_en_fecha', 'extender_hasta_fecha', 'desactivar']
+    
+    def parametro_accion(self, request, campo, requerido=True):
+        """Valor limpio de un campo del formulario de acciones (None si falta o es inválido)"""
+        campo_form = self.action_form.base_fields[campo]
+        try:
+            valor = campo_form.clean(request.POST.get(campo) or None)
+        except ValidationError as e:
+            self.message_user(request, f'{campo_form.label}: {" ".join(e.messages)}', messages.ERROR)
+            return None
+        if valor is None and requerido:
+            self.message_user(request, f'Indica {campo_form.label.lower()} para esta acción.', messages.ERROR)
+        return valor
+    
+    def invalidar_seleccion(self, queryset, fecha_inicio=None, fecha_fin=None):
+        """Invalida el calendario de las personas seleccionadas (por defecto desde su primer registro, sin fin)"""
+        personal_ids = list(queryset.order_by().values_list('personal_id', flat=True).distinct())
+        if not personal_ids:
+            return
+        if fecha_inicio is None:
+            fecha_inicio = queryset.aggregate(desde=Min('fecha_inicio'))['desde']
+        invalidar_calendario(personal_ids, fecha_inicio, fecha_fin)
+    
+    def solapamientos_al_extender(self, queryset, fecha):
+        """Filas de la selección que quedarían solapadas al extenderlas (ninguna por defecto)"""
+        return queryset.none()
+    
+    def cerrar_en_fecha(self, request, queryset):
+        fecha = self.parametro_accion(request, 'fecha')
+        if fecha is None:
+            return
+        
+        with transaction.atomic():
+            invalidas = queryset.filter(fecha_inicio__gt=fecha).count()
+            if invalidas:
+                self.message_user(request, f'{invalidas} registro(s) comienzan después del {fecha:%d/%m/%Y}; no se aplicó ningún cambio.', messages.ERROR)
+                return
+            cerradas = queryset.filter(Q(fecha_fin__isnull=True) | Q(fecha_fin__gt=fecha))
+            self.invalidar_seleccion(cerradas, fecha_inicio=fecha)
+            actualizadas = cerradas.update(fecha_fin=fecha)
+        
+        self.message_user(request, f'{actualizadas} registro(s) cerrados al {fecha:%d/%m/%Y}.', messages.SUCCESS)
+    cerrar_en_fecha.short_description = "Cerrar en la fecha indicada"
+    
+    def extender_hasta_fecha(self, request, queryset):
+        fecha = self.parametro_accion(request, 'fecha')
+        if fecha is None:
+            return
+        
+        with transaction.atomic():
+            invalidas = queryset.filter(Q(fecha_fin__isnull=True) | Q(fecha_fin__gte=fecha)).count()
+            if invalidas:
+                self.message_user(request, f'{invalidas} registro(s) no tienen fecha de fin o ya terminan el {fecha:%d/%m/%Y} o después; no se aplicó ningún cambio.', messages.ERROR)
+                return
+            
+            solapadas = list(self.solapamientos_al_extender(queryset, fecha).select_related('personal')[:5])
+            if solapadas:
+                nombres = ', '.join(str(registro.personal) for registro in solapadas)
+                self.message_user(request, f'Extender hasta el {fecha:%d/%m/%Y} solaparía asignaciones de: {nombres}; no se aplicó ningún cambio.', messages.ERROR)
+                return
+            
+            desde = queryset.aggregate(desde=Min('fecha_fin'))['desde']
+            self.invalidar_seleccion(queryset, fecha_inicio=desde, fecha_fin=fecha)
+            actualizadas = queryset.update(fecha_fin=fecha)
+        
+        self.message_user(request, f'{actualizadas} registro(s) extendidos hasta el {fecha:%d/%m/%Y}.', messages.SUCCESS)
+    extender_hasta_fecha.short_description = "Extender hasta la fecha indicada"
+    
+    def desactivar(self, request, queryset):
+        with transaction.atomic():
+            activas = queryset.filter(activo=True)
+            self.invalidar_seleccion(activas)
+            actualizadas = activas.update(activo=False)
+        self.message_user(request, f'{actualizadas} registro(s) desactivados.', messages.SUCCESS)
+    desactivar.short_description = "Desactivar seleccionados"
+
 # ============================================================================
 # ADMIN PARA MODELOS EXISTENTES
 # ============================================================================
@@ -15,9 +225,41 @@ from .models import (
 @admin.register(Personal)
 class PersonalAdmin(admin.ModelAdmin):
     list_display = ['nombre', 'apepat', 'apemat', 'rut', 'correo', 'activo']
-    list_filter = ['activo', 'fechanac']
-    search_fields = ['nombre', 'apepat', 'apemat', 'rut', 'correo']
+    list_filter = ['activo']
+    # Nombre y RUT se buscan en el índice de palabras (sin tildes, ver
+    # calendario.busqueda); el correo, por prefijo
+    search_fields = ['^correo']
     ordering = ['nombre', 'apepat']
+    action_form = EstadoManualMasivoForm
+    actions = ['aplicar_estado_manual']
+    
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        por_correo, _ = super().get_search_results(request, queryset, search_term)
+        return filtrar_personal(queryset, search_term) | por_correo, False
+    
+    def aplicar_estado_manual(self, request, queryset):
+        campos = self.action_form.base_fields
+        try:
+            estado = campos['estado'].clean(request.POST.get('estado') or None)
+            fecha_inicio = campos['fecha_inicio'].clean(request.POST.get('fecha_inicio') or None)
+            fecha_fin = campos['fecha_fin'].clean(request.POST.get('fecha_fin') or None)
+            motivo = campos['motivo'].clean(request.POST.get('motivo', ''))
+        except ValidationError as e:
+            self.message_user(request, ' '.join(e.messages), messages.ERROR)
+            return
+        if not all([estado, fecha_inicio, fecha_fin]):
+            self.message_user(request, 'Indica estado, fecha desde y fecha hasta para esta acción.', messages.ERROR)
+            return
+        
+        try:
+            personal_ids = estados_masivos.aplicar_estado_manual(estado, fecha_inicio, fecha_fin, queryset.filter(activo=True), motivo)
+        except ValueError as e:
+            self.message_user(request, str(e), messages.ERROR)
+            return
+        self.message_user(request, f'{estado.nombre} aplicado a {len(personal_ids)} persona(s).', messages.SUCCESS)
+    aplicar_estado_manual.short_description = "Aplicar estado manual a los seleccionados"
 
 @admin.register(DeptoEmpresa)
 class DeptoEmpresaAdmin(admin.ModelAdmin):
@@ -31,33 +273,40 @@ class CargoAdmin(admin.ModelAdmin):
     search_fields = ['cargo']
 
 @admin.register(InfoLaboral)
-class InfoLaboralAdmin(admin.ModelAdmin):
+class InfoLaboralAdmin(BusquedaPersonalAdminMixin, TablaGrandeAdmin):
     list_display = ['personal_id', 'depto_id', 'cargo_id', 'fechacontrata']
-    list_filter = ['depto_id', 'cargo_id', 'fechacontrata']
-    search_fields = ['personal_id__nombre', 'personal_id__apepat']
+    list_filter = ['depto_id', 'cargo_id']
+    list_select_related = ['personal_id', 'depto_id', 'cargo_id']
+    campo_personal = 'personal_id'
+    autocomplete_fields = ['personal_id', 'depto_id', 'cargo_id']
+    date_hierarchy = 'fechacontrata'
 
 @admin.register(TipoAusentismo)
-class TipoAusentismoAdmin(admin.ModelAdmin):
+class TipoAusentismoAdmin(ArchivoHistoricoAdminMixin, admin.ModelAdmin):
     list_display = ['tipo']
     search_fields = ['tipo']
 
 @admin.register(Ausentismo)
-class AusentismoAdmin(admin.ModelAdmin):
+class AusentismoAdmin(BusquedaPersonalAdminMixin, TablaGrandeAdmin):
     list_display = ['personal_id', 'tipoausen_id', 'fechaini', 'fechafin', 'observacion']
-    list_filter = ['tipoausen_id', 'fechaini', 'fechafin']
-    search_fields = ['personal_id__nombre', 'personal_id__apepat', 'observacion']
+    list_filter = ['tipoausen_id']
+    list_select_related = ['personal_id', 'tipoausen_id']
+    campo_personal = 'personal_id'
+    autocomplete_fields = ['personal_id', 'tipoausen_id']
     date_hierarchy = 'fechaini'
 
 @admin.register(TipoLicenciaMedica)
-class TipoLicenciaMedicaAdmin(admin.ModelAdmin):
+class TipoLicenciaMedicaAdmin(ArchivoHistoricoAdminMixin, admin.ModelAdmin):
     list_display = ['tipoLicenciaMedica']
     search_fields = ['tipoLicenciaMedica']
 
 @admin.register(LicenciaMedicaPorPersonal)
-class LicenciaMedicaPorPersonalAdmin(admin.ModelAdmin):
+class LicenciaMedicaPorPersonalAdmin(BusquedaPersonalAdminMixin, TablaGrandeAdmin):
     list_display = ['personal_id', 'tipoLicenciaMedica_id', 'fechaEmision', 'fecha_fin_licencia', 'observacion']
-    list_filter = ['tipoLicenciaMedica_id', 'fechaEmision', 'fecha_fin_licencia']
-    search_fields = ['personal_id__nombre', 'personal_id__apepat', 'observacion']
+    list_filter = ['tipoLicenciaMedica_id']
+    list_select_related = ['personal_id', 'tipoLicenciaMedica_id']
+    campo_personal = 'personal_id'
+    autocomplete_fields = ['personal_id', 'tipoLicenciaMedica_id']
     date_hierarchy = 'fechaEmision'
 
 # ============================================================================
@@ -65,7 +314,7 @@ class LicenciaMedicaPorPersonalAdmin(admin.ModelAdmin):
 # ============================================================================
 
 @admin.register(Estado)
-class EstadoAdmin(admin.ModelAdmin):
+class EstadoAdmin(ArchivoHistoricoAdminMixin, admin.ModelAdmin):
     list_display = ['nombre', 'nombre_corto', 'color_preview', 'background_color_preview', 'prioridad', 'es_bloqueante', 'es_predeterminado', 'activo']
     list_filter = ['activo', 'es_bloqueante', 'es_predeterminado', 'prioridad']
     search_fields = ['nombre', 'nombre_corto']
@@ -103,7 +352,7 @@ class TurnoBloqueInline(admin.TabularInline):
     fields = ['orden', 'duracion_dias', 'estado']
 
 @admin.register(Turno)
-class TurnoAdmin(admin.ModelAdmin):
+class TurnoAdmin(ArchivoHistoricoAdminMixin, admin.ModelAdmin):
     list_display = ['nombre', 'longitud_ciclo', 'activo', 'descripcion_short']
     list_filter = ['activo']
     search_fields = ['nombre', 'descripcion']
@@ -117,7 +366,7 @@ class TurnoAdmin(admin.ModelAdmin):
     descripcion_short.short_description = "Descripción"
 
 @admin.register(TurnoBloque)
-class TurnoBloqueAdmin(admin.ModelAdmin):
+class TurnoBloqueAdmin(ArchivoHistoricoAdminMixin, admin.ModelAdmin):
     list_display = ['turno', 'orden', 'duracion_dias', 'estado', 'estado_color_preview']
     list_filter = ['turno', 'estado', 'estado__activo']
     ordering = ['turno', 'orden']
@@ -135,7 +384,7 @@ class TurnoBloqueAdmin(admin.ModelAdmin):
     estado_color_preview.short_description = "Vista Previa"
 
 @admin.register(Faena)
-class FaenaAdmin(admin.ModelAdmin):
+class FaenaAdmin(ArchivoHistoricoAdminMixin, admin.ModelAdmin):
     list_display = ['nombre', 'ubicacion', 'activo', 'descripcion_short']
     list_filter = ['activo']
     search_fields = ['nombre', 'ubicacion', 'descripcion']
@@ -148,26 +397,87 @@ class FaenaAdmin(admin.ModelAdmin):
     descripcion_short.short_description = "Descripción"
 
 @admin.register(AsignacionFaena)
-class AsignacionFaenaAdmin(admin.ModelAdmin):
+class AsignacionFaenaAdmin(AccionesRangoMixin, BusquedaPersonalAdminMixin, TablaGrandeAdmin):
     list_display = ['personal', 'faena', 'turno', 'fecha_inicio', 'fecha_fin', 'bloque_inicio', 'activo']
-    list_filter = ['activo', 'faena', 'turno', 'fecha_inicio', 'fecha_fin']
-    search_fields = ['personal__nombre', 'personal__apepat', 'faena__nombre', 'turno__nombre']
+    list_filter = ['activo', 'faena', 'turno']
+    list_select_related = ['personal', 'faena', 'turno', 'bloque_inicio__turno', 'bloque_inicio__estado']
+    autocomplete_fields = ['personal', 'faena', 'turno', 'bloque_inicio']
     date_hierarchy = 'fecha_inicio'
-    ordering = ['personal', 'fecha_inicio']
+    # Mismo orden que el índice (personal, fecha_inicio, fecha_fin)
+    ordering = ['personal_id', 'fecha_inicio']
+    action_form = AsignacionAccionForm
+    actions = AccionesRangoMixin.actions + ['mover_a_faena_turno']
     
-    def get_queryset(self, request):
-        return super().get_queryset(request).select_related('personal', 'faena', 'turno', 'bloque_inicio')
+    def solapamientos_al_extender(self, queryset, fecha):
+        """
+        Asignaciones activas de la selección que, extendidas hasta `fecha`, se
+        cruzarían con otra asignación activa de la misma persona (una sola consulta).
+        """
+        otras = AsignacionFaena.objects.filter(
+            personal_id=OuterRef('personal_id'),
+            activo=True,
+            fecha_inicio__lte=fecha
+        ).filter(
+            Q(fecha_fin__isnull=True) | Q(fecha_fin__gte=OuterRef('fecha_inicio'))
+        ).exclude(pk=OuterRef('pk'))
+        return queryset.filter(activo=True).filter(Exists(otras))
+    
+    def mover_a_faena_turno(self, request, queryset):
+        faena = self.parametro_accion(request, 'faena')
+        turno = self.parametro_accion(request, 'turno', requerido=False)
+        if faena is None:
+            return
+        
+        # Validar el turno antes de tocar nada: sin bloques no hay bloque de inicio al que trasladar
+        if turno is not None:
+            bloques = sorted(turno.bloques.all(), key=lambda bloque: bloque.orden)
+            if not bloques:
+                self.message_user(request, f'El turno {turno} no tiene bloques; no se aplicó ningún cambio.', messages.ERROR)
+                return
+            por_orden = {bloque.orden: bloque for bloque in bloques}
+        
+        with transaction.atomic():
+            self.invalidar_seleccion(queryset)
+            if turno is None:
+                actualizadas = queryset.update(faena=faena)
+            else:
+                # El bloque de inicio se traslada al bloque con el mismo orden en el nuevo turno
+                asignaciones = list(queryset.select_related('bloque_inicio'))
+                for asignacion in asignaciones:
+                    asignacion.faena = faena
+                    asignacion.turno = turno
+                    asignacion.bloque_inicio = por_orden.get(asignacion.bloque_inicio.orden, bloques[0])
+                AsignacionFaena.objects.bulk_update(asignaciones, ['faena', 'turno', 'bloque_inicio'], batch_size=1000)
+                actualizadas = len(asignaciones)
+        
+        destino = f'{faena} / {turno}' if turno else str(faena)
+        self.message_user(request, f'{actualizadas} asignación(es) movidas a {destino}.', messages.SUCCESS)
+    mover_a_faena_turno.short_description = "Mover a la faena/turno indicados"
 
 @admin.register(EstadoManual)
-class EstadoManualAdmin(admin.ModelAdmin):
+class EstadoManualAdmin(AccionesRangoMixin, BusquedaPersonalAdminMixin, TablaGrandeAdmin):
     list_display = ['personal', 'estado', 'fecha_inicio', 'fecha_fin', 'motivo', 'activo', 'creado_en']
-    list_filter = ['activo', 'estado', 'fecha_inicio', 'fecha_fin', 'creado_en']
-    search_fields = ['personal__nombre', 'personal__apepat', 'motivo']
+    list_filter = ['activo', 'estado']
+    list_select_related = ['personal', 'estado']
+    autocomplete_fields = ['personal', 'estado']
     date_hierarchy = 'fecha_inicio'
-    ordering = ['personal', 'fecha_inicio']
-    
-    def get_queryset(self, request):
-        return super().get_queryset(request).select_related('personal', 'estado')
+    # Mismo orden que el índice (personal, fecha_inicio, fecha_fin)
+    ordering = ['personal_id', 'fecha_inicio']
+
+@admin.register(RegistroArchivado)
+class RegistroArchivadoAdmin(BusquedaPersonalAdminMixin, TablaGrandeAdmin):
+    """Solo lectura: el archivo se llena con el comando archivar_historial"""
+    list_display = ['modelo', 'registro_id', 'personal', 'fecha_inicio', 'fecha_fin', 'archivado_en']
+    list_filter = ['modelo']
+    list_select_related = ['personal']
+    date_hierarchy = 'fecha_inicio'
+    ordering = ['personal_id', 'fecha_inicio']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 # ============================================================================
 # PERSONALIZACIÓN DEL SITE ADMIN
@@ -0,0 +1,268 @@
+"""
+Archivo histórico de los registros que producen celdas del calendario.
+
+Las asignaciones cerradas, los estados manuales, los ausentismos y las
+licencias que terminaron antes de un corte se mueven a RegistroArchivado, de
+modo que las tablas calientes (y sus índices) solo crecen con lo vigente.
+Los estados resultantes no cambian: el motor (calendario.motor.Ventana) suma
+los registros archivados que se cruzan con su rango, y como todos terminan
+antes del corte, para rangos recientes esa consulta no encuentra nada en el
+índice (fecha_fin, fecha_inicio).
+
+Mover un registro no cambia ninguna celda, así que el borrado se hace con la
+invalidación suspendida y no encola recálculos. Las claves foráneas de los
+registros archivados quedan como ids en `datos`: borrar un Estado, Turno,
+Faena, etc. que todavía usan se rechaza o se propaga al archivo según su
+on_delete (ver referencias_archivadas).
+"""
+from datetime import datetime
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import models, transaction
+from django.db.models import prefetch_related_objects
+
+from .invalidacion import invalidacion_suspendida
+from .models import AsignacionFaena, EstadoManual, RegistroArchivado
+
+LOTE_POR_DEFECTO = 1000
+
+# Relaciones que el motor usa de cada registro, cargadas una vez para todos los archivados
+RELACIONES_MOTOR = {
+    EstadoManual._meta.label_lower: ['estado'],
+    AsignacionFaena._meta.label_lower: ['faena', 'turno__bloques__estado', 'bloque_inicio__estado'],
+}
+LOOKUPS_FILTRO = {
+    'exact': lambda valor, esperado: valor == esperado,
+    'iexact': lambda valor, esperado: valor is not None and str(valor).lower() == str(esperado).lower(),
+    'in': lambda valor, esperado: valor in esperado,
+    'isnull': lambda valor, esperado: (valor is None) == bool(esperado),
+    'gt': lambda valor, esperado: valor is not None and valor > esperado,
+    'gte': lambda valor, esperado: valor is not None and valor >= esperado,
+    'lt': lambda valor, esperado: valor is not None and valor < esperado,
+    'lte': lambda valor, esperado: valor is not None and valor <= esperado,
+    'range': lambda valor, esperado: valor is not None and esperado[0] <= valor <= esperado[1],
+    'contains': lambda valor, esperado: valor is not None and str(esperado) in str(valor),
+    'icontains': lambda valor, esperado: valor is not None and str(esperado).lower() in str(valor).lower(),
+    'startswith': lambda valor, esperado: valor is not None and str(valor).startswith(str(esperado)),
+    'istartswith': lambda valor, esperado: valor is not None and str(valor).lower().startswith(str(esperado).lower()),
+    'endswith': lambda valor, esperado: valor is not None and str(valor).endswith(str(esperado)),
+    'iendswith': lambda valor, esperado: valor is not None and str(valor).lower().endswith(str(esperado).lower()),
+}
+
+# Transformaciones de fecha que pueden ir antes del lookup (p. ej. fechaini__year__gte)
+TRANSFORMACIONES_FILTRO = {
+    'date': lambda valor: valor.date() if isinstance(valor, datetime) else valor,
+    'year': lambda valor: valor.year,
+    'month': lambda valor: valor.month,
+    'day': lambda valor: valor.day,
+}
+
+# Lookups cuyo valor esperado se convierte con el campo (fechas en texto, ids, etc.)
+LOOKUPS_CONVERTIBLES = {'exact', 'gt', 'gte', 'lt', 'lte'}
+
+
+def modelos_archivables():
+    """{modelo: (campo persona, campo inicio, campo fin)} de los registros con celdas del calendario"""
+    from .signals import RANGOS_CALENDARIO
+    return RANGOS_CALENDARIO
+
+
+def archivar(corte, lote=LOTE_POR_DEFECTO, simular=False):
+    """
+    Mueve al archivo los registros que terminan antes de `corte` (las
+    asignaciones sin fecha de fin nunca se archivan), por lotes de `lote` filas,
+    cada uno en su propia transacción. Retorna {app_label.modelo: cantidad};
+    con `simular` solo cuenta.
+    """
+    resultado = {}
+    for modelo, (campo_personal, campo_inicio, campo_fin) in modelos_archivables().items():
+        pendientes = modelo.objects.filter(**{f'{campo_fin}__lt': corte}).order_by('pk')
+        etiqueta = modelo._meta.label_lower
+        if simular:
+            resultado[etiqueta] = pendientes.count()
+            continue
+
+        resultado[etiqueta] = 0
+        while True:
+            with transaction.atomic():
+                registros = list(pendientes[:lote])
+                if not registros:
+                    break
+                RegistroArchivado.objects.bulk_create([
+                    RegistroArchivado(
+                        modelo=etiqueta,
+                        registro_id=registro.pk,
+                        personal_id=getattr(registro, campo_personal),
+                        fecha_inicio=getattr(registro, campo_inicio),
+                        fecha_fin=getattr(registro, campo_fin),
+                        datos={campo.attname: campo.value_from_object(registro) for campo in modelo._meta.concrete_fields},
+                    )
+                    for registro in registros
+                ])
+                # Las celdas no cambian: se borra sin invalidar (cascadas y PROTECT siguen aplicando)
+                with invalidacion_suspendida():
+                    _, borrados = modelo.objects.filter(pk__in=[registro.pk for registro in registros]).delete()
+                resultado[etiqueta] += borrados.get(modelo._meta.label, 0)
+    return resultado
+
+
+def relaciones_archivadas():
+    """
+    [(etiqueta, campo)] de las claves foráneas de los modelos archivables,
+    salvo la persona, cuyos ids quedan en `datos` de los registros archivados
+    """
+    return [
+        (modelo._meta.label_lower, campo)
+        for modelo, (campo_personal, _, _) in modelos_archivables().items()
+        for campo in modelo._meta.concrete_fields
+        if campo.many_to_one and campo.attname != campo_personal
+    ]
+
+
+def modelos_referenciados():
+    """Modelos a los que apuntan los registros archivados (Estado, Turno, Faena, ...)"""
+    return {campo.related_model for _, campo in relaciones_archivadas()}
+
+
+def referencias_archivadas(instancia):
+    """
+    (protegidos, en cascada): querysets de RegistroArchivado que guardan el id
+    de `instancia` en una clave foránea. Los primeros vienen de campos
+    PROTECT/RESTRICT e impiden borrarla; los segundos se borran con ella, como
+    harían sus registros vigentes.
+    """
+    protegidos = en_cascada = RegistroArchivado.objects.none()
+    modelo = instancia._meta.concrete_model
+    for etiqueta, campo in relaciones_archivadas():
+        if campo.related_model is not modelo:
+            continue
+        registros = RegistroArchivado.objects.filter(modelo=etiqueta, **{f'datos__{campo.attname}': instancia.pk})
+        if campo.remote_field.on_delete is models.CASCADE:
+            en_cascada |= registros
+        else:
+            protegidos |= registros
+    return protegidos, en_cascada
+
+
+def registros_archivados(fecha_inicio, fecha_fin, personal_ids=None):
+    """
+    {app_label.modelo: {personal_id: [instancias]}} de los registros archivados
+    que se cruzan con [fecha_inicio, fecha_fin], ordenados por (inicio, pk) y
+    con las relaciones que usa el motor ya cargadas. Vacío para rangos
+    posteriores al corte, con una sola consulta sobre el índice.
+    """
+    archivados = RegistroArchivado.objects.filter(fecha_inicio__lte=fecha_fin, fecha_fin__gte=fecha_inicio)
+    if personal_ids is not None:
+        archivados = archivados.filter(personal_id__in=personal_ids)
+
+    por_modelo = {}
+    for archivado in archivados.order_by('fecha_inicio', 'registro_id'):
+        por_modelo.setdefault(archivado.modelo, []).append((archivado.personal_id, archivado.instancia()))
+
+    resultado = {}
+    for etiqueta, registros in por_modelo.items():
+        if etiqueta in RELACIONES_MOTOR:
+            prefetch_related_objects([registro for _, registro in registros], *RELACIONES_MOTOR[etiqueta])
+        por_persona = resultado[etiqueta] = {}
+        for personal_id, registro in registros:
+            por_persona.setdefault(personal_id, []).append(registro)
+    return resultado
+
+
+def interpretar_clave(modelo, clave):
+    """
+    Separa una clave de filtro_extra en (campos, transformaciones, lookup):
+    los campos que recorre desde `modelo` (relaciones hacia adelante), las
+    transformaciones de TRANSFORMACIONES_FILTRO y el lookup de LOOKUPS_FILTRO
+    ('exact' si no se indica). ValueError si usa algo que no se puede evaluar
+    en memoria sobre un registro archivado.
+    """
+    partes = clave.split('__')
+    campos = []
+    actual = modelo
+    while partes and actual is not None:
+        try:
+            campo = actual._meta.pk if partes[0] == 'pk' else actual._meta.get_field(partes[0])
+        except FieldDoesNotExist:
+            break
+        if campo.one_to_many or campo.many_to_many or campo.one_to_one and not campo.concrete:
+            raise ValueError(f'filtro_extra "{clave}": solo se admiten relaciones hacia adelante')
+        campos.append(campo)
+        partes.pop(0)
+        actual = campo.related_model if campo.is_relation else None
+    if not campos:
+        raise ValueError(f'filtro_extra "{clave}": {modelo._meta.label} no tiene el campo "{partes[0]}"')
+
+    lookup = partes.pop() if partes and partes[-1] in LOOKUPS_FILTRO else 'exact'
+    for transformacion in partes:
+        if transformacion not in TRANSFORMACIONES_FILTRO:
+            raise ValueError(f'filtro_extra "{clave}": lookup "{transformacion}" no soportado '
+                             f'(se admiten {", ".join([*TRANSFORMACIONES_FILTRO, *LOOKUPS_FILTRO])})')
+    return campos, partes, lookup
+
+
+def _valor_esperado(campo, transformaciones, lookup, esperado):
+    """Convierte el valor del filtro al tipo del campo, como hace el ORM"""
+    if transformaciones or lookup not in LOOKUPS_CONVERTIBLES | {'in', 'range'}:
+        return esperado
+    if campo.many_to_one:
+        campo = campo.target_field
+    try:
+        if lookup in ('in', 'range'):
+            return [campo.to_python(valor) for valor in esperado]
+        return campo.to_python(esperado)
+    except (ValidationError, TypeError) as e:
+        raise ValueError(f'filtro_extra: valor inválido para {campo.name}: {esperado!r}') from e
+
+
+def validar_filtro_extra(modelo, filtro):
+    """ValueError si `filtro` no es un dict de lookups que cumple_filtro pueda evaluar sobre `modelo`"""
+    if not isinstance(filtro, dict):
+        raise ValueError('filtro_extra debe ser un objeto JSON {"campo__lookup": valor}')
+    for clave, esperado in filtro.items():
+        campos, transformaciones, lookup = interpretar_clave(modelo, clave)
+        _valor_esperado(campos[-1], transformaciones, lookup, esperado)
+
+
+def cumple_filtro(registro, filtro):
+    """
+    Evalúa en memoria un filtro_extra de EstadoFuente ({'campo__relacion__lookup': valor})
+    sobre un registro archivado, con los lookups de LOOKUPS_FILTRO y las
+    transformaciones de TRANSFORMACIONES_FILTRO. Una relación al final de la
+    ruta se compara por su clave, como en el ORM. ValueError si el filtro
+    usa algo que no se puede evaluar (ver interpretar_clave).
+    """
+    for clave, esperado in filtro.items():
+        campos, transformaciones, lookup = interpretar_clave(type(registro), clave)
+        valor = registro
+        for i, campo in enumerate(campos):
+            if valor is None:
+                break
+            ultimo = i == len(campos) - 1
+            valor = getattr(valor, campo.attname if ultimo and campo.many_to_one else campo.name)
+        for transformacion in transformaciones:
+            valor = None if valor is None else TRANSFORMACIONES_FILTRO[transformacion](valor)
+        if not LOOKUPS_FILTRO[lookup](valor, _valor_esperado(campos[-1], transformaciones, lookup, esperado)):
+            return False
+    return True
+
+
+def relaciones_filtro(modelo, filtro):
+    """Rutas de relaciones que recorre un filtro_extra sobre `modelo` (para cargarlas de una vez)"""
+    rutas = set()
+    for clave in filtro:
+        campos, _, _ = interpretar_clave(modelo, clave)
+        if len(campos) > 1:
+            rutas.add('__'.join(campo.name for campo in campos[:-1]))
+    return sorted(rutas)
+
+
+def asignacion_archivada_solapada(personal_id, fecha_inicio, fecha_fin):
+    """True si una asignación activa archivada de la persona se cruza con el rango (fin nulo = abierto)"""
+    archivadas = RegistroArchivado.objects.filter(
+        modelo=AsignacionFaena._meta.label_lower, personal_id=personal_id,
+        fecha_fin__gte=fecha_inicio, datos__activo=True
+    )
+    if fecha_fin:
+        archivadas = archivadas.filter(fecha_inicio__lte=fecha_fin)
+    return archivadas.exists()
@@ -0,0 +1,39 @@
+"""
+Búsqueda de personal por nombre o RUT, sin distinguir mayúsculas ni tildes.
+
+Cada persona tiene sus palabras normalizadas en PalabraBusquedaPersonal
+(indexada por palabra) y la concatenación en Personal.busqueda. El término
+más largo de la consulta se busca como prefijo de palabra con un rango sobre
+el índice ([termino, termino + U+FFFF)); los demás se verifican como prefijos
+de palabra en Personal.busqueda, solo sobre los candidatos de ese rango.
+"""
+from .models import Personal, PalabraBusquedaPersonal, normalizar_busqueda
+
+LIMITE_RESULTADOS = 20
+LIMITE_MAXIMO = 50
+
+
+def filtrar_personal(queryset, texto):
+    """Filtra `queryset` de Personal a las personas cuyas palabras empiezan con cada término de `texto`"""
+    terminos = normalizar_busqueda(texto).split()
+    if not terminos:
+        return queryset
+    principal = max(terminos, key=len)
+    candidatos = PalabraBusquedaPersonal.objects.filter(
+        palabra__gte=principal, palabra__lt=principal + '\uffff'
+    ).values('personal_id')
+    queryset = queryset.filter(personal_id__in=candidatos)
+    for termino in terminos:
+        queryset = queryset.filter(busqueda__contains=' ' + termino)
+    return queryset
+
+
+def buscar_personal(texto, limite=LIMITE_RESULTADOS, solo_activos=True):
+    """Hasta `limite` personas (ordenadas por nombre) que coinciden con `texto`; vacío si no hay términos"""
+    if not normalizar_busqueda(texto):
+        return []
+    personal = Personal.objects.all()
+    if solo_activos:
+        personal = personal.filter(activo=True)
+    personal = filtrar_personal(personal, texto)
+    return list(personal.order_by('nombre', 'apepat', 'personal_id')[:min(limite, LIMITE_MAXIMO)])
@@ -0,0 +1,326 @@
+"""
+Prueba de carga concurrente del calendario.
+
+Varios usuarios simulados (hilos) piden, según una mezcla con pesos, la
+página del calendario, su API y las APIs de crear, actualizar y eliminar
+asignaciones, contra la aplicación en el mismo proceso (django.test.Client,
+la misma pila WSGI) o contra un servidor local por HTTP. Se mide la latencia
+de cada petición y se clasifican los fallos: bloqueos de la base de datos
+("database is locked"), timeouts y otros errores.
+
+Las mutaciones no alteran los datos: cada usuario crea asignaciones de una
+semana en un año de prueba pasado (ANIO_MUTACIONES, anterior a las
+asignaciones reales, que pueden no tener fecha de fin), sin solaparse con
+otras, las modifica y las elimina; las que queden se eliminan al terminar
+(y limpiar_asignaciones_prueba() barre las que quedaron sin id conocido).
+"""
+import json
+import math
+import random
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+OPERACIONES = ('pagina', 'api', 'crear', 'actualizar', 'eliminar')
+MEZCLA_POR_DEFECTO = 'pagina=3,api=4,crear=1,actualizar=1,eliminar=1'
+ANIO_MUTACIONES = 1990
+REINTENTOS_LIMPIEZA = 10
+MENSAJES_BLOQUEO = ('database is locked', 'database table is locked', 'deadlock', 'lock wait timeout')
+
+
+def parsear_mezcla(texto):
+    """'pagina=3,api=4,...' -> {operacion: peso}; ValueError si no es válida"""
+    mezcla = {}
+    for parte in texto.split(','):
+        if not parte.strip():
+            continue
+        operacion, _, peso = parte.partition('=')
+        operacion = operacion.strip()
+        if operacion not in OPERACIONES:
+            raise ValueError(f"Operación desconocida '{operacion}' (opciones: {', '.join(OPERACIONES)})")
+        mezcla[operacion] = int(peso)
+        if mezcla[operacion] < 0:
+            raise ValueError('Los pesos no pueden ser negativos')
+    if not any(mezcla.values()):
+        raise ValueError('La mezcla no tiene operaciones')
+    return mezcla
+
+
+class ClienteInterno:
+    """Peticiones a la aplicación en el mismo proceso; cada hilo usa su propia conexión a la base"""
+
+    def __init__(self):
+        # Un host aceptado por ALLOWED_HOSTS ('localhost' vale con DEBUG y la lista vacía)
+        host = next((h for h in settings.ALLOWED_HOSTS if h != '*' and not h.startswith('.')), 'localhost')
+        self.client = Client(raise_request_exception=False, HTTP_HOST=host)
+
+    def get(self, ruta):
+        return self._respuesta(self.client.get(ruta))
+
+    def post(self, ruta, datos):
+        return self._respuesta(self.client.post(ruta, json.dumps(datos), content_type='application/json'))
+
+    def _respuesta(self, respuesta):
+        # Un 500 sin manejar trae la página genérica; se propaga la excepción para clasificarla
+        if respuesta.exc_info:
+            raise respuesta.exc_info[1]
+        return respuesta.status_code, respuesta.content
+
+    def cerrar(self):
+        connection.close()
+
+
+class ClienteHttp:
+    """Peticiones HTTP a un servidor (p. ej. runserver) en `base_url`"""
+
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def _pedir(self, peticion):
+        try:
+            with urllib.request.urlopen(peticion, timeout=self.timeout) as respuesta:
+                return respuesta.status, respuesta.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+        except urllib.error.URLError as e:
+            if isinstance(e.reason, socket.timeout):
+                raise TimeoutError(str(e.reason))
+            raise
+
+    def get(self, ruta):
+        return self._pedir(urllib.request.Request(self.base_url + ruta))
+
+    def post(self, ruta, datos):
+        return self._pedir(urllib.request.Request(
+            self.base_url + ruta, data=json.dumps(datos).encode(), method='POST',
+            headers={'Content-Type': 'application/json'}
+        ))
+
+    def cerrar(self):
+        pass
+
+
+def clasificar(status, cuerpo):
+    """'ok', 'bloqueo' o 'error' según la respuesta"""
+    if status < 400:
+        return 'ok'
+    texto = cuerpo.decode('utf-8', 'replace').lower()
+    if any(mensaje in texto for mensaje in MENSAJES_BLOQUEO):
+        return 'bloqueo'
+    return 'error'
+
+
+def percentil(valores_ordenados, p):
+    """Percentil p (0-100) por rango más cercano sobre una lista ya ordenada"""
+    if not valores_ordenados:
+        return None
+    indice = max(math.ceil(p * len(valores_ordenados) / 100) - 1, 0)
+    return valores_ordenados[indice]
+
+
+class PruebaCarga:
+    """
+    Ejecuta `usuarios` hilos durante `duracion` segundos o hasta completar
+    `peticiones` en total (lo que ocurra primero). `crear_cliente()` entrega
+    un cliente por hilo (ClienteInterno o ClienteHttp).
+    """
+
+    def __init__(self, crear_cliente, mezcla, usuarios=10, duracion=None, peticiones=None,
+                 year=None, month=None, semilla=None):
+        if duracion is None and peticiones is None:
+            raise ValueError('Indica la duración o la cantidad de peticiones')
+        hoy = date.today()
+        self.crear_cliente = crear_cliente
+        self.mezcla = mezcla
+        self.usuarios = usuarios
+        self.duracion = duracion
+        self.peticiones = peticiones
+        self.year = year or hoy.year
+        self.month = month or hoy.month
+        self.semilla = semilla
+        self.resultados = []
+        self._lock = threading.Lock()
+        self._emitidas = 0
+        self._semanas = {}
+
+    # Preparación
+
+    def preparar(self):
+        """Personal, faena y turno para las mutaciones, pedidos a las mismas APIs"""
+        cliente = self.crear_cliente()
+        try:
+            status, cuerpo = cliente.get(f"{reverse('calendario:api_calendario_mensual')}?year={self.year}&month={self.month}")
+            if status != 200:
+                raise RuntimeError(f'api_calendario_mensual respondió {status}')
+            self.personal_ids = [persona['id'] for persona in json.loads(cuerpo)['personal']]
+            status, cuerpo = cliente.get(reverse('calendario:api_catalogo'))
+            if status != 200:
+                raise RuntimeError(f'api_catalogo respondió {status}')
+            catalogo = json.loads(cuerpo)
+        finally:
+            cliente.cerrar()
+
+        self.faena_ids = [faena['id'] for faena in catalogo['faenas']]
+        self.turnos = [turno for turno in catalogo['turnos'] if turno['bloques']]
+        mutaciones = any(self.mezcla.get(operacion) for operacion in ('crear', 'actualizar', 'eliminar'))
+        if mutaciones and not (self.personal_ids and self.faena_ids and self.turnos):
+            raise RuntimeError('Las mutaciones necesitan personal activo, una faena y un turno con bloques')
+
+    def _semana_libre(self, personal_id):
+        """Semana del año de prueba que nadie más usa para esta persona"""
+        with self._lock:
+            semana = self._semanas.get(personal_id, 0)
+            self._semanas[personal_id] = semana + 1
+        inicio = date(ANIO_MUTACIONES, 1, 1) + timedelta(weeks=semana)
+        return inicio, inicio + timedelta(days=5)
+
+    # Ejecución
+
+    def ejecutar(self):
+        self.preparar()
+        self.inicio = time.perf_counter()
+        self.limite = self.inicio + self.duracion if self.duracion else None
+        hilos = [threading.Thread(target=self._usuario, args=(i,), name=f'carga-{i}') for i in range(self.usuarios)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.segundos = time.perf_counter() - self.inicio
+        return self.reporte()
+
+    def _turno_siguiente(self):
+        with self._lock:
+            if self.peticiones is not None and self._emitidas >= self.peticiones:
+                return False
+            if self.limite is not None and time.perf_counter() >= self.limite:
+                return False
+            self._emitidas += 1
+            return True
+
+    def _usuario(self, numero):
+        aleatorio = random.Random(None if self.semilla is None else self.semilla + numero)
+        operaciones = list(self.mezcla)
+        pesos = [self.mezcla[operacion] for operacion in operaciones]
+        cliente = self.crear_cliente()
+        propias = []
+        try:
+            while self._turno_siguiente():
+                operacion = aleatorio.choices(operaciones, pesos)[0]
+                if operacion in ('actualizar', 'eliminar') and not propias:
+                    operacion = 'crear'
+                self._medir(operacion, lambda: self._operacion(cliente, operacion, propias, aleatorio))
+            # Limpieza (sin medir) de las asignaciones que quedaron; se reintenta si la base está bloqueada
+            for asignacion in propias:
+                for intento in range(REINTENTOS_LIMPIEZA):
+                    try:
+                        status, _ = cliente.post(reverse('calendario:eliminar_asignacion'), {'asignacion_id': asignacion['id']})
+                    except TimeoutError:
+                        status = None
+                    if status in (200, 404):
+                        break
+                    time.sleep(0.1 * (intento + 1))
+        finally:
+            cliente.cerrar()
+
+    def _medir(self, operacion, pedir):
+        inicio = time.perf_counter()
+        try:
+            status, cuerpo = pedir()
+            resultado = clasificar(status, cuerpo)
+        except TimeoutError:
+            resultado = 'timeout'
+        except Exception as e:
+            resultado = 'bloqueo' if any(m in str(e).lower() for m in MENSAJES_BLOQUEO) else 'error'
+        latencia_ms = (time.perf_counter() - inicio) * 1000
+        with self._lock:
+            self.resultados.append((operacion, latencia_ms, resultado))
+
+    def _operacion(self, cliente, operacion, propias, aleatorio):
+        mes = f'?year={self.year}&month={self.month}'
+        if operacion == 'pagina':
+            return cliente.get(reverse('calendario:calendario_mensual') + mes)
+        if operacion == 'api':
+            return cliente.get(reverse('calendario:api_calendario_mensual') + mes)
+
+        visible = {'year': self.year, 'month': self.month}
+        if operacion == 'crear':
+            personal_id = aleatorio.choice(self.personal_ids)
+            inicio, fin = self._semana_libre(personal_id)
+            faena_id = aleatorio.choice(self.faena_ids)
+            turno = aleatorio.choice(self.turnos)
+            status, cuerpo = cliente.post(reverse('calendario:crear_asignacion'), dict(
+                visible, personal_id=personal_id, faena_id=faena_id, turno_id=turno['id'],
+                fecha_inicio=inicio.isoformat(), fecha_fin=fin.isoformat(), bloque_inicio_id=turno['bloques'][0]['id']
+            ))
+            if status == 200:
+                propias.append({'id': json.loads(cuerpo)['asignacion_id'], 'faena_id': faena_id, 'turno': turno, 'inicio': inicio})
+            return status, cuerpo
+
+        if operacion == 'actualizar':
+            asignacion = aleatorio.choice(propias)
+            return cliente.post(reverse('calendario:actualizar_asignacion'), dict(
+                visible, asignacion_id=asignacion['id'], faena_id=asignacion['faena_id'],
+                turno_id=asignacion['turno']['id'], bloque_inicio_id=aleatorio.choice(asignacion['turno']['bloques'])['id'],
+                fecha_inicio=asignacion['inicio'].isoformat(),
+                fecha_fin=(asignacion['inicio'] + timedelta(days=aleatorio.randint(0, 5))).isoformat()
+            ))
+
+        indice = aleatorio.randrange(len(propias))
+        status, cuerpo = cliente.post(reverse('calendario:eliminar_asignacion'), dict(visible, asignacion_id=propias[indice]['id']))
+        if status in (200, 404):
+            propias.pop(indice)
+        return status, cuerpo
+
+    # Reporte
+
+    def reporte(self):
+        """Por operación y en total: peticiones, rendimiento, percentiles de latencia y fallos"""
+        grupos = {}
+        for operacion, latencia_ms, resultado in self.resultados:
+            grupos.setdefault(operacion, []).append((latencia_ms, resultado))
+        grupos['total'] = [(latencia_ms, resultado) for _, latencia_ms, resultado in self.resultados]
+
+        filas = {}
+        for nombre, medidas in grupos.items():
+            latencias = sorted(latencia_ms for latencia_ms, _ in medidas)
+            conteo = {'ok': 0, 'error': 0, 'bloqueo': 0, 'timeout': 0}
+            for _, resultado in medidas:
+                conteo[resultado] += 1
+            filas[nombre] = dict(
+                conteo,
+                peticiones=len(medidas),
+                por_segundo=round(len(medidas) / self.segundos, 1) if self.segundos else None,
+                p50_ms=_redondear(percentil(latencias, 50)),
+                p95_ms=_redondear(percentil(latencias, 95)),
+                p99_ms=_redondear(percentil(latencias, 99)),
+                max_ms=_redondear(latencias[-1] if latencias else None),
+            )
+        return {
+            'usuarios': self.usuarios,
+            'segundos': round(self.segundos, 2),
+            'operaciones': {nombre: filas[nombre] for nombre in [*OPERACIONES, 'total'] if nombre in filas},
+        }
+
+
+def limpiar_asignaciones_prueba():
+    """
+    Elimina de la base del proyecto las asignaciones del año de prueba: las
+    que se crearon aunque la respuesta fallara (p. ej. un bloqueo al recalcular
+    las celdas después del commit) no tienen id conocido. Devuelve cuántas.
+    """
+    from .models import AsignacionFaena
+    eliminadas, _ = AsignacionFaena.objects.filter(fecha_inicio__year=ANIO_MUTACIONES).delete()
+    return eliminadas
+
+
+def _redondear(valor):
+    return None if valor is None else round(valor, 1)
@@ -0,0 +1,94 @@
+"""
+Catálogo de opciones del calendario (faenas, turnos con sus bloques, cargos y estados).
+
+Cambia muy poco, así que se arma una sola vez por versión y se guarda en la
+caché de Django. La versión vive en la base de datos (VersionCatalogo), no en
+la caché, que puede ser local a cada proceso: las señales de los modelos
+involucrados publican una nueva y todos los procesos la ven. La página la
+recibe para pedir el catálogo con una URL que el navegador puede guardar
+indefinidamente.
+"""
+import time
+
+from django.core.cache import cache
+
+from .models import Personal, Estado, Turno, Faena, VersionCatalogo
+from .serializacion import serializar_estado_catalogo
+
+
+def version_catalogo():
+    """Versión vigente del catálogo (se crea si no existe)"""
+    version = VersionCatalogo.objects.values_list('version', flat=True).first()
+    if version is None:
+        version = VersionCatalogo.objects.get_or_create(pk=1, defaults={'version': time.time_ns()})[0].version
+    return str(version)
+
+
+def invalidar_catalogo():
+    """
+    Publica una versión nueva (un timestamp, para no repetir versiones aunque
+    la base se recree); las entradas anteriores de la caché quedan huérfanas
+    y expiran solas.
+    """
+    if not VersionCatalogo.objects.update(version=time.time_ns()):
+        VersionCatalogo.objects.get_or_create(pk=1, defaults={'version': time.time_ns()})
+
+
+def obtener_catalogo():
+    """Devuelve (version, catalogo) usando la caché si la versión no ha cambiado"""
+    version = version_catalogo()
+    clave = f'calendario:catalogo:{version}'
+    catalogo = cache.get(clave)
+    if catalogo is None:
+        catalogo = construir_catalogo()
+        cache.set(clave, catalogo, timeout=60 * 60 * 24)
+    return version, catalogo
+
+
+def construir_catalogo():
+    """Arma el catálogo desde la base de datos"""
+    faenas = Faena.objects.filter(activo=True).order_by('nombre')
+    turnos = Turno.objects.filter(activo=True).prefetch_related('bloques__estado').order_by('nombre')
+    cargos = (
+        Personal.objects.filter(activo=True, infolaboral__isnull=False)
+        .values_list('infolaboral__cargo_id__cargo', flat=True)
+        .distinct()
+        .order_by('infolaboral__cargo_id__cargo')
+    )
+    estados = Estado.objects.filter(activo=True).order_by('-prioridad', 'nombre')
+
+    return {
+        'faenas': [
+            {
+                'id': faena.id,
+                'nombre': faena.nombre,
+                'ubicacion': faena.ubicacion,
+            }
+            for faena in faenas
+        ],
+        'turnos': [
+            {
+                'id': turno.id,
+                'nombre': turno.nombre,
+                'descripcion': turno.descripcion,
+                'bloques': [
+                    {
+                        'id': bloque.id,
+                        'orden': bloque.orden,
+                        'duracion_dias': bloque.duracion_dias,
+                        'estado': {
+                            'id': bloque.estado.id,
+                            'nombre': bloque.estado.nombre,
+                            'color': bloque.estado.color,
+                            'background_color': bloque.estado.background_color,
+                        }
+                    }
+                    # Orden en memoria para no invalidar el prefetch
+                    for bloque in sorted(turno.bloques.all(), key=lambda bloque: bloque.orden)
+                ]
+            }
+            for turno in turnos
+        ],
+        'cargos': list(cargos),
+        'estados': [serializar_estado_catalogo(estado) for estado in estados],
+    }
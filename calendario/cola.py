@@ -0,0 +1,224 @@
+"""
+Recálculo en segundo plano del calendario precalculado.
+
+Cada invalidación encola un TrabajoRecalculo por (persona, mes) ya precalculado;
+los pendientes del mismo par se funden en uno gracias a la restricción única
+sobre los trabajos no tomados. Al confirmarse la transacción se despierta un
+pool de hilos del propio proceso que toma los trabajos de un mes, lo recalcula
+con precalcular_mes (que solo resuelve a las personas cuyas celdas se borraron)
+y elimina los trabajos. No hay broker externo: la tabla es la cola, sobrevive a
+reinicios y `manage.py procesar_recalculos` la vacía de forma síncrona.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q, F, Min, Count
+from django.utils import timezone
+
+from .models import TrabajoRecalculo, ResumenMes
+from .precalculo import precalcular_mes
+
+logger = logging.getLogger(__name__)
+
+MAX_INTENTOS = 5
+# Un trabajo tomado hace más tiempo se considera abandonado (proceso caído)
+TIEMPO_MAXIMO_TOMADO = timedelta(minutes=15)
+
+
+def encolar(personal_ids, meses):
+    """
+    Encola el recálculo de `personal_ids` (None = todo el personal) en los meses
+    de `meses` que ya estaban precalculados. Retorna la cantidad de trabajos pedidos.
+    """
+    if not meses:
+        return 0
+    condicion = Q()
+    for year, month in meses:
+        condicion |= Q(year=year, month=month)
+    precalculados = sorted(set(
+        ResumenMes.objects.filter(condicion, faena__isnull=True).values_list('year', 'month')
+    ))
+    if not precalculados:
+        return 0
+
+    trabajos = [
+        TrabajoRecalculo(personal_id=personal_id, year=year, month=month)
+        for year, month in precalculados
+        for personal_id in ([None] if personal_ids is None else personal_ids)
+    ]
+    TrabajoRecalculo.objects.bulk_create(trabajos, batch_size=1000, ignore_conflicts=True)
+    transaction.on_commit(cola.despertar)
+    return len(trabajos)
+
+
+def tomar_mes(excluir=()):
+    """
+    Marca como tomados los trabajos pendientes del mes con el trabajo más
+    antiguo (omitiendo los meses de `excluir`). Retorna la lista de trabajos o None.
+
+    Los trabajos se bloquean con SELECT ... FOR UPDATE SKIP LOCKED y se toman
+    por pk, así dos procesos nunca se llevan el mismo trabajo (en SQLite, que
+    no tiene bloqueo por fila, las escrituras ya están serializadas).
+    """
+    pendientes = TrabajoRecalculo.objects.filter(tomado_en__isnull=True)
+    for year, month in excluir:
+        pendientes = pendientes.exclude(year=year, month=month)
+
+    with transaction.atomic():
+        mes = pendientes.order_by('encolado_en').values('year', 'month').first()
+        if mes is None:
+            return None
+        pks = list(pendientes.filter(**mes).select_for_update(skip_locked=True).values_list('pk', flat=True))
+        if not pks:
+            return None
+        TrabajoRecalculo.objects.filter(pk__in=pks).update(
+            tomado_en=timezone.now(), intentos=F('intentos') + 1, error=None
+        )
+    return list(TrabajoRecalculo.objects.filter(pk__in=pks))
+
+
+def liberar(trabajos, error):
+    """
+    Devuelve a la cola los trabajos que fallaron, salvo los que agotaron sus
+    intentos (quedan tomados y con el error a la vista). Si ya hay otro pendiente
+    para la misma persona y mes, el fallido se descarta.
+    """
+    mensaje = str(error) or error.__class__.__name__
+    agotados = [trabajo.pk for trabajo in trabajos if trabajo.intentos >= MAX_INTENTOS]
+    TrabajoRecalculo.objects.filter(pk__in=agotados).update(error=mensaje)
+
+    for trabajo in trabajos:
+        if trabajo.pk in agotados:
+            continue
+        duplicado = TrabajoRecalculo.objects.filter(
+            personal_id=trabajo.personal_id, year=trabajo.year, month=trabajo.month, tomado_en__isnull=True
+        ).exists()
+        if duplicado:
+            trabajo.delete()
+        else:
+            TrabajoRecalculo.objects.filter(pk=trabajo.pk).update(tomado_en=None, error=mensaje)
+
+
+def recuperar_abandonados():
+    """Vuelve a encolar los trabajos tomados por un proceso que no terminó"""
+    abandonados = list(TrabajoRecalculo.objects.filter(
+        tomado_en__lt=timezone.now() - TIEMPO_MAXIMO_TOMADO, intentos__lt=MAX_INTENTOS, error__isnull=True
+    ))
+    if abandonados:
+        liberar(abandonados, 'Trabajo abandonado')
+    return len(abandonados)
+
+
+class ColaRecalculo:
+    """Pool de hilos del proceso que vacía la cola de trabajos de recálculo"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._activos = 0
+        self._avisos = 0
+        self._meses_en_curso = set()
+        self.procesados = 0
+        self.fallidos = 0
+        self.ultimo_retraso_s = None
+        self.ultima_duracion_ms = None
+
+    @property
+    def hilos(self):
+        return getattr(settings, 'CALENDARIO_RECALCULO_HILOS', 0)
+
+    def despertar(self):
+        """Avisa que hay trabajos nuevos; lanza un hilo si quedan cupos"""
+        if self.hilos <= 0:
+            return
+        with self._lock:
+            self._avisos += 1
+            if self._activos >= self.hilos:
+                return
+            self._activos += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix='recalculo-calendario')
+        self._executor.submit(self._trabajar)
+
+    def _trabajar(self):
+        try:
+            recuperar_abandonados()
+            while True:
+                with self._lock:
+                    avisos = self._avisos
+                while self.procesar_siguiente():
+                    pass
+                # Si llegó un aviso mientras se vaciaba la cola, se vuelve a mirar
+                with self._lock:
+                    if self._avisos == avisos:
+                        self._activos -= 1
+                        return
+        except Exception:
+            logger.exception('Error en el recálculo en segundo plano del calendario')
+            with self._lock:
+                self._activos -= 1
+        finally:
+            connection.close()
+
+    def procesar_siguiente(self):
+        """Toma y recalcula los trabajos de un mes. Retorna False si no había pendientes."""
+        with self._lock:
+            trabajos = tomar_mes(excluir=self._meses_en_curso)
+            if trabajos is None:
+                return False
+            mes = (trabajos[0].year, trabajos[0].month)
+            self._meses_en_curso.add(mes)
+
+        inicio = time.perf_counter()
+        retraso = timezone.now() - min(trabajo.encolado_en for trabajo in trabajos)
+        try:
+            precalcular_mes(*mes)
+        except Exception as e:
+            logger.exception('No se pudo recalcular %s-%02d', *mes)
+            liberar(trabajos, e)
+            self.fallidos += len(trabajos)
+        else:
+            TrabajoRecalculo.objects.filter(pk__in=[trabajo.pk for trabajo in trabajos]).delete()
+            self.procesados += len(trabajos)
+            self.ultimo_retraso_s = round(retraso.total_seconds(), 3)
+            self.ultima_duracion_ms = int((time.perf_counter() - inicio) * 1000)
+        finally:
+            with self._lock:
+                self._meses_en_curso.discard(mes)
+        return True
+
+    def vaciar(self):
+        """Procesa de forma síncrona todos los trabajos pendientes. Retorna cuántos meses procesó."""
+        recuperar_abandonados()
+        meses = 0
+        while self.procesar_siguiente():
+            meses += 1
+        return meses
+
+
+cola = ColaRecalculo()
+
+
+def metricas_cola():
+    """Profundidad y retraso de la cola, más los contadores de este proceso"""
+    pendientes = TrabajoRecalculo.objects.filter(tomado_en__isnull=True)
+    resumen = pendientes.aggregate(cantidad=Count('id'), mas_antiguo=Min('encolado_en'))
+    tomados = TrabajoRecalculo.objects.filter(tomado_en__isnull=False)
+    return {
+        'pendientes': resumen['cantidad'],
+        'meses_pendientes': pendientes.values('year', 'month').distinct().count(),
+        'en_proceso': tomados.filter(error__isnull=True).count(),
+        'fallidos': tomados.filter(error__isnull=False).count(),
+        'retraso_segundos': (
+            round((timezone.now() - resumen['mas_antiguo']).total_seconds(), 3) if resumen['mas_antiguo'] else 0
+        ),
+        'hilos': cola.hilos,
+        'procesados': cola.procesados,
+        'ultimo_retraso_segundos': cola.ultimo_retraso_s,
+        'ultima_duracion_ms': cola.ultima_duracion_ms,
+    }
@@ -0,0 +1,216 @@
+"""
+Representación compacta en memoria de un calendario resuelto.
+
+En lugar de {personal_id: {dia: [Estado, ...]}} se guarda un código pequeño
+por celda (persona × día) en un arreglo contiguo: el código indexa una paleta
+con cada Estado usado una sola vez. Los empates de prioridad, que son escasos,
+van a una tabla aparte, igual que la referencia al registro que originó la
+celda cuando viene de un estado manual o de una fuente. El origen de cada
+celda (turno, manual, fuente, predeterminado) ocupa un byte.
+
+`vista()` entrega un Mapping de solo lectura con la forma anterior, para que
+el código que recorre `calendario['estados']` no cambie.
+"""
+from array import array
+from collections.abc import Mapping
+
+SIN_ESTADO = 0
+EMPATE = 0xFFFF
+
+# Origen del estado ganador de cada celda
+ORIGEN_DESCONOCIDO = 0  # p. ej. celdas precalculadas
+ORIGEN_PREDETERMINADO = 1
+ORIGEN_TURNO = 2
+ORIGEN_FUENTE = 3
+ORIGEN_MANUAL = 4
+
+
+class CalendarioCompacto:
+    """
+    Celdas de `personal_ids` (filas) en `fechas` (columnas). Las claves de día
+    son el número de día si todas las fechas son del mismo mes, o la fecha.
+    """
+
+    def __init__(self, personal_ids, fechas):
+        self.personal_ids = list(personal_ids)
+        self.fechas = list(fechas)
+        self.filas = {personal_id: i for i, personal_id in enumerate(self.personal_ids)}
+        mismo_mes = len({(fecha.year, fecha.month) for fecha in self.fechas}) <= 1
+        self.claves = [fecha.day if mismo_mes else fecha for fecha in self.fechas]
+        self.columnas = {clave: i for i, clave in enumerate(self.claves)}
+
+        celdas = len(self.personal_ids) * len(self.fechas)
+        self.codigos = array('H', bytes(2 * celdas))
+        self.origenes = bytearray(celdas)
+        self.paleta = [None]
+        self._codigo_estado = {}
+        self.empates = {}
+        self.referencias = {}
+
+    # Escritura
+
+    def _codigo(self, estado):
+        codigo = self._codigo_estado.get(estado.pk)
+        if codigo is None:
+            codigo = len(self.paleta)
+            if codigo >= EMPATE:
+                raise ValueError('Demasiados estados distintos para la representación compacta')
+            self.paleta.append(estado)
+            self._codigo_estado[estado.pk] = codigo
+        return codigo
+
+    def asignar(self, fila, columna, estados, origen=ORIGEN_DESCONOCIDO, referencia=None):
+        """
+        Guarda los estados de una celda. `referencia` (modelo, pk) identifica el
+        registro que la originó; solo se guarda si se entrega.
+        """
+        posicion = fila * len(self.fechas) + columna
+        if not estados:
+            codigo = SIN_ESTADO
+        elif len(estados) == 1:
+            codigo = self._codigo(estados[0])
+        else:
+            codigo = EMPATE
+            self.empates[posicion] = tuple(self._codigo(estado) for estado in estados)
+        self.codigos[posicion] = codigo
+        self.origenes[posicion] = origen
+        if referencia is not None:
+            self.referencias[posicion] = referencia
+
+    def asignar_ids(self, fila, valores, estados_por_id):
+        """Carga una fila desde valores ya serializados (id, [ids] o None por día)"""
+        for columna, valor in enumerate(valores):
+            ids = [] if valor is None else (valor if isinstance(valor, list) else [valor])
+            self.asignar(fila, columna, [estados_por_id[pk] for pk in ids if pk in estados_por_id])
+
+    # Lectura
+
+    def _codigos_celda(self, posicion):
+        codigo = self.codigos[posicion]
+        if codigo == EMPATE:
+            return self.empates[posicion]
+        return () if codigo == SIN_ESTADO else (codigo,)
+
+    def estados_celda(self, personal_id, clave):
+        """Lista de Estados de una celda"""
+        posicion = self.filas[personal_id] * len(self.fechas) + self.columnas[clave]
+        return [self.paleta[codigo] for codigo in self._codigos_celda(posicion)]
+
+    def origen_celda(self, personal_id, clave):
+        """(origen, referencia) del estado ganador de una celda"""
+        posicion = self.filas[personal_id] * len(self.fechas) + self.columnas[clave]
+        return self.origenes[posicion], self.referencias.get(posicion)
+
+    def _valor(self, posicion):
+        """Valor serializado de la celda: None, id o lista de ids"""
+        codigo = self.codigos[posicion]
+        if codigo == SIN_ESTADO:
+            return None
+        if codigo == EMPATE:
+            return [self.paleta[c].pk for c in self.empates[posicion]]
+        return self.paleta[codigo].pk
+
+    def fila(self, personal_id):
+        """Valores serializados de una persona, en el orden de `fechas`"""
+        inicio = self.filas[personal_id] * len(self.fechas)
+        return [self._valor(posicion) for posicion in range(inicio, inicio + len(self.fechas))]
+
+    def columna(self, clave):
+        """{personal_id: valor serializado} de un día"""
+        columna = self.columnas[clave]
+        n_fechas = len(self.fechas)
+        return {
+            personal_id: self._valor(fila * n_fechas + columna)
+            for fila, personal_id in enumerate(self.personal_ids)
+        }
+
+    def dotacion(self, clave):
+        """{estado_id: personas} de un día"""
+        columna = self.columnas[clave]
+        n_fechas = len(self.fechas)
+        conteo = {}
+        for fila in range(len(self.personal_ids)):
+            for codigo in self._codigos_celda(fila * n_fechas + columna):
+                pk = self.paleta[codigo].pk
+                conteo[pk] = conteo.get(pk, 0) + 1
+        return conteo
+
+    def ids_por_persona(self):
+        """{personal_id: {clave: valor serializado}}, la forma de 'estados' en las APIs"""
+        return {
+            personal_id: dict(zip(self.claves, self.fila(personal_id)))
+            for personal_id in self.personal_ids
+        }
+
+    def estados_usados(self):
+        """Estados que aparecen en alguna celda"""
+        return self.paleta[1:]
+
+    def memoria_bytes(self):
+        """Tamaño aproximado de los arreglos de celdas (sin paleta ni tablas aparte)"""
+        return self.codigos.itemsize * len(self.codigos) + len(self.origenes)
+
+    # Serialización
+
+    def json_estados(self, registrar):
+        """
+        Fragmento JSON {personal_id: {dia: celda}} escrito directamente desde los
+        códigos. `registrar(estado)` recibe cada Estado de la paleta y retorna su id.
+        """
+        fragmentos = ['null'] + [str(registrar(estado)) for estado in self.paleta[1:]]
+        prefijos = [f'"{clave}":' for clave in self.claves]
+        n_fechas = len(self.fechas)
+        personas = []
+        for fila, personal_id in enumerate(self.personal_ids):
+            inicio = fila * n_fechas
+            celdas = []
+            for columna in range(n_fechas):
+                codigo = self.codigos[inicio + columna]
+                if codigo == EMPATE:
+                    celda = '[' + ','.join(fragmentos[c] for c in self.empates[inicio + columna]) + ']'
+                else:
+                    celda = fragmentos[codigo]
+                celdas.append(prefijos[columna] + celda)
+            personas.append(f'"{personal_id}":{{{",".join(celdas)}}}')
+        return '{' + ','.join(personas) + '}'
+
+    def vista(self):
+        """Mapping {personal_id: {clave: [Estado, ...]}} de solo lectura sobre los arreglos"""
+        return VistaEstados(self)
+
+
+class VistaEstados(Mapping):
+    """Vista por persona de un CalendarioCompacto (no copia las celdas)"""
+
+    def __init__(self, compacto):
+        self.compacto = compacto
+
+    def __getitem__(self, personal_id):
+        if personal_id not in self.compacto.filas:
+            raise KeyError(personal_id)
+        return VistaFila(self.compacto, personal_id)
+
+    def __iter__(self):
+        return iter(self.compacto.personal_ids)
+
+    def __len__(self):
+        return len(self.compacto.personal_ids)
+
+
+class VistaFila(Mapping):
+    """Vista {clave: [Estado, ...]} de una persona"""
+
+    def __init__(self, compacto, personal_id):
+        self.compacto = compacto
+        self.personal_id = personal_id
+
+    def __getitem__(self, clave):
+        if clave not in self.compacto.columnas:
+            raise KeyError(clave)
+        return self.compacto.estados_celda(self.personal_id, clave)
+
+    def __iter__(self):
+        return iter(self.compacto.claves)
+
+    def __len__(self):
+        return len(self.compacto.claves)
@@ -0,0 +1,164 @@
+"""
+Días por Estado de cada persona en un rango (p. ej. para remuneraciones),
+calculados sin resolver celda por celda.
+
+Los estados manuales, los registros de cada fuente y las asignaciones son
+intervalos: sus bordes parten el rango en tramos donde los candidatos no
+cambian. En cada tramo decide el estado manual ganador, o bien los días de
+cada Estado del turno se cuentan aritméticamente sobre el ciclo (ciclos
+completos × días del bloque, más el resto) y cada grupo se resuelve una vez
+contra las fuentes vigentes con las mismas reglas de calendario.motor. El
+costo es O(asignaciones + intervalos) por persona, no O(días).
+"""
+from datetime import timedelta
+
+from .models import Personal
+from .motor import Ventana, prefetch_ventana, personal_de_faena, ciclo_asignacion
+
+UN_DIA = timedelta(days=1)
+
+
+def conteo_estados(fecha_inicio, fecha_fin, personal_ids=None, faena_id=None):
+    """
+    {personal_id: {estado_id: días}} del personal activo en [fecha_inicio, fecha_fin],
+    y los Estados que aparecen. Con `faena_id`, solo el personal asignado a esa
+    faena en el rango. En los empates cada Estado empatado (distinto) suma el día.
+    """
+    if faena_id is not None:
+        dotacion = personal_de_faena(faena_id, fecha_inicio, fecha_fin)
+        personal_ids = dotacion if personal_ids is None else sorted(set(dotacion) & set(personal_ids))
+
+    personal = Personal.objects.filter(activo=True).prefetch_related(*prefetch_ventana(fecha_inicio, fecha_fin))
+    if personal_ids is not None:
+        personal = personal.filter(personal_id__in=personal_ids)
+
+    ventana = Ventana(fecha_inicio, fecha_fin, personal_ids)
+    ciclos = {}
+    estados = {}
+    conteo = {}
+    for persona in personal.order_by('nombre', 'apepat'):
+        conteo[persona.personal_id] = contar_persona(ventana, persona, ciclos, estados)
+    return conteo, list(estados.values())
+
+
+def contar_persona(ventana, persona, ciclos=None, estados=None):
+    """
+    {estado_id: días} de una persona en el rango de la ventana. Los Estados
+    contados se agregan a `estados` ({estado_id: Estado}) si se entrega.
+    """
+    inicio, fin = ventana.fecha_inicio, ventana.fecha_fin
+    ciclos = {} if ciclos is None else ciclos
+    estados = {} if estados is None else estados
+    eventos = {}
+
+    def agregar(tipo, clave, desde, hasta):
+        desde, hasta = max(desde, inicio), min(hasta, fin)
+        if desde <= hasta:
+            eventos.setdefault(desde, []).append((tipo, clave, 1))
+            eventos.setdefault(hasta + UN_DIA, []).append((tipo, clave, -1))
+
+    manuales = [em for em in ventana.manuales(persona) if em.activo]
+    for i, em in enumerate(manuales):
+        agregar('manual', i, em.fecha_inicio, em.fecha_fin)
+    for f, (estado_fuente, por_persona) in enumerate(zip(ventana.fuentes, ventana.registros)):
+        for registro in por_persona.get(persona.pk, ()):
+            agregar('fuente', f, getattr(registro, estado_fuente.campo_fecha_inicio),
+                    getattr(registro, estado_fuente.campo_fecha_fin))
+    asignaciones = [af for af in ventana.asignaciones(persona) if af.activo]
+    for i, af in enumerate(asignaciones):
+        agregar('turno', i, af.fecha_inicio, af.fecha_fin or fin)
+
+    # Barrido por los bordes: en cada tramo [desde, hasta) los vigentes no cambian
+    vigentes = {'manual': {}, 'fuente': {}, 'turno': {}}
+    conteo = {}
+    cortes = sorted(set(eventos) | {inicio, fin + UN_DIA})
+    for desde, hasta in zip(cortes, cortes[1:]):
+        for tipo, clave, delta in eventos.get(desde, ()):
+            vigentes[tipo][clave] = vigentes[tipo].get(clave, 0) + delta
+        manual = [i for i, n in vigentes['manual'].items() if n]
+        fuentes = sorted(f for f, n in vigentes['fuente'].items() if n)
+        turno = min((i for i, n in vigentes['turno'].items() if n), default=None)
+        _contar_tramo(
+            ventana, conteo, desde, (hasta - desde).days,
+            [manuales[i] for i in sorted(manual)],
+            [ventana.fuentes[f].estado for f in fuentes],
+            asignaciones[turno] if turno is not None else None,
+            ciclos, estados
+        )
+    return conteo
+
+
+def _contar_tramo(ventana, conteo, desde, dias, manuales, estados_fuente, asignacion, ciclos, estados):
+    reglas = ventana.reglas
+    if manuales:
+        ganador = manuales[reglas.primero_mayor([em.estado for em in manuales])].estado
+        _sumar(conteo, estados, ganador, dias)
+        return
+
+    sin_turno = dias
+    if asignacion is not None:
+        for estado, dias_estado in dias_por_estado_turno(asignacion, desde, dias, ciclos):
+            _resolver_grupo(ventana, conteo, estados, estados_fuente + [estado], dias_estado)
+            sin_turno -= dias_estado
+    if sin_turno:
+        _resolver_grupo(ventana, conteo, estados, estados_fuente, sin_turno)
+
+
+def _resolver_grupo(ventana, conteo, estados, candidatos, dias):
+    if not candidatos:
+        if ventana.estado_predeterminado:
+            _sumar(conteo, estados, ventana.estado_predeterminado, dias)
+        return
+    ganadores = {candidatos[i].pk: candidatos[i] for i in ventana.reglas.ganadores(candidatos)}
+    for estado in ganadores.values():
+        _sumar(conteo, estados, estado, dias)
+
+
+def dias_por_estado_turno(asignacion, desde, dias, ciclos=None):
+    """
+    [(Estado, días)] del turno de la asignación en los `dias` días desde `desde`,
+    contados sobre los bloques del ciclo sin recorrer los días.
+    """
+    # El ciclo (ya desplazado) depende solo del turno y del bloque de inicio
+    ciclos = {} if ciclos is None else ciclos
+    clave = (asignacion.turno_id, asignacion.bloque_inicio_id)
+    if clave not in ciclos:
+        ciclos[clave] = _tramos_ciclo(ciclo_asignacion(asignacion))
+    tramos, largo = ciclos[clave]
+    if not largo:
+        return []
+
+    k0 = (desde - asignacion.fecha_inicio).days
+    k1 = k0 + dias
+
+    def hasta(k, posicion, duracion):
+        """Días k' en [0, k) cuya posición en el ciclo cae en [posicion, posicion + duracion)"""
+        return (k // largo) * duracion + min(max(k % largo - posicion, 0), duracion)
+
+    resultado = []
+    for estado, tramos_estado in tramos:
+        cantidad = sum(hasta(k1, posicion, duracion) - hasta(k0, posicion, duracion) for posicion, duracion in tramos_estado)
+        if cantidad:
+            resultado.append((estado, cantidad))
+    return resultado
+
+
+def _tramos_ciclo(ciclo):
+    """
+    [(Estado, [(posición, duración), ...])] con los tramos de días consecutivos
+    de cada Estado en el ciclo, y el largo del ciclo
+    """
+    tramos = {}
+    anterior = None
+    for posicion, estado in enumerate(ciclo):
+        if anterior is not None and anterior.pk == estado.pk:
+            tramos[estado.pk][1][-1][1] += 1
+        else:
+            tramos.setdefault(estado.pk, (estado, []))[1].append([posicion, 1])
+        anterior = estado
+    return list(tramos.values()), len(ciclo)
+
+
+def _sumar(conteo, estados, estado, dias):
+    estados[estado.pk] = estado
+    conteo[estado.pk] = conteo.get(estado.pk, 0) + dias
@@ -0,0 +1,81 @@
+"""
+Aplicación de un Estado manual a un grupo de personas en una sola operación
+(capacitaciones, paradas de faena, suspensiones por clima, etc.).
+"""
+from django.db import transaction
+from django.db.models import Q, Exists, OuterRef
+
+from .invalidacion import invalidar_calendario
+from .models import Personal, InfoLaboral, AsignacionFaena, EstadoManual
+
+
+def seleccionar_personal(fecha_inicio, fecha_fin, faena_id=None, cargo_id=None, depto_id=None,
+                         personal_ids=None, todo_el_personal=False):
+    """
+    Personal activo que cumple todos los criterios indicados:
+    - faena_id: con una asignación activa a la faena que se cruza con el rango
+    - cargo_id / depto_id: según su InfoLaboral
+    - personal_ids: lista explícita
+    Sin criterios solo se seleccionan todos si `todo_el_personal` es verdadero.
+    """
+    if not any([faena_id, cargo_id, depto_id, personal_ids is not None, todo_el_personal]):
+        raise ValueError('Indica faena, cargo, departamento o una lista de personal')
+
+    personal = Personal.objects.filter(activo=True)
+
+    if faena_id:
+        personal = personal.filter(Exists(
+            AsignacionFaena.objects.filter(
+                personal=OuterRef('pk'),
+                faena_id=faena_id,
+                activo=True,
+                fecha_inicio__lte=fecha_fin
+            ).filter(Q(fecha_fin__isnull=True) | Q(fecha_fin__gte=fecha_inicio))
+        ))
+    if cargo_id:
+        personal = personal.filter(Exists(InfoLaboral.objects.filter(personal_id=OuterRef('pk'), cargo_id=cargo_id)))
+    if depto_id:
+        personal = personal.filter(Exists(InfoLaboral.objects.filter(personal_id=OuterRef('pk'), depto_id=depto_id)))
+    if personal_ids is not None:
+        personal = personal.filter(personal_id__in=personal_ids)
+
+    return personal
+
+
+def aplicar_estado_manual(estado, fecha_inicio, fecha_fin, personal, motivo=''):
+    """
+    Crea con un solo bulk_create el EstadoManual de `estado` en el rango para
+    cada persona de `personal` (queryset), omitiendo a quien ya lo tiene
+    exactamente igual. Invalida el calendario solo de esas personas y meses.
+    Retorna la lista de personal_id a los que se aplicó.
+    """
+    if fecha_fin < fecha_inicio:
+        raise ValueError('La fecha de fin no puede ser anterior a la fecha de inicio')
+
+    with transaction.atomic():
+        ya_aplicado = EstadoManual.objects.filter(
+            personal=OuterRef('pk'),
+            estado=estado,
+            activo=True,
+            fecha_inicio=fecha_inicio,
+            fecha_fin=fecha_fin
+        )
+        personal_ids = list(
+            personal.exclude(Exists(ya_aplicado)).order_by().values_list('personal_id', flat=True)
+        )
+
+        EstadoManual.objects.bulk_create([
+            EstadoManual(
+                personal_id=personal_id,
+                estado=estado,
+                fecha_inicio=fecha_inicio,
+                fecha_fin=fecha_fin,
+                motivo=motivo or None
+            )
+            for personal_id in personal_ids
+        ], batch_size=1000)
+
+        if personal_ids:
+            invalidar_calendario(personal_ids, fecha_inicio, fecha_fin)
+
+    return personal_ids
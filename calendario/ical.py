@@ -0,0 +1,275 @@
+"""
+Calendario de turnos en formato iCalendar (RFC 5545) para los teléfonos.
+
+Cada bloque del ciclo de una asignación es un solo evento de día completo que
+se repite con RRULE cada largo del ciclo (COUNT hasta la fecha de fin; sin fin,
+indefinidamente). Lo que el motor (calendario.motor) resuelve distinto del
+turno son las excepciones: las ocurrencias que pierden todos sus días van en
+EXDATE, las que los pierden en parte se reemplazan (RECURRENCE-ID) por el
+primer tramo que queda y los otros tramos van como eventos sueltos, y los
+estados manuales o de fuentes que ganan son eventos propios. Así el tamaño
+del calendario depende de las asignaciones y las excepciones, no del rango.
+
+El calendario parte en `desde`: las ocurrencias anteriores no se incluyen.
+"""
+from datetime import date, datetime, timedelta, timezone
+
+from django.db.models import Q, Max
+
+from .compacto import ORIGEN_FUENTE, ORIGEN_MANUAL
+from .models import Personal, AsignacionFaena, VersionCalendarioMes, VersionCatalogo
+from .motor import Ventana, prefetch_ventana, ciclo_asignacion
+
+UN_DIA = timedelta(days=1)
+# Fin de la ventana: los estados manuales y las fuentes futuras también son excepciones
+FIN = date(9999, 12, 31)
+PRODID = '-//Calendario de Planificacion//Turnos//ES'
+# DTSTAMP si nunca se registró un cambio
+SIN_CAMBIOS = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+
+def feed_personal(persona, desde):
+    """Texto .ics con los turnos y excepciones de una persona desde `desde`"""
+    nombre = f'{persona.nombre} {persona.apepat}'.strip()
+    return _calendario(f'Turnos {nombre}', [persona.personal_id], desde)
+
+
+def feed_faena(faena, desde):
+    """
+    Texto .ics con los turnos de las asignaciones a la faena desde `desde`, y
+    las excepciones de esas personas en los días que están en ella. Cada
+    evento lleva el nombre de la persona.
+    """
+    personal_ids = list(AsignacionFaena.objects.filter(
+        Q(fecha_fin__isnull=True) | Q(fecha_fin__gte=desde), faena=faena, activo=True
+    ).values_list('personal_id', flat=True).distinct().order_by())
+    return _calendario(f'Turnos {faena.nombre}', personal_ids, desde, faena=faena)
+
+
+def marca_datos():
+    """
+    DTSTAMP de todos los eventos del calendario: el último cambio registrado en
+    las versiones de los meses o del catálogo, en UTC. No cambia mientras no
+    cambien los datos, así que el ETag tampoco.
+    """
+    cambios = [
+        modelo.objects.aggregate(ultimo=Max('actualizado_en'))['ultimo']
+        for modelo in (VersionCalendarioMes, VersionCatalogo)
+    ]
+    ultimo = max((cambio for cambio in cambios if cambio is not None), default=SIN_CAMBIOS)
+    return f'{ultimo.astimezone(timezone.utc):%Y%m%dT%H%M%SZ}'
+
+
+def _calendario(titulo, personal_ids, desde, faena=None):
+    personal = Personal.objects.filter(personal_id__in=personal_ids).prefetch_related(
+        *prefetch_ventana(desde, FIN)
+    ).order_by('nombre', 'apepat', 'personal_id')
+    ventana = Ventana(desde, FIN, personal_ids)
+    marca = marca_datos()
+
+    lineas = [
+        'BEGIN:VCALENDAR', 'VERSION:2.0', f'PRODID:{PRODID}', 'CALSCALE:GREGORIAN', 'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{_texto(titulo)}',
+    ]
+    for persona in personal:
+        prefijo = f'{persona.nombre} {persona.apepat}: ' if faena else ''
+        lineas.extend(_eventos_persona(ventana, persona, desde, faena, prefijo, marca))
+    lineas.append('END:VCALENDAR')
+    return ''.join(_plegar(linea) + '\r\n' for linea in lineas)
+
+
+def tramos_asignaciones(asignaciones, desde):
+    """
+    [(asignación, desde, hasta)] con los días que cada asignación activa define
+    a partir de `desde` (hasta None = sin fin). Como en el motor, si se
+    solapan, cada día es de la primera por (inicio, pk).
+    """
+    tramos = []
+    cubierto_hasta = date.min
+    for asignacion in asignaciones:
+        if not asignacion.activo:
+            continue
+        inicio = max(asignacion.fecha_inicio, desde, cubierto_hasta + UN_DIA)
+        fin = asignacion.fecha_fin
+        if fin is None or inicio <= fin:
+            tramos.append((asignacion, inicio, fin))
+        if fin is None:
+            break  # las siguientes empiezan después y esta las cubre
+        cubierto_hasta = max(cubierto_hasta, fin)
+    return tramos
+
+
+def _eventos_persona(ventana, persona, desde, faena, prefijo, marca):
+    tramos = tramos_asignaciones(ventana.asignaciones(persona), desde)
+    ciclos = {asignacion.pk: ciclo_asignacion(asignacion) for asignacion, _, _ in tramos}
+
+    def tramo_del_dia(dia):
+        for tramo in tramos:
+            if tramo[1] <= dia and (tramo[2] is None or dia <= tramo[2]):
+                return tramo
+        return None
+
+    # Días de excepción: los cubiertos por estados manuales o registros de fuentes
+    rangos = [(em.fecha_inicio, em.fecha_fin) for em in ventana.manuales(persona) if em.activo]
+    for estado_fuente, por_persona in zip(ventana.fuentes, ventana.registros):
+        for registro in por_persona.get(persona.pk, ()):
+            rangos.append((getattr(registro, estado_fuente.campo_fecha_inicio), getattr(registro, estado_fuente.campo_fecha_fin)))
+
+    perdidos = {}  # asignación -> días en que el turno no se muestra
+    extras = {}  # estado_id -> (Estado, días)
+    for inicio, fin in _unir_rangos(rangos, desde):
+        fechas = [inicio + timedelta(days=i) for i in range((fin - inicio).days + 1)]
+        for fecha, (estados, origen, _) in zip(fechas, ventana.resolver_persona(persona, fechas)):
+            if origen not in (ORIGEN_FUENTE, ORIGEN_MANUAL):
+                continue
+            tramo = tramo_del_dia(fecha)
+            estado_turno = None
+            if tramo is not None:
+                asignacion = tramo[0]
+                ciclo = ciclos[asignacion.pk]
+                if ciclo:
+                    estado_turno = ciclo[(fecha - asignacion.fecha_inicio).days % len(ciclo)]
+            turno_sigue = (estado_turno is not None and origen != ORIGEN_MANUAL
+                           and estado_turno.pk in {estado.pk for estado in estados})
+            if tramo is not None and not turno_sigue:
+                perdidos.setdefault(tramo[0].pk, set()).add(fecha)
+            if faena is not None and (tramo is None or tramo[0].faena_id != faena.pk):
+                continue
+            for estado in estados:
+                if not (turno_sigue and estado.pk == estado_turno.pk):
+                    extras.setdefault(estado.pk, (estado, set()))[1].add(fecha)
+
+    lineas = []
+    for asignacion, inicio, fin in tramos:
+        if faena is None or asignacion.faena_id == faena.pk:
+            lineas.extend(_eventos_asignacion(asignacion, inicio, fin, perdidos.get(asignacion.pk, set()), prefijo, marca))
+    for estado, dias in extras.values():
+        for inicio, fin in _tramos_consecutivos(sorted(dias)):
+            lineas.extend(_evento(
+                f'estado-{persona.pk}-{estado.pk}-{inicio:%Y%m%d}', inicio, fin, f'{prefijo}{estado.nombre}', marca
+            ))
+    return lineas
+
+
+def _eventos_asignacion(asignacion, desde, hasta, perdidos, prefijo, marca):
+    """VEVENTs de los bloques del ciclo de la asignación en [desde, hasta] sin los días `perdidos`"""
+    # Bloque de cada día contado desde la fecha de inicio: el ciclo arranca en el
+    # borde del bloque de inicio, así que cada bloque ocupa días seguidos
+    dias_ciclo = asignacion.ciclo(de_bloques=True).estados
+    largo = len(dias_ciclo)
+    if not largo:
+        return []
+    posiciones = {}
+    for posicion, bloque in enumerate(dias_ciclo):
+        posiciones.setdefault(bloque, posicion)
+    descripcion = f'Turno {asignacion.turno.nombre} · {asignacion.faena.nombre}'
+
+    lineas = []
+    for bloque, posicion in sorted(posiciones.items(), key=lambda item: item[0].orden):
+        duracion = bloque.duracion_dias
+        ancla = asignacion.fecha_inicio + timedelta(days=posicion)
+        # Primera ocurrencia que llega a `desde` y última que empieza antes de `hasta`
+        k0 = max(0, -((ancla + timedelta(days=duracion - 1) - desde).days // largo))
+        k1 = (hasta - ancla).days // largo if hasta else None
+        if k1 is not None and k1 < k0:
+            continue
+
+        def ocurrencia(k):
+            inicio = ancla + timedelta(days=k * largo)
+            return inicio, inicio + timedelta(days=duracion - 1)
+
+        afectadas = {k for k in (k0, k1) if k is not None}
+        for dia in perdidos:
+            if (dia - ancla).days % largo < duracion:
+                k = (dia - ancla).days // largo
+                if k >= k0 and (k1 is None or k <= k1):
+                    afectadas.add(k)
+
+        uid = f'asignacion-{asignacion.pk}-bloque-{bloque.pk}'
+        resumen = f'{prefijo}{bloque.estado.nombre}'
+        exdates, reemplazos = [], []
+        for k in sorted(afectadas):
+            inicio, fin = ocurrencia(k)
+            dias = [
+                inicio + timedelta(days=i) for i in range(duracion)
+                if desde <= inicio + timedelta(days=i) and (hasta is None or inicio + timedelta(days=i) <= hasta)
+                and inicio + timedelta(days=i) not in perdidos
+            ]
+            piezas = _tramos_consecutivos(dias)
+            if piezas == [(inicio, fin)]:
+                continue
+            if not piezas:
+                exdates.append(inicio)
+                continue
+            reemplazos.append((inicio, piezas))
+
+        primera, _ = ocurrencia(k0)
+        regla = f'RRULE:FREQ=DAILY;INTERVAL={largo}' + (f';COUNT={k1 - k0 + 1}' if k1 is not None else '')
+        extra = [regla] + [f'EXDATE;VALUE=DATE:{dia:%Y%m%d}' for dia in exdates]
+        lineas.extend(_evento(uid, primera, primera + timedelta(days=duracion - 1), resumen, marca, descripcion, extra))
+        for inicio, piezas in reemplazos:
+            (pieza_inicio, pieza_fin), *resto = piezas
+            lineas.extend(_evento(uid, pieza_inicio, pieza_fin, resumen, marca, descripcion,
+                                  [f'RECURRENCE-ID;VALUE=DATE:{inicio:%Y%m%d}']))
+            for pieza_inicio, pieza_fin in resto:
+                lineas.extend(_evento(f'{uid}-{pieza_inicio:%Y%m%d}', pieza_inicio, pieza_fin, resumen, marca, descripcion))
+    return lineas
+
+
+def _evento(uid, inicio, fin, resumen, marca, descripcion=None, extra=()):
+    """Evento de día completo de `inicio` a `fin` (inclusive), con DTSTAMP `marca` (ver marca_datos)"""
+    lineas = [
+        'BEGIN:VEVENT',
+        f'UID:{uid}@calendario',
+        f'DTSTAMP:{marca}',
+        f'DTSTART;VALUE=DATE:{inicio:%Y%m%d}',
+        f'DTEND;VALUE=DATE:{fin + UN_DIA:%Y%m%d}',
+        f'SUMMARY:{_texto(resumen)}',
+        'TRANSP:TRANSPARENT',
+    ]
+    if descripcion:
+        lineas.append(f'DESCRIPTION:{_texto(descripcion)}')
+    lineas.extend(extra)
+    lineas.append('END:VEVENT')
+    return lineas
+
+
+def _unir_rangos(rangos, desde):
+    """Rangos [(inicio, fin)] unidos y recortados a partir de `desde`, ordenados"""
+    unidos = []
+    for inicio, fin in sorted((max(inicio, desde), fin) for inicio, fin in rangos if fin >= desde):
+        if unidos and inicio <= unidos[-1][1] + UN_DIA:
+            unidos[-1] = (unidos[-1][0], max(unidos[-1][1], fin))
+        else:
+            unidos.append((inicio, fin))
+    return unidos
+
+
+def _tramos_consecutivos(dias):
+    """[(inicio, fin)] de los días consecutivos de una lista ordenada de fechas"""
+    tramos = []
+    for dia in dias:
+        if tramos and dia == tramos[-1][1] + UN_DIA:
+            tramos[-1] = (tramos[-1][0], dia)
+        else:
+            tramos.append((dia, dia))
+    return tramos
+
+
+def _texto(valor):
+    """Escapa un valor TEXT de iCalendar"""
+    return str(valor).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _plegar(linea):
+    """Pliega una línea en trozos de a lo más 75 octetos (RFC 5545, 3.1)"""
+    if len(linea.encode()) <= 75:
+        return linea
+    trozos, actual = [], ''
+    for caracter in linea:
+        if len((actual + caracter).encode()) > (75 if not trozos else 74):
+            trozos.append(actual)
+            actual = ''
+        actual += caracter
+    trozos.append(actual)
+    return '\r\n '.join(trozos)
@@ -0,0 +1,41 @@
+"""
+Instantáneas del calendario para calendario.nucleo.
+
+Carga desde el ORM, con las mismas consultas que el calendario mensual
+(prefetch_ventana y una Ventana, archivados incluidos), todo lo que decide los
+estados de un rango y lo convierte a los tipos de valor del núcleo. El
+resultado no tiene referencias a modelos: se resuelve con
+calendario.nucleo.resolver en este proceso, en otros o más tarde, sin Django.
+"""
+from .models import Personal, Estado
+from .motor import Ventana, prefetch_ventana, personal_de_faena
+from .nucleo import Instantanea
+
+
+def construir_instantanea(fecha_inicio, fecha_fin, personal_ids=None, faena_id=None):
+    """
+    calendario.nucleo.Instantanea del personal activo en [fecha_inicio, fecha_fin],
+    en el orden del calendario. Con `faena_id`, solo el personal asignado a esa
+    faena en el rango. El catálogo incluye todos los Estados activos.
+    """
+    if faena_id is not None:
+        dotacion = personal_de_faena(faena_id, fecha_inicio, fecha_fin)
+        personal_ids = dotacion if personal_ids is None else sorted(set(dotacion) & set(personal_ids))
+
+    personal = Personal.objects.filter(activo=True).prefetch_related(*prefetch_ventana(fecha_inicio, fecha_fin))
+    if personal_ids is not None:
+        personal = personal.filter(personal_id__in=personal_ids)
+
+    ventana = Ventana(fecha_inicio, fecha_fin, personal_ids)
+    personas = tuple(ventana.persona_nucleo(persona) for persona in personal.order_by('nombre', 'apepat'))
+    for estado in Estado.objects.filter(activo=True):
+        ventana.estado_nucleo(estado)
+
+    return Instantanea(
+        fecha_inicio=fecha_inicio,
+        fecha_fin=fecha_fin,
+        personas=personas,
+        fuentes=tuple(ventana.estado_nucleo(estado_fuente.estado) for estado_fuente in ventana.fuentes),
+        predeterminado=ventana.estado_predeterminado and ventana.estado_nucleo(ventana.estado_predeterminado),
+        estados=ventana.catalogo_nucleo(),
+    )
@@ -0,0 +1,100 @@
+"""
+Invalidación de datos derivados del calendario.
+
+Cuando cambian datos que afectan celdas (asignaciones, estados manuales,
+ausentismos, licencias) se llama a `invalidar_calendario` con las personas y el
+rango afectados. Eso incrementa la versión persistente de cada mes del rango y
+emite la señal `calendario_invalidado`, a la que se conectan las cachés o datos
+materializados para descartar solo esas personas y esos meses.
+"""
+import threading
+from contextlib import contextmanager
+from datetime import date
+
+from django.db.models import F
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import VersionCalendarioMes
+
+# Argumentos: personal_ids (lista, o None si afecta a todo el personal) y meses [(year, month), ...]
+calendario_invalidado = Signal()
+
+_local = threading.local()
+
+
+def meses_en_rango(fecha_inicio, fecha_fin):
+    """Lista de (year, month) que cubre el rango [fecha_inicio, fecha_fin]"""
+    meses = []
+    actual = date(fecha_inicio.year, fecha_inicio.month, 1)
+    while actual <= fecha_fin:
+        meses.append((actual.year, actual.month))
+        actual = date(actual.year + actual.month // 12, actual.month % 12 + 1, 1)
+    return meses
+
+
+def version_mes(year, month):
+    """Versión vigente de los datos del mes (0 si nunca se invalidó)"""
+    return VersionCalendarioMes.objects.filter(year=year, month=month).values_list('version', flat=True).first() or 0
+
+
+def meses_a_invalidar(fecha_inicio, fecha_fin):
+    """
+    Meses del rango. Sin fecha_fin (asignación indefinida) el rango llega hasta
+    el último mes con versión registrada: los meses posteriores nunca se
+    precalcularon, así que no hay nada que invalidar. Sin fecha_inicio se toman
+    todos los meses registrados.
+    """
+    registrados = VersionCalendarioMes.objects.values_list('year', 'month')
+    if fecha_inicio is None:
+        return list(registrados.order_by('year', 'month'))
+    if fecha_fin is None:
+        ultimo = registrados.order_by('-year', '-month').first()
+        fecha_fin = max(fecha_inicio, date(*ultimo, 1)) if ultimo else fecha_inicio
+    return meses_en_rango(fecha_inicio, fecha_fin)
+
+
+@contextmanager
+def invalidacion_suspendida():
+    """
+    Dentro del bloque, y solo en este hilo, los cambios no invalidan el
+    calendario: para operaciones que mueven registros sin cambiar ninguna
+    celda (ver calendario.archivo). Los demás hilos siguen invalidando.
+    """
+    anterior = getattr(_local, 'suspendida', False)
+    _local.suspendida = True
+    try:
+        yield
+    finally:
+        _local.suspendida = anterior
+
+
+def invalidar_calendario(personal_ids, fecha_inicio, fecha_fin):
+    """
+    Marca como obsoletos los datos derivados de `personal_ids` (None = todos)
+    entre fecha_inicio y fecha_fin (None = sin límite, ver meses_a_invalidar):
+    incrementa la versión de cada mes y avisa a los receptores de
+    `calendario_invalidado`. Retorna los meses afectados (ninguno si la
+    invalidación está suspendida en este hilo).
+    """
+    if getattr(_local, 'suspendida', False):
+        return []
+    meses = meses_a_invalidar(fecha_inicio, fecha_fin)
+    ahora = timezone.now()
+    for year, month in meses:
+        actualizados = VersionCalendarioMes.objects.filter(year=year, month=month).update(
+            version=F('version') + 1, actualizado_en=ahora
+        )
+        if not actualizados:
+            version, creada = VersionCalendarioMes.objects.get_or_create(
+                year=year, month=month, defaults={'version': 1}
+            )
+            if not creada:
+                VersionCalendarioMes.objects.filter(pk=version.pk).update(version=F('version') + 1, actualizado_en=ahora)
+
+    calendario_invalidado.send(
+        sender=VersionCalendarioMes,
+        personal_ids=None if personal_ids is None else list(personal_ids),
+        meses=meses,
+    )
+    return meses
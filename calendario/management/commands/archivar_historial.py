@@ -0,0 +1,48 @@
+from datetime import date, datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from calendario.archivo import archivar, LOTE_POR_DEFECTO
+
+
+class Command(BaseCommand):
+    help = ('Mueve al archivo histórico las asignaciones, estados manuales, ausentismos y licencias que '
+            'terminaron antes del corte, para que las tablas del calendario solo crezcan con lo vigente. '
+            'El calendario sigue mostrando esos registros en los meses pasados. '
+            'Pensado para programarse con cron, p. ej.: 0 4 1 * * python manage.py archivar_historial --meses 24')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses', type=int, default=24,
+                            help='Meses completos (además del actual) que se mantienen sin archivar (por defecto 24)')
+        parser.add_argument('--antes-de', help='Corte explícito YYYY-MM-DD: se archiva lo que termina antes de esa fecha')
+        parser.add_argument('--lote', type=int, default=LOTE_POR_DEFECTO,
+                            help=f'Filas por transacción (por defecto {LOTE_POR_DEFECTO})')
+        parser.add_argument('--simular', action='store_true', help='Solo cuenta lo que se archivaría')
+
+    def handle(self, *args, **options):
+        if options['meses'] < 0:
+            raise CommandError('--meses no puede ser negativo')
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser al menos 1')
+
+        if options['antes_de']:
+            try:
+                corte = datetime.strptime(options['antes_de'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--antes-de debe tener el formato YYYY-MM-DD')
+        else:
+            hoy = date.today()
+            meses = hoy.year * 12 + hoy.month - 1 - options['meses']
+            corte = date(meses // 12, meses % 12 + 1, 1)
+
+        inicio = time.perf_counter()
+        resultado = archivar(corte, lote=options['lote'], simular=options['simular'])
+        total_ms = int((time.perf_counter() - inicio) * 1000)
+
+        verbo = 'se archivarían' if options['simular'] else 'archivados'
+        for modelo, cantidad in resultado.items():
+            self.stdout.write(f'{modelo}: {cantidad} {verbo}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Corte {corte}: {sum(resultado.values())} registros {verbo} en {total_ms} ms'
+        ))
@@ -0,0 +1,116 @@
+import json
+import random
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.html import escapejs
+
+from calendario.compacto import CalendarioCompacto
+from calendario.models import Estado
+from calendario.serializacion import SerializadorCalendario, json_para_script, serializar_estado, orjson
+
+
+def celda_anterior(estados):
+    """Celda en el formato de antes del serializador: los datos de cada Estado repetidos en la celda"""
+    if not estados:
+        return None
+    if len(estados) == 1:
+        return dict(serializar_estado(estados[0]), multiple=False)
+    return {'estados': [serializar_estado(estado) for estado in estados], 'multiple': True}
+
+
+def payload_anterior(datos, estados_por_persona):
+    """Camino anterior de la página: celdas convertidas una a una, json.dumps y escapejs"""
+    calendario_json = dict(datos, estados={
+        personal_id: {dia: celda_anterior(estados) for dia, estados in estados_persona.items()}
+        for personal_id, estados_persona in estados_por_persona.items()
+    })
+    return escapejs(json.dumps(calendario_json, cls=DjangoJSONEncoder))
+
+
+def expandir_payload(payload):
+    """Payload nuevo (ya decodificado) con las celdas en el formato anterior, para compararlos"""
+    catalogo = {int(pk): estado for pk, estado in payload['estados_catalogo'].items()}
+    campos = serializar_estado(Estado()).keys()
+
+    def estado(pk):
+        return {campo: catalogo[pk][campo] for campo in campos}
+
+    def celda(valor):
+        if valor is None:
+            return None
+        if isinstance(valor, list):
+            return {'estados': [estado(pk) for pk in valor], 'multiple': True}
+        return dict(estado(valor), multiple=False)
+
+    datos = {clave: valor for clave, valor in payload.items() if clave != 'estados_catalogo'}
+    datos['estados'] = {
+        personal_id: {dia: celda(valor) for dia, valor in dias.items()}
+        for personal_id, dias in payload['estados'].items()
+    }
+    return datos
+
+
+class Command(BaseCommand):
+    help = ('Compara el serializador de la página del calendario con el camino anterior (celdas con los datos '
+            'de cada Estado, json.dumps y escapejs) sobre celdas sintéticas. Verifica que ambos payloads '
+            'lleven los mismos datos e informa tiempos (mejor de N) y tamaños.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--personas', type=int, default=2000, help='Filas del calendario (por defecto 2000)')
+        parser.add_argument('--dias', type=int, default=31, help='Días del mes, 28 a 31 (por defecto 31)')
+        parser.add_argument('--estados', type=int, default=8, help='Estados distintos (por defecto 8)')
+        parser.add_argument('--empates', type=float, default=0.02, help='Fracción de celdas con empate (por defecto 0.02)')
+        parser.add_argument('--repeticiones', type=int, default=5, help='Repeticiones por camino (por defecto 5)')
+        parser.add_argument('--semilla', type=int, default=0, help='Semilla de las celdas sintéticas')
+
+    def handle(self, *args, **options):
+        if not 28 <= options['dias'] <= 31:
+            raise CommandError('--dias debe estar entre 28 y 31')
+        if options['personas'] < 1 or options['estados'] < 2 or options['repeticiones'] < 1:
+            raise CommandError('--personas y --repeticiones deben ser al menos 1, y --estados al menos 2')
+
+        estados = [
+            Estado(pk=pk, nombre=f'Estado {pk}', nombre_corto=f'E{pk}', color='#000000',
+                   background_color='#ffffff', prioridad=pk)
+            for pk in range(1, options['estados'] + 1)
+        ]
+        fechas = [date(2025, 1, 1) + timedelta(days=i) for i in range(options['dias'])]
+        compacto = CalendarioCompacto(range(1, options['personas'] + 1), fechas)
+        azar = random.Random(options['semilla'])
+        for fila in range(options['personas']):
+            for columna in range(options['dias']):
+                if azar.random() < options['empates']:
+                    compacto.asignar(fila, columna, azar.sample(estados, 2))
+                else:
+                    compacto.asignar(fila, columna, [azar.choice(estados)])
+        vista = compacto.vista()
+        datos = {'personal': [{'personal_id': pk} for pk in compacto.personal_ids], 'dias_mes': options['dias']}
+
+        anterior = payload_anterior(datos, vista)
+        nuevo = json_para_script(SerializadorCalendario().payload(datos, vista))
+        decodificado_anterior = json.loads(json.loads(f'"{anterior}"'))
+        if expandir_payload(json.loads(nuevo)) != decodificado_anterior:
+            raise CommandError('Los payloads no llevan los mismos datos')
+
+        tiempos = {
+            'anterior': self.medir(lambda: payload_anterior(datos, vista), options['repeticiones']),
+            'nuevo': self.medir(lambda: json_para_script(SerializadorCalendario().payload(datos, vista)), options['repeticiones']),
+        }
+        celdas = options['personas'] * options['dias']
+        self.stdout.write(f"{options['personas']} personas × {options['dias']} días ({celdas} celdas), "
+                          f"backend {'orjson' if orjson is not None else 'json'}; mismos datos en ambos payloads")
+        for camino, tamano in (('anterior', len(anterior)), ('nuevo', len(nuevo))):
+            self.stdout.write(f'  {camino:<9} {tiempos[camino]:8.1f} ms  {tamano / 1e6:6.2f} MB')
+
+    def medir(self, funcion, repeticiones):
+        """Mejor tiempo en ms de `repeticiones` ejecuciones"""
+        mejor = None
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            funcion()
+            duracion = (time.perf_counter() - inicio) * 1000
+            mejor = duracion if mejor is None else min(mejor, duracion)
+        return mejor
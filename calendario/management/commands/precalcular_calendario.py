@@ -0,0 +1,59 @@
+from datetime import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from calendario.precalculo import precalcular_meses
+
+
+class Command(BaseCommand):
+    help = ('Precalcula y guarda el calendario y la dotación (total y por faena) del mes actual '
+            'y los N meses siguientes. Solo recalcula los meses que cambiaron desde la última ejecución. '
+            'Pensado para programarse con cron, p. ej.: 0 3 * * * python manage.py precalcular_calendario --meses 2')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses', type=int, default=2,
+                            help='Cantidad de meses siguientes al actual a precalcular (por defecto 2)')
+        parser.add_argument('--desde', help='Mes inicial YYYY-MM (por defecto el mes actual)')
+        parser.add_argument('--forzar', action='store_true',
+                            help='Recalcula todo aunque la versión del mes no haya cambiado')
+
+    def handle(self, *args, **options):
+        if options['meses'] < 0:
+            raise CommandError('--meses no puede ser negativo')
+
+        desde = None
+        if options['desde']:
+            try:
+                desde = datetime.strptime(options['desde'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError('--desde debe tener el formato YYYY-MM')
+
+        inicio = time.perf_counter()
+        resultados = precalcular_meses(options['meses'], desde=desde, forzar=options['forzar'])
+
+        for resultado in resultados:
+            mes = f"{resultado['year']}-{resultado['month']:02d}"
+            if resultado.get('sin_invalidacion'):
+                self.stdout.write(self.style.WARNING(
+                    f"{mes}: hay fuentes sobre modelos que no invalidan el calendario, no se guardan celdas"
+                ))
+            elif resultado.get('obsoleto'):
+                self.stdout.write(self.style.WARNING(
+                    f"{mes}: cambió mientras se calculaba, se recalculará en la próxima ejecución "
+                    f"({resultado['duracion_ms']} ms)"
+                ))
+            elif resultado['recalculado']:
+                self.stdout.write(
+                    f"{mes}: v{resultado['version']} recalculado, {resultado['personas_resueltas']} de "
+                    f"{resultado['personas']} personas resueltas, {resultado['faenas']} faenas "
+                    f"({resultado['duracion_ms']} ms)"
+                )
+            else:
+                self.stdout.write(f"{mes}: v{resultado['version']} sin cambios ({resultado['duracion_ms']} ms)")
+
+        total_ms = int((time.perf_counter() - inicio) * 1000)
+        recalculados = sum(1 for resultado in resultados if resultado['recalculado'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Precálculo terminado: {recalculados} de {len(resultados)} meses recalculados en {total_ms} ms'
+        ))
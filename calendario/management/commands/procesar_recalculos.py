@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from calendario.cola import cola, metricas_cola
+
+
+class Command(BaseCommand):
+    help = ('Procesa de forma síncrona los recálculos pendientes del calendario precalculado '
+            '(útil con CALENDARIO_RECALCULO_HILOS = 0 o tras reiniciar el servidor) y muestra las métricas de la cola')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--solo-metricas', action='store_true',
+                            help='Solo muestra las métricas, sin procesar la cola')
+
+    def handle(self, *args, **options):
+        self.mostrar_metricas()
+        if options['solo_metricas']:
+            return
+
+        inicio = time.perf_counter()
+        meses = cola.vaciar()
+        total_ms = int((time.perf_counter() - inicio) * 1000)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{meses} mes(es) recalculados en {total_ms} ms ({cola.procesados} trabajos, {cola.fallidos} fallidos)'
+        ))
+        self.mostrar_metricas()
+
+    def mostrar_metricas(self):
+        metricas = metricas_cola()
+        self.stdout.write(
+            f"Cola: {metricas['pendientes']} pendientes en {metricas['meses_pendientes']} mes(es), "
+            f"{metricas['en_proceso']} en proceso, {metricas['fallidos']} fallidos, "
+            f"retraso {metricas['retraso_segundos']} s"
+        )
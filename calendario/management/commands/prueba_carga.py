@@ -0,0 +1,81 @@
+import json
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from calendario.carga import (
+    PruebaCarga, ClienteInterno, ClienteHttp, parsear_mezcla, limpiar_asignaciones_prueba,
+    MEZCLA_POR_DEFECTO, ANIO_MUTACIONES
+)
+
+
+class Command(BaseCommand):
+    help = ('Prueba de carga concurrente: N usuarios piden la página y la API del calendario y crean, '
+            'actualizan y eliminan asignaciones según una mezcla. Informa rendimiento, latencias p50/p95/p99 '
+            f'y errores de bloqueo o timeout. Las mutaciones se hacen en {ANIO_MUTACIONES} y se deshacen al terminar.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=10, help='Usuarios concurrentes (por defecto 10)')
+        parser.add_argument('--duracion', type=float, help='Segundos de prueba (por defecto 30 si no se indica --peticiones)')
+        parser.add_argument('--peticiones', type=int, help='Total de peticiones a emitir')
+        parser.add_argument('--mezcla', default=MEZCLA_POR_DEFECTO,
+                            help=f'Pesos por operación (pagina, api, crear, actualizar, eliminar); por defecto "{MEZCLA_POR_DEFECTO}"')
+        parser.add_argument('--mes', help='Mes a cargar YYYY-MM (por defecto el actual)')
+        parser.add_argument('--url', help='URL base de un servidor (p. ej. http://127.0.0.1:8000); sin ella se usa la aplicación en proceso')
+        parser.add_argument('--timeout', type=float, default=30, help='Timeout por petición HTTP en segundos (por defecto 30)')
+        parser.add_argument('--semilla', type=int, help='Semilla para repetir la misma secuencia de operaciones')
+        parser.add_argument('--json', action='store_true', help='Imprime el reporte como JSON')
+
+    def handle(self, *args, **options):
+        try:
+            mezcla = parsear_mezcla(options['mezcla'])
+        except ValueError as e:
+            raise CommandError(f'--mezcla inválida: {e}')
+        if options['usuarios'] < 1:
+            raise CommandError('--usuarios debe ser al menos 1')
+
+        year = month = None
+        if options['mes']:
+            try:
+                mes = datetime.strptime(options['mes'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError('--mes debe tener el formato YYYY-MM')
+            year, month = mes.year, mes.month
+
+        if options['url']:
+            crear_cliente = lambda: ClienteHttp(options['url'], options['timeout'])
+        else:
+            crear_cliente = ClienteInterno
+
+        duracion = options['duracion']
+        if duracion is None and options['peticiones'] is None:
+            duracion = 30
+
+        prueba = PruebaCarga(
+            crear_cliente, mezcla, usuarios=options['usuarios'], duracion=duracion, peticiones=options['peticiones'],
+            year=year, month=month, semilla=options['semilla']
+        )
+        try:
+            reporte = prueba.ejecutar()
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        except OSError as e:
+            raise CommandError(f'No se pudo preparar la prueba: {e}')
+        reporte['asignaciones_huerfanas'] = limpiar_asignaciones_prueba()
+
+        if options['json']:
+            self.stdout.write(json.dumps(reporte, indent=2))
+            return
+
+        self.stdout.write(f"{reporte['usuarios']} usuarios durante {reporte['segundos']} s")
+        self.stdout.write(f"{'operación':<11}{'pet.':>7}{'pet/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+                          f"{'máx ms':>9}{'errores':>9}{'bloqueos':>10}{'timeouts':>10}")
+        for nombre, fila in reporte['operaciones'].items():
+            linea = (f"{nombre:<11}{fila['peticiones']:>7}{fila['por_segundo']:>8}{fila['p50_ms']:>9}{fila['p95_ms']:>9}"
+                     f"{fila['p99_ms']:>9}{fila['max_ms']:>9}{fila['error']:>9}{fila['bloqueo']:>10}{fila['timeout']:>10}")
+            fallos = fila['error'] + fila['bloqueo'] + fila['timeout']
+            self.stdout.write(self.style.WARNING(linea) if fallos else linea)
+        if reporte['asignaciones_huerfanas']:
+            self.stdout.write(self.style.WARNING(
+                f"Se eliminaron {reporte['asignaciones_huerfanas']} asignaciones de {ANIO_MUTACIONES} creadas por respuestas fallidas"
+            ))
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendario', '0004_fix_fecha_fin_licencia_editable'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ausentismo',
+            index=models.Index(fields=['personal_id', 'fechaini', 'fechafin'], name='calendario__persona_df90fe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='licenciamedicaporpersonal',
+            index=models.Index(fields=['personal_id', 'fechaEmision', 'fecha_fin_licencia'], name='calendario__persona_0333f3_idx'),
+        ),
+    ]
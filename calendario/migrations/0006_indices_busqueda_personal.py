@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendario', '0005_indices_rango_ausentismo_licencia'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='personal',
+            index=models.Index(fields=['nombre', 'apepat'], name='personal_nombre_ec50bf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='personal',
+            index=models.Index(fields=['apepat'], name='personal_apepat_d47ff4_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendario', '0006_indices_busqueda_personal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionCalendarioMes',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Versión de Mes del Calendario',
+                'verbose_name_plural': 'Versiones de Meses del Calendario',
+                'ordering': ['year', 'month'],
+                'constraints': [models.UniqueConstraint(fields=('year', 'month'), name='version_calendario_mes_unica')],
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendario', '0007_version_calendario_mes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CeldasMesPersona',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('celdas', models.JSONField()),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('calculado_en', models.DateTimeField(auto_now=True)),
+                ('personal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='celdas_precalculadas', to='calendario.personal')),
+            ],
+            options={
+                'verbose_name': 'Celdas Precalculadas',
+                'verbose_name_plural': 'Celdas Precalculadas',
+                'indexes': [models.Index(fields=['year', 'month'], name='calendario__year_0dd6f1_idx')],
+                'constraints': [models.UniqueConstraint(fields=('personal', 'year', 'month'), name='celdas_mes_persona_unica')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenMes',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('personas', models.PositiveIntegerField(default=0)),
+                ('dotacion', models.JSONField(default=dict)),
+                ('duracion_ms', models.PositiveIntegerField(default=0)),
+                ('calculado_en', models.DateTimeField(auto_now=True)),
+                ('faena', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_mes', to='calendario.faena')),
+            ],
+            options={
+                'verbose_name': 'Resumen de Mes',
+                'verbose_name_plural': 'Resúmenes de Mes',
+                'ordering': ['year', 'month', 'faena'],
+                'constraints': [models.UniqueConstraint(fields=('year', 'month', 'faena'), name='resumen_mes_faena_unico'), models.UniqueConstraint(condition=models.Q(('faena__isnull', True)), fields=('year', 'month'), name='resumen_mes_total_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendario', '0008_calendario_precalculado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoRecalculo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('encolado_en', models.DateTimeField(auto_now_add=True)),
+                ('tomado_en', models.DateTimeField(blank=True, null=True)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('personal', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='trabajos_recalculo', to='calendario.personal')),
+            ],
+            options={
+                'verbose_name': 'Trabajo de Recálculo',
+                'verbose_name_plural': 'Trabajos de Recálculo',
+                'ordering': ['encolado_en'],
+                'indexes': [models.Index(fields=['tomado_en', 'encolado_en'], name='calendario__tomado__46a8ca_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('tomado_en__isnull', True)), fields=('personal', 'year', 'month'), name='trabajo_recalculo_pendiente_unico'), models.UniqueConstraint(condition=models.Q(('personal__isnull', True), ('tomado_en__isnull', True)), fields=('year', 'month'), name='trabajo_recalculo_mes_pendiente_unico')],
+            },
+        ),
+    ]
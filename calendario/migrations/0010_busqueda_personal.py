@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:29
+
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+LOTE = 1000
+
+
+# Copia de la normalización de calendario.models a la fecha de esta migración:
+# la migración no debe cambiar si el modelo cambia después.
+def normalizar_busqueda(texto):
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.lower().replace('.', '').replace('-', '').split())
+
+
+def palabras_busqueda_personal(nombre, apepat, apemat, rut, dvrut):
+    palabras = normalizar_busqueda(f'{nombre} {apepat} {apemat or ""}').split()
+    rut = normalizar_busqueda(rut)
+    if rut:
+        palabras += [rut, rut + normalizar_busqueda(dvrut)]
+    return list(dict.fromkeys(palabra[:100] for palabra in palabras))
+
+
+def indexar_personal(apps, schema_editor):
+    Personal = apps.get_model('calendario', 'Personal')
+    PalabraBusquedaPersonal = apps.get_model('calendario', 'PalabraBusquedaPersonal')
+    palabras_nuevas = []
+    for persona in Personal.objects.only('personal_id', 'nombre', 'apepat', 'apemat', 'rut', 'dvrut').iterator():
+        palabras = palabras_busqueda_personal(persona.nombre, persona.apepat, persona.apemat, persona.rut, persona.dvrut)
+        Personal.objects.filter(pk=persona.pk).update(busqueda=' ' + ' '.join(palabras))
+        palabras_nuevas += [PalabraBusquedaPersonal(personal_id=persona.pk, palabra=palabra) for palabra in palabras]
+        if len(palabras_nuevas) >= LOTE:
+            PalabraBusquedaPersonal.objects.bulk_create(palabras_nuevas)
+            palabras_nuevas = []
+    PalabraBusquedaPersonal.objects.bulk_create(palabras_nuevas)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendario', '0009_trabajo_recalculo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='personal',
+            name='busqueda',
+            field=models.CharField(blank=True, default='', editable=False, max_length=400),
+        ),
+        migrations.CreateModel(
+            name='PalabraBusquedaPersonal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('palabra', models.CharField(max_length=100)),
+                ('personal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='palabras_busqueda', to='calendario.personal')),
+            ],
+            options={
+                'verbose_name': 'Palabra de Búsqueda',
+                'verbose_name_plural': 'Palabras de Búsqueda',
+                'indexes': [models.Index(fields=['palabra', 'personal'], name='calendario__palabra_90b6b5_idx')],
+            },
+        ),
+        migrations.RunPython(indexar_personal, migrations.RunPython.noop),
+    ]
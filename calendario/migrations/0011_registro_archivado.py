@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:42
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendario', '0010_busqueda_personal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroArchivado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(help_text='Modelo de origen (app_label.modelo)', max_length=100)),
+                ('registro_id', models.BigIntegerField(help_text='Clave primaria que tenía en su tabla')),
+                ('fecha_inicio', models.DateField()),
+                ('fecha_fin', models.DateField()),
+                ('datos', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('archivado_en', models.DateTimeField(auto_now_add=True)),
+                ('personal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='registros_archivados', to='calendario.personal')),
+            ],
+            options={
+                'verbose_name': 'Registro Archivado',
+                'verbose_name_plural': 'Registros Archivados',
+                'ordering': ['modelo', 'fecha_inicio'],
+                'indexes': [models.Index(fields=['fecha_fin', 'fecha_inicio'], name='calendario__fecha_f_63c18b_idx'), models.Index(fields=['personal', 'fecha_inicio', 'fecha_fin'], name='calendario__persona_ac6d35_idx')],
+                'constraints': [models.UniqueConstraint(fields=('modelo', 'registro_id'), name='registro_archivado_unico')],
+            },
+        ),
+    ]
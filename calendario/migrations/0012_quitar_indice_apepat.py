@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:29
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendario', '0011_registro_archivado'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='personal',
+            name='personal_apepat_d47ff4_idx',
+        ),
+    ]
@@ -1,12 +1,37 @@
-from django.db import models
+from django.db import models, transaction
+from django.apps import apps
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.exceptions import ValidationError
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.utils.translation import gettext_lazy as _
 from django.db.models import Q, CheckConstraint, F
 from datetime import datetime, timedelta
+import unicodedata
+
+from .nucleo import Ciclo
+
 # Create your models here.
 
+def normalizar_busqueda(texto):
+    """
+    Forma de búsqueda de un texto: minúsculas, sin tildes y sin puntos ni
+    guiones (así '12.345.678-K' queda '12345678k').
+    """
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.lower().replace('.', '').replace('-', '').split())
+
+
+def palabras_busqueda_personal(nombre, apepat, apemat, rut, dvrut):
+    """Palabras normalizadas del nombre completo y del RUT (sin y con dígito verificador)"""
+    palabras = normalizar_busqueda(f'{nombre} {apepat} {apemat or ""}').split()
+    rut = normalizar_busqueda(rut)
+    if rut:
+        palabras += [rut, rut + normalizar_busqueda(dvrut)]
+    return list(dict.fromkeys(palabra[:100] for palabra in palabras))
+
+
 class Personal(models.Model):
     personal_id = models.AutoField(primary_key=True, null=False, blank=False)
     rut = models.CharField(max_length=8, null=False, blank=False, unique=True)
@@ -18,17 +43,63 @@ class Personal(models.Model):
     correo = models.CharField(max_length=100, null=False, blank=False, unique=True)
     direccion = models.CharField(max_length=150, null=True, blank=True)
     activo = models.BooleanField(default=True, verbose_name='Estado')
+    # Nombre completo y RUT normalizados (ver normalizar_busqueda), con un espacio
+    # inicial para buscar prefijos de palabra con ' termino'. Se mantiene en save().
+    busqueda = models.CharField(max_length=400, blank=True, default='', editable=False)
 
     class Meta:
         verbose_name = 'Personal'
         verbose_name_plural = 'Personal'
         db_table = 'personal'
         ordering = ['nombre']
+        indexes = [
+            # Orden del calendario (las búsquedas usan PalabraBusquedaPersonal)
+            models.Index(fields=['nombre', 'apepat']),
+        ]
+
+    CAMPOS_BUSQUEDA = {'nombre', 'apepat', 'apemat', 'rut', 'dvrut'}
+
+    def save(self, *args, **kwargs):
+        """Mantener la columna y el índice de palabras de búsqueda"""
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not self.CAMPOS_BUSQUEDA & set(update_fields):
+            super().save(*args, **kwargs)
+            return
+        palabras = palabras_busqueda_personal(self.nombre, self.apepat, self.apemat, self.rut, self.dvrut)
+        self.busqueda = ' ' + ' '.join(palabras)
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'busqueda'}
+        # La fila y sus palabras se guardan juntas: un fallo no deja el índice a medias
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+            self.palabras_busqueda.all().delete()
+            PalabraBusquedaPersonal.objects.bulk_create([
+                PalabraBusquedaPersonal(personal=self, palabra=palabra) for palabra in palabras
+            ])
 
     def __str__(self):
         return self.nombre
 
 
+class PalabraBusquedaPersonal(models.Model):
+    """
+    Una palabra normalizada del nombre o RUT de una persona. El índice por
+    palabra permite buscar prefijos como rangos (ver calendario.busqueda).
+    """
+    personal = models.ForeignKey(Personal, on_delete=models.CASCADE, related_name='palabras_busqueda')
+    palabra = models.CharField(max_length=100)
+
+    class Meta:
+        verbose_name = 'Palabra de Búsqueda'
+        verbose_name_plural = 'Palabras de Búsqueda'
+        indexes = [
+            models.Index(fields=['palabra', 'personal']),
+        ]
+
+    def __str__(self):
+        return self.palabra
+
+
 class DeptoEmpresa(models.Model):
     depto_id = models.AutoField(primary_key=True, blank=False, null=False)
     depto = models.CharField(max_length=50, db_column='depto', blank=False, null=False)
@@ -70,6 +141,11 @@ class Ausentismo(models.Model):
     fechafin = models.DateField(null=False, blank=False)
     observacion = models.TextField(max_length=250, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["personal_id", "fechaini", "fechafin"]),
+        ]
+
     def __str__(self):
         trabajador = f"{self.personal_id.nombre} {self.personal_id.apepat} {self.personal_id.apemat}"
         return f"{self.tipoausen_id} - {trabajador} ({self.fechaini} a {self.fechafin})"
@@ -90,6 +166,11 @@ class LicenciaMedicaPorPersonal(models.Model):
     fecha_fin_licencia = models.DateField(null=False, blank=False, help_text="Fecha de fin de la licencia médica")
     observacion = models.TextField(max_length=250, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["personal_id", "fechaEmision", "fecha_fin_licencia"]),
+        ]
+
 
 #MODELOS NUEVOS PARA CALENDARIO Y TENER ESTADOS DINAMICOS
 
@@ -193,6 +274,22 @@ class EstadoFuente(models.Model):
         verbose_name = "Fuente de Estado"
         verbose_name_plural = "Fuentes de Estados"
 
+    def clean(self):
+        """Validar que filtro_extra se pueda evaluar también sobre los registros archivados"""
+        modelo = self.content_type.model_class() if self.content_type_id else None
+        if not self.filtro_extra or modelo is None:
+            return
+        # archivo importa este módulo
+        from .archivo import validar_filtro_extra
+        try:
+            validar_filtro_extra(modelo, self.filtro_extra)
+        except ValueError as e:
+            raise ValidationError({'filtro_extra': str(e)})
+
+    def save(self, *args, **kwargs):
+        self.clean()
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Fuente({self.estado.nombre}) → {self.content_type.app_label}.{self.content_type.model}"
 
@@ -219,7 +316,7 @@ class Turno(models.Model):
         """
         Suma total de días del ciclo (ej: 7+7+7+7 = 28).
         """
-        return sum(self.bloques.values_list("duracion_dias", flat=True))
+        return sum(bloque.duracion_dias for bloque in self.bloques.all())
 
 class TurnoBloque(models.Model):
     """
@@ -321,41 +418,19 @@ class AsignacionFaena(models.Model):
         if self.fecha_fin and fecha > self.fecha_fin:
             return None
         
-        # Calcular días transcurridos desde el inicio
-        dias_transcurridos = (fecha - self.fecha_inicio).days
-        
-        # Encontrar el bloque correspondiente
-        longitud_ciclo = self.turno.longitud_ciclo
-        if longitud_ciclo == 0:
-            return None
-        
-        # Calcular posición en el ciclo
-        posicion_ciclo = dias_transcurridos % longitud_ciclo
-        
-        # Encontrar el bloque que corresponde a esa posición
-        bloques = self.turno.bloques.all().order_by('orden')
-        
-        # Ajustar por bloque_inicio si está configurado
-        offset_inicio = 0
-        if self.bloque_inicio:
-            # Calcular el offset basado en el bloque de inicio
-            for bloque in bloques:
-                if bloque.orden < self.bloque_inicio.orden:
-                    offset_inicio += bloque.duracion_dias
-                else:
-                    break
-        
-        # Ajustar la posición del ciclo con el offset
-        posicion_ajustada = (posicion_ciclo + offset_inicio) % longitud_ciclo
-        
-        # Encontrar el bloque que corresponde a esa posición ajustada
-        dias_acumulados = 0
-        for bloque in bloques:
-            if posicion_ajustada < dias_acumulados + bloque.duracion_dias:
-                return bloque.estado
-            dias_acumulados += bloque.duracion_dias
-        
-        return None
+        return self.ciclo().estado_en((fecha - self.fecha_inicio).days)
+
+    def ciclo(self, de_bloques=False):
+        """
+        calendario.nucleo.Ciclo con los Estados del turno desde el bloque de
+        inicio (con de_bloques=True, el TurnoBloque de cada día). Usa el
+        prefetch de turno__bloques si existe.
+        """
+        bloques = [
+            (bloque.orden, bloque.duracion_dias, bloque if de_bloques else bloque.estado)
+            for bloque in self.turno.bloques.all()
+        ]
+        return Ciclo.desde_bloques(bloques, self.bloque_inicio.orden if self.bloque_inicio_id else None)
 
 
 #4 ESTADOS MANUALES
@@ -390,182 +465,178 @@ class EstadoManual(models.Model):
     def __str__(self):
         return f"{self.personal} · {self.estado.nombre} · {self.fecha_inicio} → {self.fecha_fin}"
 
-#5 MÉTODO UTILITARIO PARA CALCULAR ESTADO FINAL
-def obtener_estado_final_personal_fecha(personal, fecha):
+
+#4b VERSIONES DEL CALENDARIO
+
+class VersionCalendarioMes(models.Model):
     """
-    Método utilitario que calcula el estado final de una persona en una fecha,
-    considerando todas las fuentes y prioridades.
-    
-    Orden de prioridad:
-    1. Estados manuales (más alta prioridad)
-    2. Estados de fuentes externas (según prioridad del estado)
-    3. Estados derivados de turnos (más baja prioridad)
-    
-    Retorna una lista de estados cuando hay conflictos de prioridad.
+    Versión de los datos de un mes del calendario. Cualquier cambio que afecte
+    celdas del mes la incrementa (ver calendario.invalidacion); lo que se
+    precalcule a partir del mes guarda la versión con que se calculó.
     """
-    from django.db.models import Q
-    
-    # 1. Buscar estados manuales activos
-    estados_manuales = EstadoManual.objects.filter(
-        personal=personal,
-        fecha_inicio__lte=fecha,
-        fecha_fin__gte=fecha,
-        activo=True
-    ).select_related('estado').order_by('-estado__prioridad')
-    
-    if estados_manuales.exists():
-        # Si hay estados bloqueantes, retornar el de mayor prioridad
-        bloqueantes = [em for em in estados_manuales if em.estado.es_bloqueante]
-        if bloqueantes:
-            return [bloqueantes[0].estado]
-        # Si no hay bloqueantes, retornar el de mayor prioridad
-        return [estados_manuales.first().estado]
-    
-    # 2. Buscar estados de fuentes externas
-    estados_fuente = []
-    for estado_fuente in EstadoFuente.objects.select_related('estado', 'content_type').all():
-        if not estado_fuente.estado.activo:
-            continue
-            
-        # Construir consulta dinámica
-        modelo = estado_fuente.content_type.model_class()
-        if not modelo:
-            continue
-            
-        filtros = Q(**{
-            f"{estado_fuente.campo_personal}": personal,
-            f"{estado_fuente.campo_fecha_inicio}__lte": fecha,
-            f"{estado_fuente.campo_fecha_fin}__gte": fecha,
-        })
-        
-        # Aplicar filtros extra si existen
-        if estado_fuente.filtro_extra:
-            for campo, valor in estado_fuente.filtro_extra.items():
-                filtros &= Q(**{campo: valor})
-        
-        if modelo.objects.filter(filtros).exists():
-            estados_fuente.append(estado_fuente.estado)
-    
-    # 3. Buscar estado derivado de turno
-    estado_turno = None
-    asignaciones_activas = AsignacionFaena.objects.filter(
-        personal=personal,
-        fecha_inicio__lte=fecha,
-        activo=True
-    ).filter(
-        Q(fecha_fin__isnull=True) | Q(fecha_fin__gte=fecha)
-    ).select_related('turno').first()
-    
-    if asignaciones_activas:
-        estado_turno = asignaciones_activas.obtener_estado_en_fecha(fecha)
-    
-    # 4. Resolver conflictos de prioridad
-    todos_estados = []
-    
-    # Debug: mostrar qué estados se encontraron
-    print(f"DEBUG PRIORIDADES: {personal.nombre} - {fecha}")
-    print(f"  Estados de fuente: {[e.nombre for e in estados_fuente]}")
-    print(f"  Estado de turno: {estado_turno.nombre if estado_turno else 'None'}")
-    
-    # Agregar estados de fuentes externas
-    for estado in estados_fuente:
-        todos_estados.append({
-            'estado': estado,
-            'tipo': 'fuente',
-            'prioridad': estado.prioridad
-        })
-    
-    # Agregar estado de turno si existe
-    if estado_turno:
-        todos_estados.append({
-            'estado': estado_turno,
-            'tipo': 'turno',
-            'prioridad': estado_turno.prioridad
-        })
-    
-    if not todos_estados:
-        # Si no hay nada, retornar estado por defecto
-        try:
-            estado_predeterminado = Estado.objects.filter(
-                activo=True,
-                es_predeterminado=True
-            ).first()
-            
-            if estado_predeterminado:
-                return [estado_predeterminado]
-            
-            return []
-        except:
-            return []
-    
-    # Ordenar por prioridad (mayor número = mayor prioridad)
-    todos_estados.sort(key=lambda x: x['prioridad'], reverse=True)
-    
-    # Si hay estados bloqueantes, solo retornar el de mayor prioridad
-    bloqueantes = [x for x in todos_estados if x['estado'].es_bloqueante]
-    if bloqueantes:
-        return [bloqueantes[0]['estado']]
-    
-    # Obtener la prioridad más alta
-    prioridad_maxima = todos_estados[0]['prioridad']
-    
-    # Retornar todos los estados que tengan la prioridad más alta
-    estados_misma_prioridad = [
-        x['estado'] for x in todos_estados 
-        if x['prioridad'] == prioridad_maxima
-    ]
-    
-    # Debug: imprimir para verificar
-    print(f"DEBUG: {personal.nombre} - {fecha}")
-    estados_info = [f"{x['estado'].nombre}({x['prioridad']})" for x in todos_estados]
-    print(f"  Estados encontrados: {estados_info}")
-    print(f"  Prioridad máxima: {prioridad_maxima}")
-    print(f"  Estados seleccionados: {[e.nombre for e in estados_misma_prioridad]}")
-    
-    return estados_misma_prioridad
-
-def obtener_calendario_mensual(anio, mes, personal_filtro=None):
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    version = models.PositiveBigIntegerField(default=0)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["year", "month"]
+        verbose_name = "Versión de Mes del Calendario"
+        verbose_name_plural = "Versiones de Meses del Calendario"
+        constraints = [
+            models.UniqueConstraint(fields=["year", "month"], name="version_calendario_mes_unica"),
+        ]
+
+    def __str__(self):
+        return f"{self.year}-{self.month:02d} v{self.version}"
+
+
+class VersionCatalogo(models.Model):
     """
-    Obtiene el calendario completo para un mes específico.
-    
-    Args:
-        anio: Año (ej: 2025)
-        mes: Mes (1-12)
-        personal_filtro: QuerySet opcional para filtrar personal
-    
-    Returns:
-        dict con estructura: {
-            'personal': [lista de personal],
-            'estados': {personal_id: {dia: estado}}
-        }
+    Versión del catálogo de opciones (calendario.catalogo), una sola fila. Se
+    guarda en la base de datos para que todos los procesos vean la misma: la
+    URL versionada del catálogo se cachea en el navegador sin expiración.
     """
-    from datetime import date
-    from calendar import monthrange
-    
-    # Obtener rango de fechas del mes
-    _, ultimo_dia = monthrange(anio, mes)
-    fecha_inicio = date(anio, mes, 1)
-    fecha_fin = date(anio, mes, ultimo_dia)
-    
-    # Obtener personal activo
-    if personal_filtro is None:
-        personal = Personal.objects.filter(activo=True).order_by('nombre')
-    else:
-        personal = personal_filtro.filter(activo=True).order_by('nombre')
-    
-    # Inicializar estructura de resultados
-    calendario = {
-        'personal': list(personal),
-        'estados': {},
-        'fechas': [fecha_inicio + timedelta(days=i) for i in range(ultimo_dia)]
-    }
-    
-    # Calcular estado para cada persona en cada día
-    for persona in personal:
-        calendario['estados'][persona.personal_id] = {}
-        
-        for fecha in calendario['fechas']:
-            estados = obtener_estado_final_personal_fecha(persona, fecha)
-            calendario['estados'][persona.personal_id][fecha.day] = estados
-    
-    return calendario
+    version = models.PositiveBigIntegerField(default=0)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Versión del Catálogo"
+        verbose_name_plural = "Versiones del Catálogo"
+
+    def __str__(self):
+        return f"v{self.version}"
+
+
+class CeldasMesPersona(models.Model):
+    """
+    Celdas ya resueltas de una persona en un mes: {dia: id de Estado | [ids] | None}.
+    Las genera el precálculo (calendario.precalculo) y se eliminan en cuanto se
+    invalidan esa persona y ese mes.
+    """
+    personal = models.ForeignKey("Personal", on_delete=models.CASCADE, related_name="celdas_precalculadas")
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    celdas = models.JSONField()
+    version = models.PositiveBigIntegerField(default=0)
+    calculado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Celdas Precalculadas"
+        verbose_name_plural = "Celdas Precalculadas"
+        constraints = [
+            models.UniqueConstraint(fields=["personal", "year", "month"], name="celdas_mes_persona_unica"),
+        ]
+        indexes = [
+            models.Index(fields=["year", "month"]),
+        ]
+
+    def __str__(self):
+        return f"{self.personal_id} {self.year}-{self.month:02d} v{self.version}"
+
+
+class ResumenMes(models.Model):
+    """
+    Dotación precalculada de un mes ({dia: {estado_id: personas}}), para todo el
+    personal (faena vacía) o para quienes tienen asignación a una faena en el mes.
+    """
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    faena = models.ForeignKey(Faena, on_delete=models.CASCADE, null=True, blank=True, related_name="resumenes_mes")
+    version = models.PositiveBigIntegerField(default=0)
+    personas = models.PositiveIntegerField(default=0)
+    dotacion = models.JSONField(default=dict)
+    duracion_ms = models.PositiveIntegerField(default=0)
+    calculado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["year", "month", "faena"]
+        verbose_name = "Resumen de Mes"
+        verbose_name_plural = "Resúmenes de Mes"
+        constraints = [
+            models.UniqueConstraint(fields=["year", "month", "faena"], name="resumen_mes_faena_unico"),
+            models.UniqueConstraint(
+                fields=["year", "month"], condition=models.Q(faena__isnull=True), name="resumen_mes_total_unico"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.year}-{self.month:02d} {self.faena or 'Todas'} v{self.version}"
+
+
+class TrabajoRecalculo(models.Model):
+    """
+    Cola persistente de recálculos del calendario precalculado (ver calendario.cola).
+    Hay a lo sumo un trabajo pendiente por (persona, mes); sin persona, el
+    trabajo cubre a todo el personal del mes.
+    """
+    personal = models.ForeignKey("Personal", on_delete=models.CASCADE, null=True, blank=True, related_name="trabajos_recalculo")
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    encolado_en = models.DateTimeField(auto_now_add=True)
+    tomado_en = models.DateTimeField(null=True, blank=True)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["encolado_en"]
+        verbose_name = "Trabajo de Recálculo"
+        verbose_name_plural = "Trabajos de Recálculo"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["personal", "year", "month"], condition=models.Q(tomado_en__isnull=True),
+                name="trabajo_recalculo_pendiente_unico"
+            ),
+            models.UniqueConstraint(
+                fields=["year", "month"], condition=models.Q(tomado_en__isnull=True, personal__isnull=True),
+                name="trabajo_recalculo_mes_pendiente_unico"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["tomado_en", "encolado_en"]),
+        ]
+
+    def __str__(self):
+        return f"{self.personal_id or 'Todos'} {self.year}-{self.month:02d}"
+
+
+#5 ARCHIVO HISTÓRICO
+
+class RegistroArchivado(models.Model):
+    """
+    Registro que terminó antes del corte de archivo y se movió desde su tabla
+    (asignaciones, estados manuales, ausentismos, licencias; ver calendario.archivo).
+    `datos` guarda sus columnas tal cual, para reconstruir la instancia; persona
+    y fechas quedan como columnas para consultar por rango.
+    """
+    modelo = models.CharField(max_length=100, help_text="Modelo de origen (app_label.modelo)")
+    registro_id = models.BigIntegerField(help_text="Clave primaria que tenía en su tabla")
+    personal = models.ForeignKey("Personal", on_delete=models.CASCADE, related_name="registros_archivados")
+    fecha_inicio = models.DateField()
+    fecha_fin = models.DateField()
+    datos = models.JSONField(encoder=DjangoJSONEncoder)
+    archivado_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["modelo", "fecha_inicio"]
+        verbose_name = "Registro Archivado"
+        verbose_name_plural = "Registros Archivados"
+        constraints = [
+            models.UniqueConstraint(fields=["modelo", "registro_id"], name="registro_archivado_unico"),
+        ]
+        indexes = [
+            models.Index(fields=["fecha_fin", "fecha_inicio"]),
+            models.Index(fields=["personal", "fecha_inicio", "fecha_fin"]),
+        ]
+
+    def __str__(self):
+        return f"{self.modelo} #{self.registro_id} · {self.personal_id} · {self.fecha_inicio} → {self.fecha_fin}"
+
+    def instancia(self):
+        """Instancia del modelo de origen con los valores archivados (no existe en su tabla)"""
+        modelo = apps.get_model(self.modelo)
+        valores = {}
+        for campo in modelo._meta.concrete_fields:
+            if campo.attname in self.datos:
+                valores[campo.attname] = campo.to_python(self.datos[campo.attname])
+        return modelo(**valores)
@@ -0,0 +1,519 @@
+"""
+Motor de resolución de estados del calendario.
+
+Es la única implementación de las reglas que deciden el estado de una persona
+en un día; el calendario mensual, el precálculo, la simulación y la
+explicación de celdas la usan:
+
+1. Estados manuales: gana el primero de mayor prioridad (bloqueante primero).
+2. Fuentes externas (EstadoFuente, cualquier modelo y su filtro_extra) y el
+   turno de la primera asignación vigente compiten por prioridad: si el mayor
+   es bloqueante gana solo él; si no, se muestran todos los empatados.
+3. Sin candidatos, el estado predeterminado.
+
+Una Ventana carga de una vez, para un rango de fechas, los registros de cada
+fuente; los estados manuales y las asignaciones vienen del prefetch de cada
+persona (prefetch_ventana). Los registros ya archivados (calendario.archivo)
+que se cruzan con el rango se suman a ambos. Con eso se resuelve un vector de
+días por persona (resolver_persona) o una celda suelta (candidatos + resolver).
+"""
+import logging
+from calendar import monthrange
+from datetime import date, timedelta
+
+from django.db.models import Q, Prefetch, prefetch_related_objects
+
+from .archivo import registros_archivados, cumple_filtro, relaciones_filtro
+from .models import (
+    Personal, InfoLaboral, Estado, EstadoFuente, EstadoManual, AsignacionFaena, RegistroArchivado
+)
+from . import nucleo
+from .precalculo import celdas_precalculadas, precalculo_confiable
+from .reglas import ReglasPrioridad
+from .compacto import (
+    CalendarioCompacto, ORIGEN_DESCONOCIDO, ORIGEN_PREDETERMINADO, ORIGEN_TURNO, ORIGEN_FUENTE, ORIGEN_MANUAL
+)
+
+logger = logging.getLogger(__name__)
+
+
+def prefetch_ventana(fecha_inicio, fecha_fin):
+    """
+    Prefetch de los estados manuales y las asignaciones de cada persona
+    restringido a los registros que se cruzan con [fecha_inicio, fecha_fin].
+    El orden (inicio, pk) decide qué registro gana cuando se solapan.
+    """
+    return [
+        Prefetch(
+            'estados_manuales',
+            queryset=EstadoManual.objects.filter(
+                activo=True,
+                fecha_inicio__lte=fecha_fin,
+                fecha_fin__gte=fecha_inicio
+            ).select_related('estado').order_by('fecha_inicio', 'pk')
+        ),
+        Prefetch(
+            'asignaciones_faena',
+            queryset=AsignacionFaena.objects.filter(
+                Q(fecha_fin__isnull=True) | Q(fecha_fin__gte=fecha_inicio),
+                activo=True,
+                fecha_inicio__lte=fecha_fin
+            ).select_related('faena', 'turno', 'bloque_inicio__estado').prefetch_related(
+                'turno__bloques__estado'
+            ).order_by('fecha_inicio', 'pk')
+        ),
+    ]
+
+
+class Ventana:
+    """
+    Datos compartidos para resolver celdas en [fecha_inicio, fecha_fin]: las
+    fuentes activas con sus registros por persona (una consulta por fuente),
+    los registros archivados del rango, el estado predeterminado y los rangos
+    de prioridad compilados. Con `personal_ids` solo se cargan los registros
+    de esas personas.
+    """
+
+    def __init__(self, fecha_inicio, fecha_fin, personal_ids=None):
+        self.fecha_inicio = fecha_inicio
+        self.fecha_fin = fecha_fin
+        self.archivados = registros_archivados(fecha_inicio, fecha_fin, personal_ids)
+        self._manuales_archivados = {
+            personal_id: [em for em in registros if em.activo]
+            for personal_id, registros in self.archivados.get(EstadoManual._meta.label_lower, {}).items()
+        }
+        self._asignaciones_archivadas = {
+            personal_id: [af for af in registros if af.activo]
+            for personal_id, registros in self.archivados.get(AsignacionFaena._meta.label_lower, {}).items()
+        }
+        self.fuentes = list(
+            EstadoFuente.objects.select_related('estado', 'content_type').filter(estado__activo=True).order_by('pk')
+        )
+        self.estado_predeterminado = Estado.objects.filter(activo=True, es_predeterminado=True).first()
+        self.reglas = ReglasPrioridad(estado_fuente.estado for estado_fuente in self.fuentes)
+        self.registros = [self._registros_fuente(estado_fuente, personal_ids) for estado_fuente in self.fuentes]
+        self._asignaciones_propuestas = {}
+        self._estados_nucleo = {}
+        self._estados_modelo = {}
+        self._ciclos = {}
+
+    def _registros_fuente(self, estado_fuente, personal_ids):
+        """{personal_id: [registros]} de la fuente que se cruzan con la ventana"""
+        modelo = estado_fuente.content_type.model_class()
+        if modelo is None:
+            return {}
+        filtros = {
+            f'{estado_fuente.campo_fecha_inicio}__lte': self.fecha_fin,
+            f'{estado_fuente.campo_fecha_fin}__gte': self.fecha_inicio,
+        }
+        if personal_ids is not None:
+            filtros[f'{estado_fuente.campo_personal}__in'] = personal_ids
+        registros = modelo.objects.filter(**filtros)
+        if estado_fuente.filtro_extra:
+            registros = registros.filter(**estado_fuente.filtro_extra)
+
+        campo_personal = modelo._meta.get_field(estado_fuente.campo_personal).attname
+        por_persona = {}
+        for registro in registros.order_by(estado_fuente.campo_fecha_inicio, 'pk'):
+            por_persona.setdefault(getattr(registro, campo_personal), []).append(registro)
+
+        archivados = self.archivados.get(modelo._meta.label_lower)
+        if archivados:
+            self._sumar_archivados(estado_fuente, modelo, por_persona, archivados)
+        return por_persona
+
+    def _sumar_archivados(self, estado_fuente, modelo, por_persona, archivados):
+        """Agrega a `por_persona` los registros archivados de la fuente, con su filtro_extra evaluado en memoria"""
+        campo_inicio, campo_fin = estado_fuente.campo_fecha_inicio, estado_fuente.campo_fecha_fin
+        filtro = estado_fuente.filtro_extra or {}
+        candidatos = [
+            (personal_id, registro)
+            for personal_id, registros in archivados.items()
+            for registro in registros
+            if getattr(registro, campo_inicio) <= self.fecha_fin and getattr(registro, campo_fin) >= self.fecha_inicio
+        ]
+        try:
+            if filtro:
+                prefetch_related_objects([registro for _, registro in candidatos], *relaciones_filtro(modelo, filtro))
+            candidatos = [(personal_id, registro) for personal_id, registro in candidatos if cumple_filtro(registro, filtro)]
+        except ValueError:
+            # Fuente guardada antes de que EstadoFuente validara filtro_extra: no se
+            # puede evaluar sobre el archivo, así que se omiten sus registros archivados
+            logger.exception('No se puede evaluar el filtro_extra de %s sobre el archivo', estado_fuente)
+            return
+        tocados = set()
+        for personal_id, registro in candidatos:
+            por_persona.setdefault(personal_id, []).append(registro)
+            tocados.add(personal_id)
+        for personal_id in tocados:
+            por_persona[personal_id].sort(key=lambda registro: (getattr(registro, campo_inicio), registro.pk))
+
+    def manuales(self, persona):
+        """Estados manuales de la persona en la ventana (prefetch + archivados), por (inicio, pk)"""
+        archivados = self._manuales_archivados.get(persona.pk)
+        if not archivados:
+            return persona.estados_manuales.all()
+        return sorted([*persona.estados_manuales.all(), *archivados], key=lambda em: (em.fecha_inicio, em.pk))
+
+    def proponer_asignaciones(self, personal_id, asignaciones):
+        """
+        Resuelve a la persona con `asignaciones` (guardadas o no, p. ej. en una
+        simulación) en lugar de las suyas: se filtran a la ventana y se ordenan
+        como en prefetch_ventana, con las nuevas después de las guardadas.
+        """
+        self._asignaciones_propuestas[personal_id] = sorted(
+            (
+                af for af in asignaciones
+                if af.activo and af.fecha_inicio <= self.fecha_fin and (af.fecha_fin is None or af.fecha_fin >= self.fecha_inicio)
+            ),
+            key=lambda af: (af.fecha_inicio, af.pk is None, af.pk or 0)
+        )
+
+    def asignaciones(self, persona):
+        """Asignaciones de la persona en la ventana (prefetch + archivadas, o las propuestas), por (inicio, pk)"""
+        propuestas = self._asignaciones_propuestas.get(persona.pk)
+        if propuestas is not None:
+            return propuestas
+        archivadas = self._asignaciones_archivadas.get(persona.pk)
+        if not archivadas:
+            return persona.asignaciones_faena.all()
+        return sorted([*persona.asignaciones_faena.all(), *archivadas], key=lambda af: (af.fecha_inicio, af.pk))
+
+    # Una celda
+
+    def candidatos(self, persona, fecha):
+        """
+        Reúne todo lo que podría definir el estado de una persona en una fecha:
+        - 'manuales': EstadoManual vigentes
+        - 'fuentes': (EstadoFuente, registro, fecha_inicio, fecha_fin), un registro por fuente
+        - 'turno': (AsignacionFaena, Estado) de la primera asignación vigente, o None
+        """
+        manuales = [em for em in self.manuales(persona)
+                    if em.activo and em.fecha_inicio <= fecha <= em.fecha_fin]
+
+        fuentes = []
+        for estado_fuente, por_persona in zip(self.fuentes, self.registros):
+            for registro in por_persona.get(persona.pk, ()):
+                inicio = getattr(registro, estado_fuente.campo_fecha_inicio)
+                fin = getattr(registro, estado_fuente.campo_fecha_fin)
+                if inicio <= fecha <= fin:
+                    fuentes.append((estado_fuente, registro, inicio, fin))
+                    break
+
+        turno = None
+        for asignacion in self.asignaciones(persona):
+            if (asignacion.activo and asignacion.fecha_inicio <= fecha and
+                    (not asignacion.fecha_fin or asignacion.fecha_fin >= fecha)):
+                estado_turno = asignacion.obtener_estado_en_fecha(fecha)
+                if estado_turno:
+                    turno = (asignacion, estado_turno)
+                break
+
+        return {'manuales': manuales, 'fuentes': fuentes, 'turno': turno}
+
+    def resolver(self, candidatos):
+        """(estados ganadores, motivo) de los candidatos de una celda"""
+        return resolver_candidatos(candidatos, self.estado_predeterminado, self.reglas)
+
+    def estados(self, persona, fecha):
+        """Estados ganadores de una celda"""
+        return self.resolver(self.candidatos(persona, fecha))[0]
+
+    def explicar(self, persona, fecha):
+        """
+        Explicación completa de una celda: cada candidato (manual, fuente o turno)
+        con su prioridad y detalle, cuáles ganaron y por qué.
+        """
+        candidatos = self.candidatos(persona, fecha)
+        estados, motivo = self.resolver(candidatos)
+        ganadores = {estado.pk for estado in estados}
+
+        def candidato(origen, estado, fecha_inicio, fecha_fin, fuente_nombre, registro_id, detalles):
+            return {
+                'origen': origen,
+                'estado': {
+                    'id': estado.id,
+                    'nombre': estado.nombre,
+                    'prioridad': estado.prioridad,
+                    'es_bloqueante': estado.es_bloqueante,
+                },
+                'ganador': estado.pk in ganadores,
+                'fecha_inicio': fecha_inicio,
+                'fecha_fin': fecha_fin,
+                'fuente_nombre': fuente_nombre,
+                'registro_id': registro_id,
+                'detalles': detalles,
+            }
+
+        lista = [
+            candidato('manual', em.estado, em.fecha_inicio, em.fecha_fin, 'estado_manual', em.pk, {
+                'tipo': 'Estado Manual',
+                'motivo': em.motivo or 'Sin motivo',
+            })
+            for em in candidatos['manuales']
+        ]
+
+        for estado_fuente, registro, fecha_inicio, fecha_fin in candidatos['fuentes']:
+            lista.append(candidato(
+                'fuente', estado_fuente.estado, fecha_inicio, fecha_fin,
+                estado_fuente.content_type.model, registro.pk, detalles_registro(estado_fuente, registro)
+            ))
+
+        if candidatos['turno']:
+            asignacion, estado_turno = candidatos['turno']
+            lista.append(candidato('turno', estado_turno, asignacion.fecha_inicio, asignacion.fecha_fin, 'asignacion_faena', asignacion.pk, {
+                'faena': asignacion.faena.nombre,
+                'turno': asignacion.turno.nombre,
+                'tipo': 'Asignación de Faena'
+            }))
+
+        # Si hubo estados manuales, solo gana el manual elegido; fuentes y turno quedan descartados
+        if candidatos['manuales']:
+            elegido = False
+            for item in lista:
+                item['ganador'] = item['origen'] == 'manual' and not elegido and item['ganador']
+                elegido = elegido or item['ganador']
+
+        return {
+            'estados': [estado.pk for estado in estados],
+            'predeterminado': not lista and bool(estados),
+            'motivo': motivo,
+            'candidatos': lista,
+        }
+
+    # Un vector de días
+
+    def estado_nucleo(self, estado):
+        """calendario.nucleo.Estado del Estado (uno por id en la ventana)"""
+        valor = self._estados_nucleo.get(estado.pk)
+        if valor is None:
+            valor = self._estados_nucleo[estado.pk] = nucleo.Estado(
+                id=estado.pk, nombre=estado.nombre, prioridad=estado.prioridad, es_bloqueante=estado.es_bloqueante,
+                nombre_corto=estado.nombre_corto or '', color=estado.color, background_color=estado.background_color
+            )
+            self._estados_modelo[estado.pk] = estado
+        return valor
+
+    def catalogo_nucleo(self):
+        """{id: calendario.nucleo.Estado} de los Estados convertidos hasta ahora"""
+        return dict(self._estados_nucleo)
+
+    def ciclo_nucleo(self, asignacion):
+        """calendario.nucleo.Ciclo de la asignación, compartido por turno y bloque de inicio"""
+        clave = (asignacion.turno_id, asignacion.bloque_inicio_id)
+        ciclo = self._ciclos.get(clave)
+        if ciclo is None:
+            ciclo = self._ciclos[clave] = nucleo.Ciclo(tuple(self.estado_nucleo(estado) for estado in ciclo_asignacion(asignacion)))
+        return ciclo
+
+    def persona_nucleo(self, persona):
+        """calendario.nucleo.Persona con los registros de la persona en la ventana"""
+        fuentes = []
+        for estado_fuente, por_persona in zip(self.fuentes, self.registros):
+            estado = self.estado_nucleo(estado_fuente.estado)
+            modelo_name = estado_fuente.content_type.model
+            fuentes.append(tuple(
+                nucleo.Intervalo(getattr(registro, estado_fuente.campo_fecha_inicio), getattr(registro, estado_fuente.campo_fecha_fin),
+                          estado, (modelo_name, registro.pk))
+                for registro in por_persona.get(persona.pk, ())
+            ))
+        return nucleo.Persona(
+            personal_id=persona.pk,
+            manuales=tuple(
+                nucleo.Intervalo(em.fecha_inicio, em.fecha_fin, self.estado_nucleo(em.estado), ('estadomanual', em.pk))
+                for em in self.manuales(persona) if em.activo
+            ),
+            fuentes=tuple(fuentes),
+            asignaciones=tuple(
+                nucleo.Asignacion(af.pk, af.fecha_inicio, af.fecha_fin, self.ciclo_nucleo(af), af.faena_id)
+                for af in self.asignaciones(persona) if af.activo
+            ),
+        )
+
+    def resolver_persona(self, persona, fechas):
+        """
+        Resuelve de una vez las celdas de una persona en `fechas` (días consecutivos)
+        con calendario.nucleo, con las mismas reglas que candidatos + resolver.
+        Retorna por día (estados, origen, referencia), con los Estados del modelo.
+        """
+        predeterminado = self.estado_predeterminado and self.estado_nucleo(self.estado_predeterminado)
+        modelos = self._estados_modelo
+        return [
+            ([modelos[estado.id] for estado in estados], origen, referencia)
+            for estados, origen, referencia in nucleo.resolver_dias(self.persona_nucleo(persona), fechas, self.reglas, predeterminado)
+        ]
+
+
+def resolver_candidatos(candidatos, estado_predeterminado, reglas=None):
+    """
+    Aplica las reglas de prioridad a los candidatos de Ventana.candidatos.
+    Retorna (estados ganadores, motivo) donde motivo explica la decisión.
+    Las comparaciones usan los rangos compilados de `reglas` (ver calendario.reglas).
+    """
+    reglas = reglas or ReglasPrioridad()
+
+    # 1. Los estados manuales tienen precedencia sobre fuentes y turno
+    if candidatos['manuales']:
+        ganador = candidatos['manuales'][reglas.primero_mayor([em.estado for em in candidatos['manuales']])].estado
+        if ganador.es_bloqueante:
+            return [ganador], 'Estado manual bloqueante de mayor prioridad; los estados manuales prevalecen sobre fuentes y turno.'
+        return [ganador], 'Estado manual de mayor prioridad; los estados manuales prevalecen sobre fuentes y turno.'
+
+    # 2. Fuentes externas y turno compiten por prioridad
+    todos_estados = [fuente[0].estado for fuente in candidatos['fuentes']]
+    if candidatos['turno']:
+        todos_estados.append(candidatos['turno'][1])
+
+    if not todos_estados:
+        if estado_predeterminado:
+            return [estado_predeterminado], 'Sin estados manuales, fuentes ni turno: se usa el estado predeterminado.'
+        return [], 'Sin estados manuales, fuentes ni turno, y no hay estado predeterminado.'
+
+    ganadores = [todos_estados[i] for i in reglas.ganadores(todos_estados)]
+    if ganadores[0].es_bloqueante:
+        return ganadores, f'{ganadores[0].nombre} es bloqueante y tiene la mayor prioridad entre los bloqueantes ({ganadores[0].prioridad}).'
+
+    prioridad_maxima = ganadores[0].prioridad
+    if len(ganadores) > 1:
+        nombres = ', '.join(x.nombre for x in ganadores)
+        return ganadores, f'Empate de prioridad {prioridad_maxima} entre {nombres}: se muestran todos.'
+    return ganadores, f'{ganadores[0].nombre} tiene la mayor prioridad ({prioridad_maxima}).'
+
+
+def detalles_registro(estado_fuente, registro):
+    """Detalle que muestra la explicación de una celda para el registro de una fuente"""
+    modelo_name = estado_fuente.content_type.model
+    if modelo_name == 'ausentismo':
+        return {
+            'motivo': getattr(registro, 'motivo', 'Sin motivo'),
+            'tipo': 'Ausentismo'
+        }
+    if modelo_name == 'licenciamedicaporpersonal':
+        return {
+            'motivo': getattr(registro, 'motivo', 'Licencia médica'),
+            'tipo': 'Licencia Médica',
+            'fecha_emision': str(registro.fechaEmision) if registro.fechaEmision else None
+        }
+    return {
+        'motivo': getattr(registro, 'motivo', 'Sin motivo'),
+        'tipo': str(registro._meta.verbose_name).capitalize()
+    }
+
+
+def ciclo_asignacion(asignacion):
+    """
+    Estado de cada día del ciclo contado desde la fecha de inicio de la
+    asignación (ya desplazado por su bloque de inicio), como en
+    AsignacionFaena.obtener_estado_en_fecha. Lista vacía si el turno no tiene días.
+    """
+    return list(asignacion.ciclo().estados)
+
+
+def origen_ganador(candidatos, estados):
+    """
+    (origen, referencia) del estado ganador, según calendario.compacto:
+    la referencia (modelo, pk) se entrega para estados manuales y fuentes.
+    """
+    if not estados:
+        return ORIGEN_DESCONOCIDO, None
+    ganador = estados[0]
+    for estado_manual in candidatos['manuales']:
+        if estado_manual.estado.pk == ganador.pk:
+            return ORIGEN_MANUAL, ('estadomanual', estado_manual.pk)
+    for estado_fuente, registro, _, _ in candidatos['fuentes']:
+        if estado_fuente.estado.pk == ganador.pk:
+            return ORIGEN_FUENTE, (estado_fuente.content_type.model, registro.pk)
+    if candidatos['turno'] and candidatos['turno'][1].pk == ganador.pk:
+        return ORIGEN_TURNO, None
+    return ORIGEN_PREDETERMINADO, None
+
+
+def estado_final(personal, fecha):
+    """
+    Estados de una persona en una fecha. Para celdas sueltas; el calendario
+    resuelve meses completos con obtener_calendario_mensual.
+    """
+    persona = Personal.objects.prefetch_related(*prefetch_ventana(fecha, fecha)).get(pk=personal.pk)
+    return Ventana(fecha, fecha, [persona.pk]).estados(persona, fecha)
+
+
+def personal_de_faena(faena_id, fecha_inicio, fecha_fin):
+    """
+    Ids del personal con alguna asignación activa en la faena que se cruza con
+    [fecha_inicio, fecha_fin]. Usa el índice (faena, turno) de AsignacionFaena;
+    las asignaciones archivadas se buscan por el índice de rango del archivo.
+    """
+    vigentes = AsignacionFaena.objects.filter(
+        Q(fecha_fin__isnull=True) | Q(fecha_fin__gte=fecha_inicio),
+        faena_id=faena_id,
+        activo=True,
+        fecha_inicio__lte=fecha_fin
+    ).values_list('personal_id', flat=True).order_by()
+    archivadas = RegistroArchivado.objects.filter(
+        modelo=AsignacionFaena._meta.label_lower,
+        fecha_inicio__lte=fecha_fin,
+        fecha_fin__gte=fecha_inicio,
+        datos__faena_id=faena_id,
+        datos__activo=True
+    ).values_list('personal_id', flat=True).order_by()
+    return list(vigentes.union(archivadas))
+
+
+def obtener_calendario_mensual(year, month, faena_filter='', cargo_filter='', search_query='', personal_ids=None,
+                               faena_id=None):
+    """
+    Obtiene el calendario completo para un mes específico.
+    El filtrado por faena, cargo y búsqueda se hace en el frontend.
+
+    Si se entrega `personal_ids`, solo se resuelven las celdas de esas personas
+    (usado para devolver las celdas afectadas tras una modificación). Con
+    `faena_id` se resuelve solo al personal asignado a esa faena en el mes.
+    """
+    _, ultimo_dia = monthrange(year, month)
+    fecha_inicio = date(year, month, 1)
+    fecha_fin = date(year, month, ultimo_dia)
+
+    if faena_id is not None:
+        dotacion = personal_de_faena(faena_id, fecha_inicio, fecha_fin)
+        if personal_ids is not None:
+            dotacion = sorted(set(dotacion) & set(personal_ids))
+        personal_ids = dotacion
+
+    # Personal con los registros que se cruzan con el mes (no todo su historial)
+    personal_query = Personal.objects.filter(activo=True).prefetch_related(
+        *prefetch_ventana(fecha_inicio, fecha_fin),
+        Prefetch('infolaboral_set', queryset=InfoLaboral.objects.select_related('cargo_id'))
+    )
+    if personal_ids is not None:
+        personal_query = personal_query.filter(personal_id__in=personal_ids)
+    personal = list(personal_query.order_by('nombre', 'apepat'))
+
+    # Las celdas van en un CalendarioCompacto y 'estados' es una vista
+    # {personal_id: {dia: [Estado]}} sobre él
+    fechas = [fecha_inicio + timedelta(days=i) for i in range(ultimo_dia)]
+    compacto = CalendarioCompacto([persona.personal_id for persona in personal], fechas)
+    calendario = {
+        'personal': personal,
+        'estados': compacto.vista(),
+        'compacto': compacto,
+        'fechas': fechas,
+        'dias_mes': ultimo_dia
+    }
+
+    ventana = Ventana(fecha_inicio, fecha_fin, personal_ids)
+
+    # Celdas ya precalculadas (ver calendario.precalculo): esas personas no se resuelven.
+    # No se usan si alguna fuente lee de un modelo que no invalida las celdas guardadas
+    precalculadas = celdas_precalculadas(year, month, personal_ids) if precalculo_confiable(ventana.fuentes) else {}
+    estados_por_id = Estado.objects.in_bulk() if precalculadas else {}
+
+    for fila, persona in enumerate(personal):
+        celdas = precalculadas.get(persona.personal_id)
+        if celdas is not None:
+            compacto.asignar_ids(fila, [celdas.get(fecha.day) for fecha in fechas], estados_por_id)
+            continue
+
+        for columna, (estados, origen, referencia) in enumerate(ventana.resolver_persona(persona, fechas)):
+            compacto.asignar(fila, columna, estados, origen, referencia)
+
+    return calendario
@@ -0,0 +1,28 @@
+"""
+Núcleo del motor de estados sin Django.
+
+Los tipos de valor (calendario.nucleo.tipos) describen una instantánea de un
+rango: el catálogo de Estados, los ciclos de los turnos, las asignaciones y
+los intervalos de estados manuales y fuentes de cada persona. La resolución
+(calendario.nucleo.resolucion) aplica sobre ella las mismas reglas que
+calendario.motor, que delega aquí el cálculo de los días.
+
+Importar este paquete no carga Django ni el ORM: solo depende de
+calendario.reglas y calendario.compacto, que tampoco lo hacen. Las
+instantáneas se construyen desde la base de datos con calendario.instantanea
+y se pueden enviar a otros procesos (pickle) o guardar para un script:
+
+    instantanea = construir_instantanea(date(2025, 3, 1), date(2025, 3, 31))
+    with ProcessPoolExecutor() as pool:
+        for parte in pool.map(resolver, instantanea.particionar(4)):
+            ...
+"""
+from ..compacto import ORIGEN_DESCONOCIDO, ORIGEN_PREDETERMINADO, ORIGEN_TURNO, ORIGEN_FUENTE, ORIGEN_MANUAL
+from .resolucion import fechas_rango, resolver_dias, resolver, ids_por_dia
+from .tipos import Estado, Ciclo, Intervalo, Asignacion, Persona, Instantanea
+
+__all__ = [
+    'Estado', 'Ciclo', 'Intervalo', 'Asignacion', 'Persona', 'Instantanea',
+    'fechas_rango', 'resolver_dias', 'resolver', 'ids_por_dia',
+    'ORIGEN_DESCONOCIDO', 'ORIGEN_PREDETERMINADO', 'ORIGEN_TURNO', 'ORIGEN_FUENTE', 'ORIGEN_MANUAL',
+]
@@ -0,0 +1,113 @@
+"""
+Resolución de los días de una persona sobre los tipos de valor del núcleo,
+con las reglas de calendario.motor (ver su docstring):
+
+1. Estados manuales: gana el primero de mayor prioridad (bloqueante primero).
+2. Fuentes y el turno de la primera asignación vigente compiten por
+   prioridad: si el mayor es bloqueante gana solo él; si no, todos los empatados.
+3. Sin candidatos, el estado predeterminado.
+
+Cada intervalo se recorre una vez sobre sus días y los rangos de cada capa se
+combinan por día con calendario.reglas.
+"""
+from datetime import timedelta
+
+from ..compacto import ORIGEN_DESCONOCIDO, ORIGEN_PREDETERMINADO, ORIGEN_TURNO, ORIGEN_FUENTE, ORIGEN_MANUAL
+from ..reglas import ReglasPrioridad, resolver_vector
+
+
+def fechas_rango(fecha_inicio, fecha_fin):
+    """Días consecutivos de [fecha_inicio, fecha_fin]"""
+    return [fecha_inicio + timedelta(days=i) for i in range((fecha_fin - fecha_inicio).days + 1)]
+
+
+def resolver_dias(persona, fechas, reglas, predeterminado=None):
+    """
+    Resuelve las celdas de `persona` (calendario.nucleo.Persona) en `fechas`
+    (días consecutivos). Retorna por día (estados, origen, referencia), con el
+    origen de calendario.compacto y la referencia (modelo, pk) para estados
+    manuales y fuentes.
+    """
+    n = len(fechas)
+    primera = fechas[0]
+
+    def dias(inicio, fin):
+        """Índices de los días de [inicio, fin] dentro de `fechas`"""
+        return range(max((inicio - primera).days, 0), min((fin - primera).days + 1, n))
+
+    # Estados manuales: por día, el primero de rango máximo
+    rango_manual = [0] * n
+    manual = [None] * n
+    for intervalo in persona.manuales:
+        rango = reglas.rango(intervalo.estado)
+        for dia in dias(intervalo.inicio, intervalo.fin):
+            if rango > rango_manual[dia]:
+                rango_manual[dia] = rango
+                manual[dia] = intervalo
+
+    # Una capa por fuente (el primer intervalo que cubre cada día) y la del turno
+    capas = []
+    for intervalos in persona.fuentes:
+        rangos = [0] * n
+        capa = [None] * n
+        for intervalo in intervalos:
+            rango = reglas.rango(intervalo.estado)
+            for dia in dias(intervalo.inicio, intervalo.fin):
+                if capa[dia] is None:
+                    rangos[dia] = rango
+                    capa[dia] = intervalo
+        capas.append((rangos, [intervalo and intervalo.estado for intervalo in capa],
+                      [intervalo and intervalo.referencia for intervalo in capa], ORIGEN_FUENTE))
+
+    # Turno: la primera asignación vigente de cada día define su estado (o ninguno)
+    rangos = [0] * n
+    estados_turno = [None] * n
+    reclamado = [False] * n
+    for asignacion in persona.asignaciones:
+        ciclo = asignacion.ciclo.estados
+        for dia in dias(asignacion.inicio, asignacion.fin or fechas[-1]):
+            if reclamado[dia]:
+                continue
+            reclamado[dia] = True
+            if ciclo:
+                estado = ciclo[(fechas[dia] - asignacion.inicio).days % len(ciclo)]
+                estados_turno[dia] = estado
+                rangos[dia] = reglas.rango(estado)
+    capas.append((rangos, estados_turno, [None] * n, ORIGEN_TURNO))
+
+    resultado = []
+    ganadores = resolver_vector(rango_manual, [capa[0] for capa in capas])
+    for dia in range(n):
+        if manual[dia] is not None:
+            resultado.append(([manual[dia].estado], ORIGEN_MANUAL, manual[dia].referencia))
+        elif ganadores[dia] is None:
+            if predeterminado is not None:
+                resultado.append(([predeterminado], ORIGEN_PREDETERMINADO, None))
+            else:
+                resultado.append(([], ORIGEN_DESCONOCIDO, None))
+        else:
+            primera_capa = capas[ganadores[dia][0]]
+            resultado.append(([capas[i][1][dia] for i in ganadores[dia]], primera_capa[3], primera_capa[2][dia]))
+    return resultado
+
+
+def resolver(instantanea, fechas=None):
+    """
+    {personal_id: [(estados, origen, referencia) por día]} de todas las personas
+    de la instantánea en `fechas` (por defecto, todo su rango). Pensada para
+    trabajos por lotes y procesos: solo usa la instantánea.
+    """
+    fechas = fechas or fechas_rango(instantanea.fecha_inicio, instantanea.fecha_fin)
+    reglas = ReglasPrioridad(instantanea.estados.values())
+    return {
+        persona.personal_id: resolver_dias(persona, fechas, reglas, instantanea.predeterminado)
+        for persona in instantanea.personas
+    }
+
+
+def ids_por_dia(resuelto):
+    """{personal_id: [[estado_id, ...] por día]} de un resultado de resolver (p. ej. para serializar)"""
+    return {
+        personal_id: [[estado.id for estado in estados] for estados, _, _ in dias]
+        for personal_id, dias in resuelto.items()
+    }
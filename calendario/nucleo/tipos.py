@@ -0,0 +1,118 @@
+"""
+Tipos de valor del núcleo: Estados, ciclos, intervalos, asignaciones,
+personas e instantáneas. Son inmutables, con __slots__, y se pueden enviar a
+otros procesos (pickle) sin arrastrar el ORM.
+"""
+from dataclasses import dataclass, field, replace
+from datetime import date
+
+
+@dataclass(frozen=True, slots=True)
+class Estado:
+    """Un Estado del catálogo con lo que usan las reglas y la presentación"""
+    id: int
+    nombre: str
+    prioridad: int
+    es_bloqueante: bool = False
+    nombre_corto: str = ''
+    color: str = ''
+    background_color: str = ''
+
+    @property
+    def pk(self):
+        """Igual que en el modelo, para que calendario.reglas acepte ambos"""
+        return self.id
+
+
+@dataclass(frozen=True, slots=True)
+class Ciclo:
+    """
+    Estado de cada día del ciclo de un turno, ya desplazado por el bloque de
+    inicio: el día k de una asignación está en estados[k % largo].
+    """
+    estados: tuple = ()
+
+    @classmethod
+    def desde_bloques(cls, bloques, orden_inicio=None):
+        """
+        Ciclo de `bloques` ((orden, duración en días, estado), en cualquier
+        orden) que arranca en el bloque de orden `orden_inicio`.
+        """
+        bloques = sorted(bloques, key=lambda bloque: bloque[0])
+        estados = [estado for _, duracion, estado in bloques for _ in range(duracion)]
+        if not estados:
+            return cls()
+        desplazamiento = 0
+        if orden_inicio is not None:
+            desplazamiento = sum(duracion for orden, duracion, _ in bloques if orden < orden_inicio) % len(estados)
+        return cls(tuple(estados[desplazamiento:] + estados[:desplazamiento]))
+
+    def __len__(self):
+        return len(self.estados)
+
+    def estado_en(self, dias):
+        """Estado `dias` días después del inicio, o None si el ciclo no tiene días"""
+        return self.estados[dias % len(self.estados)] if self.estados else None
+
+
+@dataclass(frozen=True, slots=True)
+class Intervalo:
+    """
+    Un Estado en [inicio, fin] (ambos incluidos): un estado manual o el
+    registro de una fuente. `referencia` es (modelo, pk) del registro de origen.
+    """
+    inicio: date
+    fin: date
+    estado: Estado
+    referencia: tuple = None
+
+
+@dataclass(frozen=True, slots=True)
+class Asignacion:
+    """Una asignación activa a un turno desde `inicio` hasta `fin` (None = abierta)"""
+    id: int
+    inicio: date
+    fin: date
+    ciclo: Ciclo
+    faena_id: int = None
+
+    def estado_en_fecha(self, fecha):
+        """Estado del turno en `fecha`, o None fuera de la asignación"""
+        if fecha < self.inicio or (self.fin is not None and fecha > self.fin):
+            return None
+        return self.ciclo.estado_en((fecha - self.inicio).days)
+
+
+@dataclass(frozen=True, slots=True)
+class Persona:
+    """
+    Lo que decide los estados de una persona en una instantánea, en el orden
+    en que se aplican las reglas (ver calendario.nucleo.resolucion):
+    - manuales: Intervalos de estados manuales activos, por (inicio, pk)
+    - fuentes: por cada fuente de la instantánea, sus Intervalos por (inicio, pk)
+    - asignaciones: Asignaciones activas por (inicio, pk)
+    """
+    personal_id: int
+    manuales: tuple = ()
+    fuentes: tuple = ()
+    asignaciones: tuple = ()
+
+
+@dataclass(frozen=True, slots=True)
+class Instantanea:
+    """
+    Datos de un rango [fecha_inicio, fecha_fin] para resolverlo sin base de
+    datos: las personas, el Estado de cada fuente (en su orden de precedencia
+    en los empates), el estado predeterminado y el catálogo {id: Estado}.
+    """
+    fecha_inicio: date
+    fecha_fin: date
+    personas: tuple = ()
+    fuentes: tuple = ()
+    predeterminado: Estado = None
+    estados: dict = field(default_factory=dict)
+
+    def particionar(self, partes):
+        """Divide las personas en hasta `partes` instantáneas (p. ej. una por proceso)"""
+        partes = max(1, min(partes, len(self.personas)))
+        return [replace(self, personas=self.personas[i::partes]) for i in range(partes)]
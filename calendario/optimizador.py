@@ -0,0 +1,201 @@
+"""
+Optimizador de fases de rotación.
+
+Para una faena nueva se elige, para cada persona, el `bloque_inicio` del turno
+de modo que la dotación diaria por Estado (por ejemplo Día y Noche) se acerque
+lo más posible a un objetivo.
+
+Todas las personas comparten el mismo turno y la misma fecha de inicio, así que
+la cobertura solo depende de cuántas personas arrancan en cada bloque. El ciclo
+de cada fase se precalcula una vez como arreglo (día del ciclo × Estado
+objetivo) y la búsqueda trabaja sobre los conteos por fase: mover una persona de
+una fase a otra se evalúa sumando solo las posiciones en que ambas fases
+difieren, sin recalcular la cobertura completa.
+"""
+from datetime import timedelta
+
+from .nucleo import Ciclo
+
+
+class FasesCiclo:
+    """
+    Arreglos precalculados del ciclo de un turno: para cada bloque de inicio
+    posible, qué Estado objetivo tiene la persona en cada día del ciclo.
+    Cada fase es el nucleo.Ciclo que usa el motor para ese bloque de inicio.
+    """
+
+    def __init__(self, turno, estados_objetivo):
+        self.bloques = sorted(turno.bloques.all(), key=lambda bloque: bloque.orden)
+        self.estados = list(estados_objetivo)
+        indice_estado = {estado_id: i for i, estado_id in enumerate(self.estados)}
+        bloques = [(bloque.orden, bloque.duracion_dias, bloque.estado_id) for bloque in self.bloques]
+        self.longitud = sum(bloque.duracion_dias for bloque in self.bloques)
+
+        # Un arreglo plano por fase: posición dia * n_estados + indice_estado vale 1
+        # si la persona está en ese Estado objetivo ese día
+        self.arreglos = []
+        for bloque in self.bloques:
+            arreglo = [0] * (self.longitud * len(self.estados))
+            for dia, estado_id in enumerate(Ciclo.desde_bloques(bloques, bloque.orden).estados):
+                indice = indice_estado.get(estado_id)
+                if indice is not None:
+                    arreglo[dia * len(self.estados) + indice] = 1
+            self.arreglos.append(arreglo)
+
+        # Diferencias dispersas entre fases: (posición, +1/-1) al mover a alguien de p a q
+        self.diferencias = [
+            [
+                [(k, destino[k] - origen[k]) for k in range(len(origen)) if destino[k] != origen[k]]
+                for destino in self.arreglos
+            ]
+            for origen in self.arreglos
+        ]
+
+
+def optimizar_fases(turno, cantidad, objetivos, iteraciones_max=100000):
+    """
+    Busca cuántas personas deben arrancar en cada bloque del turno para que la
+    dotación diaria por Estado se acerque a `objetivos` ({estado_id: personas por día}).
+
+    Retorna (fases, conteos, desviacion, evaluaciones): `conteos[i]` es la cantidad
+    de personas para `fases.bloques[i]` y `desviacion` la suma de errores cuadráticos.
+    """
+    fases = FasesCiclo(turno, objetivos)
+    n_fases = len(fases.bloques)
+    if n_fases == 0 or fases.longitud == 0:
+        raise ValueError('El turno no tiene bloques')
+
+    objetivo = [objetivos[estado_id] for estado_id in fases.estados] * fases.longitud
+    # residuo = cobertura - objetivo en cada (día, estado)
+    residuo = [-valor for valor in objetivo]
+    conteos = [0] * n_fases
+    evaluaciones = 0
+
+    def costo_agregar(fase):
+        return sum(2 * residuo[k] + 1 for k, valor in enumerate(fases.arreglos[fase]) if valor)
+
+    # 1. Construcción voraz: cada persona va a la fase que más reduce la desviación
+    for _ in range(cantidad):
+        costos = [costo_agregar(fase) for fase in range(n_fases)]
+        evaluaciones += n_fases
+        fase = min(range(n_fases), key=lambda f: (costos[f], conteos[f]))
+        conteos[fase] += 1
+        for k, valor in enumerate(fases.arreglos[fase]):
+            residuo[k] += valor
+
+    def delta_movimiento(origen, destino):
+        return sum(2 * residuo[k] * cambio + 1 for k, cambio in fases.diferencias[origen][destino])
+
+    def mover(origen, destino):
+        conteos[origen] -= 1
+        conteos[destino] += 1
+        for k, cambio in fases.diferencias[origen][destino]:
+            residuo[k] += cambio
+
+    def mejor_movimiento():
+        nonlocal evaluaciones
+        mejor = None
+        for origen in range(n_fases):
+            if not conteos[origen]:
+                continue
+            for destino in range(n_fases):
+                if destino == origen:
+                    continue
+                delta = delta_movimiento(origen, destino)
+                evaluaciones += 1
+                if mejor is None or delta < mejor[0]:
+                    mejor = (delta, origen, destino)
+        return mejor
+
+    # 2. Búsqueda local: mover una persona de una fase a otra mientras mejore;
+    # si ningún movimiento simple mejora, se prueban pares de movimientos
+    for _ in range(iteraciones_max):
+        mejor = mejor_movimiento()
+        if mejor is not None and mejor[0] < 0:
+            mover(mejor[1], mejor[2])
+            continue
+
+        mejor_par = None
+        for origen in range(n_fases):
+            if not conteos[origen]:
+                continue
+            for destino in range(n_fases):
+                if destino == origen:
+                    continue
+                primero = delta_movimiento(origen, destino)
+                mover(origen, destino)
+                segundo = mejor_movimiento()
+                mover(destino, origen)
+                if segundo is not None and primero + segundo[0] < 0 and (
+                        mejor_par is None or primero + segundo[0] < mejor_par[0]):
+                    mejor_par = (primero + segundo[0], origen, destino, segundo[1], segundo[2])
+        if mejor_par is None:
+            break
+        mover(mejor_par[1], mejor_par[2])
+        mover(mejor_par[3], mejor_par[4])
+
+    desviacion = sum(valor * valor for valor in residuo)
+    return fases, conteos, desviacion, evaluaciones
+
+
+def sugerir_bloques_inicio(faena, turno, personal, objetivos, fecha_inicio):
+    """
+    Sugiere el `bloque_inicio` de cada persona para cubrir `objetivos` en la faena.
+    Quien ya tiene una asignación activa a la faena con ese turno conserva su
+    bloque si todavía cabe en el conteo óptimo, para minimizar cambios.
+    """
+    personal = list(personal)
+    fases, conteos, desviacion, evaluaciones = optimizar_fases(turno, len(personal), objetivos)
+
+    indice_bloque = {bloque.id: i for i, bloque in enumerate(fases.bloques)}
+    restantes = list(conteos)
+    sugerencias = {}
+
+    # Conservar el bloque actual cuando sea posible
+    for persona in personal:
+        for asignacion in persona.asignaciones_faena.all():
+            indice = indice_bloque.get(asignacion.bloque_inicio_id)
+            if (asignacion.activo and asignacion.faena_id == faena.id and asignacion.turno_id == turno.id
+                    and indice is not None and restantes[indice]):
+                sugerencias[persona.personal_id] = indice
+                restantes[indice] -= 1
+                break
+
+    # Repartir al resto en las fases que faltan
+    pendientes = (persona for persona in personal if persona.personal_id not in sugerencias)
+    for indice, cantidad in enumerate(restantes):
+        for _ in range(cantidad):
+            sugerencias[next(pendientes).personal_id] = indice
+
+    # Cobertura resultante en cada día del ciclo, desde fecha_inicio
+    cobertura = []
+    n_estados = len(fases.estados)
+    for dia in range(fases.longitud):
+        cobertura.append({
+            'fecha': fecha_inicio + timedelta(days=dia),
+            'dotacion': {
+                estado_id: sum(
+                    conteos[fase] * fases.arreglos[fase][dia * n_estados + i]
+                    for fase in range(len(conteos))
+                )
+                for i, estado_id in enumerate(fases.estados)
+            }
+        })
+
+    return {
+        'faena_id': faena.id,
+        'turno_id': turno.id,
+        'fecha_inicio': fecha_inicio,
+        'asignaciones': [
+            {
+                'personal_id': persona.personal_id,
+                'bloque_inicio_id': fases.bloques[sugerencias[persona.personal_id]].id,
+            }
+            for persona in personal
+        ],
+        'conteo_por_bloque': {bloque.id: conteos[i] for i, bloque in enumerate(fases.bloques)},
+        'objetivos': objetivos,
+        'desviacion': desviacion,
+        'cobertura': cobertura,
+        'evaluaciones': evaluaciones,
+    }
@@ -0,0 +1,184 @@
+"""
+Precálculo del calendario de los próximos meses.
+
+Las celdas resueltas de cada persona se guardan por mes en CeldasMesPersona y
+la dotación diaria por Estado en ResumenMes (total y por faena). El calendario
+usa las celdas guardadas y solo resuelve a las personas que no las tienen.
+
+Es incremental: cada ResumenMes guarda la versión del mes con que se calculó
+(VersionCalendarioMes) y solo se recalculan los meses cuya versión cambió. Al
+invalidarse un mes se borran las celdas de las personas afectadas, así que al
+recalcularlo solo se resuelven esas personas. Eso requiere que cada fuente lea
+de un modelo cuyas señales invalidan el calendario; si no (ver
+precalculo_confiable), no se guardan ni se usan celdas.
+"""
+import time
+from calendar import monthrange
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .invalidacion import version_mes
+from .models import Personal, AsignacionFaena, EstadoFuente, VersionCalendarioMes, CeldasMesPersona, ResumenMes
+
+
+def precalculo_confiable(fuentes):
+    """
+    True si todas las fuentes (EstadoFuente con su content_type) leen de modelos
+    que invalidan el calendario al cambiar (calendario.signals.RANGOS_CALENDARIO).
+    Una fuente configurada sobre otro modelo dejaría celdas guardadas obsoletas.
+    """
+    from .signals import RANGOS_CALENDARIO
+    return all(
+        modelo is None or modelo in RANGOS_CALENDARIO
+        for modelo in (estado_fuente.content_type.model_class() for estado_fuente in fuentes)
+    )
+
+
+def celdas_precalculadas(year, month, personal_ids=None):
+    """{personal_id: {dia: id | [ids] | None}} de las personas con celdas guardadas del mes"""
+    filas = CeldasMesPersona.objects.filter(year=year, month=month)
+    if personal_ids is not None:
+        filas = filas.filter(personal_id__in=personal_ids)
+    return {
+        personal_id: {int(dia): valor for dia, valor in celdas.items()}
+        for personal_id, celdas in filas.values_list('personal_id', 'celdas')
+    }
+
+
+def meses_siguientes(desde, cantidad):
+    """(year, month) del mes de `desde` y de los `cantidad` meses siguientes"""
+    meses = []
+    year, month = desde.year, desde.month
+    for _ in range(cantidad + 1):
+        meses.append((year, month))
+        year, month = year + month // 12, month % 12 + 1
+    return meses
+
+
+def precalcular_mes(year, month, forzar=False):
+    """
+    Guarda las celdas que falten y la dotación del mes si su versión cambió desde
+    el último precálculo (o siempre, con `forzar`). Retorna un dict con el
+    resultado y los tiempos.
+    """
+    from .motor import obtener_calendario_mensual
+
+    inicio = time.perf_counter()
+
+    # La fila de versión debe existir para que las invalidaciones sin fecha de
+    # fin (asignaciones indefinidas) alcancen a este mes
+    VersionCalendarioMes.objects.get_or_create(year=year, month=month)
+    version = version_mes(year, month)
+
+    resultado = {'year': year, 'month': month, 'version': version, 'recalculado': False,
+                 'personas': 0, 'personas_resueltas': 0, 'faenas': 0}
+
+    fuentes = EstadoFuente.objects.select_related('content_type').filter(estado__activo=True)
+    if not precalculo_confiable(fuentes):
+        resultado['sin_invalidacion'] = True
+        resultado['duracion_ms'] = _milisegundos(inicio)
+        return resultado
+
+    if forzar:
+        CeldasMesPersona.objects.filter(year=year, month=month).delete()
+    elif ResumenMes.objects.filter(year=year, month=month, faena__isnull=True, version=version).exists():
+        resultado['duracion_ms'] = _milisegundos(inicio)
+        return resultado
+
+    # 1. Resolver solo a las personas sin celdas guardadas
+    guardadas = celdas_precalculadas(year, month)
+    activos = list(Personal.objects.filter(activo=True).values_list('personal_id', flat=True))
+    faltantes = [personal_id for personal_id in activos if personal_id not in guardadas]
+
+    nuevas = {}
+    if faltantes:
+        calendario = obtener_calendario_mensual(year, month, personal_ids=faltantes)
+        nuevas = calendario['compacto'].ids_por_persona()
+    resultado['personas_resueltas'] = len(nuevas)
+
+    celdas = {personal_id: guardadas[personal_id] for personal_id in activos if personal_id in guardadas}
+    celdas.update(nuevas)
+    resultado['personas'] = len(celdas)
+
+    # 2. Dotación total y por cada faena con asignaciones en el mes
+    _, ultimo_dia = monthrange(year, month)
+    fecha_inicio = date(year, month, 1)
+    fecha_fin = date(year, month, ultimo_dia)
+    personal_por_faena = {}
+    for faena_id, personal_id in AsignacionFaena.objects.filter(
+        Q(fecha_fin__isnull=True) | Q(fecha_fin__gte=fecha_inicio),
+        activo=True,
+        fecha_inicio__lte=fecha_fin,
+        personal_id__in=celdas.keys()
+    ).values_list('faena_id', 'personal_id').distinct():
+        personal_por_faena.setdefault(faena_id, set()).add(personal_id)
+    resultado['faenas'] = len(personal_por_faena)
+
+    # 3. Guardar, siempre que nadie haya invalidado el mes mientras se calculaba
+    # (el bloqueo de la fila de versión ordena el guardado con las invalidaciones)
+    with transaction.atomic():
+        vigente = VersionCalendarioMes.objects.select_for_update().get(year=year, month=month).version
+        if vigente != version:
+            resultado['duracion_ms'] = _milisegundos(inicio)
+            resultado['obsoleto'] = True
+            return resultado
+
+        CeldasMesPersona.objects.bulk_create([
+            CeldasMesPersona(personal_id=personal_id, year=year, month=month, celdas=dias, version=version)
+            for personal_id, dias in nuevas.items()
+        ], batch_size=500, ignore_conflicts=True)
+
+        duracion_ms = _milisegundos(inicio)
+        ResumenMes.objects.filter(year=year, month=month).exclude(
+            Q(faena__isnull=True) | Q(faena_id__in=personal_por_faena.keys())
+        ).delete()
+        _guardar_resumen(year, month, None, version, celdas, ultimo_dia, duracion_ms)
+        for faena_id, personal_ids in personal_por_faena.items():
+            _guardar_resumen(
+                year, month, faena_id, version,
+                {personal_id: celdas[personal_id] for personal_id in personal_ids},
+                ultimo_dia, duracion_ms
+            )
+
+    resultado['recalculado'] = True
+    resultado['duracion_ms'] = _milisegundos(inicio)
+    return resultado
+
+
+def precalcular_meses(cantidad=2, desde=None, forzar=False):
+    """Precalcula el mes actual (o el de `desde`) y los `cantidad` siguientes"""
+    desde = desde or timezone.localdate()
+    return [precalcular_mes(year, month, forzar=forzar) for year, month in meses_siguientes(desde, cantidad)]
+
+
+def dotacion_mes(celdas, dias_mes):
+    """{dia: {estado_id: personas}} a partir de las celdas {personal_id: {dia: ids}}"""
+    dotacion = {}
+    for dias in celdas.values():
+        for dia in range(1, dias_mes + 1):
+            valor = dias.get(dia)
+            if valor is None:
+                continue
+            conteo = dotacion.setdefault(dia, {})
+            for estado_id in (valor if isinstance(valor, list) else [valor]):
+                conteo[estado_id] = conteo.get(estado_id, 0) + 1
+    return dotacion
+
+
+def _guardar_resumen(year, month, faena_id, version, celdas, dias_mes, duracion_ms):
+    ResumenMes.objects.update_or_create(
+        year=year, month=month, faena_id=faena_id,
+        defaults={
+            'version': version,
+            'personas': len(celdas),
+            'dotacion': dotacion_mes(celdas, dias_mes),
+            'duracion_ms': duracion_ms,
+        }
+    )
+
+
+def _milisegundos(inicio):
+    return int((time.perf_counter() - inicio) * 1000)
@@ -0,0 +1,83 @@
+"""
+Reglas de prioridad entre Estados compiladas a rangos enteros.
+
+Cada Estado se traduce una vez a un rango entero: el bit BLOQUEANTE más su
+prioridad desplazada a positivo. Así "bloqueante primero, luego mayor
+prioridad" es comparar enteros, y resolver una celda (o un vector de celdas)
+se reduce a máximos y máscaras sobre esos rangos:
+
+- entre estados manuales gana el primero de rango máximo;
+- entre fuentes y turno, si el máximo es bloqueante gana el primero con ese
+  rango; si no, ganan todos los de rango máximo (empate, en su orden).
+
+El rango 0 significa "sin estado" en los vectores.
+"""
+
+BLOQUEANTE = 1 << 32
+DESPLAZAMIENTO = 1 << 31
+
+
+def rango_estado(estado):
+    """Rango entero del Estado: mayor rango, mayor precedencia"""
+    return (BLOQUEANTE if estado.es_bloqueante else 0) + estado.prioridad + DESPLAZAMIENTO
+
+
+class ReglasPrioridad:
+    """
+    Tabla de rangos por id de Estado. Se puede compilar de antemano con el
+    catálogo; los Estados que no estén se compilan la primera vez que aparecen.
+    """
+
+    def __init__(self, estados=()):
+        self.rangos = {estado.pk: rango_estado(estado) for estado in estados}
+
+    def rango(self, estado):
+        rango = self.rangos.get(estado.pk)
+        if rango is None:
+            rango = self.rangos[estado.pk] = rango_estado(estado)
+        return rango
+
+    def primero_mayor(self, estados):
+        """Índice del primer Estado de rango máximo (regla de los estados manuales)"""
+        mejor, mejor_rango = None, 0
+        for i, estado in enumerate(estados):
+            rango = self.rango(estado)
+            if rango > mejor_rango:
+                mejor, mejor_rango = i, rango
+        return mejor
+
+    def ganadores(self, estados):
+        """Índices de los Estados ganadores entre fuentes y turno (varios si hay empate)"""
+        rangos = [self.rango(estado) for estado in estados]
+        return indices_ganadores(rangos, max(rangos, default=0))
+
+
+def indices_ganadores(rangos, maximo):
+    """Máscara de ganadores dado el rango máximo: uno si es bloqueante, todos los iguales si no"""
+    if not maximo:
+        return []
+    if maximo & BLOQUEANTE:
+        return [rangos.index(maximo)]
+    return [i for i, rango in enumerate(rangos) if rango == maximo]
+
+
+def resolver_vector(manuales, capas):
+    """
+    Resuelve un vector de celdas (los días de una persona).
+
+    - manuales: por día, el rango del estado manual ganador (0 si no hay)
+    - capas: vectores de rangos por día, uno por fuente y el del turno, en el
+      orden de precedencia de los empates
+
+    Retorna por día None si decide un estado manual o no hay candidatos
+    (rango máximo 0); si no, la lista de índices de las capas ganadoras.
+    """
+    resultado = []
+    for dia, rango_manual in enumerate(manuales):
+        if rango_manual:
+            resultado.append(None)
+            continue
+        rangos = [capa[dia] for capa in capas]
+        maximo = max(rangos, default=0)
+        resultado.append(indices_ganadores(rangos, maximo) if maximo else None)
+    return resultado
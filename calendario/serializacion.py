@@ -0,0 +1,165 @@
+"""
+Serialización del calendario a JSON.
+
+Cada celda lleva solo el id de su Estado (o la lista de ids si hay empate de
+prioridad); los datos de cada Estado van una sola vez en 'estados_catalogo'.
+La explicación de por qué una celda tiene su estado se pide aparte
+(api_procedencia_celda). Si `orjson` está instalado se usa como backend; si
+no, se usa `json` de la librería estándar.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+try:
+    import orjson
+except ImportError:  # Dependencia opcional
+    orjson = None
+
+
+if orjson is not None:
+    def dumps(obj):
+        """Serializa `obj` a un str JSON usando orjson"""
+        return orjson.dumps(obj, default=_por_defecto, option=orjson.OPT_NON_STR_KEYS).decode()
+else:
+    def dumps(obj):
+        """Serializa `obj` a un str JSON usando la librería estándar"""
+        return json.dumps(obj, cls=DjangoJSONEncoder, separators=(',', ':'), ensure_ascii=False)
+
+
+def _por_defecto(obj):
+    """Tipos que orjson no serializa por sí mismo (Decimal, lazy strings, etc.)"""
+    return DjangoJSONEncoder().default(obj)
+
+
+# Escapes para incrustar JSON dentro de <script> (igual que json_script de Django)
+_ESCAPES_SCRIPT = {
+    ord('>'): '\\u003E',
+    ord('<'): '\\u003C',
+    ord('&'): '\\u0026',
+}
+
+
+def json_para_script(texto):
+    """Escapa un JSON ya serializado para incluirlo en un <script type="application/json">"""
+    return texto.translate(_ESCAPES_SCRIPT)
+
+
+def serializar_estado(estado):
+    """Datos de un Estado tal como los consume el frontend"""
+    return {
+        'nombre': estado.nombre,
+        'nombre_corto': estado.nombre_corto or estado.nombre,
+        'color': estado.color,
+        'background_color': estado.background_color,
+        'prioridad': estado.prioridad,
+        'es_bloqueante': estado.es_bloqueante
+    }
+
+
+def serializar_estado_catalogo(estado):
+    """Estado con su id, tal como va en los catálogos del frontend"""
+    return dict(serializar_estado(estado), id=estado.id, es_predeterminado=estado.es_predeterminado)
+
+
+def _estado_de(estado_info):
+    """El resolver entrega Estado o dict con 'estado' (y 'detalle_fuente')"""
+    return estado_info['estado'] if isinstance(estado_info, dict) else estado_info
+
+
+def ids_estados_dia(estados):
+    """
+    Valor de una celda: None si no hay estado, el id del Estado si hay uno solo
+    o la lista de ids cuando hay varios con la misma prioridad.
+    """
+    if not estados:
+        return None
+    if len(estados) == 1:
+        return _estado_de(estados[0]).pk
+    return [_estado_de(estado_info).pk for estado_info in estados]
+
+
+def catalogo_estados_usados(estados_por_persona):
+    """Catálogo {id: estado} de los Estados que aparecen en las celdas"""
+    usados = {}
+    for estados_persona in estados_por_persona.values():
+        for estados in estados_persona.values():
+            for estado_info in estados or ():
+                estado = _estado_de(estado_info)
+                if estado.pk not in usados:
+                    usados[estado.pk] = serializar_estado_catalogo(estado)
+    return usados
+
+
+def serializar_asignacion(af):
+    """Datos de una AsignacionFaena para los modales del calendario"""
+    return {
+        'id': af.id,
+        'faena': {
+            'id': af.faena.id,
+            'nombre': af.faena.nombre
+        },
+        'turno_id': af.turno_id,
+        'fecha_inicio': af.fecha_inicio.isoformat() if af.fecha_inicio else None,
+        'fecha_fin': af.fecha_fin.isoformat() if af.fecha_fin else None,
+        'bloque_inicio_id': af.bloque_inicio_id,
+        'observaciones': af.observaciones,
+        'activo': af.activo
+    }
+
+
+class SerializadorCalendario:
+    """
+    Emite el JSON final del calendario en una sola pasada.
+
+    Las celdas se escriben como ids; a medida que aparecen, los Estados se
+    registran para emitir 'estados_catalogo' una vez por Estado.
+    """
+
+    def __init__(self):
+        self._estados = {}
+
+    def _registrar(self, estado):
+        if estado.pk not in self._estados:
+            self._estados[estado.pk] = estado
+        return estado.pk
+
+    def celda(self, estados):
+        """Fragmento JSON de una celda"""
+        if not estados:
+            return 'null'
+        if len(estados) == 1:
+            return str(self._registrar(_estado_de(estados[0])))
+        return '[' + ','.join(str(self._registrar(_estado_de(estado_info))) for estado_info in estados) + ']'
+
+    def estados(self, estados_por_persona):
+        """Fragmento JSON del mapa {personal_id: {dia: celda}}"""
+        # Vista de un CalendarioCompacto: se escribe directo desde los códigos
+        compacto = getattr(estados_por_persona, 'compacto', None)
+        if compacto is not None:
+            return compacto.json_estados(self._registrar)
+        
+        personas = []
+        for personal_id, estados_persona in estados_por_persona.items():
+            dias = ','.join(
+                f'"{dia}":{self.celda(estados)}'
+                for dia, estados in estados_persona.items()
+            )
+            personas.append(f'"{personal_id}":{{{dias}}}')
+        return '{' + ','.join(personas) + '}'
+
+    def catalogo(self):
+        """Fragmento JSON de los Estados registrados por las celdas ya emitidas"""
+        return dumps({pk: serializar_estado_catalogo(estado) for pk, estado in self._estados.items()})
+
+    def payload(self, datos, estados_por_persona):
+        """
+        JSON completo: `datos` (todo menos las celdas) más las claves 'estados'
+        y 'estados_catalogo' armadas a partir de los fragmentos.
+        """
+        cuerpo = dumps(datos)
+        estados = self.estados(estados_por_persona)
+        extra = '"estados":' + estados + ',"estados_catalogo":' + self.catalogo() + '}'
+        if cuerpo == '{}':
+            return '{' + extra
+        return cuerpo[:-1] + ',' + extra
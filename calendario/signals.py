@@ -0,0 +1,122 @@
+from django.db.models import Q, Min, Max, ProtectedError
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from .archivo import modelos_referenciados, referencias_archivadas
+from .catalogo import invalidar_catalogo
+from .cola import encolar
+from .invalidacion import calendario_invalidado, invalidar_calendario
+from .models import (
+    Personal, Cargo, InfoLaboral, Estado, EstadoFuente, Turno, TurnoBloque, Faena,
+    AsignacionFaena, EstadoManual, Ausentismo, LicenciaMedicaPorPersonal, CeldasMesPersona
+)
+
+# Campos (persona, inicio, fin) de los registros que producen celdas del calendario
+RANGOS_CALENDARIO = {
+    AsignacionFaena: ('personal_id', 'fecha_inicio', 'fecha_fin'),
+    EstadoManual: ('personal_id', 'fecha_inicio', 'fecha_fin'),
+    Ausentismo: ('personal_id_id', 'fechaini', 'fechafin'),
+    LicenciaMedicaPorPersonal: ('personal_id_id', 'fechaEmision', 'fecha_fin_licencia'),
+}
+
+
+@receiver([post_save, post_delete], sender=Faena)
+@receiver([post_save, post_delete], sender=Turno)
+@receiver([post_save, post_delete], sender=TurnoBloque)
+@receiver([post_save, post_delete], sender=Estado)
+@receiver([post_save, post_delete], sender=Cargo)
+@receiver([post_save, post_delete], sender=InfoLaboral)
+@receiver([post_save, post_delete], sender=Personal)
+def invalidar_catalogo_al_cambiar(sender, **kwargs):
+    """Cualquier cambio en los modelos del catálogo publica una versión nueva"""
+    invalidar_catalogo()
+
+
+@receiver(pre_save, sender=AsignacionFaena)
+@receiver(pre_save, sender=EstadoManual)
+@receiver(pre_save, sender=Ausentismo)
+@receiver(pre_save, sender=LicenciaMedicaPorPersonal)
+def recordar_rango_anterior(sender, instance, **kwargs):
+    """Guarda persona y fechas previas para invalidar también el rango que se deja"""
+    instance._rango_calendario_anterior = None
+    if instance.pk is not None:
+        instance._rango_calendario_anterior = sender.objects.filter(pk=instance.pk).values_list(
+            *RANGOS_CALENDARIO[sender]
+        ).first()
+
+
+@receiver([post_save, post_delete], sender=AsignacionFaena)
+@receiver([post_save, post_delete], sender=EstadoManual)
+@receiver([post_save, post_delete], sender=Ausentismo)
+@receiver([post_save, post_delete], sender=LicenciaMedicaPorPersonal)
+def invalidar_calendario_al_cambiar(sender, instance, **kwargs):
+    """Invalida los meses de la persona que cubren el registro (antes y después del cambio)"""
+    # to_python por si las fechas se asignaron como texto antes de guardar
+    rangos = [tuple(
+        sender._meta.get_field(campo).to_python(getattr(instance, campo))
+        for campo in RANGOS_CALENDARIO[sender]
+    )]
+    anterior = getattr(instance, '_rango_calendario_anterior', None)
+    if anterior:
+        rangos.append(anterior)
+
+    por_persona = {}
+    for personal_id, fecha_inicio, fecha_fin in rangos:
+        por_persona.setdefault(personal_id, []).append((fecha_inicio, fecha_fin))
+
+    for personal_id, fechas in por_persona.items():
+        fecha_inicio = min(inicio for inicio, _ in fechas)
+        fecha_fin = None if any(fin is None for _, fin in fechas) else max(fin for _, fin in fechas)
+        invalidar_calendario([personal_id], fecha_inicio, fecha_fin)
+
+
+@receiver([post_save, post_delete], sender=Estado)
+@receiver([post_save, post_delete], sender=EstadoFuente)
+@receiver([post_save, post_delete], sender=Turno)
+@receiver([post_save, post_delete], sender=TurnoBloque)
+def invalidar_todo_el_calendario(sender, **kwargs):
+    """Prioridades, fuentes y ciclos de turno afectan a cualquier celda"""
+    invalidar_calendario(None, None, None)
+
+
+def respetar_archivo_al_borrar(sender, instance, **kwargs):
+    """
+    Aplica a los registros archivados el on_delete de sus claves foráneas:
+    rechaza borrar lo que uno protegido todavía usa y borra los que caen en
+    cascada, invalidando los meses que cubrían.
+    """
+    protegidos, en_cascada = referencias_archivadas(instance)
+    if protegidos.exists():
+        raise ProtectedError(
+            f'No se puede eliminar "{instance}": lo usan registros del archivo histórico.',
+            set(protegidos[:10])
+        )
+    for personal_id, fecha_inicio, fecha_fin in en_cascada.values('personal_id').annotate(
+        inicio=Min('fecha_inicio'), fin=Max('fecha_fin')
+    ).values_list('personal_id', 'inicio', 'fin').order_by():
+        invalidar_calendario([personal_id], fecha_inicio, fecha_fin)
+    en_cascada.delete()
+
+
+for modelo in modelos_referenciados():
+    pre_delete.connect(respetar_archivo_al_borrar, sender=modelo, dispatch_uid=f'archivo_{modelo._meta.label_lower}')
+
+
+@receiver(calendario_invalidado)
+def descartar_celdas_precalculadas(sender, personal_ids, meses, **kwargs):
+    """Borra las celdas guardadas de las personas y meses invalidados"""
+    if not meses:
+        return
+    condicion = Q()
+    for year, month in meses:
+        condicion |= Q(year=year, month=month)
+    celdas = CeldasMesPersona.objects.filter(condicion)
+    if personal_ids is not None:
+        celdas = celdas.filter(personal_id__in=personal_ids)
+    celdas.delete()
+
+
+@receiver(calendario_invalidado)
+def encolar_recalculo(sender, personal_ids, meses, **kwargs):
+    """Los meses ya precalculados se recalculan en segundo plano (ver calendario.cola)"""
+    encolar(personal_ids, meses)
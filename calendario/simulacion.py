@@ -0,0 +1,238 @@
+"""
+Simulación de cambios de asignación ("qué pasaría si").
+
+Se cargan en memoria solo las personas afectadas, con las mismas ventanas de
+prefetch que usa el calendario. Sobre sus asignaciones se aplican las altas,
+modificaciones y bajas propuestas (instancias sin guardar), validadas como en
+las APIs de asignación, y se vuelve a resolver el mes con el mismo motor
+(Ventana.proponer_asignaciones), comparando contra el resultado real. Nada se
+escribe en la base de datos.
+"""
+from calendar import monthrange
+from datetime import date, timedelta
+
+from .models import Personal, Faena, Turno, AsignacionFaena
+from .serializacion import ids_estados_dia, catalogo_estados_usados
+from .motor import prefetch_ventana, Ventana
+from .validacion import parsear_rango, hay_solapamiento, se_solapan
+
+
+def simular_cambios(year, month, crear=(), actualizar=(), eliminar=()):
+    """
+    Aplica en memoria los cambios propuestos y devuelve las celdas resultantes
+    de las personas afectadas y las diferencias de dotación contra el mes real.
+
+    - crear: dicts con personal_id, faena_id, turno_id, fecha_inicio, fecha_fin, bloque_inicio_id, activo
+    - actualizar: los mismos campos con asignacion_id en lugar de personal_id
+    - eliminar: ids de asignaciones
+
+    Los cambios inválidos no se aplican y se informan en 'errores'.
+    """
+    _, ultimo_dia = monthrange(year, month)
+    fecha_inicio_mes = date(year, month, 1)
+    fecha_fin_mes = date(year, month, ultimo_dia)
+    fechas = [fecha_inicio_mes + timedelta(days=i) for i in range(ultimo_dia)]
+    errores = []
+
+    # Asignaciones existentes que se tocan (para saber de quién son)
+    ids_existentes = {_entero(asignacion_id) for asignacion_id in eliminar}
+    ids_existentes |= {_entero(cambio.get('asignacion_id')) for cambio in actualizar}
+    ids_existentes.discard(None)
+    existentes = AsignacionFaena.objects.only('id', 'personal_id').in_bulk(ids_existentes) if ids_existentes else {}
+
+    personal_ids = {asignacion.personal_id for asignacion in existentes.values()}
+    personal_ids |= {_entero(cambio.get('personal_id')) for cambio in crear}
+    personal_ids.discard(None)
+
+    personas = {
+        persona.personal_id: persona
+        for persona in Personal.objects.filter(personal_id__in=personal_ids).prefetch_related(
+            *prefetch_ventana(fecha_inicio_mes, fecha_fin_mes)
+        )
+    }
+
+    # Faenas y turnos (con su ciclo) que usan las asignaciones propuestas
+    propuestas = list(crear) + list(actualizar)
+    faenas = Faena.objects.in_bulk({_entero(c.get('faena_id')) for c in propuestas} - {None})
+    turnos = Turno.objects.prefetch_related('bloques__estado').in_bulk({_entero(c.get('turno_id')) for c in propuestas} - {None})
+
+    ventana = Ventana(fecha_inicio_mes, fecha_fin_mes, list(personas))
+
+    # Resultado real, antes de tocar nada
+    antes = {
+        personal_id: _resolver_mes(ventana, persona, fechas)
+        for personal_id, persona in personas.items()
+    }
+
+    # Asignaciones simuladas por persona (partiendo de las del mes). Para validar
+    # solapamientos se consulta la base de datos sin las guardadas que se bajan o
+    # modifican (`tocadas`) y se revisan en memoria las propuestas (`nuevas`)
+    simuladas = {personal_id: list(ventana.asignaciones(persona)) for personal_id, persona in personas.items()}
+    tocadas = {personal_id: set() for personal_id in personas}
+    nuevas = {personal_id: [] for personal_id in personas}
+
+    for indice, asignacion_id in enumerate(eliminar):
+        asignacion = existentes.get(_entero(asignacion_id))
+        if asignacion is None or asignacion.personal_id not in simuladas:
+            errores.append({'accion': 'eliminar', 'indice': indice, 'error': 'Asignación no encontrada'})
+            continue
+        simuladas[asignacion.personal_id] = [af for af in simuladas[asignacion.personal_id] if af.id != asignacion.id]
+        tocadas[asignacion.personal_id].add(asignacion.id)
+
+    for indice, cambio in enumerate(actualizar):
+        asignacion = existentes.get(_entero(cambio.get('asignacion_id')))
+        if asignacion is None or asignacion.personal_id not in simuladas:
+            errores.append({'accion': 'actualizar', 'indice': indice, 'error': 'Asignación no encontrada'})
+            continue
+        personal_id = asignacion.personal_id
+        excluir = tocadas[personal_id] | {asignacion.id}
+        otras = [af for af in nuevas[personal_id] if af.id != asignacion.id]
+        try:
+            nueva = _asignacion_propuesta(cambio, personal_id, faenas, turnos, excluir, otras)
+        except ValueError as e:
+            errores.append({'accion': 'actualizar', 'indice': indice, 'error': str(e)})
+            continue
+        nueva.id = asignacion.id
+        simuladas[personal_id] = [af for af in simuladas[personal_id] if af.id != asignacion.id] + [nueva]
+        tocadas[personal_id] = excluir
+        nuevas[personal_id] = otras + [nueva]
+
+    for indice, cambio in enumerate(crear):
+        personal_id = _entero(cambio.get('personal_id'))
+        if personal_id not in simuladas:
+            errores.append({'accion': 'crear', 'indice': indice, 'error': 'Personal no encontrado'})
+            continue
+        try:
+            nueva = _asignacion_propuesta(cambio, personal_id, faenas, turnos, tocadas[personal_id], nuevas[personal_id])
+        except ValueError as e:
+            errores.append({'accion': 'crear', 'indice': indice, 'error': str(e)})
+            continue
+        simuladas[personal_id].append(nueva)
+        nuevas[personal_id].append(nueva)
+
+    # Resolver de nuevo con las asignaciones simuladas y comparar
+    despues = {}
+    for personal_id, persona in personas.items():
+        ventana.proponer_asignaciones(personal_id, simuladas[personal_id])
+        despues[personal_id] = _resolver_mes(ventana, persona, fechas)
+
+    celdas = {}
+    celdas_cambiadas = {}
+    dotacion = {}
+    cobertura = {}
+    for personal_id in personas:
+        celdas[personal_id] = {}
+        for fecha in fechas:
+            estados_antes, faena_antes = antes[personal_id][fecha.day]
+            estados_despues, faena_despues = despues[personal_id][fecha.day]
+            celdas[personal_id][fecha.day] = ids_estados_dia(estados_despues)
+
+            ids_antes = [estado.pk for estado in estados_antes]
+            ids_despues = [estado.pk for estado in estados_despues]
+            if ids_antes == ids_despues and faena_antes == faena_despues:
+                continue
+
+            celdas_cambiadas.setdefault(personal_id, []).append(fecha.day)
+            for estado_id in ids_antes:
+                _sumar(dotacion, fecha.day, estado_id, -1)
+            for estado_id in ids_despues:
+                _sumar(dotacion, fecha.day, estado_id, 1)
+            if faena_antes is not None:
+                for estado_id in ids_antes:
+                    _sumar(cobertura.setdefault(faena_antes, {}), fecha.day, estado_id, -1)
+            if faena_despues is not None:
+                for estado_id in ids_despues:
+                    _sumar(cobertura.setdefault(faena_despues, {}), fecha.day, estado_id, 1)
+
+    return {
+        'year': year,
+        'month': month,
+        'estados': celdas,
+        'estados_catalogo': catalogo_estados_usados({
+            personal_id: {dia: estados for dia, (estados, _) in dias.items()}
+            for personal_id, dias in despues.items()
+        }),
+        'celdas_cambiadas': celdas_cambiadas,
+        'dotacion': _sin_ceros(dotacion),
+        'cobertura': {faena_id: _sin_ceros(dias) for faena_id, dias in cobertura.items() if _sin_ceros(dias)},
+        'errores': errores,
+    }
+
+
+def _entero(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _asignacion_propuesta(cambio, personal_id, faenas, turnos, excluir, otras):
+    """
+    Construye (sin guardar) la AsignacionFaena propuesta con las mismas
+    validaciones que las APIs de asignación: no puede solaparse con las
+    asignaciones guardadas o archivadas de la persona (salvo las de `excluir`,
+    que la simulación baja o modifica) ni con las propuestas `otras`.
+    """
+    if not all([cambio.get('faena_id'), cambio.get('turno_id'), cambio.get('fecha_inicio')]):
+        raise ValueError('Faltan datos requeridos')
+
+    fecha_inicio, fecha_fin = parsear_rango(cambio.get('fecha_inicio'), cambio.get('fecha_fin'))
+
+    faena = faenas.get(_entero(cambio.get('faena_id')))
+    turno = turnos.get(_entero(cambio.get('turno_id')))
+    bloques = sorted(turno.bloques.all(), key=lambda bloque: bloque.orden) if turno else []
+    if faena is None or not bloques:
+        raise ValueError('Datos inválidos')
+
+    bloque_inicio = bloques[0]
+    if cambio.get('bloque_inicio_id'):
+        bloque_inicio = next((b for b in bloques if str(b.id) == str(cambio['bloque_inicio_id'])), None)
+        if bloque_inicio is None:
+            raise ValueError('Datos inválidos')
+
+    activo = cambio.get('activo', True)
+    if activo and (
+        any(se_solapan(otra, fecha_inicio, fecha_fin) for otra in otras)
+        or hay_solapamiento(personal_id, fecha_inicio, fecha_fin, excluir=excluir)
+    ):
+        raise ValueError('Las fechas se solapan con otra asignación existente')
+
+    return AsignacionFaena(
+        personal_id=personal_id,
+        faena=faena,
+        turno=turno,
+        fecha_inicio=fecha_inicio,
+        fecha_fin=fecha_fin,
+        bloque_inicio=bloque_inicio,
+        activo=activo,
+    )
+
+
+def _resolver_mes(ventana, persona, fechas):
+    """{dia: (estados, faena_id)}; faena_id solo si el estado ganador viene del turno"""
+    resultado = {}
+    for fecha in fechas:
+        candidatos = ventana.candidatos(persona, fecha)
+        estados, _ = ventana.resolver(candidatos)
+        faena_id = None
+        if candidatos['turno'] and not candidatos['manuales']:
+            asignacion, estado_turno = candidatos['turno']
+            if any(estado is estado_turno for estado in estados):
+                faena_id = asignacion.faena_id
+        resultado[fecha.day] = (estados, faena_id)
+    return resultado
+
+
+def _sumar(por_dia, dia, estado_id, delta):
+    conteo = por_dia.setdefault(dia, {})
+    conteo[estado_id] = conteo.get(estado_id, 0) + delta
+
+
+def _sin_ceros(por_dia):
+    """Quita las diferencias que se compensan (p. ej. un estado que sale y vuelve a entrar)"""
+    limpio = {}
+    for dia, conteo in por_dia.items():
+        conteo = {estado_id: delta for estado_id, delta in conteo.items() if delta}
+        if conteo:
+            limpio[dia] = conteo
+    return limpio
@@ -0,0 +1,1284 @@
+// Datos del backend de Django
+const calendarioData = JSON.parse(document.getElementById('calendarioData').textContent);
+const pagina = JSON.parse(document.getElementById('calendarioPagina').textContent);
+const currentYear = pagina.current_year;
+const currentMonth = pagina.current_month;
+const currentMonthName = pagina.current_month_name;
+const catalogoUrl = pagina.catalogo_url;
+const procedenciaUrl = pagina.procedencia_url;
+const simulacionUrl = pagina.simulacion_url;
+const filtros = pagina.filtros;
+const mesAnterior = pagina.mes_anterior;
+const mesSiguiente = pagina.mes_siguiente;
+
+let currentDate = new Date(currentYear, currentMonth - 1, 1);
+
+// Month names in Spanish
+const monthNames = [
+    'Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
+    'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre'
+];
+
+// Day names in Spanish (abbreviated)
+const dayNames = ['dom', 'lun', 'mar', 'mié', 'jue', 'vie', 'sáb'];
+
+// ====== CATÁLOGO DE OPCIONES ======
+// Faenas, turnos, cargos y estados cambian poco: se piden a una URL versionada
+// que el navegador guarda en caché, en vez de venir en cada página del mes.
+const catalogoListo = cargarCatalogo();
+
+function cargarCatalogo() {
+    return fetch(catalogoUrl)
+        .then(response => response.json())
+        .then(catalogo => {
+            calendarioData.faenas = catalogo.faenas;
+            calendarioData.turnos = catalogo.turnos;
+            calendarioData.cargos = catalogo.cargos;
+            calendarioData.todos_estados_disponibles = catalogo.estados;
+
+            poblarFiltrosCatalogo();
+            generateStatusLegend();
+            return catalogo;
+        })
+        .catch(error => {
+            console.error('Error cargando el catálogo:', error);
+        });
+}
+
+function poblarFiltrosCatalogo() {
+    const faenaFilter = document.getElementById('faenaFilter');
+    const sinAsignar = document.getElementById('faenaFilterSinAsignar');
+    calendarioData.faenas.forEach(faena => {
+        const option = document.createElement('option');
+        option.value = faena.nombre;
+        option.textContent = faena.nombre;
+        faenaFilter.insertBefore(option, sinAsignar);
+    });
+
+    const cargoOptions = document.getElementById('cargoFilterOptions');
+    const sinCargo = document.getElementById('cargoFilterSinCargo');
+    calendarioData.cargos.forEach(cargo => {
+        const label = document.createElement('label');
+        label.className = 'cargo-option';
+        const checkbox = document.createElement('input');
+        checkbox.type = 'checkbox';
+        checkbox.value = cargo;
+        checkbox.addEventListener('change', updateCargoFilter);
+        label.appendChild(checkbox);
+        label.appendChild(document.createTextNode(` ${cargo}`));
+        cargoOptions.insertBefore(label, sinCargo);
+    });
+}
+
+function updateCalendar() {
+    const year = currentDate.getFullYear();
+    const month = currentDate.getMonth();
+
+    // Update headers
+    document.getElementById('currentYear').textContent = year;
+    document.getElementById('currentMonth').textContent = monthNames[month];
+
+    // Generate calendar
+    generateCalendarTable(year, month);
+}
+
+         function generateStatusLegend() {
+     const legendContainer = document.getElementById('statusLegend');
+     legendContainer.innerHTML = '';
+
+     // Mostrar TODOS los estados del modelo, no solo los usados
+     if (calendarioData.todos_estados_disponibles && calendarioData.todos_estados_disponibles.length > 0) {
+         // Ordenar por prioridad (mayor a menor)
+         const estados = calendarioData.todos_estados_disponibles.sort((a, b) => b.prioridad - a.prioridad);
+
+                      estados.forEach(estado => {
+         const legendItem = document.createElement('div');
+         legendItem.className = 'legend-item';
+
+         // Mostrar nombre corto si existe, sino solo el nombre completo
+         const displayText = estado.nombre_corto && estado.nombre_corto !== estado.nombre 
+             ? `${estado.nombre} (${estado.nombre_corto})`
+             : estado.nombre;
+
+         legendItem.innerHTML = `
+             <div class="legend-color" style="background: ${estado.background_color}; border: 1px solid ${estado.color || '#dee2e6'};"></div>
+             <span>${displayText}</span>
+         `;
+         legendContainer.appendChild(legendItem);
+     });
+     } else {
+         // Fallback: mostrar mensaje de que no hay estados
+         legendContainer.innerHTML = '<p style="color: #666; font-style: italic;">No hay estados configurados</p>';
+     }
+}
+
+// ====== GRILLA VIRTUALIZADA ======
+// Solo se renderizan las filas visibles más un margen; los <tr> se reciclan
+// al hacer scroll y los filtros trabajan sobre el arreglo de datos, no sobre el DOM.
+const FILAS_MARGEN = 10;
+const ALTURA_FILA_POR_DEFECTO = 52;
+let personalFiltrado = [];
+let filasPool = [];
+let alturaFila = 0;
+let diasMesGrilla = 0;
+let renderPendiente = false;
+// Evita que una respuesta de procedencia atrasada pise la del último modal abierto
+let solicitudProcedencia = 0;
+
+function generateCalendarTable(year, month) {
+    const table = document.getElementById('calendarTable');
+    table.innerHTML = '';
+    filasPool = [];
+    alturaFila = 0;
+
+    // Get month info
+    const lastDay = new Date(year, month + 1, 0);
+    const daysInMonth = lastDay.getDate();
+    const today = new Date();
+    diasMesGrilla = daysInMonth;
+    window.currentDayColumnIndex = null;
+
+    // Create header row with PERSONAL column and date headers
+    const headerRow = table.createTHead().insertRow();
+
+    // PERSONAL column header
+    const personalHeader = headerRow.insertCell();
+    personalHeader.className = 'personal-header-cell';
+    personalHeader.innerHTML = '<strong>PERSONAL</strong>';
+
+    // Date headers
+    for (let day = 1; day <= daysInMonth; day++) {
+        const dateHeader = headerRow.insertCell();
+        dateHeader.className = 'date-header';
+
+        const date = new Date(year, month, day);
+        const dayOfWeek = date.getDay();
+
+        dateHeader.innerHTML = `
+            <div class="date-number">${day}</div>
+            <div class="date-day">${dayNames[dayOfWeek]}</div>
+        `;
+
+        // Highlight current day
+        if (year === today.getFullYear() && month === today.getMonth() && day === today.getDate()) {
+            dateHeader.classList.add('current-day');
+            // Store the column index for highlighting the entire column
+            window.currentDayColumnIndex = day + 1; // +1 because first column is PERSONAL
+        }
+    }
+
+    // Cuerpo virtualizado: espaciadores arriba/abajo y filas recicladas entre ellos
+    const tbody = table.createTBody();
+    tbody.id = 'calendarBody';
+    tbody.appendChild(crearEspaciador('espaciadorSuperior', daysInMonth));
+    tbody.appendChild(crearEspaciador('espaciadorInferior', daysInMonth));
+    tbody.addEventListener('click', clickCeldaCalendario);
+
+    personalFiltrado = filtrarPersonal();
+    renderizarFilasVisibles(true);
+}
+
+function crearEspaciador(id, daysInMonth) {
+    const fila = document.createElement('tr');
+    fila.id = id;
+    fila.className = 'virtual-spacer';
+    const celda = document.createElement('td');
+    celda.colSpan = daysInMonth + 1;
+    fila.appendChild(celda);
+    return fila;
+}
+
+// Crea un <tr> reutilizable con la celda de persona y una celda por día
+function crearFila() {
+    const fila = document.createElement('tr');
+    fila.className = 'person-row';
+    fila._idx = -1;
+
+    const personCell = fila.insertCell();
+    personCell.className = 'person-info-cell';
+
+    for (let day = 1; day <= diasMesGrilla; day++) {
+        const scheduleCell = fila.insertCell();
+        scheduleCell.className = 'status-cell';
+
+        // Highlight the entire column of the current day
+        if (window.currentDayColumnIndex && day === window.currentDayColumnIndex - 1) {
+            scheduleCell.classList.add('today-column');
+        }
+    }
+    return fila;
+}
+
+// Vuelca los datos de una persona en un <tr> del pool
+function pintarFila(fila, person) {
+    const personCell = fila.cells[0];
+    const cargo = cargoPersona(person);
+    const faenaTexto = faenaTextoPersona(person);
+
+    personCell.innerHTML = `
+        <div class="person-info-row">
+            <div class="person-details">
+                <div class="person-name">${person.nombre} ${person.apepat} ${person.apemat} <i class="fas fa-info-circle" onclick="showPersonalInfoModal(${person.personal_id})" title="Ver información personal"></i></div>
+                <div class="person-assignment">FAENA: ${faenaTexto}</div>
+                <div class="person-role">${cargo}</div>
+            </div>
+            <div class="person-actions">
+                <button class="btn-faena-manager" onclick="showFaenaManagerModal(${person.personal_id})" title="Gestionar asignación de faena"><i class="fas fa-calendar-check"></i></button>
+            </div>
+        </div>
+    `;
+
+    const estadosPersona = calendarioData.estados[person.personal_id] || {};
+    for (let day = 1; day <= diasMesGrilla; day++) {
+        const scheduleCell = fila.cells[day];
+        const estado = estadoDeCelda(estadosPersona[day]);
+
+        if (estado && estado.multiple && estado.estados) {
+            // Múltiples estados con la misma prioridad
+            scheduleCell.innerHTML = estado.estados.map(e => 
+                `<span class="multi-estado" style="background: ${e.background_color}; color: ${e.color};">${e.nombre_corto}</span>`
+            ).join('');
+            scheduleCell.style.backgroundColor = '#f8f9fa';
+            scheduleCell.style.color = '#495057';
+            scheduleCell.style.cursor = 'pointer';
+            scheduleCell.title = `Múltiples estados: ${estado.estados.map(e => e.nombre).join(', ')}`;
+        } else if (estado) {
+            // Estado único
+            scheduleCell.innerHTML = estado.nombre_corto;
+            scheduleCell.style.backgroundColor = estado.background_color;
+            scheduleCell.style.color = estado.color;
+            scheduleCell.style.cursor = estado.es_predeterminado ? '' : 'pointer';
+            scheduleCell.title = `${estado.nombre} - Prioridad: ${estado.prioridad}`;
+        } else {
+            scheduleCell.innerHTML = '';
+            scheduleCell.style.backgroundColor = '';
+            scheduleCell.style.color = '';
+            scheduleCell.style.cursor = '';
+            scheduleCell.title = '';
+        }
+    }
+}
+
+// Renderiza solo las filas dentro del viewport (más un margen), reciclando los <tr>
+function renderizarFilasVisibles(forzar) {
+    const tbody = document.getElementById('calendarBody');
+    if (!tbody) return;
+
+    const espaciadorSuperior = document.getElementById('espaciadorSuperior');
+    const espaciadorInferior = document.getElementById('espaciadorInferior');
+    const total = personalFiltrado.length;
+
+    // Medir la altura real de una fila la primera vez
+    if (!alturaFila && total > 0) {
+        const fila = crearFila();
+        pintarFila(fila, personalFiltrado[0]);
+        fila._idx = 0;
+        tbody.insertBefore(fila, espaciadorInferior);
+        alturaFila = fila.offsetHeight || ALTURA_FILA_POR_DEFECTO;
+        filasPool.push(fila);
+    }
+    const altura = alturaFila || ALTURA_FILA_POR_DEFECTO;
+
+    // Rango visible respecto al inicio del cuerpo de la tabla
+    const top = tbody.getBoundingClientRect().top;
+    const inicio = Math.min(total, Math.max(0, Math.floor(-top / altura) - FILAS_MARGEN));
+    const fin = Math.min(total, Math.max(inicio, Math.ceil((window.innerHeight - top) / altura) + FILAS_MARGEN));
+
+    // Asegurar suficientes filas en el pool; si crece, se repinta todo
+    if (fin - inicio > filasPool.length) {
+        while (filasPool.length < fin - inicio) {
+            filasPool.push(crearFila());
+        }
+        forzar = true;
+    }
+
+    // Cada índice usa siempre la misma fila del pool mientras siga visible
+    const fragmento = document.createDocumentFragment();
+    const enUso = new Set();
+    for (let idx = inicio; idx < fin; idx++) {
+        const fila = filasPool[idx % filasPool.length];
+        if (forzar || fila._idx !== idx) {
+            pintarFila(fila, personalFiltrado[idx]);
+            fila._idx = idx;
+        }
+        enUso.add(fila);
+        fragmento.appendChild(fila);
+    }
+    filasPool.forEach(fila => {
+        if (!enUso.has(fila)) {
+            fila.remove();
+            fila._idx = -1;
+        }
+    });
+
+    espaciadorSuperior.style.height = `${inicio * altura}px`;
+    espaciadorInferior.style.height = `${(total - fin) * altura}px`;
+    tbody.insertBefore(fragmento, espaciadorInferior);
+}
+
+function programarRenderizado() {
+    if (renderPendiente) return;
+    renderPendiente = true;
+    requestAnimationFrame(() => {
+        renderPendiente = false;
+        renderizarFilasVisibles(false);
+    });
+}
+
+// Un solo listener para todas las celdas de estado (delegación de eventos)
+function clickCeldaCalendario(e) {
+    const scheduleCell = e.target.closest('.status-cell');
+    if (!scheduleCell) return;
+
+    const fila = scheduleCell.parentElement;
+    const person = personalFiltrado[fila._idx];
+    const day = scheduleCell.cellIndex; // la columna 0 es PERSONAL
+    if (!person) return;
+
+    const estado = estadoDeCelda(calendarioData.estados[person.personal_id] && calendarioData.estados[person.personal_id][day]);
+    if (!estado || (!estado.multiple && estado.es_predeterminado)) return;
+
+    e.stopPropagation();
+    const fecha = new Date(currentYear, currentMonth - 1, day);
+    showModal(person, fecha, estado);
+}
+
+// Las celdas traen solo ids; los datos de cada estado van una vez en estados_catalogo
+function estadoDeCelda(valor) {
+    if (valor === null || valor === undefined) return null;
+    if (Array.isArray(valor)) {
+        return { multiple: true, estados: valor.map(id => calendarioData.estados_catalogo[id]) };
+    }
+    return calendarioData.estados_catalogo[valor] || null;
+}
+
+function cargoPersona(person) {
+    return person.infolaboral_set && person.infolaboral_set.length > 0 ? person.infolaboral_set[0].cargo_id.cargo : 'Sin cargo';
+}
+
+// Manejar múltiples faenas
+function faenaTextoPersona(person) {
+    if (person.asignaciones_faena && person.asignaciones_faena.length > 0) {
+        return person.asignaciones_faena.length === 1 ? person.asignaciones_faena[0].faena.nombre : 'Múltiples';
+    }
+    return 'Sin asignar';
+}
+
+function previousMonth() {
+    currentDate.setMonth(currentDate.getMonth() - 1);
+    redirectToCalendar();
+}
+
+function nextMonth() {
+    currentDate.setMonth(currentDate.getMonth() + 1);
+    redirectToCalendar();
+}
+
+function previousYear() {
+    currentDate.setFullYear(currentDate.getFullYear() - 1);
+    redirectToCalendar();
+}
+
+function nextYear() {
+    currentDate.setFullYear(currentDate.getFullYear() + 1);
+    redirectToCalendar();
+}
+
+function goToToday() {
+    // Efecto visual del botón
+    const todayBtn = document.querySelector('.today-btn');
+    todayBtn.style.transform = 'scale(0.95)';
+    todayBtn.style.transition = 'all 0.2s ease';
+
+    // Efecto de loading
+    const originalText = todayBtn.textContent;
+    todayBtn.textContent = '⏳ Cargando...';
+    todayBtn.disabled = true;
+
+    // Efecto de fade en el calendario
+    const calendar = document.querySelector('.calendar-table');
+    calendar.style.opacity = '0.6';
+    calendar.style.transition = 'opacity 0.3s ease';
+
+    // Esperar un poco para mostrar el efecto, luego navegar
+    setTimeout(() => {
+    currentDate = new Date();
+        redirectToCalendar();
+    }, 300);
+}
+
+function redirectToCalendar() {
+    const year = currentDate.getFullYear();
+    const month = currentDate.getMonth() + 1;
+    const url = new URL(window.location.href);
+    url.searchParams.set('year', year);
+    url.searchParams.set('month', month);
+    window.location.href = url.toString();
+}
+
+// Funciones del modal
+function showModal(personal, fecha, estado) {
+    // No mostrar modal para estado predeterminado
+    if (estado && estado.es_predeterminado) {
+        return;
+    }
+
+    document.getElementById('modalPersonal').textContent = `${personal.nombre} ${personal.apepat} ${personal.apemat}`;
+    document.getElementById('modalFecha').textContent = fecha.toLocaleDateString('es-ES', { 
+        weekday: 'long', 
+        year: 'numeric', 
+        month: 'long', 
+        day: 'numeric' 
+    });
+
+    if (estado && estado.multiple && estado.estados) {
+        // Múltiples estados
+        document.getElementById('modalEstado').textContent = estado.estados.map(e => e.nombre).join(' + ');
+    } else if (estado) {
+        // Estado único
+        document.getElementById('modalEstado').textContent = estado.nombre || 'Sin estado';
+    } else {
+        document.getElementById('modalEstado').textContent = 'Sin estado';
+    }
+
+    document.getElementById('modalFaena').textContent = 'Cargando...';
+    document.getElementById('modalCargo').textContent = cargoPersona(personal);
+    document.getElementById('modalDetalleSection').style.display = 'none';
+
+    // Mostrar modal
+    document.getElementById('estadoModal').style.display = 'flex';
+
+    // La procedencia de la celda (fuentes, prioridades y ganador) se pide al abrirla
+    const solicitud = ++solicitudProcedencia;
+    const fechaIso = `${fecha.getFullYear()}-${String(fecha.getMonth() + 1).padStart(2, '0')}-${String(fecha.getDate()).padStart(2, '0')}`;
+    fetch(`${procedenciaUrl}?personal_id=${personal.personal_id}&fecha=${fechaIso}`)
+        .then(response => response.json())
+        .then(procedencia => {
+            if (procedencia.error) throw new Error(procedencia.error);
+            if (solicitud === solicitudProcedencia) {
+                mostrarProcedencia(personal, fecha, procedencia);
+            }
+        })
+        .catch(error => {
+            console.error('Error al cargar la procedencia de la celda:', error);
+            if (solicitud === solicitudProcedencia) {
+                document.getElementById('modalFaena').textContent = faenaParaFecha(personal, fecha);
+            }
+        });
+}
+
+function mostrarProcedencia(personal, fecha, procedencia) {
+    const ganadores = procedencia.candidatos.filter(c => c.ganador);
+    const descartados = procedencia.candidatos.filter(c => !c.ganador);
+
+    // Faena según el estado que ganó: solo aplica si ganó el turno
+    const turnoGanador = ganadores.find(c => c.origen === 'turno');
+    let faenaEspecifica;
+    if (turnoGanador) {
+        faenaEspecifica = turnoGanador.detalles.faena;
+    } else if (ganadores.length > 0) {
+        faenaEspecifica = 'No aplica (permiso/licencia)';
+    } else {
+        faenaEspecifica = faenaParaFecha(personal, fecha);
+    }
+    document.getElementById('modalFaena').textContent = faenaEspecifica;
+
+    let detalleInfo = ganadores.map(formatearDetalleFuente).filter(Boolean)
+        .join('<hr style="margin: 10px 0; border: 1px solid #ecf0f1;">');
+    if (procedencia.motivo) {
+        detalleInfo += `${detalleInfo ? '<br>' : ''}<em>${procedencia.motivo}</em>`;
+    }
+    if (descartados.length > 0) {
+        detalleInfo += '<br><strong>Descartados:</strong><br>' + descartados.map(c =>
+            `${c.estado.nombre} (${c.detalles.tipo}, prioridad ${c.estado.prioridad}${c.estado.es_bloqueante ? ', bloqueante' : ''})`
+        ).join('<br>');
+    }
+
+    if (detalleInfo) {
+        document.getElementById('modalDetalle').innerHTML = detalleInfo;
+        document.getElementById('modalDetalleSection').style.display = 'block';
+    }
+}
+
+// Faena de la asignación vigente en la fecha, sin consultar al servidor
+function faenaParaFecha(personal, fecha) {
+    if (!personal.asignaciones_faena || personal.asignaciones_faena.length === 0) {
+        return 'Sin asignar';
+    }
+    if (personal.asignaciones_faena.length === 1) {
+        return personal.asignaciones_faena[0].faena.nombre;
+    }
+    const asignacionParaFecha = personal.asignaciones_faena.find(af => {
+        const fechaInicio = new Date(af.fecha_inicio);
+        const fechaFin = af.fecha_fin ? new Date(af.fecha_fin) : null;
+        return fechaInicio <= fecha && (!fechaFin || fechaFin >= fecha);
+    });
+    return asignacionParaFecha ? asignacionParaFecha.faena.nombre : 'Sin asignación para esta fecha';
+}
+
+function formatearDetalleFuente(detalle) {
+    if (!detalle) return '';
+
+    let info = '';
+
+    if (detalle.detalles) {
+        if (detalle.detalles.tipo === 'Estado Manual') {
+            info = `<strong>${detalle.detalles.tipo}: ${detalle.estado.nombre}</strong><br>`;
+            info += `Motivo: ${detalle.detalles.motivo || 'No especificado'}<br>`;
+            if (detalle.fecha_inicio && detalle.fecha_fin) {
+                info += `Período: ${new Date(detalle.fecha_inicio).toLocaleDateString('es-ES')} - ${new Date(detalle.fecha_fin).toLocaleDateString('es-ES')}`;
+            }
+        } else if (detalle.detalles.tipo === 'Licencia Médica') {
+            info = `<strong>${detalle.detalles.tipo}</strong><br>`;
+            info += `Motivo: ${detalle.detalles.motivo || 'No especificado'}<br>`;
+            if (detalle.fecha_inicio && detalle.fecha_fin) {
+                info += `Período: ${new Date(detalle.fecha_inicio).toLocaleDateString('es-ES')} - ${new Date(detalle.fecha_fin).toLocaleDateString('es-ES')}`;
+            }
+        } else if (detalle.detalles.tipo === 'Ausentismo') {
+            info = `<strong>${detalle.detalles.tipo}</strong><br>`;
+            info += `Motivo: ${detalle.detalles.motivo || 'No especificado'}<br>`;
+            if (detalle.fecha_inicio && detalle.fecha_fin) {
+                info += `Período: ${new Date(detalle.fecha_inicio).toLocaleDateString('es-ES')} - ${new Date(detalle.fecha_fin).toLocaleDateString('es-ES')}`;
+            }
+        } else if (detalle.detalles.tipo === 'Asignación de Faena') {
+            info = `<strong>${detalle.detalles.tipo}</strong><br>`;
+            info += `Faena: ${detalle.detalles.faena}<br>`;
+            info += `Turno: ${detalle.detalles.turno}<br>`;
+            if (detalle.fecha_inicio) {
+                const fechaFin = detalle.fecha_fin ? new Date(detalle.fecha_fin).toLocaleDateString('es-ES') : 'Indefinido';
+                info += `Período: ${new Date(detalle.fecha_inicio).toLocaleDateString('es-ES')} - ${fechaFin}`;
+            }
+        }
+    }
+
+    return info;
+}
+
+function closeModal() {
+    document.getElementById('estadoModal').style.display = 'none';
+}
+
+// Cerrar modal al hacer click fuera
+document.addEventListener('click', function(event) {
+    const modal = document.getElementById('estadoModal');
+    if (event.target === modal) {
+        closeModal();
+    }
+});
+
+// Cerrar modal con ESC
+document.addEventListener('keydown', function(event) {
+    if (event.key === 'Escape') {
+        closeModal();
+    }
+});
+
+// ====== FUNCIONES PARA MODAL DE INFORMACIÓN PERSONAL ======
+function showPersonalInfoModal(personalId) {
+    const personal = calendarioData.personal.find(p => p.personal_id === personalId);
+
+    if (!personal) {
+        alert('No se pudo cargar la información del personal');
+        return;
+    }
+
+    // Poblar datos en el modal
+    document.getElementById('personalNombre').textContent = `${personal.nombre} ${personal.apepat} ${personal.apemat}`;
+
+    // RUT completo con dígito verificador
+    const rutCompleto = personal.rut && personal.dvrut ? 
+        `${personal.rut}-${personal.dvrut}` : 'No especificado';
+    document.getElementById('personalRut').textContent = rutCompleto;
+
+    // Fecha de nacimiento formateada
+    document.getElementById('personalFechaNac').textContent = personal.fecha_nac ? 
+        formatearFecha(personal.fecha_nac) : 'No especificada';
+
+    document.getElementById('personalCorreo').textContent = personal.correo || 'No especificado';
+    document.getElementById('personalDireccion').textContent = personal.direccion || 'No especificada';
+
+    // Cargo actual
+    const cargo = personal.infolaboral_set && personal.infolaboral_set.length > 0 ? 
+        personal.infolaboral_set[0].cargo_id.cargo : 'Sin cargo';
+    document.getElementById('personalCargo').textContent = cargo;
+
+    // Mostrar modal
+    document.getElementById('personalInfoModal').style.display = 'flex';
+}
+
+function closePersonalInfoModal() {
+    document.getElementById('personalInfoModal').style.display = 'none';
+}
+
+// ====== FUNCIONES PARA MODAL DE GESTIÓN DE FAENAS ======
+function showFaenaManagerModal(personalId) {
+    const personal = calendarioData.personal.find(p => p.personal_id === personalId);
+
+    if (!personal) {
+        alert('No se pudo cargar la información del personal');
+        return;
+    }
+
+    // Guardar ID del personal
+    document.getElementById('personalId').value = personalId;
+    document.getElementById('faenaPersonalNombre').textContent = `${personal.nombre} ${personal.apepat} ${personal.apemat}`;
+
+    // Obtener todas las asignaciones activas
+    const asignacionesActivas = personal.asignaciones_faena && personal.asignaciones_faena.length > 0 ? 
+        personal.asignaciones_faena : [];
+
+    // Cargar faenas y turnos disponibles (cuando el catálogo esté listo)
+    catalogoListo.then(() => cargarFaenasYTurnos(personal)).then(() => {
+        if (asignacionesActivas.length > 0) {
+            // Mostrar lista de asignaciones existentes
+            mostrarAsignacionesExistentes(asignacionesActivas);
+            // Comenzar en modo lista
+            modoListaAsignaciones();
+        } else {
+            // No hay asignaciones, ir directo a crear nueva
+            modoCrearAsignacion();
+        }
+    });
+
+    // Mostrar modal
+    document.getElementById('faenaManagerModal').style.display = 'flex';
+}
+
+function mostrarAsignacionesExistentes(asignaciones) {
+    const listaContainer = document.getElementById('listaAsignaciones');
+    listaContainer.innerHTML = '';
+
+    asignaciones.forEach(asignacion => {
+        const asignacionDiv = document.createElement('div');
+        asignacionDiv.className = 'asignacion-item';
+
+        const fechaInicio = formatearFecha(asignacion.fecha_inicio);
+        const fechaFin = asignacion.fecha_fin ? formatearFecha(asignacion.fecha_fin) : 'Sin fecha fin';
+
+        asignacionDiv.innerHTML = `
+            <div class="asignacion-info">
+                <h5>${asignacion.faena.nombre}</h5>
+                <p>Desde: ${fechaInicio} hasta: ${fechaFin}</p>
+            </div>
+            <div class="asignacion-actions">
+                <button type="button" class="btn-asignacion btn-editar" onclick="editarAsignacion(${asignacion.id}, event)">Editar</button>
+                <button type="button" class="btn-asignacion btn-eliminar-asig" onclick="eliminarAsignacionDirecta(${asignacion.id}, event)">Eliminar</button>
+            </div>
+        `;
+
+        listaContainer.appendChild(asignacionDiv);
+    });
+}
+
+function modoListaAsignaciones() {
+    // Mostrar lista de asignaciones
+    document.getElementById('asignacionesExistentes').style.display = 'block';
+    // Ocultar formulario
+    document.getElementById('faenaSection').style.display = 'none';
+    document.getElementById('turnoSection').style.display = 'none';
+    document.getElementById('fechaInicioSection').style.display = 'none';
+    document.getElementById('fechaFinSection').style.display = 'none';
+    document.getElementById('bloqueInicioSection').style.display = 'none';
+    document.getElementById('observacionesSection').style.display = 'none';
+    document.getElementById('activoSection').style.display = 'none';
+    document.getElementById('simulacionSection').style.display = 'none';
+    document.querySelector('.form-actions').style.display = 'none';
+}
+
+function modoCrearAsignacion(event) {
+    if (event) event.preventDefault();
+
+    // Ocultar lista
+    document.getElementById('asignacionesExistentes').style.display = 'none';
+    // Mostrar formulario
+    document.getElementById('faenaSection').style.display = 'block';
+    document.getElementById('turnoSection').style.display = 'block';
+    document.getElementById('fechaInicioSection').style.display = 'block';
+    document.getElementById('fechaFinSection').style.display = 'block';
+    document.getElementById('bloqueInicioSection').style.display = 'block';
+    document.getElementById('observacionesSection').style.display = 'block';
+    document.getElementById('activoSection').style.display = 'block';
+    document.querySelector('.form-actions').style.display = 'flex';
+
+    // Limpiar formulario para nueva asignación
+    document.getElementById('asignacionId').value = '';
+    document.getElementById('faenaForm').reset();
+    document.getElementById('personalId').value = document.getElementById('personalId').value; // Mantener personal ID
+    document.getElementById('activo').checked = true;
+    document.getElementById('btnEliminar').style.display = 'none';
+    document.getElementById('btnGuardar').textContent = 'Guardar';
+    document.getElementById('simulacionSection').style.display = 'none';
+}
+
+function editarAsignacion(asignacionId, event) {
+    if (event) event.preventDefault();
+
+    // Encontrar la asignación por ID
+    const personal = calendarioData.personal.find(p => p.personal_id == document.getElementById('personalId').value);
+    const asignacion = personal.asignaciones_faena.find(a => a.id == asignacionId);
+
+    if (!asignacion) {
+        alert('Asignación no encontrada');
+        return;
+    }
+
+    // Cambiar a modo formulario
+    modoCrearAsignacion();
+
+    // Precargar datos de la asignación
+    document.getElementById('asignacionId').value = asignacion.id;
+    document.getElementById('faenaSelect').value = asignacion.faena.id;
+    document.getElementById('turnoSelect').value = asignacion.turno_id;
+    document.getElementById('fechaInicio').value = asignacion.fecha_inicio;
+    document.getElementById('fechaFin').value = asignacion.fecha_fin || '';
+    document.getElementById('observaciones').value = asignacion.observaciones || '';
+    document.getElementById('activo').checked = asignacion.activo !== false;
+
+    // Cargar bloques del turno y seleccionar el correcto
+    if (asignacion.turno_id) {
+        cargarBloquesTurno(asignacion.turno_id).then(() => {
+            if (asignacion.bloque_inicio_id) {
+                document.getElementById('bloqueInicioSelect').value = asignacion.bloque_inicio_id;
+            }
+        });
+    }
+
+    document.getElementById('btnEliminar').style.display = 'inline-block';
+    document.getElementById('btnGuardar').textContent = 'Actualizar';
+}
+
+function eliminarAsignacionDirecta(asignacionId, event) {
+    if (event) event.preventDefault();
+
+    if (!confirm('¿Estás seguro de que quieres eliminar esta asignación?')) {
+        return;
+    }
+
+    fetch('/calendario/api/eliminar-asignacion/', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': getCSRFToken()
+        },
+        body: JSON.stringify({
+            asignacion_id: asignacionId,
+            year: calendarioData.current_year,
+            month: calendarioData.current_month
+        })
+    })
+    .then(response => response.json())
+    .then(result => {
+        if (result.success) {
+            alert(result.message || 'Asignación eliminada correctamente');
+            closeFaenaManagerModal();
+            aplicarCeldasActualizadas(result.calendario);
+        } else {
+            alert(result.error || 'Error al eliminar la asignación');
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        alert('Error al comunicarse con el servidor');
+    });
+}
+
+function closeFaenaManagerModal() {
+    document.getElementById('faenaManagerModal').style.display = 'none';
+}
+
+// Handler para el cambio de turno
+function turnoChangeHandler() {
+    cargarBloquesTurno(this.value);
+}
+
+// Función para formatear fechas en formato dd/mm/yyyy
+function formatearFecha(fechaString) {
+    if (!fechaString) return 'Sin fecha';
+
+    let fecha;
+
+    // Si ya tiene tiempo, usar como está
+    if (fechaString.includes('T')) {
+        fecha = new Date(fechaString);
+    } else {
+        // Si es solo fecha (YYYY-MM-DD), agregar tiempo local para evitar problemas de zona horaria
+        fecha = new Date(fechaString + 'T00:00:00');
+    }
+
+    const dia = fecha.getDate().toString().padStart(2, '0');
+    const mes = (fecha.getMonth() + 1).toString().padStart(2, '0');
+    const año = fecha.getFullYear();
+
+    const fechaFormateada = `${dia}/${mes}/${año}`;
+
+    return fechaFormateada;
+}
+
+function cargarFaenasYTurnos(personal) {
+    return new Promise((resolve) => {
+        // Cargar faenas
+        const faenaSelect = document.getElementById('faenaSelect');
+        faenaSelect.innerHTML = '<option value="">Seleccionar faena...</option>';
+
+        if (calendarioData.faenas && personal) {
+            // Obtener IDs de faenas activas en el mes actual para este personal
+            const faenasActivasEnMes = new Set();
+            let tieneAsignacionesEnMes = false;
+
+            if (personal.asignaciones_faena && personal.asignaciones_faena.length > 0) {
+                personal.asignaciones_faena.forEach(asignacion => {
+                    if (asignacion.activo) {
+                        // Verificar si la asignación está activa en el mes actual
+                        const fechaInicio = new Date(asignacion.fecha_inicio);
+                        const fechaFin = asignacion.fecha_fin ? new Date(asignacion.fecha_fin) : null;
+                        const mesActual = new Date(calendarioData.current_year, calendarioData.current_month - 1, 1);
+                        const ultimoDiaMes = new Date(calendarioData.current_year, calendarioData.current_month, 0);
+
+                        // Verificar si hay solapamiento con el mes actual
+                        if (fechaInicio <= ultimoDiaMes && (!fechaFin || fechaFin >= mesActual)) {
+                            faenasActivasEnMes.add(asignacion.faena.id);
+                            tieneAsignacionesEnMes = true;
+                        }
+                    }
+                });
+            }
+
+            // Lógica de filtrado:
+            // - Si tiene asignaciones activas en el mes actual: mostrar solo esas faenas
+            // - Si NO tiene asignaciones activas en el mes actual: mostrar TODAS las faenas disponibles
+            calendarioData.faenas.forEach(faena => {
+                if (!tieneAsignacionesEnMes || faenasActivasEnMes.has(faena.id)) {
+                    const option = document.createElement('option');
+                    option.value = faena.id;
+                    option.textContent = faena.nombre;
+                    faenaSelect.appendChild(option);
+                }
+            });
+        }
+
+        // Cargar turnos
+        const turnoSelect = document.getElementById('turnoSelect');
+        turnoSelect.innerHTML = '<option value="">Seleccionar turno...</option>';
+
+        if (calendarioData.turnos) {
+            calendarioData.turnos.forEach(turno => {
+                const option = document.createElement('option');
+                option.value = turno.id;
+                option.textContent = turno.nombre;
+                turnoSelect.appendChild(option);
+            });
+        }
+
+        // Remover listeners previos y agregar nuevo listener para cargar bloques
+        turnoSelect.removeEventListener('change', turnoChangeHandler);
+        turnoSelect.addEventListener('change', turnoChangeHandler);
+
+        // Resolver la promesa
+        resolve();
+    });
+}
+
+function cargarBloquesTurno(turnoId) {
+    const bloqueSelect = document.getElementById('bloqueInicioSelect');
+    bloqueSelect.innerHTML = '<option value="">Seleccionar bloque de inicio...</option>';
+
+    if (!turnoId) return Promise.resolve();
+
+    // Buscar el turno en los datos locales
+    const turno = calendarioData.turnos.find(t => t.id == turnoId);
+
+    if (turno && turno.bloques) {
+        turno.bloques.forEach(bloque => {
+            const option = document.createElement('option');
+            option.value = bloque.id;
+            option.textContent = `${bloque.orden}. ${bloque.estado.nombre} (${bloque.duracion_dias} días)`;
+            bloqueSelect.appendChild(option);
+        });
+    }
+
+    return Promise.resolve();
+}
+
+// ====== VISTA PREVIA (SIMULACIÓN) DE LA ASIGNACIÓN ======
+// Se simula en el servidor sin guardar; se reprograma en cada cambio del formulario
+let temporizadorSimulacion = null;
+let solicitudSimulacion = 0;
+
+function programarSimulacion() {
+    clearTimeout(temporizadorSimulacion);
+    temporizadorSimulacion = setTimeout(simularAsignacionActual, 150);
+}
+
+function simularAsignacionActual() {
+    const data = Object.fromEntries(new FormData(document.getElementById('faenaForm')).entries());
+    data.activo = document.getElementById('activo').checked;
+
+    const seccion = document.getElementById('simulacionSection');
+    if (!data.faena_id || !data.turno_id || !data.fecha_inicio) {
+        seccion.style.display = 'none';
+        return;
+    }
+
+    const cambios = data.asignacion_id ? { actualizar: [data] } : { crear: [data] };
+    const solicitud = ++solicitudSimulacion;
+    fetch(simulacionUrl, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': getCSRFToken()
+        },
+        body: JSON.stringify(Object.assign({
+            year: calendarioData.current_year,
+            month: calendarioData.current_month
+        }, cambios))
+    })
+    .then(response => response.json())
+    .then(result => {
+        if (solicitud !== solicitudSimulacion) return;
+        if (result.error) throw new Error(result.error);
+        mostrarSimulacion(result);
+    })
+    .catch(error => {
+        console.error('Error al simular la asignación:', error);
+        seccion.style.display = 'none';
+    });
+}
+
+function mostrarSimulacion(result) {
+    const resumen = document.getElementById('simulacionResumen');
+    document.getElementById('simulacionSection').style.display = 'block';
+
+    if (result.errores.length > 0) {
+        resumen.textContent = result.errores.map(e => e.error).join('. ');
+        return;
+    }
+
+    const dias = Object.values(result.celdas_cambiadas).reduce((total, lista) => total + lista.length, 0);
+    if (dias === 0) {
+        resumen.textContent = `Sin cambios en ${currentMonthName}`;
+        return;
+    }
+
+    // Diferencia de dotación por estado, sumada en el mes
+    const totales = {};
+    Object.values(result.dotacion).forEach(conteo => {
+        Object.entries(conteo).forEach(([estadoId, delta]) => {
+            totales[estadoId] = (totales[estadoId] || 0) + delta;
+        });
+    });
+    const detalle = Object.entries(totales)
+        .filter(([, delta]) => delta !== 0)
+        .map(([estadoId, delta]) => `${delta > 0 ? '+' : ''}${delta} ${nombreEstado(estadoId, result.estados_catalogo)}`)
+        .join(', ');
+    resumen.textContent = `${dias} día(s) cambian en ${currentMonthName}` + (detalle ? `: ${detalle}` : '');
+}
+
+function nombreEstado(estadoId, catalogo) {
+    const estado = (catalogo && catalogo[estadoId]) || calendarioData.estados_catalogo[estadoId] ||
+        (calendarioData.todos_estados_disponibles || []).find(e => e.id == estadoId);
+    return estado ? estado.nombre : `estado ${estadoId}`;
+}
+
+function guardarAsignacion(event) {
+    if (event) event.preventDefault();
+
+    const formData = new FormData(document.getElementById('faenaForm'));
+    const data = Object.fromEntries(formData.entries());
+
+    // Manejar checkbox
+    data.activo = document.getElementById('activo').checked;
+
+    // Mes visible, para que el servidor devuelva las celdas recalculadas
+    data.year = calendarioData.current_year;
+    data.month = calendarioData.current_month;
+
+    // Validaciones básicas
+    if (!data.faena_id || !data.turno_id || !data.fecha_inicio) {
+        alert('Por favor completa todos los campos requeridos');
+        return;
+    }
+
+    // Enviar datos al servidor
+    const url = data.asignacion_id ? '/calendario/api/actualizar-asignacion/' : '/calendario/api/crear-asignacion/';
+
+    fetch(url, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': getCSRFToken()
+        },
+        body: JSON.stringify(data)
+    })
+    .then(response => response.json())
+    .then(result => {
+        if (result.success) {
+            alert(result.message || 'Asignación guardada correctamente');
+            closeFaenaManagerModal();
+            aplicarCeldasActualizadas(result.calendario);
+        } else {
+            alert(result.error || 'Error al guardar la asignación');
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        alert('Error al comunicarse con el servidor');
+    });
+}
+
+function eliminarAsignacion(event) {
+    if (event) event.preventDefault();
+
+    const asignacionId = document.getElementById('asignacionId').value;
+    if (!asignacionId) {
+        alert('No hay asignación para eliminar');
+        return;
+    }
+
+    if (!confirm('¿Estás seguro de que quieres eliminar esta asignación?')) {
+        return;
+    }
+
+    fetch('/calendario/api/eliminar-asignacion/', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': getCSRFToken()
+        },
+        body: JSON.stringify({
+            asignacion_id: asignacionId,
+            year: calendarioData.current_year,
+            month: calendarioData.current_month
+        })
+    })
+    .then(response => response.json())
+    .then(result => {
+        if (result.success) {
+            alert(result.message || 'Asignación eliminada correctamente');
+            closeFaenaManagerModal();
+            aplicarCeldasActualizadas(result.calendario);
+        } else {
+            alert(result.error || 'Error al eliminar la asignación');
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        alert('Error al comunicarse con el servidor');
+    });
+}
+
+// Aplica las celdas recalculadas que devuelven las APIs de asignación
+function aplicarCeldasActualizadas(calendario) {
+    if (!calendario || calendario.year !== calendarioData.current_year || calendario.month !== calendarioData.current_month) {
+        location.reload();
+        return;
+    }
+
+    Object.assign(calendarioData.estados_catalogo, calendario.estados_catalogo);
+    calendarioData.estados[calendario.personal_id] = calendario.estados;
+    const persona = calendarioData.personal.find(p => p.personal_id === calendario.personal_id);
+    if (persona) {
+        persona.asignaciones_faena = calendario.asignaciones_faena;
+    }
+
+    aplicarTodosLosFiltros();
+}
+
+function getCSRFToken() {
+    return document.querySelector('[name=csrfmiddlewaretoken]').value || 
+           document.querySelector('meta[name="csrf-token"]').getAttribute('content') || '';
+}
+
+// ====== EVENT LISTENERS PARA CERRAR MODALES ======
+
+// Cerrar modales al hacer click fuera
+document.addEventListener('click', function(event) {
+    // Modal de información personal
+    const personalModal = document.getElementById('personalInfoModal');
+    if (event.target === personalModal) {
+        closePersonalInfoModal();
+    }
+
+    // Modal de gestión de faenas
+    const faenaModal = document.getElementById('faenaManagerModal');
+    if (event.target === faenaModal) {
+        closeFaenaManagerModal();
+    }
+
+    // Modal de estado (existente)
+    const estadoModal = document.getElementById('estadoModal');
+    if (event.target === estadoModal) {
+        closeModal();
+    }
+});
+
+// Cerrar modales con ESC
+document.addEventListener('keydown', function(event) {
+    if (event.key === 'Escape') {
+        closeModal();
+        closePersonalInfoModal();
+        closeFaenaManagerModal();
+    }
+});
+
+// ====== FUNCIONES PARA FILTRO MÚLTIPLE DE CARGO ======
+function toggleCargoDropdown() {
+    const dropdown = document.getElementById('cargoFilterDropdown');
+    const options = document.getElementById('cargoFilterOptions');
+
+    if (options.style.display === 'none') {
+        options.style.display = 'block';
+        dropdown.classList.add('open');
+    } else {
+        options.style.display = 'none';
+        dropdown.classList.remove('open');
+    }
+}
+
+function updateCargoFilter() {
+    const checkboxes = document.querySelectorAll('#cargoFilterOptions input[type="checkbox"]');
+    const textElement = document.getElementById('cargoFilterText');
+    const todosCheckbox = checkboxes[0]; // El primer checkbox es "Todos"
+
+    // Si se marca "Todos", desmarcar todos los demás
+    if (todosCheckbox.checked && event.target === todosCheckbox) {
+        checkboxes.forEach((cb, index) => {
+            if (index > 0) cb.checked = false;
+        });
+        textElement.textContent = 'Cargo: Todos';
+    } else if (event.target !== todosCheckbox) {
+        // Si se marca cualquier otro, desmarcar "Todos"
+        todosCheckbox.checked = false;
+
+        // Actualizar el texto según las selecciones
+        const selectedValues = Array.from(checkboxes)
+            .filter((cb, index) => cb.checked && index > 0)
+            .map(cb => cb.nextSibling.textContent.trim());
+
+        if (selectedValues.length === 0) {
+            todosCheckbox.checked = true;
+            textElement.textContent = 'Cargo: Todos';
+        } else if (selectedValues.length === 1) {
+            textElement.textContent = `Cargo: ${selectedValues[0]}`;
+        } else {
+            textElement.textContent = `Cargo: ${selectedValues.length} seleccionados`;
+        }
+    }
+
+    // Aplicar filtros
+    aplicarTodosLosFiltros();
+}
+
+function getSelectedCargos() {
+    const checkboxes = document.querySelectorAll('#cargoFilterOptions input[type="checkbox"]');
+    const todosCheckbox = checkboxes[0];
+
+    if (todosCheckbox.checked) {
+        return []; // Vacío significa "todos"
+    }
+
+    return Array.from(checkboxes)
+        .filter((cb, index) => cb.checked && index > 0)
+        .map(cb => cb.value);
+}
+
+// Cerrar dropdown al hacer click fuera
+document.addEventListener('click', function(event) {
+    const dropdown = document.getElementById('cargoFilterDropdown');
+    if (!dropdown.contains(event.target)) {
+        document.getElementById('cargoFilterOptions').style.display = 'none';
+        dropdown.classList.remove('open');
+    }
+});
+
+// ====== FILTROS EN TIEMPO REAL (SIN RECARGAR) ======
+// Se filtra el arreglo de personal y luego se repinta solo la ventana visible
+// Misma normalización que el servidor (normalizar_busqueda): sin tildes,
+// minúsculas y sin puntos ni guiones
+function normalizarBusqueda(texto) {
+    return (texto || '').normalize('NFKD').replace(/[\u0300-\u036f]/g, '')
+        .toLowerCase().replace(/[.\-]/g, '').replace(/\s+/g, ' ').trim();
+}
+
+function filtrarPersonal() {
+    const searchTerm = normalizarBusqueda(document.querySelector('.search-input').value);
+    const faenaFilter = document.getElementById('faenaFilter').value;
+    const selectedCargos = getSelectedCargos().map(c => c.toLowerCase());
+
+    return calendarioData.personal.filter(person => {
+        // Filtro de búsqueda por nombre/RUT
+        if (searchTerm) {
+            const fullName = normalizarBusqueda(`${person.nombre} ${person.apepat} ${person.apemat || ''}`);
+            let matchesSearch = fullName.includes(searchTerm);
+
+            if (!matchesSearch && person.rut && person.dvrut) {
+                matchesSearch = normalizarBusqueda(`${person.rut}${person.dvrut}`).includes(searchTerm);
+            }
+
+            if (!matchesSearch) return false;
+        }
+
+        // Filtro por faena: una persona con "Múltiples" aparece si alguna de sus faenas coincide
+        if (faenaFilter) {
+            const filterLower = faenaFilter.toLowerCase();
+            const faenas = person.asignaciones_faena || [];
+            let matchesFaena;
+
+            if (filterLower === 'sin asignar') {
+                matchesFaena = faenas.length === 0;
+            } else if (filterLower === 'múltiples') {
+                matchesFaena = faenas.length > 1;
+            } else {
+                matchesFaena = faenas.some(af => af.faena.nombre.toLowerCase().includes(filterLower));
+            }
+
+            if (!matchesFaena) return false;
+        }
+
+        // Filtro por cargo (múltiple); vacío significa "Todos"
+        if (selectedCargos.length > 0) {
+            const cargoTextoLower = cargoPersona(person).toLowerCase();
+            if (!selectedCargos.some(cargo => cargoTextoLower.includes(cargo))) return false;
+        }
+
+        return true;
+    });
+}
+
+function aplicarTodosLosFiltros() {
+    personalFiltrado = filtrarPersonal();
+    renderizarFilasVisibles(true);
+}
+
+// Initialize calendar
+document.addEventListener('DOMContentLoaded', function() {
+    // SIEMPRE inicializar filtros en "Todos" (ignorar parámetros URL)
+    document.querySelector('.search-input').value = '';
+    document.getElementById('faenaFilter').value = '';
+
+    // Inicializar filtro de cargo múltiple en "Todos"
+    const todosCheckbox = document.querySelector('#cargoFilterOptions input[type="checkbox"]');
+    if (todosCheckbox) {
+        todosCheckbox.checked = true;
+        // Desmarcar todos los otros checkboxes
+        const allCheckboxes = document.querySelectorAll('#cargoFilterOptions input[type="checkbox"]');
+        allCheckboxes.forEach((cb, index) => {
+            if (index > 0) cb.checked = false;
+        });
+    }
+
+    updateCalendar();
+
+    // Agregar event listeners para filtros (TODOS EN TIEMPO REAL)
+    document.querySelector('.search-input').addEventListener('input', aplicarTodosLosFiltros);
+    document.getElementById('faenaFilter').addEventListener('change', aplicarTodosLosFiltros);
+
+    // Vista previa de la asignación mientras se edita el formulario
+    document.getElementById('faenaForm').addEventListener('input', programarSimulacion);
+    document.getElementById('faenaForm').addEventListener('change', programarSimulacion);
+    // Nota: cargoFilter ahora usa checkboxes con updateCargoFilter()
+
+    // Repintar la ventana visible al hacer scroll o cambiar el tamaño
+    window.addEventListener('scroll', programarRenderizado, { passive: true });
+    window.addEventListener('resize', programarRenderizado);
+    document.querySelector('.calendar-container').addEventListener('scroll', programarRenderizado, { passive: true });
+});
@@ -1,3 +1,1522 @@
-from django.test import TestCase
+import json
+import pickle
+import random
+import re
+import subprocess
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+from importlib import import_module
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.staticfiles import finders
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import ProtectedError
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .carga import PruebaCarga, ClienteInterno, parsear_mezcla, limpiar_asignaciones_prueba, ANIO_MUTACIONES
+from . import nucleo
+from .admin import PaginadorConteoEstimado
+from .archivo import archivar
+from .cola import cola, metricas_cola, tomar_mes
+from .estadisticas import conteo_estados
+from .compacto import CalendarioCompacto, EMPATE, ORIGEN_FUENTE, ORIGEN_MANUAL, ORIGEN_TURNO, ORIGEN_PREDETERMINADO
+from .instantanea import construir_instantanea
+from .invalidacion import calendario_invalidado, version_mes
+from .optimizador import optimizar_fases, sugerir_bloques_inicio
+from .precalculo import precalcular_mes
+from .reglas import ReglasPrioridad
+from .motor import obtener_calendario_mensual, prefetch_ventana, Ventana, origen_ganador, estado_final, personal_de_faena
+from .models import (
+    Personal, DeptoEmpresa, Cargo, InfoLaboral, TipoAusentismo, Ausentismo,
+    TipoLicenciaMedica, LicenciaMedicaPorPersonal, Estado, EstadoFuente,
+    Turno, TurnoBloque, Faena, AsignacionFaena, EstadoManual, VersionCalendarioMes,
+    CeldasMesPersona, ResumenMes, TrabajoRecalculo, RegistroArchivado, PalabraBusquedaPersonal
+)
+from .views import celdas_afectadas
+from .management.commands.medir_serializacion import payload_anterior, expandir_payload
+
+
+class CalendarioDatosMixin:
+    """Catálogo mínimo (estados, turno 7x7x7x7, faena y fuentes) para los tests del calendario"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dia = Estado.objects.create(nombre='Día', nombre_corto='D', color='#FFFFFF', background_color='#28A745', prioridad=10)
+        cls.noche = Estado.objects.create(nombre='Noche', nombre_corto='N', color='#FFFFFF', background_color='#343A40', prioridad=10)
+        cls.descanso = Estado.objects.create(nombre='Descanso', nombre_corto='X', color='#000000', background_color='#FFC107', prioridad=8)
+        cls.disponible = Estado.objects.create(nombre='Disponible', color='#000000', background_color='#E9ECEF', prioridad=5, es_predeterminado=True)
+        cls.permiso = Estado.objects.create(nombre='Permiso', nombre_corto='P', color='#FFFFFF', background_color='#FF7675', prioridad=15, es_bloqueante=True)
+        cls.licencia = Estado.objects.create(nombre='Licencia', nombre_corto='L', color='#FFFFFF', background_color='#FDCB6E', prioridad=20, es_bloqueante=True)
+        cls.capacitacion = Estado.objects.create(nombre='Capacitación', nombre_corto='C', color='#FFFFFF', background_color='#6C5CE7', prioridad=12)
+
+        cls.turno = Turno.objects.create(nombre='7x7x7x7')
+        cls.bloques = [
+            TurnoBloque.objects.create(turno=cls.turno, orden=orden, duracion_dias=7, estado=estado)
+            for orden, estado in enumerate([cls.dia, cls.descanso, cls.noche, cls.descanso], start=1)
+        ]
+        cls.faena = Faena.objects.create(nombre='Mina Norte')
+
+        EstadoFuente.objects.create(
+            estado=cls.permiso, content_type=ContentType.objects.get_for_model(Ausentismo),
+            campo_fecha_inicio='fechaini', campo_fecha_fin='fechafin', campo_personal='personal_id'
+        )
+        EstadoFuente.objects.create(
+            estado=cls.licencia, content_type=ContentType.objects.get_for_model(LicenciaMedicaPorPersonal),
+            campo_fecha_inicio='fechaEmision', campo_fecha_fin='fecha_fin_licencia', campo_personal='personal_id'
+        )
+
+        cls.depto = DeptoEmpresa.objects.create(depto='Operaciones')
+        cls.cargo = Cargo.objects.create(depto_id=cls.depto, cargo='Operador')
+        cls.tipo_ausentismo = TipoAusentismo.objects.create(tipo='Permiso')
+        cls.tipo_licencia = TipoLicenciaMedica.objects.create(tipoLicenciaMedica='Común')
+
+    @classmethod
+    def crear_personal(cls, cantidad, desde=0):
+        """Crea personal con cargo, asignación, ausentismo, licencia y estado manual en marzo 2025"""
+        personas = []
+        for i in range(desde, desde + cantidad):
+            persona = Personal.objects.create(
+                rut=str(10000000 + i), dvrut='K', nombre=f'Persona {i}',
+                apepat='Pérez', apemat='Soto', correo=f'persona{i}@example.com'
+            )
+            InfoLaboral.objects.create(personal_id=persona, depto_id=cls.depto, cargo_id=cls.cargo, fechacontrata=date(2020, 1, 1))
+            AsignacionFaena.objects.create(
+                personal=persona, faena=cls.faena, turno=cls.turno,
+                fecha_inicio=date(2025, 1, 1), bloque_inicio=cls.bloques[i % 4]
+            )
+            Ausentismo.objects.create(personal_id=persona, tipoausen_id=cls.tipo_ausentismo, fechaini=date(2025, 3, 5), fechafin=date(2025, 3, 6))
+            LicenciaMedicaPorPersonal.objects.create(
+                personal_id=persona, tipoLicenciaMedica_id=cls.tipo_licencia,
+                fechaEmision=date(2025, 3, 10), fecha_fin_licencia=date(2025, 3, 12)
+            )
+            EstadoManual.objects.create(personal=persona, estado=cls.capacitacion, fecha_inicio=date(2025, 3, 20), fecha_fin=date(2025, 3, 20))
+            personas.append(persona)
+        return personas
+
+
+class PresupuestoConsultasTests(CalendarioDatosMixin, TestCase):
+    """El número de consultas de las vistas del calendario no depende de la dotación"""
+
+    def contar_consultas(self, url):
+        with CaptureQueriesContext(connection) as contexto:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return len(contexto.captured_queries)
+
+    def test_calendario_mensual_consultas_constantes(self):
+        url = reverse('calendario:calendario_mensual') + '?year=2025&month=3'
+        self.crear_personal(2)
+        consultas_pocas = self.contar_consultas(url)
+
+        self.crear_personal(20, desde=2)
+        self.assertEqual(self.contar_consultas(url), consultas_pocas)
+
+    def test_api_calendario_mensual_consultas_constantes(self):
+        url = reverse('calendario:api_calendario_mensual') + '?year=2025&month=3'
+        self.crear_personal(2)
+        consultas_pocas = self.contar_consultas(url)
+
+        self.crear_personal(20, desde=2)
+        self.assertEqual(self.contar_consultas(url), consultas_pocas)
+
+    def test_presupuesto_fijo(self):
+        self.crear_personal(10)
+        # La página lee además la versión del catálogo
+        with self.assertNumQueries(13):
+            self.client.get(reverse('calendario:calendario_mensual') + '?year=2025&month=3')
+        with self.assertNumQueries(12):
+            self.client.get(reverse('calendario:api_calendario_mensual') + '?year=2025&month=3')
+
+    def test_apis_de_asignacion_presupuesto_fijo(self):
+        persona = self.crear_personal(10)[0]
+        persona.asignaciones_faena.update(fecha_fin=date(2025, 3, 15))
+        datos = {'personal_id': persona.personal_id, 'faena_id': self.faena.id, 'turno_id': self.turno.id,
+                 'fecha_inicio': '2025-03-16', 'year': 2025, 'month': 3}
+
+        with self.assertNumQueries(24):
+            asignacion_id = self.client.post(
+                reverse('calendario:crear_asignacion'), json.dumps(datos), content_type='application/json'
+            ).json()['asignacion_id']
+        with self.assertNumQueries(25):
+            self.client.post(reverse('calendario:actualizar_asignacion'), json.dumps(
+                dict(datos, asignacion_id=asignacion_id, fecha_inicio='2025-03-17')
+            ), content_type='application/json')
+        with self.assertNumQueries(20):
+            self.client.post(reverse('calendario:eliminar_asignacion'), json.dumps(
+                {'asignacion_id': asignacion_id, 'year': 2025, 'month': 3}
+            ), content_type='application/json')
+
+    def test_api_calendario_mensual_serializa_estados(self):
+        persona = self.crear_personal(1)[0]
+        respuesta = self.client.get(reverse('calendario:api_calendario_mensual') + '?year=2025&month=3')
+        datos = respuesta.json()
+
+        self.assertEqual(datos['personal'][0]['faena'], 'Mina Norte')
+        self.assertEqual(datos['personal'][0]['cargo'], 'Operador')
+        celda = datos['estados'][str(persona.personal_id)]['10']
+        self.assertEqual(celda, self.licencia.id)
+        self.assertEqual(datos['estados_catalogo'][str(celda)]['nombre'], 'Licencia')
+
+    def test_pagina_no_incrusta_detalle_fuente(self):
+        persona = self.crear_personal(1)[0]
+        respuesta = self.client.get(reverse('calendario:calendario_mensual') + '?year=2025&month=3')
+
+        self.assertContains(respuesta, '"10":%d' % self.licencia.id)
+        self.assertNotContains(respuesta, 'detalle_fuente')
+
+    def test_asignacion_sin_fecha_fin_visible_en_el_mes(self):
+        persona = self.crear_personal(1)[0]
+        respuesta = self.client.get(reverse('calendario:calendario_mensual') + '?year=2025&month=3')
+
+        self.assertContains(respuesta, '"asignaciones_faena":[{"id":%d' % persona.asignaciones_faena.get().id)
+
+
+class PrefetchVentanaTests(CalendarioDatosMixin, TestCase):
+    """El prefetch por ventana solo trae lo que se cruza con el mes, sin perder lo que lo atraviesa"""
+
+    def setUp(self):
+        self.abierta, self.cruzada = self.crear_personal(2)
+        # Cruza desde febrero y termina el 5 de marzo; la siguiente sigue en abril
+        self.cruzada.asignaciones_faena.update(fecha_inicio=date(2025, 2, 20), fecha_fin=date(2025, 3, 5))
+        self.hasta_abril = AsignacionFaena.objects.create(
+            personal=self.cruzada, faena=self.faena, turno=self.turno,
+            fecha_inicio=date(2025, 3, 25), fecha_fin=date(2025, 4, 10), bloque_inicio=self.bloques[1]
+        )
+        # Fuera de la ventana: no se cargan
+        AsignacionFaena.objects.create(
+            personal=self.cruzada, faena=self.faena, turno=self.turno,
+            fecha_inicio=date(2024, 1, 1), fecha_fin=date(2024, 12, 31), bloque_inicio=self.bloques[0]
+        )
+        AsignacionFaena.objects.create(
+            personal=self.cruzada, faena=self.faena, turno=self.turno,
+            fecha_inicio=date(2025, 5, 1), bloque_inicio=self.bloques[0]
+        )
+
+    def test_solo_carga_asignaciones_del_mes(self):
+        calendario = obtener_calendario_mensual(2025, 3)
+        cargadas = {persona.personal_id: [af.id for af in persona.asignaciones_faena.all()] for persona in calendario['personal']}
+
+        self.assertEqual(cargadas[self.abierta.personal_id], [self.abierta.asignaciones_faena.get().id])
+        self.assertEqual(cargadas[self.cruzada.personal_id], [
+            self.cruzada.asignaciones_faena.get(fecha_inicio=date(2025, 2, 20)).id, self.hasta_abril.id
+        ])
+        datos = celdas_afectadas(self.cruzada.personal_id, 2025, 3)
+        self.assertEqual([af['id'] for af in datos['asignaciones_faena']], cargadas[self.cruzada.personal_id])
+
+    def test_abiertas_y_cruzadas_se_dibujan(self):
+        compacto = obtener_calendario_mensual(2025, 3)['compacto']
+
+        for dia in (1, 31):
+            self.assertEqual(compacto.origen_celda(self.abierta.personal_id, dia)[0], ORIGEN_TURNO)
+        for dia in (1, 4, 25, 31):
+            self.assertEqual(compacto.origen_celda(self.cruzada.personal_id, dia)[0], ORIGEN_TURNO)
+        self.assertEqual(compacto.origen_celda(self.cruzada.personal_id, 15)[0], ORIGEN_PREDETERMINADO)
+        # El ciclo sigue contando desde el inicio de la asignación en febrero
+        asignacion = self.cruzada.asignaciones_faena.get(fecha_inicio=date(2025, 2, 20))
+        self.assertEqual(compacto.fila(self.cruzada.personal_id)[0], asignacion.obtener_estado_en_fecha(date(2025, 3, 1)).id)
+
+    def test_consultas_no_dependen_de_asignaciones_fuera_del_mes(self):
+        def cargar():
+            with CaptureQueriesContext(connection) as contexto:
+                list(Personal.objects.prefetch_related(*prefetch_ventana(date(2025, 3, 1), date(2025, 3, 31))))
+            return contexto.captured_queries
+
+        consultas = cargar()
+        for year in range(2015, 2024):
+            AsignacionFaena.objects.create(
+                personal=self.abierta, faena=self.faena, turno=self.turno,
+                fecha_inicio=date(year, 1, 1), fecha_fin=date(year, 12, 31), bloque_inicio=self.bloques[0]
+            )
+
+        # Personal, estados manuales, asignaciones y los bloques de sus turnos con sus estados
+        self.assertEqual(len(consultas), 5)
+        self.assertEqual(len(cargar()), 5)
+        with self.assertNumQueries(13):
+            self.client.get(reverse('calendario:calendario_mensual') + '?year=2025&month=3')
+
+
+class SerializacionPaginaTests(CalendarioDatosMixin, TestCase):
+    """El payload de la página lleva los mismos datos que el camino anterior (celdas con cada Estado completo)"""
+
+    def test_mismos_datos_que_el_camino_anterior(self):
+        # Permiso deja de ser bloqueante y empata con los turnos de día y noche
+        Estado.objects.filter(pk=self.permiso.pk).update(es_bloqueante=False, prioridad=10)
+        self.crear_personal(4)
+
+        respuesta = self.client.get(reverse('calendario:calendario_mensual') + '?year=2025&month=3')
+        nuevo = json.loads(respuesta.context['calendario'])
+        datos = {clave: valor for clave, valor in nuevo.items() if clave not in ('estados', 'estados_catalogo')}
+        anterior = payload_anterior(datos, obtener_calendario_mensual(2025, 3)['estados'])
+
+        self.assertTrue(any(isinstance(valor, list) for dias in nuevo['estados'].values() for valor in dias.values()))
+        self.assertEqual(expandir_payload(nuevo), json.loads(json.loads(f'"{anterior}"')))
+
+    def test_comando_de_medicion(self):
+        salida = StringIO()
+        call_command('medir_serializacion', personas=50, repeticiones=1, stdout=salida)
+        self.assertIn('mismos datos en ambos payloads', salida.getvalue())
+
+
+class GrillaVirtualizadaTests(CalendarioDatosMixin, TestCase):
+    """La página entrega la tabla vacía y los datos que la grilla virtualizada pinta en el navegador"""
+
+    def test_configuracion_y_datos_de_la_grilla(self):
+        personal = self.crear_personal(30)
+        respuesta = self.client.get(reverse('calendario:calendario_mensual'), {'year': 2025, 'month': 3})
+        html = respuesta.content.decode()
+
+        # Sin filas del servidor: el JS crea los espaciadores y recicla los <tr>
+        tabla = re.search(r'<table class="calendar-table" id="calendarTable">(.*?)</table>', html, re.S).group(1)
+        self.assertNotIn('<tr', tabla)
+
+        datos = json.loads(re.search(r'id="calendarioData" type="application/json">(.*?)</script>', html).group(1))
+        pagina = json.loads(re.search(r'id="calendarioPagina" type="application/json">(.*?)</script>', html).group(1))
+        self.assertEqual((datos['current_year'], datos['current_month'], datos['dias_mes']), (2025, 3, 31))
+        self.assertCountEqual([p['personal_id'] for p in datos['personal']], [p.personal_id for p in personal])
+        for persona in datos['personal']:
+            celdas = datos['estados'][str(persona['personal_id'])]
+            self.assertEqual(list(celdas), [str(dia) for dia in range(1, 32)])
+            self.assertTrue({str(valor) for valor in celdas.values()} <= set(datos['estados_catalogo']))
+        self.assertEqual(pagina['filtros'], {'faena': '', 'cargo': '', 'search': ''})
+        self.assertEqual(pagina['procedencia_url'], reverse('calendario:api_procedencia_celda'))
+
+        script = open(finders.find('calendario/calendario_mensual.js'), encoding='utf-8').read()
+        for gancho in ('calendarioData', 'calendarioPagina', 'calendarTable', 'calendarBody',
+                       'espaciadorSuperior', 'espaciadorInferior', 'FILAS_MARGEN'):
+            self.assertIn(gancho, script)
+        estilos = open(finders.find('calendario/calendario_mensual.css'), encoding='utf-8').read()
+        self.assertIn('tr.virtual-spacer', estilos)
+
+
+class CalendarioFaenaTests(CalendarioDatosMixin, TestCase):
+    """Calendario acotado al personal de una faena"""
+
+    def setUp(self):
+        self.otra_faena = Faena.objects.create(nombre='Mina Sur')
+        self.cuadrilla = self.crear_personal(2)
+        self.url = reverse('calendario:api_calendario_faena', args=[self.otra_faena.pk]) + '?year=2025&month=3'
+        for persona in self.cuadrilla:
+            persona.asignaciones_faena.update(faena=self.otra_faena)
+
+    def test_solo_personal_de_la_faena(self):
+        self.crear_personal(3, desde=2)
+        datos = self.client.get(self.url).json()
+        completo = self.client.get(reverse('calendario:api_calendario_mensual') + '?year=2025&month=3').json()
+
+        ids = [str(persona.personal_id) for persona in self.cuadrilla]
+        self.assertEqual(sorted(p['id'] for p in datos['personal']), [persona.personal_id for persona in self.cuadrilla])
+        self.assertEqual(sorted(datos['estados']), sorted(ids))
+        self.assertEqual(datos['estados'], {personal_id: completo['estados'][personal_id] for personal_id in ids})
+        self.assertEqual(datos['faena'], {'id': self.otra_faena.pk, 'nombre': 'Mina Sur'})
+        self.assertEqual(datos['personal'][0]['faena'], 'Mina Sur')
+
+    def test_consultas_no_dependen_del_resto_de_la_empresa(self):
+        with CaptureQueriesContext(connection) as contexto:
+            self.client.get(self.url)
+        consultas = len(contexto.captured_queries)
+
+        self.crear_personal(20, desde=2)
+        with self.assertNumQueries(consultas):
+            respuesta = self.client.get(self.url)
+        self.assertEqual(len(respuesta.json()['personal']), 2)
+
+    def test_errores(self):
+        self.assertEqual(self.client.get(reverse('calendario:api_calendario_faena', args=[9999])).status_code, 404)
+        self.assertEqual(self.client.get(self.url.replace('month=3', 'month=13')).status_code, 400)
+
+
+class BusquedaPersonalTests(CalendarioDatosMixin, TestCase):
+    """Autocompletado de personal por prefijo de palabra, sin tildes ni mayúsculas"""
+
+    def buscar(self, q, **parametros):
+        respuesta = self.client.get(reverse('calendario:api_buscar_personal'), dict(q=q, **parametros))
+        self.assertEqual(respuesta.status_code, 200)
+        return [resultado['id'] for resultado in respuesta.json()['resultados']]
+
+    def test_nombre_y_rut_normalizados(self):
+        persona = Personal.objects.create(rut='12345678', dvrut='K', nombre='José Andrés', apepat='Núñez',
+                                          apemat='Ávila', correo='jose@example.com')
+        otra = self.crear_personal(1)[0]
+
+        for consulta in ['jose', 'NUÑEZ', 'andres nun', 'avi jos', '12.345.678-k', '1234']:
+            self.assertEqual(self.buscar(consulta), [persona.personal_id], consulta)
+        self.assertEqual(self.buscar('perez'), [otra.personal_id])
+        self.assertEqual(self.buscar('ose'), [])
+        self.assertEqual(self.buscar('  '), [])
+
+    def test_indice_se_mantiene_al_guardar(self):
+        persona = self.crear_personal(1)[0]
+        persona.apepat = 'Muñoz'
+        persona.save(update_fields=['apepat'])
+
+        self.assertEqual(self.buscar('munoz'), [persona.personal_id])
+        self.assertEqual(self.buscar('perez'), [])
+        self.assertEqual(persona.palabras_busqueda.count(), 6)
+
+    def test_guardar_es_atomico(self):
+        persona = self.crear_personal(1)[0]
+        persona.apepat = 'Muñoz'
+        with mock.patch('calendario.models.PalabraBusquedaPersonal.objects.bulk_create', side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            persona.save()
+
+        persona.refresh_from_db()
+        self.assertEqual(persona.apepat, 'Pérez')
+        self.assertEqual(self.buscar('perez'), [persona.personal_id])
+        self.assertEqual(persona.palabras_busqueda.count(), 6)
+
+    def test_migracion_indexa_por_lotes(self):
+        migracion = import_module('calendario.migrations.0010_busqueda_personal')
+        personas = self.crear_personal(3)
+        PalabraBusquedaPersonal.objects.all().delete()
+        Personal.objects.update(busqueda='')
+
+        crear = PalabraBusquedaPersonal.objects.bulk_create
+        with mock.patch.object(migracion, 'LOTE', 6), \
+                mock.patch.object(type(PalabraBusquedaPersonal.objects), 'bulk_create', autospec=True,
+                                  side_effect=lambda manager, objetos, **kwargs: crear(objetos, **kwargs)) as bulk_create:
+            migracion.indexar_personal(django_apps, None)
+
+        # 6 palabras por persona: un lote por persona y el último vacío
+        self.assertEqual([len(llamada.args[1]) for llamada in bulk_create.call_args_list], [6, 6, 6, 0])
+        self.assertEqual(self.buscar('perez'), [persona.personal_id for persona in personas])
+
+    def test_inactivos_y_limite(self):
+        personas = self.crear_personal(3)
+        Personal.objects.filter(pk=personas[0].pk).update(activo=False)
+
+        self.assertEqual(self.buscar('persona'), [personas[1].personal_id, personas[2].personal_id])
+        self.assertEqual(len(self.buscar('persona', inactivos='1')), 3)
+        self.assertEqual(len(self.buscar('persona', limite='1')), 1)
+        self.assertEqual(self.client.get(reverse('calendario:api_buscar_personal'), {'q': 'x', 'limite': 'a'}).status_code, 400)
+
+
+class ProcedenciaCeldaTests(CalendarioDatosMixin, TestCase):
+    """Explicación bajo demanda de por qué una celda tiene su estado"""
+
+    def setUp(self):
+        self.persona = self.crear_personal(1)[0]
+
+    def procedencia(self, fecha):
+        respuesta = self.client.get(reverse('calendario:api_procedencia_celda'), {
+            'personal_id': self.persona.personal_id, 'fecha': fecha
+        })
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()
+
+    def test_bloqueante_gana_sobre_turno(self):
+        datos = self.procedencia('2025-03-10')
+
+        self.assertEqual(datos['estados'], [self.licencia.id])
+        ganadores = [c for c in datos['candidatos'] if c['ganador']]
+        self.assertEqual([(c['origen'], c['detalles']['tipo']) for c in ganadores], [('fuente', 'Licencia Médica')])
+        self.assertIn('turno', [c['origen'] for c in datos['candidatos'] if not c['ganador']])
+        self.assertIn('bloqueante', datos['motivo'])
+
+    def test_manual_prevalece(self):
+        datos = self.procedencia('2025-03-20')
+
+        self.assertEqual(datos['estados'], [self.capacitacion.id])
+        self.assertEqual([c['origen'] for c in datos['candidatos'] if c['ganador']], ['manual'])
+
+    def test_coincide_con_la_grilla(self):
+        grilla = self.client.get(reverse('calendario:api_calendario_mensual') + '?year=2025&month=3').json()
+        celdas = grilla['estados'][str(self.persona.personal_id)]
+        for dia in range(1, 32):
+            celda = celdas[str(dia)]
+            esperado = celda if isinstance(celda, list) else [celda]
+            self.assertEqual(self.procedencia(f'2025-03-{dia:02d}')['estados'], esperado, dia)
+
+    def test_parametros_invalidos(self):
+        respuesta = self.client.get(reverse('calendario:api_procedencia_celda'), {'personal_id': 'x'})
+        self.assertEqual(respuesta.status_code, 400)
+
+
+class APIsAsignacionTests(CalendarioDatosMixin, TestCase):
+    """Las APIs de asignación devuelven la fila recalculada y no escriben si hay solapamiento"""
+
+    def setUp(self):
+        self.persona = self.crear_personal(1)[0]
+        self.asignacion = self.persona.asignaciones_faena.get()
+        self.asignacion.fecha_fin = date(2025, 3, 15)
+        self.asignacion.save()
+
+    def post(self, nombre, datos):
+        return self.client.post(reverse(f'calendario:{nombre}'), json.dumps(datos), content_type='application/json')
+
+    def fila_real(self):
+        datos = self.client.get(reverse('calendario:api_calendario_mensual') + '?year=2025&month=3').json()
+        return datos['estados'][str(self.persona.personal_id)]
+
+    def test_celdas_afectadas_coinciden_con_el_calendario(self):
+        datos = {'personal_id': self.persona.personal_id, 'faena_id': self.faena.id, 'turno_id': self.turno.id,
+                 'fecha_inicio': '2025-03-16', 'bloque_inicio_id': self.bloques[2].id, 'year': 2025, 'month': 3}
+        creada = self.post('crear_asignacion', datos).json()
+        self.assertEqual(creada['calendario']['estados'], self.fila_real())
+        self.assertEqual(
+            [af['id'] for af in creada['calendario']['asignaciones_faena']], [self.asignacion.id, creada['asignacion_id']]
+        )
+        self.assertTrue(set(creada['calendario']['estados'].values()) <= {int(pk) for pk in creada['calendario']['estados_catalogo']})
+
+        datos.update(asignacion_id=creada['asignacion_id'], bloque_inicio_id=self.bloques[0].id)
+        actualizada = self.post('actualizar_asignacion', datos).json()
+        self.assertNotEqual(actualizada['calendario']['estados'], creada['calendario']['estados'])
+        self.assertEqual(actualizada['calendario']['estados'], self.fila_real())
+
+        eliminada = self.post('eliminar_asignacion', {'asignacion_id': creada['asignacion_id'], 'year': 2025, 'month': 3}).json()
+        self.assertEqual(eliminada['calendario']['estados'], self.fila_real())
+        self.assertEqual(eliminada['calendario']['estados']['21'], self.disponible.id)
+
+    def test_solapamiento_no_escribe_ni_invalida(self):
+        otra = AsignacionFaena.objects.create(
+            personal=self.persona, faena=self.faena, turno=self.turno,
+            fecha_inicio=date(2025, 3, 20), bloque_inicio=self.bloques[0]
+        )
+        version = version_mes(2025, 3)
+        fila = self.fila_real()
+
+        respuesta = self.post('crear_asignacion', {
+            'personal_id': self.persona.personal_id, 'faena_id': self.faena.id,
+            'turno_id': self.turno.id, 'fecha_inicio': '2025-03-10', 'fecha_fin': '2025-03-25'
+        })
+        self.assertEqual(respuesta.status_code, 400)
+        respuesta = self.post('actualizar_asignacion', {
+            'asignacion_id': self.asignacion.id, 'faena_id': self.faena.id, 'turno_id': self.turno.id,
+            'fecha_inicio': '2025-01-01', 'fecha_fin': '2025-03-22', 'bloque_inicio_id': self.bloques[1].id
+        })
+        self.assertEqual(respuesta.status_code, 400)
+
+        self.assertEqual(list(AsignacionFaena.objects.order_by('id').values_list('id', flat=True)), [self.asignacion.id, otra.id])
+        self.asignacion.refresh_from_db()
+        self.assertEqual((self.asignacion.fecha_fin, self.asignacion.bloque_inicio_id), (date(2025, 3, 15), self.bloques[0].id))
+        self.assertEqual(version_mes(2025, 3), version)
+        self.assertEqual(self.fila_real(), fila)
+
+
+class SimulacionTests(CalendarioDatosMixin, TestCase):
+    """Simulación de cambios de asignación sin escribir en la base de datos"""
+
+    def setUp(self):
+        self.persona = self.crear_personal(1)[0]
+        self.asignacion = self.persona.asignaciones_faena.get()
+
+    def simular(self, **cambios):
+        respuesta = self.client.post(
+            reverse('calendario:api_simular_asignaciones'),
+            json.dumps(dict(year=2025, month=3, **cambios)), content_type='application/json'
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()
+
+    def celdas_reales(self):
+        datos = self.client.get(reverse('calendario:api_calendario_mensual') + '?year=2025&month=3').json()
+        return datos['estados'][str(self.persona.personal_id)]
+
+    def test_actualizar_coincide_con_guardar(self):
+        cambio = {
+            'asignacion_id': self.asignacion.id, 'faena_id': self.faena.id, 'turno_id': self.turno.id,
+            'fecha_inicio': '2025-01-01', 'bloque_inicio_id': self.bloques[2].id
+        }
+        datos = self.simular(actualizar=[cambio])
+
+        self.assertEqual(AsignacionFaena.objects.get().bloque_inicio_id, self.bloques[0].id)
+        self.assertTrue(datos['celdas_cambiadas'])
+
+        self.client.post(
+            reverse('calendario:actualizar_asignacion'),
+            json.dumps(cambio), content_type='application/json'
+        )
+        self.assertEqual(datos['estados'][str(self.persona.personal_id)], self.celdas_reales())
+
+    def test_eliminar_reporta_dotacion_y_cobertura(self):
+        datos = self.simular(eliminar=[self.asignacion.id])
+
+        self.assertTrue(AsignacionFaena.objects.exists())
+        # 1 de marzo: sin turno la persona queda en el estado predeterminado
+        self.assertEqual(datos['estados'][str(self.persona.personal_id)]['1'], self.disponible.id)
+        self.assertEqual(datos['dotacion']['1'][str(self.disponible.id)], 1)
+        self.assertEqual(sum(datos['cobertura'][str(self.faena.id)]['1'].values()), -1)
+        # Los días de licencia no cambian: la licencia ya ganaba al turno
+        self.assertNotIn(10, datos['celdas_cambiadas'][str(self.persona.personal_id)])
+
+    def test_solapamiento_se_informa(self):
+        datos = self.simular(crear=[{
+            'personal_id': self.persona.personal_id, 'faena_id': self.faena.id,
+            'turno_id': self.turno.id, 'fecha_inicio': '2025-03-15'
+        }])
+
+        self.assertEqual(datos['errores'][0]['accion'], 'crear')
+        self.assertEqual(datos['celdas_cambiadas'], {})
+
+    def test_solapamiento_fuera_del_mes_como_la_api(self):
+        AsignacionFaena.objects.filter(pk=self.asignacion.pk).update(fecha_fin=date(2025, 3, 15))
+        AsignacionFaena.objects.create(
+            personal=self.persona, faena=self.faena, turno=self.turno,
+            fecha_inicio=date(2025, 5, 1), bloque_inicio=self.bloques[0]
+        )
+        cambio = {
+            'personal_id': self.persona.personal_id, 'faena_id': self.faena.id,
+            'turno_id': self.turno.id, 'fecha_inicio': '2025-03-20'
+        }
+
+        datos = self.simular(crear=[cambio])
+        respuesta = self.client.post(reverse('calendario:crear_asignacion'), json.dumps(cambio), content_type='application/json')
+
+        # La asignación de mayo no se carga para marzo, pero se solapa igual
+        self.assertEqual(datos['errores'][0]['accion'], 'crear')
+        self.assertEqual(respuesta.status_code, 400)
+
+        # Cerrándola antes de mayo en la misma simulación, la propuesta es válida
+        cambio['fecha_fin'] = '2025-04-30'
+        datos = self.simular(crear=[cambio])
+        self.assertEqual(datos['errores'], [])
+        self.assertIn(21, datos['celdas_cambiadas'][str(self.persona.personal_id)])
+
+    def test_consultas_no_dependen_de_la_dotacion(self):
+        def contar():
+            with CaptureQueriesContext(connection) as contexto:
+                self.simular(eliminar=[self.asignacion.id])
+            return len(contexto.captured_queries)
+
+        consultas = contar()
+        self.crear_personal(20, desde=1)
+        self.assertEqual(contar(), consultas)
+
+
+class OptimizadorFasesTests(CalendarioDatosMixin, TestCase):
+    """Sugerencia de bloques de inicio para cubrir la dotación objetivo"""
+
+    def test_reparto_exacto(self):
+        fases, conteos, desviacion, _ = optimizar_fases(self.turno, 8, {self.dia.id: 2, self.noche.id: 2})
+
+        self.assertEqual(desviacion, 0)
+        self.assertEqual(conteos, [2, 2, 2, 2])
+
+    def test_cobertura_coincide_con_el_turno(self):
+        personal = self.crear_personal(7)
+        objetivos = {self.dia.id: 3, self.noche.id: 1}
+        resultado = sugerir_bloques_inicio(self.faena, self.turno, personal, objetivos, date(2025, 3, 1))
+
+        bloques = {bloque.id: bloque for bloque in self.bloques}
+        for dia in resultado['cobertura']:
+            estados = [
+                AsignacionFaena(
+                    faena=self.faena, turno=self.turno, fecha_inicio=date(2025, 3, 1),
+                    bloque_inicio=bloques[sugerencia['bloque_inicio_id']]
+                ).obtener_estado_en_fecha(dia['fecha'])
+                for sugerencia in resultado['asignaciones']
+            ]
+            self.assertEqual(dia['dotacion'], {
+                estado_id: sum(1 for estado in estados if estado.id == estado_id) for estado_id in objetivos
+            })
+
+    def test_conserva_bloque_actual(self):
+        personal = self.crear_personal(4)
+        resultado = self.client.post(reverse('calendario:api_optimizar_fases'), json.dumps({
+            'faena_id': self.faena.id, 'turno_id': self.turno.id, 'fecha_inicio': '2025-01-01',
+            'personal_ids': [persona.personal_id for persona in personal],
+            'objetivos': {str(self.dia.id): 1, str(self.noche.id): 1},
+        }), content_type='application/json').json()
+
+        self.assertEqual(resultado['desviacion'], 0)
+        # crear_personal ya reparte a las 4 personas en los 4 bloques
+        self.assertEqual(
+            {s['personal_id']: s['bloque_inicio_id'] for s in resultado['asignaciones']},
+            {persona.personal_id: persona.asignaciones_faena.get().bloque_inicio_id for persona in personal}
+        )
+
+
+class AdminTablasGrandesTests(CalendarioDatosMixin, TestCase):
+    """Los changelists de tablas grandes no hacen consultas por fila ni cargan selects completos"""
+
+    def setUp(self):
+        usuario = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'clave')
+        self.client.force_login(usuario)
+
+    def contar_consultas(self, url):
+        with CaptureQueriesContext(connection) as contexto:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return len(contexto.captured_queries)
+
+    def test_changelists_consultas_constantes(self):
+        self.crear_personal(2)
+        for modelo in ['asignacionfaena', 'estadomanual', 'ausentismo', 'licenciamedicaporpersonal', 'infolaboral']:
+            url = reverse(f'admin:calendario_{modelo}_changelist')
+            with self.subTest(modelo=modelo):
+                pocas = self.contar_consultas(url)
+                self.crear_personal(10, desde=2 + 10 * len(modelo))
+                self.assertEqual(self.contar_consultas(url), pocas)
+
+    def test_conteo_estimado_en_sqlite(self):
+        self.crear_personal(5)
+        AsignacionFaena.objects.order_by('pk').first().delete()
+        url = reverse('admin:calendario_asignacionfaena_changelist')
+
+        with mock.patch.object(PaginadorConteoEstimado, 'umbral', 3):
+            with CaptureQueriesContext(connection) as contexto:
+                respuesta = self.client.get(url)
+            # MAX(rowid) es una cota superior: no descuenta la fila borrada
+            self.assertEqual(respuesta.context['cl'].result_count, 5)
+            self.assertFalse([q for q in contexto.captured_queries if 'COUNT(*)' in q['sql']])
+            self.assertEqual(self.client.get(url, {'activo__exact': '1'}).context['cl'].result_count, 4)
+
+    def test_busqueda_por_persona_usa_el_indice_de_palabras(self):
+        personas = self.crear_personal(2)
+        Personal.objects.filter(pk=personas[0].pk).update(apepat='Núñez')
+        personas[0].refresh_from_db()
+        personas[0].save()
+
+        for modelo in ['asignacionfaena', 'estadomanual', 'ausentismo', 'licenciamedicaporpersonal', 'infolaboral']:
+            url = reverse(f'admin:calendario_{modelo}_changelist')
+            with self.subTest(modelo=modelo):
+                with CaptureQueriesContext(connection) as contexto:
+                    respuesta = self.client.get(url, {'q': 'nunez pers'})
+                self.assertEqual(respuesta.context['cl'].result_count, 1)
+                # Rango sobre el índice de palabras; nada de LIKE sobre nombre o apellido
+                sql = ' '.join(q['sql'] for q in contexto.captured_queries)
+                self.assertIn('"palabra" >=', sql)
+                self.assertNotRegex(sql, r'"(nombre|apepat)" LIKE')
+                self.assertEqual(self.client.get(url, {'q': personas[1].rut}).context['cl'].result_count, 1)
+
+    def test_formulario_usa_autocompletado(self):
+        self.crear_personal(1)
+        respuesta = self.client.get(reverse('admin:calendario_asignacionfaena_add'))
+
+        self.assertContains(respuesta, 'admin-autocomplete')
+        self.assertNotContains(respuesta, 'Persona 0')
+
+
+class AccionesMasivasAdminTests(CalendarioDatosMixin, TestCase):
+    """Acciones masivas del admin sobre asignaciones"""
+
+    def setUp(self):
+        usuario = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'clave')
+        self.client.force_login(usuario)
+        self.personal = self.crear_personal(3)
+        self.url = reverse('admin:calendario_asignacionfaena_changelist')
+
+    def accion(self, accion, asignaciones, **datos):
+        return self.client.post(self.url, dict(
+            datos, action=accion, _selected_action=[asignacion.pk for asignacion in asignaciones]
+        ), follow=True)
+
+    def test_cerrar_y_extender(self):
+        asignaciones = list(AsignacionFaena.objects.all())
+        with CaptureQueriesContext(connection) as contexto:
+            self.accion('cerrar_en_fecha', asignaciones, fecha='2025-03-31')
+        actualizaciones = [
+            q for q in contexto.captured_queries
+            if q['sql'].startswith('UPDATE') and 'asignacionfaena' in q['sql']
+        ]
+        self.assertEqual(len(actualizaciones), 1)
+        self.assertEqual(set(AsignacionFaena.objects.values_list('fecha_fin', flat=True)), {date(2025, 3, 31)})
+
+        self.accion('extender_hasta_fecha', asignaciones, fecha='2025-06-30')
+        self.assertEqual(set(AsignacionFaena.objects.values_list('fecha_fin', flat=True)), {date(2025, 6, 30)})
+
+    def test_extender_rechaza_solapamientos(self):
+        persona = self.personal[0]
+        actual = persona.asignaciones_faena.get()
+        actual.fecha_fin = date(2025, 3, 31)
+        actual.save()
+        AsignacionFaena.objects.create(
+            personal=persona, faena=self.faena, turno=self.turno,
+            fecha_inicio=date(2025, 5, 1), bloque_inicio=self.bloques[0]
+        )
+        otra = self.personal[1].asignaciones_faena.get()
+        otra.fecha_fin = date(2025, 3, 31)
+        otra.save()
+
+        respuesta = self.accion('extender_hasta_fecha', [actual, otra], fecha='2025-06-30')
+
+        self.assertContains(respuesta, 'solaparía')
+        self.assertEqual(AsignacionFaena.objects.get(pk=otra.pk).fecha_fin, date(2025, 3, 31))
+
+    def test_mover_a_otro_turno_conserva_orden_del_bloque(self):
+        turno = Turno.objects.create(nombre='4x4')
+        nuevos = [
+            TurnoBloque.objects.create(turno=turno, orden=orden, duracion_dias=4, estado=estado)
+            for orden, estado in enumerate([self.dia, self.descanso], start=1)
+        ]
+        faena = Faena.objects.create(nombre='Mina Sur')
+
+        self.accion('mover_a_faena_turno', AsignacionFaena.objects.all(), faena=faena.pk, turno=turno.pk)
+
+        # crear_personal usa los bloques 1, 2 y 3; el 3 no existe en el nuevo turno y cae al primero
+        self.assertEqual(
+            list(AsignacionFaena.objects.order_by('personal_id').values_list('faena', 'bloque_inicio')),
+            [(faena.pk, nuevos[0].pk), (faena.pk, nuevos[1].pk), (faena.pk, nuevos[0].pk)]
+        )
+
+    def test_mover_a_turno_sin_bloques_no_invalida(self):
+        turno = Turno.objects.create(nombre='Vacío')
+        faena = Faena.objects.create(nombre='Mina Sur')
+        version = version_mes(2025, 3)
+
+        respuesta = self.accion('mover_a_faena_turno', AsignacionFaena.objects.all(), faena=faena.pk, turno=turno.pk)
+
+        self.assertContains(respuesta, 'no tiene bloques')
+        self.assertEqual(set(AsignacionFaena.objects.values_list('faena', 'turno')), {(self.faena.pk, self.turno.pk)})
+        self.assertEqual(version_mes(2025, 3), version)
+
+    def test_desactivar(self):
+        self.accion('desactivar', AsignacionFaena.objects.all())
+        self.assertFalse(AsignacionFaena.objects.filter(activo=True).exists())
+
+
+class EstadoManualMasivoTests(CalendarioDatosMixin, TestCase):
+    """Aplicación de un Estado manual a un grupo en una sola operación"""
+
+    def setUp(self):
+        self.personal = self.crear_personal(3)
+        self.otra_faena = Faena.objects.create(nombre='Mina Sur')
+        asignacion = self.personal[2].asignaciones_faena.get()
+        asignacion.faena = self.otra_faena
+        asignacion.save()
+
+    def aplicar(self, **datos):
+        datos = dict({'estado_id': self.capacitacion.id, 'fecha_inicio': '2025-03-28', 'fecha_fin': '2025-04-02'}, **datos)
+        return self.client.post(
+            reverse('calendario:api_aplicar_estado_manual'), json.dumps(datos), content_type='application/json'
+        )
+
+    def test_aplica_por_faena_con_un_solo_insert(self):
+        invalidaciones = []
+        receptor = lambda **kwargs: invalidaciones.append(kwargs)
+        calendario_invalidado.connect(receptor)
+        self.addCleanup(calendario_invalidado.disconnect, receptor)
+
+        versiones = [version_mes(2025, 3), version_mes(2025, 4), version_mes(2025, 5)]
+        with CaptureQueriesContext(connection) as contexto:
+            respuesta = self.aplicar(faena_id=self.faena.id, motivo='Capacitación anual')
+        inserts = [q for q in contexto.captured_queries if q['sql'].startswith('INSERT')]
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(sorted(respuesta.json()['personal_ids']), [p.personal_id for p in self.personal[:2]])
+        self.assertEqual(len([q for q in inserts if 'estadomanual' in q['sql']]), 1)
+        self.assertEqual(invalidaciones[0]['meses'], [(2025, 3), (2025, 4)])
+        self.assertEqual(sorted(invalidaciones[0]['personal_ids']), [p.personal_id for p in self.personal[:2]])
+        self.assertEqual(
+            [version_mes(2025, 3), version_mes(2025, 4), version_mes(2025, 5)],
+            [versiones[0] + 1, versiones[1] + 1, versiones[2]]
+        )
+
+    def test_no_duplica_y_exige_criterio(self):
+        self.aplicar(personal_ids=[self.personal[0].personal_id])
+        respuesta = self.aplicar(personal_ids=[self.personal[0].personal_id])
+
+        self.assertEqual(respuesta.json()['personal_ids'], [])
+        self.assertEqual(EstadoManual.objects.filter(estado=self.capacitacion, fecha_inicio=date(2025, 3, 28)).count(), 1)
+        self.assertEqual(self.aplicar().status_code, 400)
+
+    def test_accion_del_admin(self):
+        usuario = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'clave')
+        self.client.force_login(usuario)
+
+        self.client.post(reverse('admin:calendario_personal_changelist'), {
+            'action': 'aplicar_estado_manual', '_selected_action': [p.pk for p in self.personal],
+            'estado': self.permiso.id, 'fecha_inicio': '2025-05-01', 'fecha_fin': '2025-05-01',
+        })
+
+        self.assertEqual(EstadoManual.objects.filter(estado=self.permiso).count(), 3)
+        self.assertTrue(VersionCalendarioMes.objects.filter(year=2025, month=5, version=1).exists())
+
+
+class CatalogoTests(CalendarioDatosMixin, TestCase):
+    """Catálogo de opciones cacheado e invalidado por versión"""
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('calendario:api_catalogo')
+
+    def test_catalogo_contiene_opciones(self):
+        self.crear_personal(1)
+        datos = self.client.get(self.url).json()
+
+        self.assertEqual([f['nombre'] for f in datos['faenas']], ['Mina Norte'])
+        self.assertEqual([b['orden'] for b in datos['turnos'][0]['bloques']], [1, 2, 3, 4])
+        self.assertEqual(datos['cargos'], ['Operador'])
+        self.assertEqual(datos['estados'][0]['nombre'], 'Licencia')
+
+    def test_catalogo_se_sirve_desde_cache(self):
+        self.client.get(self.url)
+        # Solo se lee la versión
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+    def test_version_compartida_entre_procesos(self):
+        self.client.get(self.url)
+        Faena.objects.create(nombre='Mina Sur')
+        version = self.client.get(self.url).json()['version']
+
+        # Otro proceso, con su propia caché vacía, ve la misma versión y los mismos datos
+        cache.clear()
+        datos = self.client.get(self.url).json()
+        self.assertEqual(datos['version'], version)
+        self.assertEqual([f['nombre'] for f in datos['faenas']], ['Mina Norte', 'Mina Sur'])
+        self.assertContains(self.client.get(reverse('calendario:calendario_mensual') + '?year=2025&month=3'), version)
+
+    def test_cambio_en_faena_invalida_version(self):
+        respuesta = self.client.get(self.url)
+        version = respuesta.json()['version']
+
+        Faena.objects.create(nombre='Mina Sur')
+        datos = self.client.get(self.url).json()
+
+        self.assertNotEqual(datos['version'], version)
+        self.assertEqual([f['nombre'] for f in datos['faenas']], ['Mina Norte', 'Mina Sur'])
+
+    def test_etag_y_cache_del_navegador(self):
+        respuesta = self.client.get(self.url)
+        version = respuesta.json()['version']
+        self.assertEqual(respuesta['Cache-Control'], 'no-cache')
+
+        versionada = self.client.get(self.url, {'v': version})
+        self.assertIn('immutable', versionada['Cache-Control'])
+
+        no_modificada = self.client.get(self.url, HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(no_modificada.status_code, 304)
+
+    def test_pagina_apunta_a_la_version_vigente(self):
+        respuesta = self.client.get(reverse('calendario:calendario_mensual') + '?year=2025&month=3')
+        version = self.client.get(self.url).json()['version']
+
+        self.assertContains(respuesta, version)
+
+
+class PrecalculoTests(CalendarioDatosMixin, TestCase):
+    """Precálculo incremental de celdas y dotación de los próximos meses"""
+
+    def setUp(self):
+        self.personal = self.crear_personal(4)
+        self.url = reverse('calendario:api_calendario_mensual') + '?year=2025&month=3'
+
+    def test_comando_guarda_celdas_y_dotacion(self):
+        en_vivo = self.client.get(self.url).json()
+        salida = StringIO()
+        call_command('precalcular_calendario', meses=1, desde='2025-03', stdout=salida)
+        self.assertIn('2 de 2 meses recalculados', salida.getvalue())
+
+        self.assertEqual(CeldasMesPersona.objects.filter(year=2025, month=3).count(), 4)
+        self.assertEqual(CeldasMesPersona.objects.filter(year=2025, month=4).count(), 4)
+        total = ResumenMes.objects.get(year=2025, month=3, faena__isnull=True)
+        por_faena = ResumenMes.objects.get(year=2025, month=3, faena=self.faena)
+        self.assertEqual(total.personas, 4)
+        self.assertEqual(por_faena.dotacion, total.dotacion)
+        self.assertEqual(total.dotacion['10'], {str(self.licencia.id): 4})
+
+        # El calendario usa las celdas guardadas y el resultado no cambia
+        self.assertEqual(self.client.get(self.url).json()['estados'], en_vivo['estados'])
+
+    def test_solo_recalcula_lo_que_cambio(self):
+        precalcular_mes(2025, 3)
+        self.assertFalse(precalcular_mes(2025, 3)['recalculado'])
+
+        EstadoManual.objects.create(
+            personal=self.personal[0], estado=self.permiso, fecha_inicio=date(2025, 3, 25), fecha_fin=date(2025, 3, 25)
+        )
+        self.assertEqual(CeldasMesPersona.objects.filter(year=2025, month=3).count(), 3)
+
+        resultado = precalcular_mes(2025, 3)
+        self.assertTrue(resultado['recalculado'])
+        self.assertEqual(resultado['personas_resueltas'], 1)
+        celdas = CeldasMesPersona.objects.get(personal=self.personal[0], year=2025, month=3).celdas
+        self.assertEqual(celdas['25'], self.permiso.id)
+
+    def test_asignacion_indefinida_invalida_meses_precalculados(self):
+        precalcular_mes(2025, 5)
+        asignacion = self.personal[1].asignaciones_faena.get()
+        asignacion.bloque_inicio = self.bloques[0]
+        asignacion.save()
+
+        self.assertFalse(CeldasMesPersona.objects.filter(personal=self.personal[1], year=2025, month=5).exists())
+        self.assertEqual(CeldasMesPersona.objects.filter(year=2025, month=5).count(), 3)
+
+    def test_fuente_sobre_otro_modelo_no_usa_celdas_guardadas(self):
+        precalcular_mes(2025, 3)
+        # RegistroArchivado no está en RANGOS_CALENDARIO: sus cambios no invalidan el calendario
+        curso = Estado.objects.create(nombre='Curso', color='#000000', background_color='#FFFFFF', prioridad=30, es_bloqueante=True)
+        EstadoFuente.objects.create(
+            estado=curso, content_type=ContentType.objects.get_for_model(RegistroArchivado),
+            campo_fecha_inicio='fecha_inicio', campo_fecha_fin='fecha_fin', campo_personal='personal'
+        )
+        self.assertTrue(precalcular_mes(2025, 3)['sin_invalidacion'])
+        self.assertFalse(CeldasMesPersona.objects.filter(year=2025, month=3).exists())
+
+        CeldasMesPersona.objects.create(personal=self.personal[0], year=2025, month=3, celdas={}, version=0)
+        RegistroArchivado.objects.create(modelo='calendario.faena', registro_id=1, personal=self.personal[0],
+                                         fecha_inicio=date(2025, 3, 3), fecha_fin=date(2025, 3, 3), datos={})
+        estados = obtener_calendario_mensual(2025, 3, personal_ids=[self.personal[0].pk])['estados']
+        self.assertEqual(estados[self.personal[0].pk][3], [curso])
+
+
+class ColaRecalculoTests(CalendarioDatosMixin, TestCase):
+    """Cola persistente de recálculos tras cada cambio"""
+
+    def setUp(self):
+        self.personal = self.crear_personal(3)
+        precalcular_mes(2025, 3)
+
+    def crear_permiso(self, dia, month=3):
+        return EstadoManual.objects.create(
+            personal=self.personal[0], estado=self.permiso,
+            fecha_inicio=date(2025, month, dia), fecha_fin=date(2025, month, dia)
+        )
+
+    def test_funde_trabajos_y_omite_meses_no_precalculados(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.crear_permiso(25)
+            self.crear_permiso(26)
+            self.crear_permiso(10, month=7)
+
+        self.assertEqual(list(TrabajoRecalculo.objects.values_list('personal_id', 'year', 'month')),
+                         [(self.personal[0].personal_id, 2025, 3)])
+        self.assertTrue(callbacks)
+
+    def test_vaciar_recalcula_y_reporta_metricas(self):
+        self.crear_permiso(25)
+        self.assertEqual(metricas_cola()['pendientes'], 1)
+
+        self.assertEqual(cola.vaciar(), 1)
+
+        metricas = metricas_cola()
+        self.assertEqual((metricas['pendientes'], metricas['retraso_segundos']), (0, 0))
+        celdas = CeldasMesPersona.objects.get(personal=self.personal[0], year=2025, month=3).celdas
+        self.assertEqual(celdas['25'], self.permiso.id)
+        self.assertEqual(self.client.get(reverse('calendario:api_cola_recalculo')).json()['pendientes'], 0)
+
+    def test_fallo_devuelve_el_trabajo_a_la_cola(self):
+        self.crear_permiso(25)
+        with mock.patch('calendario.cola.precalcular_mes', side_effect=RuntimeError('sin conexión')), \
+                self.assertLogs('calendario.cola', level='ERROR'):
+            cola.procesar_siguiente()
+
+        trabajo = TrabajoRecalculo.objects.get()
+        self.assertIsNone(trabajo.tomado_en)
+        self.assertEqual((trabajo.intentos, trabajo.error), (1, 'sin conexión'))
+
+    def test_tomar_mes_no_se_lleva_trabajos_de_otro_proceso(self):
+        ahora = timezone.now()
+        ajeno = TrabajoRecalculo.objects.create(personal=self.personal[0], year=2025, month=3, tomado_en=ahora, intentos=1)
+        pendiente = TrabajoRecalculo.objects.create(personal=self.personal[1], year=2025, month=3)
+
+        # Aunque el otro proceso lo tomara en el mismo instante, solo se toma el pendiente
+        with mock.patch('calendario.cola.timezone.now', return_value=ahora):
+            trabajos = tomar_mes()
+
+        self.assertEqual([trabajo.pk for trabajo in trabajos], [pendiente.pk])
+        self.assertEqual(trabajos[0].intentos, 1)
+        self.assertEqual(TrabajoRecalculo.objects.get(pk=ajeno.pk).intentos, 1)
+        self.assertIsNone(tomar_mes())
+
+
+class CalendarioCompactoTests(CalendarioDatosMixin, TestCase):
+    """Representación compacta de las celdas resueltas"""
+
+    def test_celdas_origenes_y_vistas(self):
+        persona = self.crear_personal(1)[0]
+        calendario = obtener_calendario_mensual(2025, 3)
+        compacto = calendario['compacto']
+        licencia = persona.licenciamedicaporpersonal_set.get()
+        manual = persona.estados_manuales.get()
+
+        self.assertEqual(calendario['estados'][persona.personal_id][10], [self.licencia])
+        self.assertEqual(compacto.origen_celda(persona.personal_id, 10),
+                         (ORIGEN_FUENTE, ('licenciamedicaporpersonal', licencia.pk)))
+        self.assertEqual(compacto.origen_celda(persona.personal_id, 20), (ORIGEN_MANUAL, ('estadomanual', manual.pk)))
+        self.assertEqual(compacto.origen_celda(persona.personal_id, 1)[0], ORIGEN_TURNO)
+        self.assertEqual(compacto.fila(persona.personal_id)[9], self.licencia.id)
+        self.assertEqual(compacto.columna(10), {persona.personal_id: self.licencia.id})
+        self.assertEqual(compacto.dotacion(10), {self.licencia.id: 1})
+
+    def test_empates_van_a_la_tabla_aparte(self):
+        compacto = CalendarioCompacto([1, 2], [date(2025, 3, 1), date(2025, 3, 2)])
+        compacto.asignar(0, 1, [self.dia, self.noche])
+        compacto.asignar(1, 0, [self.dia])
+
+        self.assertEqual(compacto.codigos[1], EMPATE)
+        self.assertEqual(compacto.estados_celda(1, 2), [self.dia, self.noche])
+        self.assertEqual(compacto.ids_por_persona(), {1: {1: None, 2: [self.dia.id, self.noche.id]}, 2: {1: self.dia.id, 2: None}})
+        registrados = []
+        fragmento = compacto.json_estados(lambda estado: registrados.append(estado) or estado.pk)
+        self.assertEqual(json.loads(fragmento), {'1': {'1': None, '2': [self.dia.id, self.noche.id]}, '2': {'1': self.dia.id, '2': None}})
+        self.assertEqual(registrados, [self.dia, self.noche])
+
+
+def estado_referencia(personal, fecha):
+    """
+    Resolución de referencia de una celda, consultando el ORM directamente
+    (lenta pero evidente): sirve de oráculo para el motor en los tests.
+    """
+    def clave(estado):
+        return (estado.es_bloqueante, estado.prioridad)
+
+    manuales = EstadoManual.objects.filter(
+        personal=personal, activo=True, fecha_inicio__lte=fecha, fecha_fin__gte=fecha
+    ).select_related('estado').order_by('fecha_inicio', 'pk')
+    if manuales:
+        return [max((em.estado for em in manuales), key=clave)]
+
+    candidatos = []
+    for estado_fuente in EstadoFuente.objects.filter(estado__activo=True).order_by('pk'):
+        registros = estado_fuente.content_type.model_class().objects.filter(**{
+            estado_fuente.campo_personal: personal,
+            f'{estado_fuente.campo_fecha_inicio}__lte': fecha,
+            f'{estado_fuente.campo_fecha_fin}__gte': fecha,
+        }).filter(**(estado_fuente.filtro_extra or {}))
+        if registros.exists():
+            candidatos.append(estado_fuente.estado)
+
+    asignacion = AsignacionFaena.objects.filter(
+        personal=personal, activo=True, fecha_inicio__lte=fecha
+    ).exclude(fecha_fin__lt=fecha).order_by('fecha_inicio', 'pk').first()
+    estado_turno = asignacion.obtener_estado_en_fecha(fecha) if asignacion else None
+    if estado_turno:
+        candidatos.append(estado_turno)
+
+    if not candidatos:
+        predeterminado = Estado.objects.filter(activo=True, es_predeterminado=True).first()
+        return [predeterminado] if predeterminado else []
+    mejor = max(clave(estado) for estado in candidatos)
+    ganadores = [estado for estado in candidatos if clave(estado) == mejor]
+    return ganadores[:1] if mejor[0] else ganadores
+
+
+class MotorEstadosTests(CalendarioDatosMixin, TestCase):
+    """El motor (vector, celda suelta y calendario mensual) resuelve igual que la referencia por celda"""
+
+    def generar_datos(self, semilla, inicio_mes):
+        aleatorio = random.Random(semilla)
+        estados = [self.dia, self.noche, self.descanso, self.permiso, self.licencia, self.capacitacion] + [
+            Estado.objects.create(
+                nombre=f'Extra {i}', color='#000000', background_color='#FFFFFF',
+                prioridad=aleatorio.choice([5, 10, 12, 20]), es_bloqueante=aleatorio.random() < 0.3
+            )
+            for i in range(4)
+        ]
+        # Segunda fuente sobre Ausentismo, acotada por filtro_extra
+        vacaciones = Estado.objects.create(nombre='Vacaciones', color='#000000', background_color='#FFFFFF', prioridad=12)
+        tipo_vacaciones = TipoAusentismo.objects.create(tipo='Vacaciones')
+        EstadoFuente.objects.create(
+            estado=vacaciones, content_type=ContentType.objects.get_for_model(Ausentismo),
+            campo_fecha_inicio='fechaini', campo_fecha_fin='fechafin', campo_personal='personal_id',
+            filtro_extra={'tipoausen_id__tipo': 'Vacaciones'}
+        )
+        otro_turno = Turno.objects.create(nombre='4x4')
+        for orden in (1, 2):
+            TurnoBloque.objects.create(turno=otro_turno, orden=orden, duracion_dias=4, estado=aleatorio.choice(estados))
+
+        def rango_aleatorio():
+            inicio = inicio_mes + timedelta(days=aleatorio.randint(-10, 35))
+            return inicio, inicio + timedelta(days=aleatorio.randint(0, 12))
+
+        for persona in self.crear_personal(12):
+            for _ in range(aleatorio.randint(0, 3)):
+                inicio, fin = rango_aleatorio()
+                EstadoManual.objects.create(personal=persona, estado=aleatorio.choice(estados), fecha_inicio=inicio,
+                                            fecha_fin=fin, activo=aleatorio.random() < 0.8)
+            for _ in range(aleatorio.randint(0, 3)):
+                inicio, fin = rango_aleatorio()
+                Ausentismo.objects.create(personal_id=persona, tipoausen_id=aleatorio.choice([self.tipo_ausentismo, tipo_vacaciones]),
+                                          fechaini=inicio, fechafin=fin)
+            for _ in range(aleatorio.randint(0, 2)):
+                inicio, fin = rango_aleatorio()
+                AsignacionFaena.objects.create(
+                    personal=persona, faena=self.faena, turno=aleatorio.choice([self.turno, otro_turno]), fecha_inicio=inicio,
+                    fecha_fin=aleatorio.choice([fin, None]), bloque_inicio=otro_turno.bloques.last(),
+                    activo=aleatorio.random() < 0.7
+                )
+
+    def comparar_con_referencia(self, fechas):
+        ventana = Ventana(fechas[0], fechas[-1])
+        for persona in Personal.objects.prefetch_related(*prefetch_ventana(fechas[0], fechas[-1])):
+            vector = ventana.resolver_persona(persona, fechas)
+            for fecha, (estados, origen, referencia) in zip(fechas, vector):
+                esperados = [estado.pk for estado in estado_referencia(persona, fecha)]
+                candidatos = ventana.candidatos(persona, fecha)
+                por_celda, _ = ventana.resolver(candidatos)
+                self.assertEqual([estado.pk for estado in estados], esperados, (persona.pk, fecha))
+                self.assertEqual([estado.pk for estado in por_celda], esperados, (persona.pk, fecha))
+                self.assertEqual((origen, referencia), origen_ganador(candidatos, por_celda), (persona.pk, fecha))
+
+    def test_mes_igual_a_referencia(self):
+        inicio_mes = date(2025, 3, 1)
+        self.generar_datos(41, inicio_mes)
+        fechas = [inicio_mes + timedelta(days=i) for i in range(31)]
+        self.comparar_con_referencia(fechas)
+
+        calendario = obtener_calendario_mensual(2025, 3)
+        for persona in calendario['personal']:
+            for fecha in fechas[::5]:
+                esperados = estado_referencia(persona, fecha)
+                self.assertEqual(calendario['estados'][persona.personal_id][fecha.day], esperados, (persona.pk, fecha))
+                self.assertEqual(estado_final(persona, fecha), esperados, (persona.pk, fecha))
+
+    def test_ventana_entre_meses_igual_a_referencia(self):
+        self.generar_datos(7, date(2025, 3, 1))
+        inicio = date(2025, 2, 20)
+        self.comparar_con_referencia([inicio + timedelta(days=i) for i in range(20)])
+
+
+class EstadisticasEstadosTests(CalendarioDatosMixin, TestCase):
+    """Los días por Estado calculados sobre ciclos e intervalos coinciden con contar las celdas"""
+
+    generar_datos = MotorEstadosTests.generar_datos
+
+    def contar_celdas(self, fecha_inicio, fecha_fin):
+        fechas = [fecha_inicio + timedelta(days=i) for i in range((fecha_fin - fecha_inicio).days + 1)]
+        ventana = Ventana(fecha_inicio, fecha_fin)
+        conteo = {}
+        for persona in Personal.objects.filter(activo=True).prefetch_related(*prefetch_ventana(fecha_inicio, fecha_fin)):
+            dias = conteo[persona.personal_id] = {}
+            for estados, _, _ in ventana.resolver_persona(persona, fechas):
+                for estado_id in {estado.pk for estado in estados}:
+                    dias[estado_id] = dias.get(estado_id, 0) + 1
+        return conteo
+
+    def test_igual_a_contar_celdas(self):
+        self.generar_datos(41, date(2025, 3, 1))
+        for fecha_inicio, fecha_fin in [(date(2025, 3, 1), date(2025, 3, 31)), (date(2025, 2, 17), date(2025, 4, 20)),
+                                        (date(2025, 3, 9), date(2025, 3, 9))]:
+            conteo, _ = conteo_estados(fecha_inicio, fecha_fin)
+            self.assertEqual(conteo, self.contar_celdas(fecha_inicio, fecha_fin), (fecha_inicio, fecha_fin))
+
+    def test_api_anual(self):
+        persona = self.crear_personal(1)[0]
+        respuesta = self.client.get(reverse('calendario:api_estadisticas_estados'),
+                                    {'desde': '2025-01-01', 'hasta': '2025-12-31', 'personal_id': str(persona.personal_id)})
+        datos = respuesta.json()
+
+        dias = datos['personal'][str(persona.personal_id)]
+        self.assertEqual(sum(dias.values()), 365)
+        self.assertEqual(dias[str(self.licencia.id)], 3)
+        self.assertEqual(dias[str(self.capacitacion.id)], 1)
+        self.assertEqual(datos['estados_catalogo'][str(self.licencia.id)]['nombre'], 'Licencia')
+        self.assertEqual(self.client.get(reverse('calendario:api_estadisticas_estados'), {'desde': '2025-02-01'}).status_code, 400)
+
+
+class ArchivoHistoricoTests(CalendarioDatosMixin, TestCase):
+    """Archivar lo que terminó antes del corte no cambia el calendario ni los conteos"""
+
+    generar_datos = MotorEstadosTests.generar_datos
+
+    def foto(self):
+        """Celdas de febrero a abril, días por Estado y dotación de la faena"""
+        celdas = {}
+        for month in (2, 3, 4):
+            calendario = obtener_calendario_mensual(2025, month)
+            for persona in calendario['personal']:
+                for dia, estados in calendario['estados'][persona.personal_id].items():
+                    celdas[(persona.personal_id, month, dia)] = [estado.pk for estado in estados]
+        conteo, _ = conteo_estados(date(2025, 2, 10), date(2025, 4, 20))
+        return celdas, conteo, sorted(personal_de_faena(self.faena.pk, date(2025, 2, 1), date(2025, 2, 28)))
+
+    def test_calendario_igual_tras_archivar(self):
+        self.generar_datos(23, date(2025, 3, 1))
+        antes = self.foto()
+        persona = Personal.objects.first()
+        procedencia = Ventana(date(2025, 3, 5), date(2025, 3, 5), [persona.pk]).explicar(
+            Personal.objects.prefetch_related(*prefetch_ventana(date(2025, 3, 5), date(2025, 3, 5))).get(pk=persona.pk),
+            date(2025, 3, 5)
+        )
+
+        archivados = archivar(date(2025, 3, 15), lote=7)
+
+        self.assertTrue(all(archivados.values()), archivados)
+        self.assertEqual(RegistroArchivado.objects.count(), sum(archivados.values()))
+        self.assertFalse(Ausentismo.objects.filter(fechafin__lt=date(2025, 3, 15)).exists())
+        self.assertEqual(self.foto(), antes)
+        despues = Ventana(date(2025, 3, 5), date(2025, 3, 5), [persona.pk]).explicar(
+            Personal.objects.prefetch_related(*prefetch_ventana(date(2025, 3, 5), date(2025, 3, 5))).get(pk=persona.pk),
+            date(2025, 3, 5)
+        )
+        self.assertEqual(despues, procedencia)
+
+    def test_filtro_extra_con_lookups_fuera_de_la_tabla(self):
+        """Lookups y transformaciones que el motor evalúa sobre el archivo, sin pasar por LOOKUPS_FILTRO directo"""
+        self.generar_datos(29, date(2025, 3, 1))
+        vacaciones = Estado.objects.create(nombre='Vacaciones 2025', color='#000000', background_color='#FFFFFF',
+                                           prioridad=25, es_bloqueante=True)
+        EstadoFuente.objects.create(
+            estado=vacaciones,
+            content_type=ContentType.objects.get_for_model(Ausentismo),
+            campo_fecha_inicio='fechaini', campo_fecha_fin='fechafin', campo_personal='personal_id',
+            filtro_extra={'tipoausen_id__tipo__istartswith': 'vaca', 'fechaini__year': 2025, 'fechafin__month__gte': 3}
+        )
+        antes = self.foto()
+        self.assertIn([vacaciones.pk], antes[0].values())
+        archivar(date(2025, 3, 15))
+        self.assertTrue(RegistroArchivado.objects.filter(modelo='calendario.ausentismo').exists())
+        self.assertEqual(self.foto(), antes)
+
+    def test_filtro_extra_no_evaluable(self):
+        persona = self.crear_personal(1)[0]
+        fuente = EstadoFuente.objects.get(estado=self.permiso)
+        fuente.filtro_extra = {'observacion__regex': '^x'}
+        with self.assertRaises(ValidationError):
+            fuente.save()
+        fuente.filtro_extra = {'personal_id__asignaciones_faena__activo': True}
+        with self.assertRaises(ValidationError):
+            fuente.save()
+
+        # Una fuente guardada antes de la validación no tumba el calendario:
+        # se omiten sus registros archivados y queda en el log
+        archivar(date(2025, 4, 1))
+        EstadoFuente.objects.filter(pk=fuente.pk).update(filtro_extra={'observacion__regex': '^x'})
+        with self.assertLogs('calendario.motor', level='ERROR'):
+            calendario = obtener_calendario_mensual(2025, 3)
+        self.assertNotIn(self.permiso, calendario['estados'][persona.personal_id][5])
+        self.assertIn(self.capacitacion, calendario['estados'][persona.personal_id][20])
+
+    def test_no_se_crean_asignaciones_sobre_el_historial_archivado(self):
+        persona = self.crear_personal(1)[0]
+        persona.asignaciones_faena.update(fecha_fin=date(2025, 1, 31))
+        call_command('archivar_historial', antes_de='2025-02-01', stdout=StringIO())
+        self.assertFalse(persona.asignaciones_faena.exists())
+
+        datos = {
+            'personal_id': persona.personal_id, 'faena_id': self.faena.pk, 'turno_id': self.turno.pk,
+            'bloque_inicio_id': self.bloques[0].pk, 'fecha_inicio': '2025-01-20', 'fecha_fin': '2025-02-10',
+        }
+        respuesta = self.client.post(reverse('calendario:crear_asignacion'), json.dumps(datos), content_type='application/json')
+        self.assertEqual(respuesta.status_code, 400)
+        datos['fecha_inicio'] = '2025-02-01'
+        respuesta = self.client.post(reverse('calendario:crear_asignacion'), json.dumps(datos), content_type='application/json')
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_borrar_lo_que_usa_el_archivo(self):
+        persona = self.crear_personal(1)[0]
+        persona.asignaciones_faena.update(fecha_fin=date(2025, 3, 31))
+        version = version_mes(2025, 3)
+        archivar(date(2025, 4, 1))
+        self.assertEqual(version_mes(2025, 3), version)
+        self.assertFalse(EstadoManual.objects.exists())
+
+        # EstadoManual.estado es PROTECT: el Estado sigue en uso por el archivo
+        with self.assertRaises(ProtectedError), transaction.atomic():
+            self.capacitacion.delete()
+        self.assertTrue(Estado.objects.filter(pk=self.capacitacion.pk).exists())
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'clave'))
+        respuesta = self.client.get(reverse('admin:calendario_estado_delete', args=[self.capacitacion.pk]))
+        self.assertContains(respuesta, 'Registro Archivado: calendario.estadomanual')
+
+        # AsignacionFaena.faena es CASCADE: la asignación archivada se va con la faena
+        self.faena.delete()
+        self.assertFalse(RegistroArchivado.objects.filter(modelo='calendario.asignacionfaena').exists())
+        self.assertGreater(version_mes(2025, 3), version)
+
+
+def expandir_ics(texto, fecha_inicio, fecha_fin):
+    """{fecha: {SUMMARY}} de los eventos de un .ics en [fecha_inicio, fecha_fin], expandiendo RRULE, EXDATE y RECURRENCE-ID"""
+    def fecha(valor):
+        return datetime.strptime(valor, '%Y%m%d').date()
+
+    eventos = []
+    for bloque in texto.replace('\r\n ', '').split('BEGIN:VEVENT')[1:]:
+        evento = {'EXDATE': set()}
+        for linea in bloque.split('END:VEVENT')[0].split('\r\n'):
+            clave, _, valor = linea.partition(':')
+            clave = clave.split(';')[0]
+            if clave == 'EXDATE':
+                evento['EXDATE'].add(fecha(valor))
+            elif clave:
+                evento[clave] = valor
+        eventos.append(evento)
+    reemplazos = {(e['UID'], fecha(e['RECURRENCE-ID'])): e for e in eventos if 'RECURRENCE-ID' in e}
+
+    dias = {}
+    for evento in eventos:
+        if 'RECURRENCE-ID' in evento:
+            continue
+        inicio, fin = fecha(evento['DTSTART']), fecha(evento['DTEND'])
+        ocurrencias = [(inicio, fin)]
+        if 'RRULE' in evento:
+            regla = dict(parte.split('=') for parte in evento['RRULE'].split(';'))
+            paso, cuenta = timedelta(days=int(regla['INTERVAL'])), int(regla.get('COUNT', 10 ** 6))
+            ocurrencias = []
+            while inicio <= fecha_fin and len(ocurrencias) < cuenta:
+                ocurrencias.append((inicio, fin))
+                inicio, fin = inicio + paso, fin + paso
+        for inicio, fin in ocurrencias:
+            if inicio in evento['EXDATE']:
+                continue
+            reemplazo = reemplazos.get((evento['UID'], inicio))
+            if reemplazo:
+                inicio, fin = fecha(reemplazo['DTSTART']), fecha(reemplazo['DTEND'])
+            dia = max(inicio, fecha_inicio)
+            while dia < fin and dia <= fecha_fin:
+                dias.setdefault(dia, set()).add(evento['SUMMARY'])
+                dia += timedelta(days=1)
+    return dias
+
+
+class CalendarioIcalTests(CalendarioDatosMixin, TestCase):
+    """El .ics (turnos como RRULE con excepciones) muestra lo mismo que el motor día a día"""
+
+    generar_datos = MotorEstadosTests.generar_datos
+
+    def ics(self, persona, desde):
+        respuesta = self.client.get(reverse('calendario:ical_personal', args=[persona.pk]), {'desde': desde.isoformat()})
+        self.assertEqual(respuesta['Content-Type'], 'text/calendar; charset=utf-8')
+        return respuesta.content.decode()
+
+    def test_igual_al_motor(self):
+        self.generar_datos(17, date(2025, 3, 1))
+        desde, hasta = date(2025, 2, 20), date(2025, 5, 10)
+        fechas = [desde + timedelta(days=i) for i in range((hasta - desde).days + 1)]
+        ventana = Ventana(desde, hasta)
+        for persona in Personal.objects.prefetch_related(*prefetch_ventana(desde, hasta)):
+            dias = expandir_ics(self.ics(persona, desde), desde, hasta)
+            for fecha, (estados, origen, _) in zip(fechas, ventana.resolver_persona(persona, fechas)):
+                esperado = set() if origen == ORIGEN_PREDETERMINADO else {estado.nombre for estado in estados}
+                self.assertEqual(dias.get(fecha, set()), esperado, (persona.pk, fecha))
+
+    def test_tamano_constante_y_etag(self):
+        persona = self.crear_personal(1)[0]
+        # Un evento por bloque del ciclo (y el que reemplaza la ocurrencia cortada por `desde`)
+        cercano = self.ics(persona, date(2025, 6, 1))
+        lejano = self.ics(persona, date(2031, 6, 1))
+        self.assertEqual(cercano.count('BEGIN:VEVENT'), 5)
+        self.assertEqual(lejano.count('BEGIN:VEVENT'), 5)
+        self.assertIn('RRULE:FREQ=DAILY;INTERVAL=28', cercano)
+
+        # Un solo DTSTAMP por calendario: el último cambio de los datos, no la fecha de cada evento
+        marcas = set(re.findall(r'DTSTAMP:(\S+)', cercano))
+        self.assertEqual(marcas, set(re.findall(r'DTSTAMP:(\S+)', lejano)))
+        self.assertEqual(len(marcas), 1)
+
+        url = reverse('calendario:ical_personal', args=[persona.pk])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        EstadoManual.objects.create(personal=persona, estado=self.permiso, fecha_inicio=date.today(), fecha_fin=date.today())
+        respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        ultimo_cambio = VersionCalendarioMes.objects.latest('actualizado_en').actualizado_en
+        self.assertIn(f'DTSTAMP:{ultimo_cambio:%Y%m%dT%H%M%SZ}', respuesta.content.decode())
+
+    def test_faena_y_errores(self):
+        self.crear_personal(2)
+        respuesta = self.client.get(reverse('calendario:ical_faena', args=[self.faena.pk]), {'desde': '2025-03-01'})
+        self.assertContains(respuesta, 'SUMMARY:Persona 1 Pérez: Licencia')
+        self.assertEqual(self.client.get(reverse('calendario:ical_faena', args=[9999])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('calendario:ical_faena', args=[self.faena.pk]), {'desde': '2025-13-01'}).status_code, 400)
+
+
+class NucleoMotorTests(CalendarioDatosMixin, TestCase):
+    """El núcleo sin Django resuelve una instantánea (enviada por pickle) igual que la referencia"""
+
+    generar_datos = MotorEstadosTests.generar_datos
+
+    def test_instantanea_igual_a_referencia(self):
+        self.generar_datos(41, date(2025, 3, 1))
+        desde, hasta = date(2025, 2, 25), date(2025, 4, 5)
+        instantanea = pickle.loads(pickle.dumps(construir_instantanea(desde, hasta)))
+        resuelto = {}
+        for parte in instantanea.particionar(3):
+            resuelto.update(nucleo.resolver(parte))
+
+        self.assertEqual(set(resuelto), set(Personal.objects.filter(activo=True).values_list('pk', flat=True)))
+        for persona in Personal.objects.filter(activo=True):
+            for fecha, (estados, _, _) in zip(nucleo.fechas_rango(desde, hasta)[::3], resuelto[persona.pk][::3]):
+                self.assertEqual([estado.id for estado in estados],
+                                 [estado.pk for estado in estado_referencia(persona, fecha)], (persona.pk, fecha))
+
+        dotacion = construir_instantanea(desde, hasta, faena_id=self.faena.pk)
+        self.assertEqual({persona.personal_id for persona in dotacion.personas}, set(personal_de_faena(self.faena.pk, desde, hasta)))
+
+    def test_ciclo_desde_bloque_de_inicio(self):
+        ciclo = nucleo.Ciclo.desde_bloques([(2, 1, 'X'), (1, 2, 'D'), (3, 3, 'N')], orden_inicio=2)
+        self.assertEqual(ciclo.estados, ('X', 'N', 'N', 'N', 'D', 'D'))
+        self.assertEqual(ciclo.estado_en(13), 'N')
+        self.assertIsNone(nucleo.Ciclo.desde_bloques([]).estado_en(3))
+
+        persona = self.crear_personal(3)[2]  # arranca en el bloque 3 (Noche)
+        asignacion = persona.asignaciones_faena.get()
+        inicio = asignacion.fecha_inicio
+        self.assertEqual([asignacion.obtener_estado_en_fecha(inicio + timedelta(days=d)) for d in (0, 7, 14, 21, 28)],
+                         [self.noche, self.descanso, self.dia, self.descanso, self.noche])
+
+    def test_importa_sin_django(self):
+        codigo = "import sys, calendario.nucleo; print(sorted(m for m in sys.modules if m.split('.')[0] == 'django'))"
+        salida = subprocess.run([sys.executable, '-c', codigo], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True)
+        self.assertEqual(salida.stdout.strip(), '[]')
+
+
+class EstaticosPaginaTests(CalendarioDatosMixin, TestCase):
+    """La página es solo marcado y datos; el CSS y el JS van aparte, con hash y caché larga"""
+
+    def test_pagina_con_estaticos_con_hash(self):
+        self.crear_personal(2)
+        with tempfile.TemporaryDirectory() as raiz, override_settings(STATIC_ROOT=raiz, STORAGES={
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'},
+        }):
+            call_command('collectstatic', interactive=False, verbosity=0, ignore_patterns=['admin'])
+            html = self.client.get(reverse('calendario:calendario_mensual'), {'year': 2025, 'month': 3}).content.decode()
+            self.assertNotIn('<style>', html)
+            self.assertNotIn('function ', html)
+            pagina = json.loads(re.search(r'id="calendarioPagina" type="application/json">(.*?)</script>', html).group(1))
+            self.assertEqual(pagina['mes_siguiente'], {'year': 2025, 'month': 4})
+
+            for extension in ('css', 'js'):
+                url = re.search(rf'"(/static/calendario/calendario_mensual\.[0-9a-f]{{12}}\.{extension})"', html).group(1)
+                respuesta = self.client.get(url)
+                self.assertEqual(respuesta.status_code, 200)
+                self.assertEqual(respuesta['Cache-Control'], 'public, max-age=31536000, immutable')
+            sin_hash = self.client.get('/static/calendario/calendario_mensual.js')
+            self.assertEqual(sin_hash['Cache-Control'], 'no-cache')
+            self.assertIn(b'calendarioPagina', b''.join(sin_hash.streaming_content))
+
+
+class PruebaCargaTests(CalendarioDatosMixin, TransactionTestCase):
+    """Usuarios concurrentes contra la aplicación en proceso (hilos con su propia conexión)"""
+
+    def setUp(self):
+        self.setUpTestData()
+        self.crear_personal(4)
+
+    def test_mezcla(self):
+        self.assertEqual(parsear_mezcla('api=2, crear=1,'), {'api': 2, 'crear': 1})
+        for invalida in ['api=2,borrar=1', 'api=0', 'api=-1', 'api=x']:
+            with self.assertRaises(ValueError):
+                parsear_mezcla(invalida)
+
+    def test_carga_sin_errores_y_sin_residuos(self):
+        prueba = PruebaCarga(ClienteInterno, parsear_mezcla('pagina=1,api=2,crear=2,actualizar=1,eliminar=1'),
+                             usuarios=2, peticiones=20, year=2025, month=3, semilla=7)
+        reporte = prueba.ejecutar()
+
+        total = reporte['operaciones']['total']
+        self.assertEqual(total['peticiones'], 20)
+        self.assertEqual(total['ok'] + total['bloqueo'], 20)
+        self.assertEqual(total['error'] + total['timeout'], 0)
+        self.assertLessEqual(total['p50_ms'], total['p95_ms'])
+        self.assertLessEqual(total['p99_ms'], total['max_ms'])
+        # Lo que no se pudo eliminar por bloqueos queda solo en el año de prueba
+        limpiar_asignaciones_prueba()
+        self.assertFalse(AsignacionFaena.objects.filter(fecha_inicio__year=ANIO_MUTACIONES).exists())
+        self.assertEqual(AsignacionFaena.objects.count(), 4)
+
+
+class ReglasPrioridadTests(CalendarioDatosMixin, TestCase):
+    """Los rangos compilados aplican la precedencia de los estados"""
+
+    def test_reglas_de_precedencia(self):
+        reglas = ReglasPrioridad([self.dia, self.noche, self.permiso, self.licencia])
+
+        self.assertEqual(reglas.ganadores([self.dia, self.noche, self.descanso]), [0, 1])
+        self.assertEqual(reglas.ganadores([self.dia, self.permiso, self.licencia]), [2])
+        self.assertEqual(reglas.primero_mayor([self.descanso, self.capacitacion, self.permiso]), 2)
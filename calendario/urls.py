@@ -6,7 +6,18 @@ app_name = 'calendario'
 urlpatterns = [
     path('', views.calendario_mensual, name='calendario_mensual'),
     path('api/calendario/', views.api_calendario_mensual, name='api_calendario_mensual'),
+    path('api/faena/<int:faena_id>/calendario/', views.api_calendario_faena, name='api_calendario_faena'),
+    path('api/catalogo/', views.api_catalogo, name='api_catalogo'),
+    path('api/cola-recalculo/', views.api_cola_recalculo, name='api_cola_recalculo'),
+    path('api/estadisticas-estados/', views.api_estadisticas_estados, name='api_estadisticas_estados'),
+    path('api/buscar-personal/', views.api_buscar_personal, name='api_buscar_personal'),
+    path('ical/personal/<int:personal_id>.ics', views.ical_personal, name='ical_personal'),
+    path('ical/faena/<int:faena_id>.ics', views.ical_faena, name='ical_faena'),
+    path('api/procedencia-celda/', views.api_procedencia_celda, name='api_procedencia_celda'),
     path('api/crear-asignacion/', views.crear_asignacion, name='crear_asignacion'),
     path('api/actualizar-asignacion/', views.actualizar_asignacion, name='actualizar_asignacion'),
     path('api/eliminar-asignacion/', views.eliminar_asignacion, name='eliminar_asignacion'),
+    path('api/simular-asignaciones/', views.api_simular_asignaciones, name='api_simular_asignaciones'),
+    path('api/optimizar-fases/', views.api_optimizar_fases, name='api_optimizar_fases'),
+    path('api/aplicar-estado-manual/', views.api_aplicar_estado_manual, name='api_aplicar_estado_manual'),
 ]
@@ -0,0 +1,48 @@
+"""
+Validaciones de asignaciones compartidas por las APIs de asignación y la
+simulación (calendario.simulacion): las fechas del payload y los solapamientos
+con las asignaciones vigentes y archivadas de la persona.
+"""
+from datetime import datetime
+
+from django.db.models import Q
+
+from .archivo import asignacion_archivada_solapada
+from .models import AsignacionFaena
+
+
+def parsear_rango(fecha_inicio, fecha_fin):
+    """Convierte las fechas string (YYYY-MM-DD) del payload a objetos date"""
+    fecha_inicio_date = datetime.strptime(fecha_inicio, '%Y-%m-%d').date()
+    fecha_fin_date = None
+    if fecha_fin:
+        fecha_fin_date = datetime.strptime(fecha_fin, '%Y-%m-%d').date()
+        if fecha_fin_date < fecha_inicio_date:
+            raise ValueError('La fecha de fin no puede ser anterior a la fecha de inicio')
+    return fecha_inicio_date, fecha_fin_date
+
+
+def hay_solapamiento(personal_id, fecha_inicio, fecha_fin, excluir=()):
+    """
+    Verifica si hay asignaciones activas de la persona (salvo las de `excluir`)
+    que se solapen con el rango. Dos rangos se solapan si:
+    inicio1 <= fin2 AND inicio2 <= fin1 (un fin nulo es abierto).
+    """
+    solapamiento_query = Q(personal_id=personal_id, activo=True) & (
+        Q(fecha_fin__isnull=True) | Q(fecha_fin__gte=fecha_inicio)
+    )
+    if fecha_fin:
+        solapamiento_query &= Q(fecha_inicio__lte=fecha_fin)
+
+    asignaciones_solapadas = AsignacionFaena.objects.filter(solapamiento_query)
+    if excluir:
+        asignaciones_solapadas = asignaciones_solapadas.exclude(id__in=list(excluir))
+    # Las asignaciones ya archivadas (cerradas antes del corte) también cuentan
+    return asignaciones_solapadas.exists() or asignacion_archivada_solapada(personal_id, fecha_inicio, fecha_fin)
+
+
+def se_solapan(asignacion, fecha_inicio, fecha_fin):
+    """True si la asignación (guardada o no) está activa y se cruza con el rango"""
+    return asignacion.activo and (asignacion.fecha_fin is None or asignacion.fecha_fin >= fecha_inicio) and (
+        fecha_fin is None or asignacion.fecha_inicio <= fecha_fin
+    )
@@ -1,18 +1,41 @@
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
 from django.shortcuts import render
-from django.http import JsonResponse
-from django.db.models import Q
+from django.http import HttpResponse, JsonResponse, HttpResponseNotModified
+from django.urls import reverse
+from django.db import transaction
+from django.db.models import Q, Prefetch
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
+from django.views.static import serve
 from datetime import datetime, date, timedelta
 from calendar import monthrange
+import hashlib
 import json
 from .models import (
-    Personal, Estado, EstadoFuente, Turno, TurnoBloque, 
-    Faena, AsignacionFaena, EstadoManual
+    Personal, Estado, Turno, TurnoBloque, 
+    Faena, AsignacionFaena
+)
+from .catalogo import obtener_catalogo, version_catalogo
+from .optimizador import sugerir_bloques_inicio
+from .estados_masivos import seleccionar_personal, aplicar_estado_manual
+from .motor import obtener_calendario_mensual, prefetch_ventana, Ventana
+from .busqueda import buscar_personal, LIMITE_RESULTADOS
+from .validacion import parsear_rango, hay_solapamiento
+from .estadisticas import conteo_estados
+from .ical import feed_personal, feed_faena
+from .simulacion import simular_cambios
+from .cola import metricas_cola
+from .serializacion import (
+    SerializadorCalendario, json_para_script,
+    serializar_estado_catalogo, serializar_asignacion
 )
 
 # Create your views here.
 
+# Los estáticos con el hash del contenido en el nombre no cambian nunca: un año sin revalidar
+CACHE_ESTATICO_CON_HASH = 'public, max-age=31536000, immutable'
+
 def calendario_mensual(request):
     """Vista para mostrar el calendario mensual con datos reales"""
     
@@ -43,25 +66,13 @@ def calendario_mensual(request):
     fecha_inicio_mes = date(year, month, 1)
     fecha_fin_mes = date(year, month, ultimo_dia)
     
-    # Obtener opciones para filtros
-    faenas = Faena.objects.filter(activo=True).order_by('nombre')
-    turnos = Turno.objects.filter(activo=True).prefetch_related('bloques__estado').order_by('nombre')
-    cargos = Personal.objects.filter(activo=True).values_list('infolaboral__cargo_id__cargo', flat=True).distinct().order_by('infolaboral__cargo_id__cargo')
-    
-    # Obtener TODOS los estados disponibles para la leyenda
-    todos_estados = Estado.objects.filter(activo=True).order_by('-prioridad', 'nombre')
-    
     # Nombres de meses en español
     month_names = [
         'Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
         'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre'
     ]
     
-    # Convertir datos a formato JSON serializable
-    from django.core.serializers.json import DjangoJSONEncoder
-    import json
-    
-    # Preparar datos del calendario para JSON
+    # Preparar datos del calendario (todo menos las celdas, que emite el serializador)
     calendario_json = {
         'personal': [
             {
@@ -83,557 +94,516 @@ def calendario_mensual(request):
                     } for il in p.infolaboral_set.all()
                 ],
                 'asignaciones_faena': [
-                    {
-                        'id': af.id,
-                        'faena': {
-                            'id': af.faena.id,
-                            'nombre': af.faena.nombre
-                        },
-                        'turno_id': af.turno.id,
-                        'fecha_inicio': af.fecha_inicio.isoformat() if af.fecha_inicio else None,
-                        'fecha_fin': af.fecha_fin.isoformat() if af.fecha_fin else None,
-                        'bloque_inicio_id': af.bloque_inicio.id if af.bloque_inicio else None,
-                        'observaciones': af.observaciones,
-                        'activo': af.activo
-                    } for af in p.asignaciones_faena.filter(
-                        activo=True,
-                        fecha_inicio__lte=fecha_fin_mes,
-                        fecha_fin__gte=fecha_inicio_mes
-                    )
+                    serializar_asignacion(af)
+                    for af in asignaciones_en_ventana(p, fecha_inicio_mes, fecha_fin_mes)
                 ]
             } for p in calendario_data['personal']
         ],
-        'estados': {},
-        'dias_mes': calendario_data['dias_mes']
-    }
-    
-    # Convertir estados a diccionarios serializables
-    for personal_id, estados_persona in calendario_data['estados'].items():
-        calendario_json['estados'][personal_id] = {}
-        for dia, estados in estados_persona.items():
-            # Asegurar que estados sea siempre una lista
-            if estados:
-                if hasattr(estados, '__iter__') and not isinstance(estados, str):
-                    # Es una lista o iterable
-                    if len(estados) == 1:
-                        estado_info = estados[0]
-                        # Extraer el estado del diccionario si es necesario
-                        estado = estado_info['estado'] if isinstance(estado_info, dict) else estado_info
-                        detalle_fuente = estado_info.get('detalle_fuente') if isinstance(estado_info, dict) else None
-                        
-                        calendario_json['estados'][personal_id][dia] = {
-                            'nombre': estado.nombre,
-                            'nombre_corto': estado.nombre_corto or estado.nombre,
-                            'color': estado.color,
-                            'background_color': estado.background_color,
-                            'prioridad': estado.prioridad,
-                            'es_bloqueante': estado.es_bloqueante,
-                            'multiple': False,
-                            'detalle_fuente': detalle_fuente
-                        }
-                    elif len(estados) > 1:
-                        # Múltiples estados con la misma prioridad
-                        estados_procesados = []
-                        detalles_fuentes = []
-                        
-                        for estado_info in estados:
-                            estado = estado_info['estado'] if isinstance(estado_info, dict) else estado_info
-                            detalle_fuente = estado_info.get('detalle_fuente') if isinstance(estado_info, dict) else None
-                            
-                            estados_procesados.append({
-                                'nombre': estado.nombre,
-                                'nombre_corto': estado.nombre_corto or estado.nombre,
-                                'color': estado.color,
-                                'background_color': estado.background_color,
-                                'prioridad': estado.prioridad,
-                                'es_bloqueante': estado.es_bloqueante
-                            })
-                            
-                            if detalle_fuente:
-                                detalles_fuentes.append(detalle_fuente)
-                        
-                        calendario_json['estados'][personal_id][dia] = {
-                            'estados': estados_procesados,
-                            'multiple': True,
-                            'detalles_fuentes': detalles_fuentes
-                        }
-                    else:
-                        calendario_json['estados'][personal_id][dia] = None
-                else:
-                    # Es un objeto Estado individual
-                    estado = estados
-                    calendario_json['estados'][personal_id][dia] = {
-                        'nombre': estado.nombre,
-                        'nombre_corto': estado.nombre_corto or estado.nombre,
-                        'color': estado.color,
-                        'background_color': estado.background_color,
-                        'prioridad': estado.prioridad,
-                        'es_bloqueante': estado.es_bloqueante,
-                        'multiple': False
-                    }
-            else:
-                calendario_json['estados'][personal_id][dia] = None
-    
-
-    
-    context = {
-        'calendario': json.dumps(calendario_json, cls=DjangoJSONEncoder),
+        'dias_mes': calendario_data['dias_mes'],
+        # Información del mes actual para el frontend
         'current_year': year,
         'current_month': month,
-        'current_month_name': month_names[month - 1],
-        'faenas': faenas,  # Para loops de Django
-        'cargos': cargos,  # Para loops de Django
-        'filtros': json.dumps({
-            'faena': faena_filter,
-            'cargo': cargo_filter,
-            'search': search_query,
-        }),
-        'mes_anterior': json.dumps({
-            'year': year if month > 1 else year - 1,
-            'month': month - 1 if month > 1 else 12
-        }),
-        'mes_siguiente': json.dumps({
-            'year': year if month < 12 else year + 1,
-            'month': month + 1 if month < 12 else 1
-        })
     }
     
-    # Agregar todos los estados disponibles al calendario JSON
-    calendario_json['todos_estados_disponibles'] = [
-        {
-            'nombre': estado.nombre,
-            'nombre_corto': estado.nombre_corto or estado.nombre,
-            'color': estado.color,
-            'background_color': estado.background_color,
-            'prioridad': estado.prioridad,
-            'es_bloqueante': estado.es_bloqueante
-        } for estado in todos_estados
-    ]
-    
-    # Agregar faenas y turnos para los modales
-    calendario_json['faenas'] = [
-        {
-            'id': faena.id,
-            'nombre': faena.nombre,
-            'ubicacion': faena.ubicacion,
-        }
-        for faena in faenas
-    ]
-    
-    calendario_json['turnos'] = [
-        {
-            'id': turno.id,
-            'nombre': turno.nombre,
-            'descripcion': turno.descripcion,
-            'bloques': [
-                {
-                    'id': bloque.id,
-                    'orden': bloque.orden,
-                    'duracion_dias': bloque.duracion_dias,
-                    'estado': {
-                        'id': bloque.estado.id,
-                        'nombre': bloque.estado.nombre,
-                        'color': bloque.estado.color,
-                        'background_color': bloque.estado.background_color,
-                    }
-                }
-                for bloque in turno.bloques.all().order_by('orden')
-            ]
-        }
-        for turno in turnos.prefetch_related('bloques__estado')
-    ]
-    
-    # Agregar cargos para filtros
-    calendario_json['cargos'] = list(cargos)
-    
-    # Agregar información del mes actual para el frontend
-    calendario_json['current_year'] = year
-    calendario_json['current_month'] = month
-    
-    # Actualizar el calendario en el context con los estados incluidos
-    context['calendario'] = json.dumps(calendario_json, cls=DjangoJSONEncoder)
+    context = {
+        # JSON final emitido en una sola pasada, listo para un <script type="application/json">
+        'calendario': json_para_script(
+            SerializadorCalendario().payload(calendario_json, calendario_data['estados'])
+        ),
+        # Lo que el script estático (calendario/calendario_mensual.js) necesita de esta página
+        'pagina': json_para_script(json.dumps({
+            'current_year': year,
+            'current_month': month,
+            'current_month_name': month_names[month - 1],
+            # Faenas, turnos, cargos y estados se piden aparte (api_catalogo) y los cachea el navegador
+            'catalogo_url': f"{reverse('calendario:api_catalogo')}?v={version_catalogo()}",
+            'procedencia_url': reverse('calendario:api_procedencia_celda'),
+            'simulacion_url': reverse('calendario:api_simular_asignaciones'),
+            'filtros': {
+                'faena': faena_filter,
+                'cargo': cargo_filter,
+                'search': search_query,
+            },
+            'mes_anterior': {
+                'year': year if month > 1 else year - 1,
+                'month': month - 1 if month > 1 else 12
+            },
+            'mes_siguiente': {
+                'year': year if month < 12 else year + 1,
+                'month': month + 1 if month < 12 else 1
+            },
+        })),
+    }
     
     return render(request, 'calendario/calendario_mensual.html', context)
 
-def obtener_calendario_mensual(year, month, faena_filter='', cargo_filter='', search_query=''):
+@require_http_methods(["GET"])
+def api_catalogo(request):
     """
-    Obtiene el calendario completo para un mes específico con filtros.
-    OPTIMIZADO: Reduce las consultas de ~620-930 a menos de 10.
+    API con las opciones de filtros y modales (faenas, turnos, cargos, estados).
+    Se sirve desde caché y con ETag; si la URL trae la versión vigente (?v=),
+    el navegador puede guardarla sin volver a preguntar.
     """
-    # Obtener rango de fechas del mes
-    _, ultimo_dia = monthrange(year, month)
-    fecha_inicio = date(year, month, 1)
-    fecha_fin = date(year, month, ultimo_dia)
-    
-    # Construir filtros para el personal con prefetch optimizado
-    personal_query = Personal.objects.filter(activo=True).prefetch_related(
-        'estados_manuales__estado',
-        'asignaciones_faena__turno__bloques__estado',
-        'asignaciones_faena__faena',
-        'asignaciones_faena__bloque_inicio__estado',
-        'ausentismo_set',
-        'licenciamedicaporpersonal_set'
-    )
-    
-    # COMENTADO: Ahora el filtrado se hace solo en el frontend
-    # if faena_filter:
-    #     personal_query = personal_query.filter(
-    #         asignaciones_faena__faena__nombre__icontains=faena_filter,
-    #         asignaciones_faena__activo=True
-    #     ).distinct()
-    # 
-    # if cargo_filter:
-    #     personal_query = personal_query.filter(
-    #         infolaboral__cargo_id__cargo__icontains=cargo_filter
-    #     ).distinct()
-    # 
-    # if search_query:
-    #     personal_query = personal_query.filter(
-    #         Q(nombre__icontains=search_query) |
-    #         Q(apepat__icontains=search_query) |
-    #         Q(apemat__icontains=search_query) |
-    #         Q(rut__icontains=search_query)
-    #     )
-    
-    personal = personal_query.order_by('nombre', 'apepat')
-    
-    # Inicializar estructura de resultados
-    calendario = {
-        'personal': list(personal),
-        'estados': {},
-        'fechas': [fecha_inicio + timedelta(days=i) for i in range(ultimo_dia)],
-        'dias_mes': ultimo_dia
-    }
-    
-    # Pre-cargar EstadoFuente una sola vez
-    estados_fuente_cache = list(EstadoFuente.objects.select_related('estado', 'content_type').filter(estado__activo=True))
-    
-    # Calcular estado para cada persona en cada día (optimizado)
-    for persona in personal:
-        calendario['estados'][persona.personal_id] = {}
+    version, catalogo = obtener_catalogo()
+    etag = f'"{version}"'
+    
+    if request.headers.get('If-None-Match') == etag:
+        respuesta = HttpResponseNotModified()
+    else:
+        respuesta = JsonResponse(dict(catalogo, version=version))
+    
+    respuesta['ETag'] = etag
+    if request.GET.get('v') == version:
+        respuesta['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        respuesta['Cache-Control'] = 'no-cache'
+    return respuesta
+
+@require_http_methods(["GET"])
+def api_cola_recalculo(request):
+    """Métricas de la cola de recálculo en segundo plano (profundidad y retraso)"""
+    return JsonResponse(metricas_cola())
+
+def api_calendario_mensual(request):
+    """API para obtener datos del calendario en formato JSON"""
+    try:
+        year = int(request.GET.get('year', datetime.now().year))
+        month = int(request.GET.get('month', datetime.now().month))
+        faena_filter = request.GET.get('faena', '')
+        cargo_filter = request.GET.get('cargo', '')
+        search_query = request.GET.get('search', '')
         
-        for fecha in calendario['fechas']:
-            estado = obtener_estado_final_personal_fecha_optimizado(persona, fecha, estados_fuente_cache)
-            calendario['estados'][persona.personal_id][fecha.day] = estado
-    
-    return calendario
+        calendario_data = obtener_calendario_mensual(year, month, faena_filter, cargo_filter, search_query)
+        return JsonResponse(calendario_a_json(calendario_data))
+        
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
 
-def obtener_estado_final_personal_fecha_optimizado(personal, fecha, estados_fuente_cache):
+
+@require_http_methods(["GET"])
+def api_calendario_faena(request, faena_id):
     """
-    Versión optimizada que usa datos pre-cargados en memoria.
-    Reduce consultas de ~620 a menos de 10 por carga de página.
+    API del calendario de una sola faena: solo el personal con asignaciones
+    activas en ella durante el mes, con sus celdas completas. El costo depende
+    de la dotación de la faena, no del total de la empresa.
     """
-    from django.db.models import Q
-    
-    # 1. Buscar estados manuales (ya pre-cargados con prefetch_related)
-    estados_manuales = [em for em in personal.estados_manuales.all() 
-                       if em.fecha_inicio <= fecha <= em.fecha_fin and em.activo]
-    
-    if estados_manuales:
-        estados_manuales.sort(key=lambda x: x.estado.prioridad, reverse=True)
-        bloqueantes = [em for em in estados_manuales if em.estado.es_bloqueante]
-        if bloqueantes:
-            return [bloqueantes[0].estado]
-        return [estados_manuales[0].estado]
-    
-    # 2. Buscar estados de fuentes externas (usando cache)
-    estados_fuente = []
-    for estado_fuente in estados_fuente_cache:
-        modelo_name = estado_fuente.content_type.model
-        
-        # Buscar en los datos pre-cargados según el modelo
-        if modelo_name == 'ausentismo':
-            registros = personal.ausentismo_set.all()
-        elif modelo_name == 'licenciamedicaporpersonal':
-            registros = personal.licenciamedicaporpersonal_set.all()
-        else:
-            continue  # Otros modelos no implementados aún
-        
-        # Verificar si algún registro coincide con la fecha
-        for registro in registros:
-            fecha_inicio_campo = getattr(registro, estado_fuente.campo_fecha_inicio, None)
-            fecha_fin_campo = getattr(registro, estado_fuente.campo_fecha_fin, None)
-            
-            if (fecha_inicio_campo and fecha_fin_campo and 
-                fecha_inicio_campo <= fecha <= fecha_fin_campo):
-                # Incluir información detallada de la fuente
-                estado_con_detalle = {
-                    'estado': estado_fuente.estado,
-                    'tipo_fuente': 'externa',
-                    'fuente_nombre': estado_fuente.content_type.model,
-                    'fecha_inicio': fecha_inicio_campo,
-                    'fecha_fin': fecha_fin_campo,
-                    'registro_id': registro.pk,
-                    'detalles': {}
-                }
-                
-                # Agregar detalles específicos según el tipo
-                try:
-                    if modelo_name == 'ausentismo':
-                        estado_con_detalle['detalles'] = {
-                            'motivo': getattr(registro, 'motivo', 'Sin motivo'),
-                            'tipo': 'Ausentismo'
-                        }
-                    elif modelo_name == 'licenciamedicaporpersonal':
-                        estado_con_detalle['detalles'] = {
-                            'motivo': getattr(registro, 'motivo', 'Licencia médica'),
-                            'tipo': 'Licencia Médica',
-                            'fecha_emision': str(getattr(registro, 'fechaEmision', '')) if getattr(registro, 'fechaEmision', None) else None
-                        }
-                except Exception as e:
-                    print(f"Error agregando detalles: {e}")
-                    estado_con_detalle['detalles'] = {'tipo': 'Error al cargar detalles'}
-                
-                estados_fuente.append(estado_con_detalle)
-                break
-    
-    # 3. Buscar estado derivado de turno (ya pre-cargado)
-    estado_turno = None
-    for asignacion in personal.asignaciones_faena.all():
-        if (asignacion.activo and 
-            asignacion.fecha_inicio <= fecha and 
-            (not asignacion.fecha_fin or asignacion.fecha_fin >= fecha)):
-            estado_turno = asignacion.obtener_estado_en_fecha(fecha)
-            break
-    
-    # 4. Resolver conflictos de prioridad
-    todos_estados = []
-    
-    for estado_detalle in estados_fuente:
-        if isinstance(estado_detalle, dict):
-            # Nuevo formato con detalles
-            todos_estados.append({
-                'estado': estado_detalle['estado'],
-                'tipo': 'fuente',
-                'prioridad': estado_detalle['estado'].prioridad,
-                'detalle_fuente': estado_detalle
-            })
-        else:
-            # Formato anterior (fallback)
-            todos_estados.append({
-                'estado': estado_detalle,
-                'tipo': 'fuente',
-                'prioridad': estado_detalle.prioridad
-            })
+    try:
+        year = int(request.GET.get('year', datetime.now().year))
+        month = int(request.GET.get('month', datetime.now().month))
+        date(year, month, 1)
+    except (ValueError, TypeError):
+        return JsonResponse({'error': 'Parámetros inválidos: year y month deben ser un mes válido'}, status=400)
     
-    if estado_turno:
-        todos_estados.append({
-            'estado': estado_turno,
-            'tipo': 'turno',
-            'prioridad': estado_turno.prioridad
+    try:
+        faena = Faena.objects.filter(pk=faena_id).first()
+        if faena is None:
+            return JsonResponse({'error': 'Faena no encontrada'}, status=404)
+        
+        calendario_data = obtener_calendario_mensual(year, month, faena_id=faena.pk)
+        return JsonResponse(dict(
+            calendario_a_json(calendario_data, faena=faena),
+            faena={'id': faena.pk, 'nombre': faena.nombre}, year=year, month=month
+        ))
+        
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+def calendario_a_json(calendario_data, faena=None):
+    """
+    Personal (cargo y faena salen de los datos pre-cargados), celdas y catálogo
+    de estados usados del calendario, en el formato de las APIs. Con `faena`,
+    se informa esa faena para cada persona en lugar de su primera asignación.
+    """
+    personal_json = []
+    for p in calendario_data['personal']:
+        infolaboral = p.infolaboral_set.all()
+        asignaciones = p.asignaciones_faena.all()
+        personal_json.append({
+            'id': p.personal_id,
+            'nombre': f"{p.nombre} {p.apepat} {p.apemat}".strip(),
+            'cargo': infolaboral[0].cargo_id.cargo if infolaboral else 'Sin cargo',
+            'faena': faena.nombre if faena else (asignaciones[0].faena.nombre if asignaciones else 'Sin asignar')
         })
     
-    if not todos_estados:
-        # Buscar estado predeterminado (cache esto también)
-        try:
-            from .models import Estado
-            estado_predeterminado = Estado.objects.filter(
-                activo=True,
-                es_predeterminado=True
-            ).first()
-            
-            if estado_predeterminado:
-                return [estado_predeterminado]
-            return []
-        except:
-            return []
-    
-    # Ordenar y resolver prioridades
-    todos_estados.sort(key=lambda x: x['prioridad'], reverse=True)
-    
-    bloqueantes = [x for x in todos_estados if x['estado'].es_bloqueante]
-    if bloqueantes:
-        return [bloqueantes[0]['estado']]
-    
-    prioridad_maxima = todos_estados[0]['prioridad']
-    estados_misma_prioridad = [
-        x['estado'] for x in todos_estados 
-        if x['prioridad'] == prioridad_maxima
-    ]
-    
-    return estados_misma_prioridad
+    return {
+        'personal': personal_json,
+        'estados': calendario_data['compacto'].ids_por_persona(),
+        'estados_catalogo': {
+            estado.pk: serializar_estado_catalogo(estado)
+            for estado in calendario_data['compacto'].estados_usados()
+        },
+        'dias_mes': calendario_data['dias_mes']
+    }
+
 
-def obtener_estado_final_personal_fecha(personal, fecha):
+@require_http_methods(["GET"])
+def api_estadisticas_estados(request):
     """
-    Calcula el estado final de una persona en una fecha específica,
-    considerando todas las fuentes y prioridades.
-    
-    Orden de prioridad:
-    1. Estados manuales (más alta prioridad)
-    2. Estados de fuentes externas (según prioridad del estado)
-    3. Estados derivados de turnos (más baja prioridad)
-    
-    Retorna una lista de estados cuando hay conflictos de prioridad.
+    API de días por Estado de cada persona en un rango (desde, hasta: YYYY-MM-DD),
+    p. ej. para remuneraciones. Opcionalmente acotada a personal_id (varios
+    separados por coma) o a faena_id. Se calcula sobre los ciclos y los
+    intervalos, sin resolver cada día (ver calendario.estadisticas).
     """
-    from django.db.models import Q
-    
-    # 1. Buscar estados manuales activos
-    estados_manuales = EstadoManual.objects.filter(
-        personal=personal,
-        fecha_inicio__lte=fecha,
-        fecha_fin__gte=fecha,
-        activo=True
-    ).select_related('estado').order_by('-estado__prioridad')
-    
-    if estados_manuales.exists():
-        # Si hay estados bloqueantes, retornar el de mayor prioridad
-        bloqueantes = [em for em in estados_manuales if em.estado.es_bloqueante]
-        if bloqueantes:
-            return [bloqueantes[0].estado]
-        # Si no hay bloqueantes, retornar el de mayor prioridad
-        return [estados_manuales.first().estado]
+    try:
+        fecha_inicio, fecha_fin = parsear_rango(request.GET.get('desde', ''), request.GET.get('hasta', ''))
+        if fecha_fin is None:
+            raise ValueError('Se requiere la fecha hasta')
+        personal_ids = None
+        if request.GET.get('personal_id'):
+            personal_ids = [int(pk) for pk in request.GET['personal_id'].split(',')]
+        faena_id = int(request.GET['faena_id']) if request.GET.get('faena_id') else None
+    except (ValueError, TypeError) as e:
+        return JsonResponse({'error': f'Parámetros inválidos: {e}'}, status=400)
     
-    # 2. Buscar estados de fuentes externas
-    estados_fuente = []
-    for estado_fuente in EstadoFuente.objects.select_related('estado', 'content_type').all():
-        if not estado_fuente.estado.activo:
-            continue
-            
-        # Construir consulta dinámica
-        modelo = estado_fuente.content_type.model_class()
-        if not modelo:
-            continue
-            
-        filtros = Q(**{
-            f"{estado_fuente.campo_personal}": personal,
-            f"{estado_fuente.campo_fecha_inicio}__lte": fecha,
-            f"{estado_fuente.campo_fecha_fin}__gte": fecha,
+    try:
+        conteo, estados = conteo_estados(fecha_inicio, fecha_fin, personal_ids, faena_id)
+        return JsonResponse({
+            'desde': fecha_inicio.isoformat(),
+            'hasta': fecha_fin.isoformat(),
+            'dias': (fecha_fin - fecha_inicio).days + 1,
+            'personal': conteo,
+            'estados_catalogo': {estado.pk: serializar_estado_catalogo(estado) for estado in estados},
         })
         
-        # Aplicar filtros extra si existen
-        if estado_fuente.filtro_extra:
-            for campo, valor in estado_fuente.filtro_extra.items():
-                filtros &= Q(**{campo: valor})
-        
-        if modelo.objects.filter(filtros).exists():
-            estados_fuente.append(estado_fuente.estado)
-    
-    # 3. Buscar estado derivado de turno
-    estado_turno = None
-    asignaciones_activas = AsignacionFaena.objects.filter(
-        personal=personal,
-        fecha_inicio__lte=fecha,
-        activo=True
-    ).filter(
-        Q(fecha_fin__isnull=True) | Q(fecha_fin__gte=fecha)
-    ).select_related('turno').first()
-    
-    if asignaciones_activas:
-        estado_turno = asignaciones_activas.obtener_estado_en_fecha(fecha)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@require_http_methods(["GET"])
+def ical_personal(request, personal_id):
+    """
+    Turnos de una persona en formato iCalendar (.ics) para suscribirse desde el
+    teléfono. Cada bloque del ciclo es un evento que se repite (RRULE) y los
+    estados manuales y ausencias van como excepciones (ver calendario.ical).
+    Parámetro opcional desde=YYYY-MM-DD (por defecto, el inicio del mes anterior).
+    """
+    desde = _desde_ical(request)
+    if desde is None:
+        return JsonResponse({'error': 'Parámetro inválido: desde debe tener el formato YYYY-MM-DD'}, status=400)
     
-    # 4. Resolver conflictos de prioridad
-    todos_estados = []
+    try:
+        persona = Personal.objects.filter(pk=personal_id).first()
+        if persona is None:
+            return JsonResponse({'error': 'Persona no encontrada'}, status=404)
+        return _respuesta_ical(request, feed_personal(persona, desde), f'turnos-{personal_id}.ics')
+        
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@require_http_methods(["GET"])
+def ical_faena(request, faena_id):
+    """Turnos del personal de una faena en formato iCalendar (.ics), como ical_personal"""
+    desde = _desde_ical(request)
+    if desde is None:
+        return JsonResponse({'error': 'Parámetro inválido: desde debe tener el formato YYYY-MM-DD'}, status=400)
     
-    # Agregar estados de fuentes externas
-    for estado_detalle in estados_fuente:
-        if isinstance(estado_detalle, dict):
-            # Nuevo formato con detalles
-            todos_estados.append({
-                'estado': estado_detalle['estado'],
-                'tipo': 'fuente',
-                'prioridad': estado_detalle['estado'].prioridad,
-                'detalle_fuente': estado_detalle
-            })
-        else:
-            # Formato anterior (fallback)
-            todos_estados.append({
-                'estado': estado_detalle,
-                'tipo': 'fuente',
-                'prioridad': estado_detalle.prioridad
-            })
+    try:
+        faena = Faena.objects.filter(pk=faena_id).first()
+        if faena is None:
+            return JsonResponse({'error': 'Faena no encontrada'}, status=404)
+        return _respuesta_ical(request, feed_faena(faena, desde), f'turnos-faena-{faena_id}.ics')
+        
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+def _desde_ical(request):
+    """Fecha `desde` del calendario .ics (None si es inválida)"""
+    if request.GET.get('desde'):
+        try:
+            return datetime.strptime(request.GET['desde'], '%Y-%m-%d').date()
+        except ValueError:
+            return None
+    hoy = date.today()
+    return date(hoy.year - (hoy.month == 1), (hoy.month - 2) % 12 + 1, 1)
+
+
+def _respuesta_ical(request, contenido, nombre_archivo):
+    """Respuesta text/calendar con ETag del contenido; 304 si el cliente ya lo tiene"""
+    etag = f'"{hashlib.sha1(contenido.encode()).hexdigest()}"'
+    
+    if request.headers.get('If-None-Match') == etag:
+        respuesta = HttpResponseNotModified()
+    else:
+        respuesta = HttpResponse(contenido, content_type='text/calendar; charset=utf-8')
+        respuesta['Content-Disposition'] = f'inline; filename="{nombre_archivo}"'
+    
+    respuesta['ETag'] = etag
+    respuesta['Cache-Control'] = 'no-cache'
+    return respuesta
+
+
+@require_http_methods(["GET"])
+def api_buscar_personal(request):
+    """
+    API de autocompletado de personal (q = nombre, apellidos o RUT, sin
+    importar tildes, mayúsculas, puntos ni guión). Busca por prefijo de
+    palabra sobre el índice de búsqueda; `inactivos=1` incluye al personal inactivo.
+    """
+    try:
+        limite = int(request.GET.get('limite', LIMITE_RESULTADOS))
+        if limite < 1:
+            raise ValueError
+    except (ValueError, TypeError):
+        return JsonResponse({'error': 'limite debe ser un entero positivo'}, status=400)
     
-    # Agregar estado de turno si existe
-    if estado_turno:
-        # Incluir información detallada del turno
-        estado_turno_detalle = {
-            'estado': estado_turno,
-            'tipo_fuente': 'turno',
-            'fuente_nombre': 'asignacion_faena',
-            'fecha_inicio': asignaciones_activas.fecha_inicio,
-            'fecha_fin': asignaciones_activas.fecha_fin,
-            'detalles': {
-                'faena': asignaciones_activas.faena.nombre,
-                'turno': asignaciones_activas.turno.nombre,
-                'tipo': 'Asignación de Faena'
+    try:
+        personas = buscar_personal(
+            request.GET.get('q', ''), limite, solo_activos=request.GET.get('inactivos') != '1'
+        )
+        return JsonResponse({'resultados': [
+            {
+                'id': p.personal_id,
+                'nombre': f"{p.nombre} {p.apepat} {p.apemat}".strip(),
+                'rut': f"{p.rut}-{p.dvrut}",
+                'activo': p.activo,
             }
-        }
-        todos_estados.append({
-            'estado': estado_turno,
-            'tipo': 'turno',
-            'prioridad': estado_turno.prioridad,
-            'detalle_fuente': estado_turno_detalle
-        })
+            for p in personas
+        ]})
+        
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@require_http_methods(["GET"])
+def api_procedencia_celda(request):
+    """
+    API que explica una celda del calendario (personal_id, fecha YYYY-MM-DD):
+    qué estados manuales, fuentes y turno coinciden, sus prioridades y por qué
+    ganó el estado mostrado. Se pide al abrir el detalle de la celda.
+    """
+    try:
+        personal_id = int(request.GET.get('personal_id', ''))
+        fecha = datetime.strptime(request.GET.get('fecha', ''), '%Y-%m-%d').date()
+    except (ValueError, TypeError):
+        return JsonResponse({'error': 'Parámetros inválidos: se requiere personal_id y fecha (YYYY-MM-DD)'}, status=400)
     
-    if not todos_estados:
-        # Si no hay nada, retornar estado por defecto
+    try:
+        persona = Personal.objects.prefetch_related(*prefetch_ventana(fecha, fecha)).filter(personal_id=personal_id).first()
+        if persona is None:
+            return JsonResponse({'error': 'Personal no encontrado'}, status=404)
+        
+        explicacion = Ventana(fecha, fecha, [personal_id]).explicar(persona, fecha)
+        return JsonResponse(dict(explicacion, personal_id=personal_id, fecha=fecha.isoformat()))
+        
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def api_simular_asignaciones(request):
+    """
+    API de simulación: aplica en memoria altas, modificaciones y bajas de
+    asignaciones propuestas y devuelve las celdas resultantes y las diferencias
+    de dotación del mes visible, sin escribir en la base de datos.
+    """
+    try:
+        data = json.loads(request.body)
+        year, month = _mes_visible(data, date.today())
+        
+        crear = data.get('crear') or []
+        actualizar = data.get('actualizar') or []
+        eliminar = data.get('eliminar') or []
+        if not all(isinstance(cambios, list) for cambios in (crear, actualizar, eliminar)):
+            return JsonResponse({'error': 'crear, actualizar y eliminar deben ser listas'}, status=400)
+        
+        return JsonResponse(simular_cambios(year, month, crear, actualizar, eliminar))
+        
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Datos JSON inválidos'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def api_optimizar_fases(request):
+    """
+    API que sugiere el bloque de inicio de cada persona de una faena para
+    acercar la dotación diaria por Estado a los objetivos indicados
+    ({estado_id: personas por día}). No crea ni modifica asignaciones.
+    """
+    try:
+        data = json.loads(request.body)
+        
+        faena_id = data.get('faena_id')
+        turno_id = data.get('turno_id')
+        personal_ids = data.get('personal_ids') or []
+        objetivos = data.get('objetivos') or {}
+        fecha_inicio = data.get('fecha_inicio')
+        
+        if not all([faena_id, turno_id, personal_ids, objetivos, fecha_inicio]):
+            return JsonResponse({'error': 'Faltan datos requeridos'}, status=400)
+        
         try:
-            estado_predeterminado = Estado.objects.filter(
-                activo=True,
-                es_predeterminado=True
-            ).first()
-            
-            if estado_predeterminado:
-                return [estado_predeterminado]
-            
-            return []
-        except:
-            return []
-    
-    # Ordenar por prioridad (mayor número = mayor prioridad)
-    todos_estados.sort(key=lambda x: x['prioridad'], reverse=True)
-    
-    # Si hay estados bloqueantes, solo retornar el de mayor prioridad
-    bloqueantes = [x for x in todos_estados if x['estado'].es_bloqueante]
-    if bloqueantes:
-        return [bloqueantes[0]['estado']]
-    
-    # Obtener la prioridad más alta
-    prioridad_maxima = todos_estados[0]['prioridad']
-    
-    # Retornar todos los estados que tengan la prioridad más alta con sus detalles
-    estados_misma_prioridad = [
-        x for x in todos_estados 
-        if x['prioridad'] == prioridad_maxima
-    ]
-    
-    return estados_misma_prioridad
+            fecha_inicio_date, _ = parsear_rango(fecha_inicio, None)
+            objetivos = {int(estado_id): int(cantidad) for estado_id, cantidad in objetivos.items()}
+        except (ValueError, TypeError, AttributeError) as e:
+            return JsonResponse({'error': f'Datos inválidos: {e}'}, status=400)
+        
+        try:
+            faena = Faena.objects.get(id=faena_id)
+            turno = Turno.objects.prefetch_related('bloques').get(id=turno_id)
+        except (Faena.DoesNotExist, Turno.DoesNotExist, ValueError):
+            return JsonResponse({'error': 'Datos inválidos'}, status=400)
+        
+        personal = list(
+            Personal.objects.filter(personal_id__in=personal_ids).prefetch_related(
+                Prefetch('asignaciones_faena', queryset=AsignacionFaena.objects.filter(activo=True, faena=faena, turno=turno))
+            ).order_by('nombre', 'apepat')
+        )
+        if not personal:
+            return JsonResponse({'error': 'Personal no encontrado'}, status=400)
+        
+        try:
+            resultado = sugerir_bloques_inicio(faena, turno, personal, objetivos, fecha_inicio_date)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse(resultado)
+        
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Datos JSON inválidos'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
 
-def api_calendario_mensual(request):
-    """API para obtener datos del calendario en formato JSON"""
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def api_aplicar_estado_manual(request):
+    """
+    API para aplicar un Estado manual en un rango de fechas a un grupo de
+    personas (por faena, cargo, departamento o lista explícita) de una vez.
+    """
     try:
-        year = int(request.GET.get('year', datetime.now().year))
-        month = int(request.GET.get('month', datetime.now().month))
-        faena_filter = request.GET.get('faena', '')
-        cargo_filter = request.GET.get('cargo', '')
-        search_query = request.GET.get('search', '')
+        data = json.loads(request.body)
         
-        calendario_data = obtener_calendario_mensual(year, month, faena_filter, cargo_filter, search_query)
+        estado_id = data.get('estado_id')
+        fecha_inicio = data.get('fecha_inicio')
+        fecha_fin = data.get('fecha_fin')
+        
+        if not all([estado_id, fecha_inicio, fecha_fin]):
+            return JsonResponse({'error': 'Faltan datos requeridos'}, status=400)
         
-        # Convertir a formato JSON serializable
-        json_data = {
-            'personal': [
-                {
-                    'id': p.personal_id,
-                    'nombre': f"{p.nombre} {p.apepat} {p.apemat}".strip(),
-                    'cargo': p.infolaboral_set.first().cargo_id.cargo if p.infolaboral_set.exists() else 'Sin cargo',
-                    'faena': p.asignaciones_faena.filter(activo=True).first().faena.nombre if p.asignaciones_faena.filter(activo=True).exists() else 'Sin asignar'
-                }
-                for p in calendario_data['personal']
-            ],
-            'estados': calendario_data['estados'],
-            'dias_mes': calendario_data['dias_mes']
-        }
-        
-        return JsonResponse(json_data)
+        try:
+            fecha_inicio_date, fecha_fin_date = parsear_rango(fecha_inicio, fecha_fin)
+        except ValueError as e:
+            return JsonResponse({'error': f'Fechas inválidas: {e}'}, status=400)
         
+        try:
+            estado = Estado.objects.get(id=estado_id, activo=True)
+        except (Estado.DoesNotExist, ValueError):
+            return JsonResponse({'error': 'Estado no encontrado'}, status=400)
+        
+        try:
+            personal = seleccionar_personal(
+                fecha_inicio_date, fecha_fin_date,
+                faena_id=data.get('faena_id'),
+                cargo_id=data.get('cargo_id'),
+                depto_id=data.get('depto_id'),
+                personal_ids=data.get('personal_ids'),
+                todo_el_personal=bool(data.get('todo_el_personal'))
+            )
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        
+        personal_ids = aplicar_estado_manual(
+            estado, fecha_inicio_date, fecha_fin_date, personal, motivo=data.get('motivo', '')
+        )
+        return JsonResponse({
+            'success': True,
+            'message': f'Estado {estado.nombre} aplicado a {len(personal_ids)} persona(s)',
+            'personal_ids': personal_ids
+        })
+        
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Datos JSON inválidos'}, status=400)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 
+def asignaciones_en_ventana(persona, fecha_inicio, fecha_fin):
+    """
+    Asignaciones activas (ya pre-cargadas) que se cruzan con el rango dado,
+    incluyendo las que no tienen fecha de fin.
+    """
+    return [
+        af for af in persona.asignaciones_faena.all()
+        if af.activo and af.fecha_inicio <= fecha_fin and (not af.fecha_fin or af.fecha_fin >= fecha_inicio)
+    ]
+
+
+def celdas_afectadas(personal_id, year, month):
+    """
+    Recalcula con el motor del calendario las celdas de una persona en el mes
+    visible del cliente, para que pueda actualizar su fila sin recargar la página.
+    """
+    calendario_data = obtener_calendario_mensual(year, month, personal_ids=[personal_id])
+    fecha_inicio_mes = calendario_data['fechas'][0]
+    fecha_fin_mes = calendario_data['fechas'][-1]
+    
+    asignaciones = [
+        serializar_asignacion(af)
+        for persona in calendario_data['personal']
+        for af in asignaciones_en_ventana(persona, fecha_inicio_mes, fecha_fin_mes)
+    ]
+    
+    compacto = calendario_data['compacto']
+    return {
+        'personal_id': personal_id,
+        'year': year,
+        'month': month,
+        'estados': dict(zip(compacto.claves, compacto.fila(personal_id))) if personal_id in compacto.filas else {},
+        'estados_catalogo': {estado.pk: serializar_estado_catalogo(estado) for estado in compacto.estados_usados()},
+        'asignaciones_faena': asignaciones
+    }
+
+
+def _mes_visible(data, fecha_referencia):
+    """Mes que el cliente tiene en pantalla (year/month del payload) o el de la fecha de referencia"""
+    try:
+        year = int(data.get('year') or fecha_referencia.year)
+        month = int(data.get('month') or fecha_referencia.month)
+    except (ValueError, TypeError):
+        return fecha_referencia.year, fecha_referencia.month
+    
+    if month < 1 or month > 12 or year < 1900 or year > 2100:
+        return fecha_referencia.year, fecha_referencia.month
+    return year, month
+
+
+def _precargar_referencias(personal_id, faena_id, turno_id, bloque_inicio_id):
+    """
+    Carga Personal, Faena, Turno y el bloque de inicio con el mínimo de consultas:
+    los bloques del turno traen su Turno con select_related, así turno y ciclo
+    llegan en una sola consulta. Si no se indica bloque de inicio se usa el primero
+    del ciclo.
+    """
+    personal = Personal.objects.get(personal_id=personal_id) if personal_id else None
+    faena = Faena.objects.get(id=faena_id)
+    bloques = list(TurnoBloque.objects.select_related('turno').filter(turno_id=turno_id).order_by('orden'))
+    if not bloques:
+        raise Turno.DoesNotExist
+    
+    turno = bloques[0].turno
+    if not bloque_inicio_id:
+        return personal, faena, turno, bloques[0]
+    
+    for bloque in bloques:
+        if str(bloque.id) == str(bloque_inicio_id):
+            return personal, faena, turno, bloque
+    raise TurnoBloque.DoesNotExist
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def crear_asignacion(request):
-    """API para crear una nueva asignación de faena"""
+    """
+    API para crear una nueva asignación de faena.
+    Devuelve las celdas recalculadas de la persona para el mes visible.
+    """
     try:
         data = json.loads(request.body)
         
@@ -651,65 +621,41 @@ def crear_asignacion(request):
             return JsonResponse({'error': 'Faltan datos requeridos'}, status=400)
         
         try:
-            personal = Personal.objects.get(personal_id=personal_id)
-            faena = Faena.objects.get(id=faena_id)
-            turno = Turno.objects.get(id=turno_id)
-            bloque_inicio = None
-            if bloque_inicio_id:
-                bloque_inicio = TurnoBloque.objects.get(id=bloque_inicio_id, turno=turno)
-        except (Personal.DoesNotExist, Faena.DoesNotExist, Turno.DoesNotExist, TurnoBloque.DoesNotExist):
-            return JsonResponse({'error': 'Datos inválidos'}, status=400)
-        
-        # Verificar solapamiento de fechas con asignaciones existentes
-        from django.db.models import Q
-        
-        # Convertir fechas string a objetos date
-        fecha_inicio_date = datetime.strptime(fecha_inicio, '%Y-%m-%d').date()
-        fecha_fin_date = None
-        if fecha_fin:
-            fecha_fin_date = datetime.strptime(fecha_fin, '%Y-%m-%d').date()
-        
-        # Buscar asignaciones que se solapen
-        solapamiento_query = Q(personal=personal, activo=True)
-        
-        if fecha_fin_date:
-            # Nueva asignación tiene fecha fin: buscar cualquier solapamiento
-            # Dos rangos se solapan si: inicio1 <= fin2 AND inicio2 <= fin1
-            solapamiento_query &= (
-                Q(fecha_inicio__lte=fecha_fin_date) & 
-                (Q(fecha_fin__isnull=True) | Q(fecha_fin__gte=fecha_inicio_date))
-            )
-        else:
-            # Nueva asignación sin fecha fin: buscar asignaciones que estén activas en la fecha de inicio
-            # Una asignación sin fin se solapa con cualquier asignación que esté activa en esa fecha
-            solapamiento_query &= (
-                Q(fecha_inicio__lte=fecha_inicio_date) & 
-                (Q(fecha_fin__isnull=True) | Q(fecha_fin__gte=fecha_inicio_date))
+            fecha_inicio_date, fecha_fin_date = parsear_rango(fecha_inicio, fecha_fin)
+        except ValueError as e:
+            return JsonResponse({'error': f'Fechas inválidas: {e}'}, status=400)
+        
+        with transaction.atomic():
+            try:
+                personal, faena, turno, bloque_inicio = _precargar_referencias(
+                    personal_id, faena_id, turno_id, bloque_inicio_id
+                )
+            except (Personal.DoesNotExist, Faena.DoesNotExist, Turno.DoesNotExist, TurnoBloque.DoesNotExist):
+                return JsonResponse({'error': 'Datos inválidos'}, status=400)
+            
+            if hay_solapamiento(personal.personal_id, fecha_inicio_date, fecha_fin_date):
+                return JsonResponse({
+                    'error': 'Las fechas se solapan con una asignación existente. Revisa las fechas de las asignaciones actuales.'
+                }, status=400)
+            
+            # Crear nueva asignación
+            asignacion = AsignacionFaena.objects.create(
+                personal=personal,
+                faena=faena,
+                turno=turno,
+                fecha_inicio=fecha_inicio_date,
+                fecha_fin=fecha_fin_date,
+                bloque_inicio=bloque_inicio,
+                observaciones=observaciones,
+                activo=activo
             )
         
-        asignaciones_solapadas = AsignacionFaena.objects.filter(solapamiento_query)
-        
-        if asignaciones_solapadas.exists():
-            return JsonResponse({
-                'error': f'Las fechas se solapan con una asignación existente. Revisa las fechas de las asignaciones actuales.'
-            }, status=400)
-        
-        # Crear nueva asignación
-        asignacion = AsignacionFaena.objects.create(
-            personal=personal,
-            faena=faena,
-            turno=turno,
-            fecha_inicio=fecha_inicio,
-            fecha_fin=fecha_fin if fecha_fin else None,
-            bloque_inicio=bloque_inicio,
-            observaciones=observaciones,
-            activo=activo
-        )
-        
+        year, month = _mes_visible(data, fecha_inicio_date)
         return JsonResponse({
             'success': True,
             'message': 'Asignación creada correctamente',
-            'asignacion_id': asignacion.id
+            'asignacion_id': asignacion.id,
+            'calendario': celdas_afectadas(personal.personal_id, year, month)
         })
         
     except json.JSONDecodeError:
@@ -721,7 +667,10 @@ def crear_asignacion(request):
 @csrf_exempt
 @require_http_methods(["POST"])
 def actualizar_asignacion(request):
-    """API para actualizar una asignación de faena existente"""
+    """
+    API para actualizar una asignación de faena existente.
+    Devuelve las celdas recalculadas de la persona para el mes visible.
+    """
     try:
         data = json.loads(request.body)
         
@@ -739,60 +688,41 @@ def actualizar_asignacion(request):
             return JsonResponse({'error': 'Faltan datos requeridos'}, status=400)
         
         try:
-            asignacion = AsignacionFaena.objects.get(id=asignacion_id)
-            faena = Faena.objects.get(id=faena_id)
-            turno = Turno.objects.get(id=turno_id)
-            bloque_inicio = None
-            if bloque_inicio_id:
-                bloque_inicio = TurnoBloque.objects.get(id=bloque_inicio_id, turno=turno)
-        except (AsignacionFaena.DoesNotExist, Faena.DoesNotExist, Turno.DoesNotExist, TurnoBloque.DoesNotExist):
-            return JsonResponse({'error': 'Datos inválidos'}, status=400)
-        
-        # Verificar solapamiento de fechas con otras asignaciones (excluyendo la actual)
-        from django.db.models import Q
-        
-        # Convertir fechas string a objetos date
-        fecha_inicio_date = datetime.strptime(fecha_inicio, '%Y-%m-%d').date()
-        fecha_fin_date = None
-        if fecha_fin:
-            fecha_fin_date = datetime.strptime(fecha_fin, '%Y-%m-%d').date()
-        
-        # Buscar asignaciones que se solapen (excluyendo la que estamos editando)
-        solapamiento_query = Q(personal=asignacion.personal, activo=True) & ~Q(id=asignacion.id)
-        
-        if fecha_fin_date:
-            # Asignación editada tiene fecha fin: buscar cualquier solapamiento
-            solapamiento_query &= (
-                Q(fecha_inicio__lte=fecha_fin_date) & 
-                (Q(fecha_fin__isnull=True) | Q(fecha_fin__gte=fecha_inicio_date))
-            )
-        else:
-            # Asignación editada sin fecha fin: buscar asignaciones que empiecen antes o en la fecha de inicio
-            solapamiento_query &= (
-                Q(fecha_inicio__lte=fecha_inicio_date) & 
-                (Q(fecha_fin__isnull=True) | Q(fecha_fin__gte=fecha_inicio_date))
-            )
-        
-        asignaciones_solapadas = AsignacionFaena.objects.filter(solapamiento_query)
-        
-        if asignaciones_solapadas.exists():
-            return JsonResponse({
-                'error': f'Las fechas se solapan con otra asignación existente. Revisa las fechas de las asignaciones actuales.'
-            }, status=400)
-        
-        # Actualizar asignación
-        asignacion.faena = faena
-        asignacion.turno = turno
-        asignacion.fecha_inicio = fecha_inicio
-        asignacion.fecha_fin = fecha_fin if fecha_fin else None
-        asignacion.bloque_inicio = bloque_inicio
-        asignacion.observaciones = observaciones
-        asignacion.activo = activo
-        asignacion.save()
-        
+            fecha_inicio_date, fecha_fin_date = parsear_rango(fecha_inicio, fecha_fin)
+        except ValueError as e:
+            return JsonResponse({'error': f'Fechas inválidas: {e}'}, status=400)
+        
+        with transaction.atomic():
+            try:
+                asignacion = AsignacionFaena.objects.get(id=asignacion_id)
+                _, faena, turno, bloque_inicio = _precargar_referencias(
+                    None, faena_id, turno_id, bloque_inicio_id
+                )
+            except (AsignacionFaena.DoesNotExist, Faena.DoesNotExist, Turno.DoesNotExist, TurnoBloque.DoesNotExist):
+                return JsonResponse({'error': 'Datos inválidos'}, status=400)
+            
+            # Verificar solapamiento con otras asignaciones (excluyendo la actual)
+            if hay_solapamiento(asignacion.personal_id, fecha_inicio_date, fecha_fin_date, excluir=[asignacion.id]):
+                return JsonResponse({
+                    'error': 'Las fechas se solapan con otra asignación existente. Revisa las fechas de las asignaciones actuales.'
+                }, status=400)
+            
+            # Actualizar asignación
+            asignacion.faena = faena
+            asignacion.turno = turno
+            asignacion.fecha_inicio = fecha_inicio_date
+            asignacion.fecha_fin = fecha_fin_date
+            asignacion.bloque_inicio = bloque_inicio
+            asignacion.observaciones = observaciones
+            asignacion.activo = activo
+            asignacion.save()
+        
+        year, month = _mes_visible(data, fecha_inicio_date)
         return JsonResponse({
             'success': True,
-            'message': 'Asignación actualizada correctamente'
+            'message': 'Asignación actualizada correctamente',
+            'asignacion_id': asignacion.id,
+            'calendario': celdas_afectadas(asignacion.personal_id, year, month)
         })
         
     except json.JSONDecodeError:
@@ -804,7 +734,10 @@ def actualizar_asignacion(request):
 @csrf_exempt
 @require_http_methods(["POST"])
 def eliminar_asignacion(request):
-    """API para eliminar una asignación de faena"""
+    """
+    API para eliminar una asignación de faena.
+    Devuelve las celdas recalculadas de la persona para el mes visible.
+    """
     try:
         data = json.loads(request.body)
         asignacion_id = data.get('asignacion_id')
@@ -812,15 +745,21 @@ def eliminar_asignacion(request):
         if not asignacion_id:
             return JsonResponse({'error': 'ID de asignación requerido'}, status=400)
         
-        try:
-            asignacion = AsignacionFaena.objects.get(id=asignacion_id)
+        with transaction.atomic():
+            try:
+                asignacion = AsignacionFaena.objects.get(id=asignacion_id)
+            except AsignacionFaena.DoesNotExist:
+                return JsonResponse({'error': 'Asignación no encontrada'}, status=404)
+            
+            personal_id = asignacion.personal_id
+            fecha_referencia = asignacion.fecha_inicio
             asignacion.delete()
-        except AsignacionFaena.DoesNotExist:
-            return JsonResponse({'error': 'Asignación no encontrada'}, status=404)
         
+        year, month = _mes_visible(data, fecha_referencia)
         return JsonResponse({
             'success': True,
-            'message': 'Asignación eliminada correctamente'
+            'message': 'Asignación eliminada correctamente',
+            'calendario': celdas_afectadas(personal_id, year, month)
         })
         
     except json.JSONDecodeError:
@@ -829,4 +768,15 @@ def eliminar_asignacion(request):
         return JsonResponse({'error': str(e)}, status=500)
 
 
-
+@require_http_methods(["GET", "HEAD"])
+def servir_estatico(request, path):
+    """
+    Sirve STATIC_ROOT (lo que deja collectstatic) cuando no hay un servidor web
+    delante. Los archivos del manifiesto de ManifestStaticFilesStorage llevan el
+    hash en el nombre y se cachean por un año; si cambian, cambia su URL. El
+    resto (p. ej. el nombre sin hash) se revalida en cada uso.
+    """
+    respuesta = serve(request, path, document_root=settings.STATIC_ROOT)
+    con_hash = path in getattr(staticfiles_storage, 'hashed_files', {}).values()
+    respuesta['Cache-Control'] = CACHE_ESTATICO_CON_HASH if con_hash else 'no-cache'
+    return respuesta
@@ -117,8 +117,28 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# En producción `collectstatic` copia el CSS y el JS con el hash del contenido
+# en el nombre, y calendario.views.servir_estatico los sirve con caché de un
+# año. Con DEBUG se sirven sin hash desde las apps (no hace falta collectstatic).
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'
+        ),
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Hilos para recalcular en segundo plano el calendario precalculado tras cada
+# cambio (0 = sin hilos; los trabajos quedan en cola para `manage.py procesar_recalculos`)
+CALENDARIO_RECALCULO_HILOS = 2
@@ -14,10 +14,17 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
+
+from calendario.views import servir_estatico
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('calendario/', include('calendario.urls')),
+    # Con DEBUG, runserver sirve los estáticos desde las apps antes de llegar aquí
+    re_path(rf'^{re.escape(settings.STATIC_URL.lstrip("/"))}(?P<path>.+)$', servir_estatico),
 ]